@@ -0,0 +1,137 @@
+"""Queries per second of the embedded DNS server.
+
+Fills a ``DNSAuthority`` with N records, then measures:
+
+- in-process: ``DNSServer.handle`` (parse + trie lookup + encode) in a tight loop
+- udp: K concurrent clients sending queries over loopback UDP, each waiting
+  for its answer before sending the next one
+
+    cd backend && python benchmarks/bench_dns_server.py --records 100000 --clients 64 --seconds 5
+
+Prints a JSON report.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dns_server import TYPE_A, DNSAuthority, DNSServer  # noqa: E402
+
+ZONE = "bench.example"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def build_query(name: str, msg_id: int) -> bytes:
+    qname = b"".join(bytes([len(label)]) + label.encode() for label in name.split(".")) + b"\0"
+    return struct.pack("!HHHHHH", msg_id, 0x0100, 1, 0, 0, 0) + qname + struct.pack("!HH", TYPE_A, 1)
+
+
+def build_authority(records: int) -> DNSAuthority:
+    authority = DNSAuthority([f"ns1.{ZONE}"])
+    authority.loaded = True
+    authority.add_zone(ZONE)
+    for i in range(records):
+        authority.upsert({
+            "id": str(i), "full_name": f"host{i}.{ZONE}", "record_type": "A",
+            "content": f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}", "ttl": 60,
+        })
+    return authority
+
+
+def bench_in_process(server: DNSServer, names, seconds: float) -> dict:
+    queries = [build_query(name, i & 0xFFFF) for i, name in enumerate(names)]
+    done = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for query in queries[:1000]:
+            server.handle(query, udp=True)
+        done += 1000
+        queries.append(queries.pop(0))
+    elapsed = time.perf_counter() - start
+    return {"queries": done, "qps": round(done / elapsed), "us_per_query": round(elapsed / done * 1e6, 2)}
+
+
+class Client(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.waiter = None
+
+    def datagram_received(self, data, addr):
+        if self.waiter and not self.waiter.done():
+            self.waiter.set_result(data)
+
+
+async def bench_udp(port: int, names, clients: int, seconds: float) -> dict:
+    loop = asyncio.get_running_loop()
+    latencies = []
+    timeouts = 0
+    deadline = time.perf_counter() + seconds
+
+    async def run_client():
+        nonlocal timeouts
+        transport, protocol = await loop.create_datagram_endpoint(Client, remote_addr=("127.0.0.1", port))
+        try:
+            while time.perf_counter() < deadline:
+                protocol.waiter = loop.create_future()
+                start = time.perf_counter()
+                transport.sendto(build_query(random.choice(names), random.randrange(0x10000)))
+                try:
+                    await asyncio.wait_for(protocol.waiter, 1.0)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                except asyncio.TimeoutError:
+                    timeouts += 1
+        finally:
+            transport.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    return {
+        "clients": clients,
+        "queries": len(latencies),
+        "timeouts": timeouts,
+        "qps": round(len(latencies) / elapsed),
+        "latency_ms": {"p50": round(percentile(latencies, 50), 3), "p99": round(percentile(latencies, 99), 3)},
+    }
+
+
+async def main(args):
+    start = time.perf_counter()
+    authority = build_authority(args.records)
+    load_s = time.perf_counter() - start
+    names = [f"host{random.randrange(args.records)}.{ZONE}" for _ in range(5000)]
+    # A share of misses exercises the NXDOMAIN path too
+    names += [f"missing{i}.{ZONE}" for i in range(500)]
+
+    server = DNSServer(authority, "127.0.0.1", args.port)
+    in_process = bench_in_process(server, names, args.seconds)
+    await server.start()
+    try:
+        udp = await bench_udp(args.port, names, args.clients, args.seconds)
+    finally:
+        await server.close()
+    print(json.dumps({
+        "records": args.records,
+        "trie_build_s": round(load_s, 3),
+        "in_process": in_process,
+        "udp": udp,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--port", type=int, default=53053)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,92 @@
+"""Event-loop lag under concurrent logins: bcrypt inline vs. on the worker pool.
+
+Simulates N concurrent login checks while a probe coroutine measures how late
+the event loop wakes it up. Inline bcrypt blocks the loop for the whole
+check; the pooled hasher keeps it responsive.
+
+    cd backend && python benchmarks/bench_password_hashing.py --logins 32 --rounds 12
+
+Prints a JSON report.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import bcrypt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from password_hasher import PasswordHasher  # noqa: E402
+
+PROBE_INTERVAL = 0.005
+
+
+async def probe_lag(stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        samples.append((time.perf_counter() - start - PROBE_INTERVAL) * 1000)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+async def run_scenario(name, check, logins):
+    samples = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_lag(stop, samples))
+    await asyncio.sleep(PROBE_INTERVAL * 2)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(check() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe
+    return {
+        "scenario": name,
+        "logins": logins,
+        "elapsed_s": round(elapsed, 3),
+        "logins_per_s": round(logins / elapsed, 1),
+        "loop_lag_ms": {
+            "mean": round(statistics.mean(samples), 2) if samples else 0.0,
+            "p99": round(percentile(samples, 99), 2),
+            "max": round(max(samples), 2) if samples else 0.0,
+        },
+    }
+
+
+async def main(args):
+    password = b"correct horse battery staple"
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds=args.rounds))
+
+    async def inline_check():
+        # What the handlers did before: bcrypt straight on the event loop
+        bcrypt.checkpw(password, hashed)
+        await asyncio.sleep(0)
+
+    hasher = PasswordHasher(rounds=args.rounds, workers=args.workers, max_queue=args.logins)
+
+    async def pooled_check():
+        await hasher.verify(password.decode(), hashed.decode())
+
+    report = [
+        await run_scenario("inline", inline_check, args.logins),
+        await run_scenario("pool", pooled_check, args.logins),
+    ]
+    hasher.shutdown()
+    print(json.dumps({"rounds": args.rounds, "workers": args.workers, "results": report}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=2)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,96 @@
+"""Records validated per second: the old inline regexes vs. validation.py.
+
+Builds a synthetic import (mostly A records sharing a few addresses, some
+AAAA/CNAME/NS and a slice of invalid entries) and times three ways of
+checking it: the regexes the routes used to compile on every call, the
+per-record ``record_error`` and the batch ``validate_records``.
+
+    cd backend && python benchmarks/bench_validation.py --records 100000 --addresses 500
+
+Prints a JSON report.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from validation import record_error, validate_records  # noqa: E402
+
+
+def legacy_error(record_type, name, content):
+    """What create_record/update_record did before (kept here for comparison)."""
+    if record_type not in ["A", "AAAA", "CNAME", "NS"]:
+        return "Record type must be A, AAAA, CNAME, or NS"
+    if not re.match(r'^[a-zA-Z0-9]([a-zA-Z0-9-]*[a-zA-Z0-9])?$', name):
+        return "Invalid subdomain name. Use only letters, numbers, and hyphens."
+    if len(name) > 63:
+        return "Subdomain name too long (max 63 characters)"
+    if record_type == "A":
+        if not re.match(r'^(\d{1,3}\.){3}\d{1,3}$', content) or any(int(p) > 255 for p in content.split('.')):
+            return "Invalid IPv4 address"
+    elif record_type == "AAAA":
+        if not re.match(r'^[0-9a-fA-F:]+$', content):
+            return "Invalid IPv6 address"
+    elif record_type in ("CNAME", "NS"):
+        if not re.match(r'^[a-zA-Z0-9][a-zA-Z0-9.\-]+[a-zA-Z0-9]$', content):
+            return "Invalid target"
+    return None
+
+
+def make_records(count, addresses, invalid, seed=1):
+    rng = random.Random(seed)
+    v4 = [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}" for _ in range(addresses)]
+    v6 = [f"2001:db8:{rng.randint(0, 0xffff):x}::{rng.randint(1, 0xffff):x}" for _ in range(addresses)]
+    records = []
+    for i in range(count):
+        roll = rng.random()
+        name = f"host-{i}"
+        if roll < invalid:
+            records.append(rng.choice([("A", name, "300.1.1.1"), ("AAAA", name, ":::::"), ("CNAME", f"-{name}", "x.example.com")]))
+        elif roll < 0.75:
+            records.append(("A", name, rng.choice(v4)))
+        elif roll < 0.9:
+            records.append(("AAAA", name, rng.choice(v6)))
+        elif roll < 0.97:
+            records.append(("CNAME", name, f"target-{i % 50}.example.net"))
+        else:
+            records.append(("NS", name, f"ns{i % 4}.example.org"))
+    return records
+
+
+def timed(name, fn, records, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        errors = fn(records)
+        best = min(best, time.perf_counter() - start)
+    return {
+        "scenario": name,
+        "elapsed_s": round(best, 4),
+        "records_per_s": round(len(records) / best),
+        "invalid": sum(1 for e in errors if e),
+    }
+
+
+def main(args):
+    records = make_records(args.records, args.addresses, args.invalid)
+    report = [
+        timed("legacy inline regexes", lambda rs: [legacy_error(*r) for r in rs], records, args.repeat),
+        timed("record_error per record", lambda rs: [record_error(*r) for r in rs], records, args.repeat),
+        timed("validate_records batch", validate_records, records, args.repeat),
+    ]
+    print(json.dumps({"records": args.records, "distinct_addresses": args.addresses, "results": report}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--addresses", type=int, default=500, help="distinct A/AAAA contents")
+    parser.add_argument("--invalid", type=float, default=0.02, help="share of invalid records")
+    parser.add_argument("--repeat", type=int, default=3)
+    main(parser.parse_args())
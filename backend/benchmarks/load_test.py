@@ -0,0 +1,341 @@
+"""Offline load test: the whole API in-process against a local mongod and a fake Cloudflare.
+
+The FastAPI app is started in this process (startup hooks included) and driven
+through an ASGI client, so no ports, proxies or real Cloudflare/SMTP accounts
+are involved. Cloudflare is replaced by ``fake_cloudflare.FakeCloudflare`` with
+configurable latency and 429 injection; outgoing mail is discarded.
+
+Scenarios (each run with ``--concurrency`` requests in flight):
+
+- signup: registration burst of new Gmail addresses (bcrypt + email outbox)
+- login: login storm against pre-seeded verified users
+- ddns: /nic/update flood over pre-seeded hosts, each update changing the IP
+- admin: paging /api/admin/users (by date, record count and email, plus a
+  search) over ``--admin-users`` seeded users
+
+    cd backend && python benchmarks/load_test.py --mongo-url mongodb://localhost:27017 \\
+        --cf-latency 0.05 --cf-429-every 50 --output report.json
+    python benchmarks/load_test.py --baseline report.json   # exit 1 on regressions
+
+The database named by ``--db`` is dropped before and after the run. Reports
+req/s, p50/p95/p99 latency and event-loop lag per scenario as JSON.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ZONE_ID = "bench-zone"
+PASSWORD = "bench-password"
+PROBE_INTERVAL = 0.005
+SCENARIOS = ("signup", "login", "ddns", "admin")
+
+
+class NullSMTP:
+    """Accepts and drops every message, so signups exercise the outbox without a mail server."""
+
+    def send(self, from_addr, to_addr, message):
+        pass
+
+    def close(self):
+        pass
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def probe_lag(stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        samples.append((time.perf_counter() - start - PROBE_INTERVAL) * 1000)
+
+
+async def drive(name, make_request, total, concurrency, fake):
+    """Send ``total`` requests with ``concurrency`` in flight; ``make_request(i)`` returns a response."""
+    latencies = []
+    statuses = Counter()
+    lag = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_lag(stop, lag))
+    cf_before = sum(fake.calls.values())
+    cf_limited_before = fake.rate_limited
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                resp = await make_request(i)
+                statuses[resp.status_code] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+
+    ok = sum(n for status, n in statuses.items() if isinstance(status, int) and status < 400)
+    return {
+        "scenario": name,
+        "requests": total,
+        "concurrency": concurrency,
+        "ok": ok,
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=str)},
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(max(latencies), 2) if latencies else 0.0,
+        },
+        "loop_lag_ms": {
+            "mean": round(statistics.mean(lag), 2) if lag else 0.0,
+            "p99": round(percentile(lag, 99), 2),
+            "max": round(max(lag), 2) if lag else 0.0,
+        },
+        "cloudflare": {"calls": sum(fake.calls.values()) - cf_before, "rate_limited": fake.rate_limited - cf_limited_before},
+    }
+
+
+# --- seeding (straight into Mongo, bypassing the API) ---
+
+def user_doc(email, password_hash, created_at, role="user"):
+    return {
+        "id": str(uuid.uuid4()),
+        "email": email,
+        "password_hash": password_hash,
+        "plan": "free",
+        "verified": True,
+        "role": role,
+        "created_at": created_at.isoformat(),
+    }
+
+
+async def seed_users(db, prefix, count, password_hash, batch=10000):
+    base = datetime.now(timezone.utc) - timedelta(days=365)
+    ids = []
+    for start in range(0, count, batch):
+        docs = [
+            user_doc(f"{prefix}{i}@gmail.com", password_hash, base + timedelta(seconds=i))
+            for i in range(start, min(count, start + batch))
+        ]
+        await db.users.insert_many(docs, ordered=False)
+        ids.extend(d["id"] for d in docs)
+    return ids
+
+
+async def seed_hosts(server, fake, owners, count):
+    """One A record per host, present on both sides, each with a dyndns token."""
+    hosts = []
+    docs = []
+    for i in range(count):
+        full_name = f"bench{i}.{server.DEFAULT_DOMAIN}"
+        cf_record = fake.add_record(ZONE_ID, "A", full_name, "192.0.2.1")
+        token = f"bench-token-{i}"
+        docs.append({
+            "id": str(uuid.uuid4()),
+            "cf_id": cf_record["id"],
+            "user_id": owners[i % len(owners)],
+            "domain_id": "",
+            "domain_name": server.DEFAULT_DOMAIN,
+            "zone_id": ZONE_ID,
+            "record_type": "A",
+            "name": f"bench{i}",
+            "full_name": full_name,
+            "content": "192.0.2.1",
+            "ttl": 1,
+            "proxied": False,
+            "update_token_hash": server.hash_update_token(token),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        })
+        hosts.append((full_name, token))
+    if docs:
+        await server.db.dns_records.insert_many(docs, ordered=False)
+    return hosts
+
+
+# --- scenarios ---
+
+async def scenario_signup(server, client, fake, args):
+    run_id = uuid.uuid4().hex[:8]
+
+    def request(i):
+        return client.post("/api/auth/register", json={"email": f"signup{run_id}{i}@gmail.com", "password": PASSWORD})
+    return await drive("signup", request, args.signups, args.concurrency, fake)
+
+
+async def scenario_login(server, client, fake, args, password_hash):
+    await seed_users(server.db, "login", args.login_users, password_hash)
+
+    def request(i):
+        return client.post("/api/auth/login", json={"email": f"login{i % args.login_users}@gmail.com", "password": PASSWORD})
+    return await drive("login", request, args.logins, args.concurrency, fake)
+
+
+async def scenario_ddns(server, client, fake, args, owners):
+    hosts = await seed_hosts(server, fake, owners, args.hosts)
+
+    def request(i):
+        hostname, token = hosts[i % len(hosts)]
+        ip = f"198.51.{(i >> 8) & 255}.{i & 255}"
+        return client.get("/nic/update", params={"hostname": hostname, "myip": ip, "token": token})
+    return await drive("ddns", request, args.updates, args.concurrency, fake)
+
+
+async def scenario_admin(server, client, fake, args, password_hash):
+    await seed_users(server.db, "member", args.admin_users, password_hash)
+    admin = user_doc("bench-admin@gmail.com", password_hash, datetime.now(timezone.utc), role="admin")
+    await server.db.users.insert_one(admin)
+    headers = {"Authorization": f"Bearer {server.create_token(admin['id'], admin['email'], 'admin')}"}
+    listings = [
+        {"sort": "created_at", "order": "desc"},
+        {"sort": "record_count", "order": "desc"},
+        {"sort": "email", "order": "asc"},
+        {"search": "member12"},
+    ]
+    cursors = [None] * len(listings)
+
+    async def request(i):
+        # Each listing is paged forward, as an admin clicking "Load more" would
+        slot = i % len(listings)
+        params = {**listings[slot], "limit": 50}
+        if cursors[slot]:
+            params["cursor"] = cursors[slot]
+        resp = await client.get("/api/admin/users", params=params, headers=headers)
+        if resp.status_code == 200:
+            cursors[slot] = resp.json().get("next_cursor")
+        return resp
+    return await drive("admin", request, args.admin_requests, args.concurrency, fake)
+
+
+# --- comparison ---
+
+def compare(report, baseline, tolerance):
+    """Scenarios whose req/s dropped or p95 rose by more than ``tolerance`` (a fraction)."""
+    previous = {s["scenario"]: s for s in baseline.get("scenarios", [])}
+    regressions = []
+    for current in report["scenarios"]:
+        before = previous.get(current["scenario"])
+        if not before:
+            continue
+        if before["rps"] and current["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append({"scenario": current["scenario"], "metric": "rps", "before": before["rps"], "after": current["rps"]})
+        p95_before, p95_after = before["latency_ms"]["p95"], current["latency_ms"]["p95"]
+        if p95_before and p95_after > p95_before * (1 + tolerance):
+            regressions.append({"scenario": current["scenario"], "metric": "p95_ms", "before": p95_before, "after": p95_after})
+    return regressions
+
+
+async def main(args):
+    os.environ["MONGO_URL"] = args.mongo_url
+    os.environ["DB_NAME"] = args.db
+    os.environ.setdefault("JWT_SECRET", "bench-jwt-secret-0123456789abcdef")
+    os.environ["CLOUDFLARE_ZONE_ID"] = ZONE_ID
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    # Every simulated client shares one address; measure the handlers, not the limiter
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    os.environ.setdefault("SMTP_EMAIL", "bench@gmail.com")
+    os.environ.setdefault("SMTP_SECURITY", "none")
+    for name in ("TELEGRAM_BOT_TOKEN", "TELEGRAM_CHAT_ID"):
+        os.environ[name] = ""
+
+    import bcrypt
+    import httpx
+    import server
+    from fake_cloudflare import FakeCloudflare
+
+    logging.getLogger().setLevel(logging.WARNING)
+    fake = FakeCloudflare(latency=args.cf_latency, rate_limit_every=args.cf_429_every, retry_after=args.cf_retry_after)
+    server.cf.transport = fake.transport()
+    server.email_outbox.session = NullSMTP()
+
+    await server.mongo_client.drop_database(args.db)
+    await server.app.router.startup()
+    password_hash = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds=args.bcrypt_rounds)).decode()
+    scenarios = args.scenarios or list(SCENARIOS)
+    results = []
+    try:
+        transport = httpx.ASGITransport(app=server.app, client=("127.0.0.1", 40000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            owners = None
+            for name in scenarios:
+                if name == "signup":
+                    results.append(await scenario_signup(server, client, fake, args))
+                elif name == "login":
+                    results.append(await scenario_login(server, client, fake, args, password_hash))
+                elif name == "ddns":
+                    owners = owners or await seed_users(server.db, "owner", max(1, args.hosts // 2), password_hash)
+                    results.append(await scenario_ddns(server, client, fake, args, owners))
+                elif name == "admin":
+                    results.append(await scenario_admin(server, client, fake, args, password_hash))
+                print(json.dumps(results[-1]), file=sys.stderr)
+    finally:
+        if not args.keep:
+            await server.mongo_client.drop_database(args.db)
+        await server.app.router.shutdown()
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("baseline", "output", "mongo_url")},
+        "scenarios": results,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default="ddns_bench")
+    parser.add_argument("--scenarios", nargs="*", choices=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--signups", type=int, default=500)
+    parser.add_argument("--logins", type=int, default=1000)
+    parser.add_argument("--login-users", type=int, default=200)
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--hosts", type=int, default=1000)
+    parser.add_argument("--admin-users", type=int, default=100000)
+    parser.add_argument("--admin-requests", type=int, default=400)
+    parser.add_argument("--bcrypt-rounds", type=int, default=10)
+    parser.add_argument("--cf-latency", type=float, default=0.05, help="seconds added to every fake Cloudflare call")
+    parser.add_argument("--cf-429-every", type=int, default=0, help="answer every Nth Cloudflare call with 429 (0: never)")
+    parser.add_argument("--cf-retry-after", type=float, default=0.5)
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative regression against --baseline")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark database afterwards")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,88 @@
+"""Cross-worker notifications of changed keys, through a Mongo collection.
+
+Every uvicorn worker keeps some state in memory (the DNS trie, the user
+cache) and updates it right after its own writes; the other workers, and
+other hosts, would only notice at their next full reload. ``Broadcast``
+closes that gap without change streams, so it also works on a standalone
+mongod: ``publish(topic, keys)`` inserts ``{topic, keys, at, origin}`` into
+``changes``, and every worker polls the collection each ``poll_interval`` and
+passes the keys published by *other* processes to the topic's handlers.
+
+Handlers get keys, not payloads, and re-read whatever they need from Mongo,
+so applying a notification twice or out of order is harmless. Polls overlap
+by ``overlap`` seconds to tolerate clock skew between hosts and inserts that
+land late; entries already seen are skipped. A TTL index removes entries
+after ``keep_for`` seconds.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Set, Union
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Set[str]], Union[None, Awaitable[None]]]
+
+
+class Broadcast:
+    def __init__(self, collection, origin: str, poll_interval: float = 1.0, overlap: float = 5.0, keep_for: float = 300.0):
+        self.collection = collection
+        self.origin = origin
+        self.poll_interval = poll_interval
+        self.overlap = overlap
+        self.keep_for = keep_for
+        self._handlers: Dict[str, List[Handler]] = {}
+        # _id -> at of entries already handled within the overlap window
+        self._seen: Dict[object, float] = {}
+        # Start of the previous poll
+        self._since = time.time()
+
+    def subscribe(self, topic: str, handler: Handler):
+        self._handlers.setdefault(topic, []).append(handler)
+
+    async def publish(self, topic: str, keys: Iterable[str]):
+        keys = sorted({k for k in keys if k})
+        if not keys:
+            return
+        try:
+            await self.collection.insert_one({
+                "topic": topic, "keys": keys, "at": time.time(), "origin": self.origin,
+                "expire_at": datetime.now(timezone.utc) + timedelta(seconds=self.keep_for),
+            })
+        except Exception as e:
+            # Other workers catch up at their next full reload / cache expiry
+            logger.error(f"Could not broadcast {topic} change: {e}")
+
+    async def poll(self) -> int:
+        """Handle entries published since the last poll; returns how many were new."""
+        started = time.time()
+        since = self._since - self.overlap
+        cursor = self.collection.find({"at": {"$gte": since}, "origin": {"$ne": self.origin}}).sort("at", 1)
+        batches: Dict[str, Set[str]] = {}
+        new = 0
+        async for entry in cursor:
+            if entry["_id"] in self._seen:
+                continue
+            self._seen[entry["_id"]] = entry["at"]
+            batches.setdefault(entry["topic"], set()).update(entry["keys"])
+            new += 1
+        self._since = started
+        self._seen = {key: at for key, at in self._seen.items() if at >= since}
+        for topic, keys in batches.items():
+            for handler in self._handlers.get(topic, ()):
+                result = handler(keys)
+                if asyncio.iscoroutine(result):
+                    await result
+        return new
+
+    async def run(self):
+        """Poll until cancelled."""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Broadcast poll failed: {e}")
@@ -0,0 +1,81 @@
+"""Bounded-concurrency executor for cascading operations.
+
+Used for teardown work such as deleting every Cloudflare record of a user or
+domain. Items are pulled from a (possibly async) iterable as workers free up,
+so a Motor cursor can be streamed without loading every document first.
+Failures are collected per item instead of aborting the whole cascade.
+"""
+import asyncio
+import logging
+from typing import Any, AsyncIterable, Awaitable, Callable, Iterable, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+ProgressFn = Callable[[int, int], Any]
+
+
+async def _iterate(items: Union[Iterable, AsyncIterable]):
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def run_cascade(
+    items: Union[Iterable, AsyncIterable],
+    action: Callable[[Any], Awaitable[Any]],
+    concurrency: int = 8,
+    describe: Callable[[Any], Any] = lambda item: item,
+    on_progress: Optional[ProgressFn] = None,
+) -> dict:
+    """Run ``action`` on every item with at most ``concurrency`` in flight.
+
+    Returns ``{"total", "succeeded": [...], "failed": [{"item", "error"}]}``
+    where items are passed through ``describe``. ``on_progress(done, failed)``
+    is called after each item.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    succeeded = []
+    failed = []
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            try:
+                if item is _DONE:
+                    return
+                try:
+                    await action(item)
+                    succeeded.append(describe(item))
+                except Exception as e:
+                    failed.append({"item": describe(item), "error": getattr(e, "detail", None) or str(e)})
+                if on_progress:
+                    on_progress(len(succeeded) + len(failed), len(failed))
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, concurrency))]
+    try:
+        async for item in _iterate(items):
+            await queue.put(item)
+        for _ in workers:
+            await queue.put(_DONE)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+
+    return {"total": len(succeeded) + len(failed), "succeeded": succeeded, "failed": failed}
+
+
+def log_progress(label: str, every: int = 50) -> ProgressFn:
+    """Progress callback that logs every ``every`` items."""
+    def report(done: int, failed: int):
+        if done % every == 0:
+            logger.info(f"{label}: {done} done, {failed} failed")
+    return report
+
+
+_DONE = object()
@@ -0,0 +1,191 @@
+"""Long-lived Cloudflare API client shared by the whole app.
+
+One ``httpx.AsyncClient`` is opened at startup and reused for every call, so
+record operations ride on pooled keep-alive connections instead of paying a
+fresh TCP+TLS handshake each time. In-flight requests are capped with a
+semaphore, and 429/5xx responses are retried with jittered exponential
+backoff that honours ``Retry-After``.
+"""
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+CF_BASE = "https://api.cloudflare.com/client/v4"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "PUT", "DELETE", "PATCH"}
+# Errors raised before the request reached Cloudflare, safe to retry for any method
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class CloudflareError(Exception):
+    """Cloudflare could not be reached or kept failing after all retries."""
+
+    def __init__(self, message: str, status_code: int = 502, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class CloudflareRateLimited(CloudflareError):
+    """Cloudflare kept answering 429 after all retries."""
+
+    def __init__(self, retry_after: Optional[float] = None):
+        super().__init__("Rate limited by Cloudflare, try again shortly", status_code=503, retry_after=retry_after)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Return the delay in seconds from a Retry-After header (seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def error_message(data: dict) -> str:
+    """The first error message of an unsuccessful Cloudflare API response."""
+    errors = data.get("errors", [])
+    return errors[0].get("message", "Unknown error") if errors else "Unknown error"
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class CloudflareClient:
+    def __init__(
+        self,
+        token: str,
+        base_url: str = CF_BASE,
+        max_connections: int = 20,
+        max_in_flight: int = 10,
+        http2: bool = False,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+        timeout: float = 30.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        observer: Optional[Callable[[str, str, str, float], None]] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        }
+        self.max_connections = max_connections
+        self.max_in_flight = max_in_flight
+        self.http2 = http2
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.transport = transport
+        # Called as observer(method, path, status or error name, seconds) for every attempt
+        self.observer = observer
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def start(self):
+        if self._client is not None:
+            return
+        http2 = self.http2
+        if http2 and not _http2_available():
+            logger.warning("CF_HTTP2 is enabled but the 'h2' package is not installed, falling back to HTTP/1.1")
+            http2 = False
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self.headers,
+            timeout=self.timeout,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+                keepalive_expiry=60,
+            ),
+            transport=self.transport,
+        )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max) + random.uniform(0, self.backoff_base)
+        # Full jitter: uniform(0, base * 2^attempt), capped
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _observe(self, method: str, path: str, status: str, started: float):
+        if self.observer:
+            self.observer(method, path, status, time.perf_counter() - started)
+
+    async def request(self, method: str, path: str, *, params: Optional[dict] = None, json: Optional[dict] = None) -> dict:
+        """Send a request and return the decoded Cloudflare envelope.
+
+        The envelope is returned as-is for 4xx answers so callers can read
+        ``success``/``errors`` themselves; only retryable failures that never
+        recovered raise ``CloudflareError``. POSTs are only retried when the
+        request provably never reached Cloudflare (429, connect errors), so a
+        record is never created twice.
+        """
+        if self._client is None:
+            await self.start()
+
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        retry_after = None
+        last_error = "Unknown error"
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                delay = self._backoff(attempt - 1, retry_after)
+                logger.warning(f"CF {method} {path} retry {attempt}/{self.max_retries} in {delay:.2f}s ({last_error})")
+                await asyncio.sleep(delay)
+
+            started = time.perf_counter()
+            try:
+                async with self._semaphore:
+                    resp = await self._client.request(method, path, params=params, json=json)
+            except httpx.TransportError as e:
+                self._observe(method, path, type(e).__name__, started)
+                if not idempotent and not isinstance(e, CONNECT_ERRORS):
+                    raise CloudflareError(f"Cloudflare unavailable: {type(e).__name__}: {e}")
+                retry_after = None
+                last_error = f"{type(e).__name__}: {e}"
+                continue
+
+            self._observe(method, path, str(resp.status_code), started)
+            if resp.status_code == 429 or (idempotent and resp.status_code in RETRY_STATUSES):
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                last_error = f"HTTP {resp.status_code}"
+                continue
+
+            try:
+                return resp.json()
+            except ValueError:
+                raise CloudflareError(f"Invalid response from Cloudflare (HTTP {resp.status_code})")
+
+        if last_error == "HTTP 429":
+            raise CloudflareRateLimited(retry_after)
+        raise CloudflareError(f"Cloudflare unavailable: {last_error}", retry_after=retry_after)
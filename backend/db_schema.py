@@ -0,0 +1,184 @@
+"""Versioned index migrations for the users, dns_records and domains collections.
+
+Migrations run once, in order, on startup; the applied versions are recorded
+in the ``schema_migrations`` collection. A migration that fails stops the run
+(later ones may depend on it) and is kept in ``last_failure`` for
+``/admin/schema`` until a later startup applies it. ``explain_hot_queries`` runs
+``explain()`` on every query the request handlers issue per request and
+reports whether each one is served by an index.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+def _unique(*keys):
+    return IndexModel([(k, ASCENDING) for k in keys], unique=True)
+
+
+def _index(*keys):
+    return IndexModel([(k, ASCENDING) for k in keys])
+
+
+# (version, description, {collection: [IndexModel, ...]})
+MIGRATIONS = [
+    (1, "Initial unique and lookup indexes", {
+        "users": [
+            _unique("id"),
+            _unique("email"),
+        ],
+        "dns_records": [
+            _unique("id"),
+            # Also closes the race between two concurrent creates of the same name
+            _unique("full_name"),
+            _index("domain_id"),
+        ],
+        "domains": [
+            _unique("id"),
+            _unique("name"),
+            _index("active"),
+        ],
+    }),
+    (2, "Per-record dyndns update tokens", {
+        "dns_records": [
+            IndexModel([("update_token_hash", ASCENDING)], unique=True, sparse=True),
+        ],
+    }),
+    (3, "Cloudflare write-behind outbox", {
+        "cf_outbox": [
+            _index("due_at"),
+            _index("enqueued_at"),
+        ],
+    }),
+    (4, "Email outbox", {
+        "email_outbox": [
+            _index("status", "due_at"),
+            # Sent/failed mails are kept only for the resend interval bookkeeping
+            IndexModel([("expire_at", ASCENDING)], expireAfterSeconds=0),
+        ],
+    }),
+    (5, "Keyset pagination sort keys", {
+        "dns_records": [
+            _index("user_id", "created_at", "id"),
+            _index("domain_id", "created_at", "id"),
+            _index("created_at", "id"),
+        ],
+        "users": [_index("created_at", "id")],
+        "domains": [
+            _index("created_at", "id"),
+            _index("active", "created_at", "id"),
+        ],
+    }),
+    (6, "Per-zone record scans for reconciliation", {
+        "dns_records": [_index("zone_id")],
+    }),
+    (7, "Shared rate limit counters", {
+        "rate_limits": [IndexModel([("expire_at", ASCENDING)], expireAfterSeconds=0)],
+    }),
+    (8, "Async record provisioning jobs", {
+        "record_jobs": [_index("due_at"), _index("enqueued_at")],
+        # Only async-mode records carry a status; recovery scans the pending ones
+        "dns_records": [IndexModel([("status", ASCENDING)], sparse=True)],
+    }),
+    (9, "Cross-worker change broadcast", {
+        "changes": [
+            _index("at"),
+            IndexModel([("expire_at", ASCENDING)], expireAfterSeconds=0),
+        ],
+    }),
+]
+
+# Set when migrate() stopped at a failing migration, cleared once it applies
+last_failure: Optional[dict] = None
+
+# (description, collection, filter) for the queries run on hot request paths
+HOT_QUERIES = [
+    ("get_current_user", "users", {"id": "x"}),
+    ("login / register by email", "users", {"email": "x@gmail.com"}),
+    ("list_records / record count", "dns_records", {"user_id": "x"}),
+    ("create_record name check", "dns_records", {"full_name": "x.example.com"}),
+    ("update/delete own record", "dns_records", {"id": "x", "user_id": "x"}),
+    ("domain record count", "dns_records", {"domain_id": "x"}),
+    ("dyndns update", "dns_records", {"full_name": "x.example.com", "update_token_hash": "x"}),
+    ("get_domain", "domains", {"id": "x"}),
+    ("default domain lookup", "domains", {"name": "x"}),
+    ("active domains", "domains", {"active": True}),
+]
+
+
+async def current_version(db) -> int:
+    latest = await db.schema_migrations.find_one(sort=[("_id", -1)])
+    return latest["_id"] if latest else 0
+
+
+def pending_migrations(version: int) -> List[dict]:
+    return [{"version": number, "description": description} for number, description, _ in MIGRATIONS if number > version]
+
+
+async def migrate(db) -> int:
+    """Apply every pending migration and return the resulting schema version."""
+    global last_failure
+    version = await current_version(db)
+    for number, description, indexes in MIGRATIONS:
+        if number <= version:
+            continue
+        try:
+            for collection, models in indexes.items():
+                await db[collection].create_indexes(models)
+        except OperationFailure as e:
+            # Typically duplicates blocking a unique index; retried on next startup
+            logger.error(f"Schema migration {number} ({description}) failed, {len(pending_migrations(version))} migrations pending: {e}")
+            last_failure = {
+                "version": number,
+                "description": description,
+                "error": str(e),
+                "at": datetime.now(timezone.utc).isoformat(),
+            }
+            return version
+        try:
+            await db.schema_migrations.insert_one({
+                "_id": number,
+                "description": description,
+                "applied_at": datetime.now(timezone.utc).isoformat(),
+            })
+        except DuplicateKeyError:
+            # Another worker recorded it first (index creation is idempotent)
+            pass
+        version = number
+        logger.info(f"Applied schema migration {number}: {description}")
+    last_failure = None
+    return version
+
+
+def _plan_stages(plan):
+    """Yield (stage, indexName) for every node in an explain() plan tree."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"], plan.get("indexName")
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+
+async def explain_hot_queries(db):
+    """Explain every hot query and report which index (if any) serves it."""
+    report = []
+    for description, collection, query in HOT_QUERIES:
+        explain = await db[collection].find(query).explain()
+        stages = list(_plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {})))
+        indexes = [name for stage, name in stages if name]
+        report.append({
+            "query": description,
+            "collection": collection,
+            "filter": sorted(query),
+            "index": indexes[0] if indexes else None,
+            "collscan": any(stage == "COLLSCAN" for stage, _ in stages),
+        })
+    return report
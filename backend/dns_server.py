@@ -0,0 +1,584 @@
+"""Embedded authoritative DNS server answering straight from MongoDB.
+
+Zones delegated to this host are answered from an in-memory label trie that
+mirrors ``db.domains`` (active domains become zones) and ``dns_records``.
+The request handlers update the trie right after each Mongo write, so a
+dyndns update is visible to resolvers within milliseconds and without a
+Cloudflare API call. Writes made by other workers reach this one through a
+change stream when MongoDB runs as a replica set, and otherwise through the
+server's ``Broadcast`` of changed record ids and zone names, which
+``refresh_records``/``refresh_zones`` re-read; a full reload every
+``reload_interval`` seconds catches anything missed.
+
+Served: A, AAAA, CNAME (chased inside our zones), NS (apex NS comes from the
+configured nameservers; NS records below the apex are delegations answered
+with a referral) and a synthesized SOA. Proxied records are not served since
+their public addresses belong to Cloudflare. UDP and TCP are both handled,
+with EDNS(0) payload sizes and truncation for UDP.
+"""
+import asyncio
+import logging
+import socket
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TYPE_A, TYPE_NS, TYPE_CNAME, TYPE_SOA, TYPE_AAAA, TYPE_OPT, TYPE_ANY = 1, 2, 5, 6, 28, 41, 255
+TYPE_CODES = {"A": TYPE_A, "NS": TYPE_NS, "CNAME": TYPE_CNAME, "SOA": TYPE_SOA, "AAAA": TYPE_AAAA}
+CLASS_IN = 1
+RCODE_OK, RCODE_FORMERR, RCODE_SERVFAIL, RCODE_NXDOMAIN, RCODE_NOTIMP, RCODE_REFUSED = 0, 1, 2, 3, 4, 5
+
+FLAG_QR, FLAG_AA, FLAG_TC, FLAG_RD = 0x8000, 0x0400, 0x0200, 0x0100
+UDP_PAYLOAD = 512
+EDNS_PAYLOAD = 1232
+AUTO_TTL = 300
+MAX_CNAME_CHAIN = 8
+TCP_IDLE_TIMEOUT = 10.0
+RECORD_FIELDS = {"id": 1, "full_name": 1, "record_type": 1, "content": 1, "ttl": 1, "proxied": 1, "status": 1}
+
+
+class DNSFormatError(Exception):
+    pass
+
+
+# --- the record trie ---
+
+class Node:
+    __slots__ = ("children", "records", "zone")
+
+    def __init__(self):
+        self.children: Dict[str, "Node"] = {}
+        # type code -> [(rdata value, ttl)]: packed address bytes for A/AAAA, target name for CNAME/NS
+        self.records: Dict[int, List[Tuple[object, int]]] = {}
+        self.zone = False
+
+
+def _labels(name: str) -> List[str]:
+    name = name.lower().rstrip(".")
+    return name.split(".")[::-1] if name else []
+
+
+class RecordTrie:
+    """Names stored label by label from the root, so a lookup finds the enclosing zone on the way down."""
+
+    def __init__(self):
+        self.root = Node()
+
+    def node(self, name: str, create: bool = False) -> Optional[Node]:
+        node = self.root
+        for label in _labels(name):
+            child = node.children.get(label)
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[label] = Node()
+            node = child
+        return node
+
+    def add_zone(self, name: str):
+        self.node(name, create=True).zone = True
+
+    def remove_zone(self, name: str):
+        node = self.node(name)
+        if node is not None:
+            node.zone = False
+
+    def add(self, name: str, type_code: int, value, ttl: int):
+        entries = self.node(name, create=True).records.setdefault(type_code, [])
+        entries[:] = [e for e in entries if e[0] != value]
+        entries.append((value, ttl))
+
+    def remove(self, name: str, type_code: int, value):
+        path = [self.root]
+        for label in _labels(name):
+            child = path[-1].children.get(label)
+            if child is None:
+                return
+            path.append(child)
+        node = path[-1]
+        entries = [e for e in node.records.get(type_code, []) if e[0] != value]
+        if entries:
+            node.records[type_code] = entries
+        else:
+            node.records.pop(type_code, None)
+        # Prune empty leaves so removed names turn into NXDOMAIN again
+        labels = _labels(name)
+        for depth in range(len(labels), 0, -1):
+            node = path[depth]
+            if node.records or node.children or node.zone:
+                break
+            del path[depth - 1].children[labels[depth - 1]]
+
+
+def rdata_value(record_type: str, content: str):
+    """Trie value for a record's content, or None when it can't be served."""
+    try:
+        if record_type == "A":
+            return socket.inet_pton(socket.AF_INET, content.strip())
+        if record_type == "AAAA":
+            return socket.inet_pton(socket.AF_INET6, content.strip())
+    except OSError:
+        return None
+    if record_type in ("CNAME", "NS"):
+        return content.strip().lower().rstrip(".") or None
+    return None
+
+
+# --- resolution ---
+
+@dataclass
+class Answer:
+    rcode: int = RCODE_OK
+    authoritative: bool = True
+    answers: List[tuple] = field(default_factory=list)      # (name, type, ttl, value)
+    authority: List[tuple] = field(default_factory=list)
+    additional: List[tuple] = field(default_factory=list)
+
+
+class DNSAuthority:
+    """The trie plus zone metadata; all lookups and updates are synchronous and O(labels)."""
+
+    def __init__(self, nameservers: Iterable[str] = (), hostmaster: str = "", soa_ttl: int = AUTO_TTL):
+        self.nameservers = [ns.lower().rstrip(".") for ns in nameservers if ns.strip()]
+        self.hostmaster = hostmaster
+        self.soa_ttl = soa_ttl
+        self.trie = RecordTrie()
+        self.serial = int(time.time())
+        self.loaded = False
+        # id -> (full_name, type code, value) of every served record, to undo it on update/delete
+        self._by_id: Dict[str, Tuple[str, int, object]] = {}
+        # Mongo _id -> record id, since change stream delete events carry only the _id
+        self._oids: Dict[object, str] = {}
+        # Updates that arrive while a reload is building the next trie
+        self._pending: Optional[List[tuple]] = None
+
+    # --- updates from the write paths ---
+
+    def upsert(self, record: dict):
+        if self._pending is not None:
+            self._pending.append(("upsert", record))
+        if self.loaded:
+            self._upsert(self.trie, self._by_id, self._oids, record)
+
+    def remove(self, record: dict):
+        if self._pending is not None:
+            self._pending.append(("remove", record))
+        if self.loaded:
+            self._remove(self.trie, self._by_id, record.get("id"))
+
+    def remove_oid(self, oid):
+        record_id = self._oids.pop(oid, None)
+        if record_id:
+            self.remove({"id": record_id})
+
+    def add_zone(self, name: str):
+        if self._pending is not None:
+            self._pending.append(("add_zone", name))
+        if self.loaded:
+            self.trie.add_zone(name)
+            self.serial += 1
+
+    def remove_zone(self, name: str):
+        if self._pending is not None:
+            self._pending.append(("remove_zone", name))
+        if self.loaded:
+            self.trie.remove_zone(name)
+            self.serial += 1
+
+    def _upsert(self, trie: RecordTrie, by_id: dict, oids: dict, record: dict):
+        self._remove(trie, by_id, record["id"])
+        if "_id" in record:
+            oids[record["_id"]] = record["id"]
+        type_code = TYPE_CODES.get(record.get("record_type"))
+        value = rdata_value(record.get("record_type"), record.get("content", ""))
+        if type_code is None or value is None or record.get("status") == "failed" or (record.get("proxied") and record["record_type"] != "NS"):
+            return
+        ttl = record.get("ttl") or 1
+        trie.add(record["full_name"], type_code, value, AUTO_TTL if ttl == 1 else ttl)
+        by_id[record["id"]] = (record["full_name"], type_code, value)
+        self.serial += 1
+
+    def _remove(self, trie: RecordTrie, by_id: dict, record_id: Optional[str]):
+        previous = by_id.pop(record_id, None)
+        if previous:
+            trie.remove(*previous)
+            self.serial += 1
+
+    async def load(self, domains, records):
+        """Rebuild the trie from the domains and dns_records collections, then swap it in."""
+        self._pending = []
+        try:
+            trie = RecordTrie()
+            by_id: Dict[str, Tuple[str, int, object]] = {}
+            oids: Dict[object, str] = {}
+            async for domain in domains.find({"active": True}, {"_id": 0, "name": 1}):
+                trie.add_zone(domain["name"])
+            async for record in records.find({}, RECORD_FIELDS).batch_size(5000):
+                self._upsert(trie, by_id, oids, record)
+            for op, arg in self._pending:
+                if op == "upsert":
+                    self._upsert(trie, by_id, oids, arg)
+                elif op == "remove":
+                    self._remove(trie, by_id, arg.get("id"))
+                elif op == "add_zone":
+                    trie.add_zone(arg)
+                else:
+                    trie.remove_zone(arg)
+            self.trie, self._by_id, self._oids = trie, by_id, oids
+            self.loaded = True
+            self.serial += 1
+        finally:
+            self._pending = None
+        logger.info(f"DNS server loaded {len(self._by_id)} records")
+
+    def size(self) -> int:
+        return len(self._by_id)
+
+    # --- lookups ---
+
+    def _soa(self, zone: str) -> tuple:
+        mname = self.nameservers[0] if self.nameservers else f"ns1.{zone}"
+        rname = (self.hostmaster or f"hostmaster@{zone}").replace("@", ".")
+        return (zone, TYPE_SOA, self.soa_ttl, (mname, rname, self.serial & 0xFFFFFFFF, 3600, 600, 604800, self.soa_ttl))
+
+    def _glue(self, targets: Iterable[str]) -> List[tuple]:
+        glue = []
+        for target in targets:
+            node = self.trie.node(target)
+            if node is not None:
+                for type_code in (TYPE_A, TYPE_AAAA):
+                    glue.extend((target, type_code, ttl, value) for value, ttl in node.records.get(type_code, []))
+        return glue
+
+    def resolve(self, qname: str, qtype: int) -> Answer:
+        labels = _labels(qname)
+        node = self.trie.root
+        zone_depth = None
+        cut = None   # (depth, node) of the first delegation below the zone apex
+        for depth, label in enumerate(labels, start=1):
+            node = node.children.get(label)
+            if node is None:
+                break
+            if node.zone:
+                zone_depth, cut = depth, None
+            elif zone_depth is not None and cut is None and TYPE_NS in node.records:
+                cut = (depth, node)
+        if zone_depth is None:
+            return Answer(rcode=RCODE_REFUSED, authoritative=False)
+        zone = ".".join(labels[:zone_depth][::-1])
+
+        if cut is not None:
+            # Delegated to the record owner's nameservers: refer, don't answer
+            depth, cut_node = cut
+            cut_name = ".".join(labels[:depth][::-1])
+            ns = [(cut_name, TYPE_NS, ttl, value) for value, ttl in cut_node.records[TYPE_NS]]
+            return Answer(authoritative=False, authority=ns, additional=self._glue(v for _, _, _, v in ns))
+
+        result = Answer()
+        if node is None:
+            result.rcode = RCODE_NXDOMAIN
+            result.authority.append(self._soa(zone))
+            return result
+
+        name = qname.lower().rstrip(".")
+        is_apex = len(labels) == zone_depth
+        for _ in range(MAX_CNAME_CHAIN):
+            if is_apex and qtype in (TYPE_SOA, TYPE_ANY):
+                result.answers.append(self._soa(zone))
+            if is_apex and qtype in (TYPE_NS, TYPE_ANY):
+                result.answers.extend((name, TYPE_NS, self.soa_ttl, ns) for ns in self.nameservers)
+            wanted = list(node.records) if qtype == TYPE_ANY else [qtype]
+            for type_code in wanted:
+                result.answers.extend((name, type_code, ttl, value) for value, ttl in node.records.get(type_code, []))
+            cname = node.records.get(TYPE_CNAME)
+            if not cname or qtype in (TYPE_CNAME, TYPE_ANY):
+                break
+            target, ttl = cname[0]
+            result.answers.append((name, TYPE_CNAME, ttl, target))
+            # Follow the alias only while it stays inside a zone we serve
+            target_answer_node = self.trie.node(target)
+            if target_answer_node is None or self._zone_of(target) is None:
+                break
+            name, node, is_apex = target, target_answer_node, target_answer_node.zone
+        if not result.answers:
+            result.authority.append(self._soa(zone))
+        if qtype == TYPE_NS and is_apex:
+            result.additional = self._glue(self.nameservers)
+        return result
+
+    def _zone_of(self, name: str) -> Optional[str]:
+        labels = _labels(name)
+        node = self.trie.root
+        zone = None
+        for depth, label in enumerate(labels, start=1):
+            node = node.children.get(label)
+            if node is None:
+                break
+            if node.zone:
+                zone = depth
+        return ".".join(labels[:zone][::-1]) if zone else None
+
+
+# --- wire format ---
+
+def _read_name(data: bytes, offset: int) -> Tuple[str, int]:
+    labels = []
+    end = None
+    for _ in range(128):
+        if offset >= len(data):
+            raise DNSFormatError("name runs past the message")
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if offset + 1 >= len(data):
+                raise DNSFormatError("truncated pointer")
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            continue
+        offset += 1
+        if length == 0:
+            return ".".join(labels), end if end is not None else offset
+        labels.append(data[offset:offset + length].decode("ascii", errors="replace"))
+        offset += length
+    raise DNSFormatError("name has too many labels")
+
+
+@dataclass
+class Query:
+    id: int
+    flags: int
+    qname: str
+    qtype: int
+    qclass: int
+    question: bytes          # the raw question section, echoed back
+    udp_payload: int = UDP_PAYLOAD
+    edns: bool = False
+
+
+def parse_query(data: bytes) -> Query:
+    if len(data) < 12:
+        raise DNSFormatError("short header")
+    msg_id, flags, qdcount, _, _, arcount = struct.unpack("!HHHHHH", data[:12])
+    if flags & FLAG_QR or qdcount != 1:
+        raise DNSFormatError("not a single-question query")
+    qname, offset = _read_name(data, 12)
+    if offset + 4 > len(data):
+        raise DNSFormatError("truncated question")
+    qtype, qclass = struct.unpack("!HH", data[offset:offset + 4])
+    query = Query(msg_id, flags, qname, qtype, qclass, data[12:offset + 4])
+    offset += 4
+    for _ in range(arcount):
+        _, offset = _read_name(data, offset)
+        if offset + 10 > len(data):
+            break
+        rtype, rclass, _, rdlength = struct.unpack("!HHIH", data[offset:offset + 10])
+        if rtype == TYPE_OPT:
+            query.edns = True
+            query.udp_payload = max(UDP_PAYLOAD, min(rclass, EDNS_PAYLOAD))
+        offset += 10 + rdlength
+    return query
+
+
+class _Writer:
+    """Message builder with name compression."""
+
+    def __init__(self, header: bytes, qname: str, question: bytes):
+        self.buf = bytearray(header + question)
+        self.names = {qname.lower().rstrip("."): 12} if qname else {}
+
+    def name(self, name: str):
+        labels = name.lower().rstrip(".").split(".") if name.rstrip(".") else []
+        for i in range(len(labels)):
+            suffix = ".".join(labels[i:])
+            pointer = self.names.get(suffix)
+            if pointer is not None:
+                self.buf += struct.pack("!H", 0xC000 | pointer)
+                return
+            if len(self.buf) < 0x3FFF:
+                self.names[suffix] = len(self.buf)
+            encoded = labels[i].encode("ascii", errors="replace")[:63]
+            self.buf.append(len(encoded))
+            self.buf += encoded
+        self.buf.append(0)
+
+    def record(self, name: str, type_code: int, ttl: int, value):
+        self.name(name)
+        self.buf += struct.pack("!HHI", type_code, CLASS_IN, ttl)
+        length_at = len(self.buf)
+        self.buf += b"\0\0"
+        if type_code in (TYPE_A, TYPE_AAAA):
+            self.buf += value
+        elif type_code in (TYPE_CNAME, TYPE_NS):
+            self.name(value)
+        elif type_code == TYPE_SOA:
+            mname, rname, *numbers = value
+            self.name(mname)
+            self.name(rname)
+            self.buf += struct.pack("!IIIII", *numbers)
+        struct.pack_into("!H", self.buf, length_at, len(self.buf) - length_at - 2)
+
+
+def build_response(query: Query, answer: Answer, max_size: int = 65535) -> bytes:
+    flags = FLAG_QR | (query.flags & 0x7800) | (query.flags & FLAG_RD) | answer.rcode
+    if answer.authoritative:
+        flags |= FLAG_AA
+    opt = struct.pack("!BHHIH", 0, TYPE_OPT, EDNS_PAYLOAD, 0, 0) if query.edns else b""
+    counts = (1, len(answer.answers), len(answer.authority), len(answer.additional) + (1 if opt else 0))
+    writer = _Writer(struct.pack("!HHHHHH", query.id, flags, *counts), query.qname, query.question)
+    for section in (answer.answers, answer.authority, answer.additional):
+        for rr in section:
+            writer.record(*rr)
+    writer.buf += opt
+    if len(writer.buf) > max_size:
+        # Too big for this transport: header and question only, client retries over TCP
+        header = struct.pack("!HHHHHH", query.id, flags | FLAG_TC, 1, 0, 0, 1 if opt else 0)
+        return header + query.question + opt
+    return bytes(writer.buf)
+
+
+def error_response(data: bytes, rcode: int) -> Optional[bytes]:
+    """Header-only reply for a message we couldn't parse (None when there's no usable id)."""
+    if len(data) < 12:
+        return None
+    msg_id, flags = struct.unpack("!HH", data[:4])
+    return struct.pack("!HHHHHH", msg_id, FLAG_QR | (flags & 0x7800) | (flags & FLAG_RD) | rcode, 0, 0, 0, 0)
+
+
+# --- transports ---
+
+class DNSServer:
+    def __init__(self, authority: DNSAuthority, host: str = "0.0.0.0", port: int = 53):
+        self.authority = authority
+        self.host = host
+        self.port = port
+        self.queries = 0
+        self._udp: Optional[asyncio.DatagramTransport] = None
+        self._tcp: Optional[asyncio.AbstractServer] = None
+
+    def handle(self, data: bytes, udp: bool = False) -> Optional[bytes]:
+        self.queries += 1
+        try:
+            query = parse_query(data)
+        except DNSFormatError:
+            return error_response(data, RCODE_FORMERR)
+        if (query.flags >> 11) & 0xF != 0:
+            answer = Answer(rcode=RCODE_NOTIMP, authoritative=False)
+        elif query.qclass != CLASS_IN:
+            answer = Answer(rcode=RCODE_REFUSED, authoritative=False)
+        else:
+            try:
+                answer = self.authority.resolve(query.qname, query.qtype)
+            except Exception as e:
+                logger.error(f"DNS resolve error for {query.qname}: {e}")
+                answer = Answer(rcode=RCODE_SERVFAIL, authoritative=False)
+        return build_response(query, answer, query.udp_payload if udp else 65535)
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        server = self
+
+        class UDPProtocol(asyncio.DatagramProtocol):
+            def connection_made(self, transport):
+                self.transport = transport
+
+            def datagram_received(self, data, addr):
+                response = server.handle(data, udp=True)
+                if response:
+                    self.transport.sendto(response, addr)
+
+        # SO_REUSEPORT lets every uvicorn worker bind the port; the kernel spreads queries across them
+        reuse_port = hasattr(socket, "SO_REUSEPORT")
+        self._udp, _ = await loop.create_datagram_endpoint(UDPProtocol, local_addr=(self.host, self.port), reuse_port=reuse_port)
+        self._tcp = await asyncio.start_server(self._serve_tcp, self.host, self.port, reuse_port=reuse_port)
+        logger.info(f"DNS server listening on {self.host}:{self.port} (UDP/TCP)")
+
+    async def _serve_tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                length = struct.unpack("!H", await asyncio.wait_for(reader.readexactly(2), TCP_IDLE_TIMEOUT))[0]
+                data = await asyncio.wait_for(reader.readexactly(length), TCP_IDLE_TIMEOUT)
+                response = self.handle(data)
+                if response:
+                    writer.write(struct.pack("!H", len(response)) + response)
+                    await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def close(self):
+        if self._udp is not None:
+            self._udp.close()
+        if self._tcp is not None:
+            self._tcp.close()
+            await self._tcp.wait_closed()
+
+
+async def sync_authority(authority: DNSAuthority, db, reload_interval: float):
+    """Keep the trie current: full reloads every ``reload_interval``, change streams in between when available."""
+    while True:
+        try:
+            await authority.load(db.domains, db.dns_records)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"DNS server reload failed: {e}")
+        try:
+            await asyncio.wait_for(_follow_changes(authority, db), reload_interval)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Standalone mongod has no change streams: rely on the write paths, the broadcast and periodic reloads
+            logger.debug(f"DNS server change stream unavailable: {e}")
+            await asyncio.sleep(reload_interval)
+
+
+async def refresh_records(authority: DNSAuthority, records, record_ids: Iterable[str]):
+    """Re-read records another worker changed: upsert the ones that exist, drop the rest."""
+    record_ids = set(record_ids)
+    async for record in records.find({"id": {"$in": list(record_ids)}}, RECORD_FIELDS):
+        authority.upsert(record)
+        record_ids.discard(record["id"])
+    for record_id in record_ids:
+        authority.remove({"id": record_id})
+
+
+async def refresh_zones(authority: DNSAuthority, domains, names: Iterable[str]):
+    """Re-read zones another worker added, renamed, toggled or deleted."""
+    names = set(names)
+    active = set()
+    async for domain in domains.find({"name": {"$in": list(names)}, "active": True}, {"_id": 0, "name": 1}):
+        active.add(domain["name"])
+    for name in names:
+        if name in active:
+            authority.add_zone(name)
+        else:
+            authority.remove_zone(name)
+
+
+async def _follow_changes(authority: DNSAuthority, db):
+    async def watch_records():
+        async with db.dns_records.watch(full_document="updateLookup") as stream:
+            async for change in stream:
+                doc = change.get("fullDocument")
+                if change["operationType"] == "delete":
+                    authority.remove_oid(change["documentKey"]["_id"])
+                elif doc:
+                    authority.upsert(doc)
+
+    async def watch_domains():
+        async with db.domains.watch(full_document="updateLookup") as stream:
+            async for change in stream:
+                doc = change.get("fullDocument")
+                if doc and doc.get("active"):
+                    authority.add_zone(doc["name"])
+                elif doc:
+                    authority.remove_zone(doc["name"])
+
+    await asyncio.gather(watch_records(), watch_domains())
+
@@ -0,0 +1,138 @@
+"""Process-wide copy of the ``domains`` collection.
+
+The table is tiny and only changes through the admin domain routes, yet
+record creation and the Dashboard's domain list used to read it on every
+request. ``DomainRegistry`` keeps every domain in memory, indexed by id and by
+name, so those lookups are dictionary hits.
+
+The worker that changes a domain updates its own copy straight away
+(``put``/``discard``); the other workers follow a change stream on
+``domains``. Standalone mongod has no change streams, so there the registry
+reloads the collection every ``poll_interval`` instead. Either way a full
+reload also happens every ``reload_interval`` in case a change was missed.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DomainRegistry:
+    def __init__(self, collection, poll_interval: float = 1.0, reload_interval: float = 300.0):
+        self.collection = collection
+        self.poll_interval = poll_interval
+        self.reload_interval = reload_interval
+        self.loaded = False
+        # True while change streams are unavailable and the registry polls
+        self.polling = False
+        self._by_id: Dict[str, dict] = {}
+        self._by_name: Dict[str, dict] = {}
+        # Mongo _id -> domain id, to resolve change-stream deletes (they carry only the _id)
+        self._ids_by_oid: Dict[object, str] = {}
+
+    # --- lookups ---
+
+    def get(self, domain_id: str) -> Optional[dict]:
+        domain = self._by_id.get(domain_id)
+        return dict(domain) if domain else None
+
+    def by_name(self, name: str) -> Optional[dict]:
+        domain = self._by_name.get(name)
+        return dict(domain) if domain else None
+
+    def all(self) -> List[dict]:
+        """Every domain in ``(created_at, id)`` order, the order the list endpoints page in."""
+        domains = sorted(self._by_id.values(), key=lambda d: (d.get("created_at") or "", d["id"]))
+        return [dict(d) for d in domains]
+
+    def active(self) -> List[dict]:
+        return [d for d in self.all() if d.get("active")]
+
+    def __len__(self):
+        return len(self._by_id)
+
+    # --- updates ---
+
+    async def ensure_loaded(self):
+        if not self.loaded:
+            await self.load()
+
+    async def load(self):
+        by_id, by_name, ids_by_oid = {}, {}, {}
+        async for doc in self.collection.find({}):
+            oid = doc.pop("_id", None)
+            by_id[doc["id"]] = doc
+            by_name[doc["name"]] = doc
+            if oid is not None:
+                ids_by_oid[oid] = doc["id"]
+        self._by_id, self._by_name, self._ids_by_oid = by_id, by_name, ids_by_oid
+        self.loaded = True
+
+    def put(self, domain: dict):
+        """Add or replace a domain (a freshly written document, or a change-stream fullDocument)."""
+        domain = dict(domain)
+        oid = domain.pop("_id", None)
+        previous = self._by_id.get(domain["id"])
+        if previous is not None and previous["name"] != domain["name"]:
+            self._by_name.pop(previous["name"], None)
+        self._by_id[domain["id"]] = domain
+        self._by_name[domain["name"]] = domain
+        if oid is not None:
+            self._ids_by_oid[oid] = domain["id"]
+
+    def discard(self, domain_id: str):
+        domain = self._by_id.pop(domain_id, None)
+        if domain is not None and self._by_name.get(domain["name"]) is domain:
+            del self._by_name[domain["name"]]
+
+    def apply(self, change: dict):
+        """Apply one change-stream event."""
+        if change["operationType"] == "delete":
+            domain_id = self._ids_by_oid.pop(change["documentKey"]["_id"], None)
+            if domain_id is not None:
+                self.discard(domain_id)
+        elif change.get("fullDocument"):
+            self.put(change["fullDocument"])
+
+    # --- background refresh ---
+
+    async def _follow_changes(self):
+        async with self.collection.watch(full_document="updateLookup") as stream:
+            # Loaded after the stream is open, so nothing written in between is missed
+            await self.load()
+            if self.polling:
+                logger.info("Domain registry is following the change stream again")
+                self.polling = False
+            async for change in stream:
+                if change["operationType"] in ("drop", "rename", "invalidate"):
+                    return
+                self.apply(change)
+
+    async def _poll(self, duration: float):
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Domain registry reload failed: {e}")
+
+    async def run(self):
+        """Keep the registry current until cancelled."""
+        while True:
+            try:
+                await asyncio.wait_for(self._follow_changes(), self.reload_interval)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Standalone mongod has no change streams (or Mongo is briefly unreachable)
+                if not self.polling:
+                    logger.info(f"Domain change stream unavailable ({e}); polling every {self.poll_interval:g}s")
+                    self.polling = True
+                await self._poll(self.reload_interval)
@@ -0,0 +1,245 @@
+"""Server-Sent Events for the dashboards, fed by one change stream per process.
+
+``EventHub.run`` watches the database once (records, users and domains) and
+turns every change into ``Event``s through the ``describe`` function the
+server passes in. Each event is encoded once and appended to the queue of
+every subscriber in its audience: everyone, admins only, non-admins only, or
+one user (whom admins also receive). ``GET /api/events`` streams a
+subscription's queue to the browser.
+
+A subscriber that falls ``max_queue`` events behind has its backlog replaced
+by one ``resync`` event, which tells the page to reload its lists. The same
+happens to everyone when the feed restarts without a resume token.
+
+Deletes carry only the Mongo ``_id``; routing them needs the document's
+pre-image, which MongoDB 6+ keeps when ``changeStreamPreAndPostImages`` is
+enabled on the collection (``run`` tries to enable it). Without one the
+event becomes a ``resync``. Standalone mongod has no change streams at all;
+``available`` stays False and the endpoint answers 503, so pages keep
+reloading after their own changes as before.
+
+A subscription's scope is fixed when it opens, so ``revoke`` ends the
+subscriptions of a user who was deleted or whose role changed; the browser
+reconnects and is authorized again.
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+EVERYONE = "*"
+ADMINS = "admins"
+MEMBERS = "members"
+
+
+class Event:
+    def __init__(self, kind: str, data: dict, audience: str):
+        self.kind = kind
+        self.data = data
+        # EVERYONE, ADMINS, MEMBERS (non-admins) or a user id
+        self.audience = audience
+
+    def encode(self) -> str:
+        return f"event: {self.kind}\ndata: {json.dumps(self.data, separators=(',', ':'), default=str)}\n\n"
+
+
+RESYNC = Event("resync", {}, EVERYONE).encode()
+
+DescribeFn = Callable[[dict], Iterable[Event]]
+
+
+class Subscription:
+    def __init__(self, user_id: str, admin: bool, max_queue: int):
+        self.user_id = user_id
+        self.admin = admin
+        self.max_queue = max_queue
+        self._queue: Deque[str] = deque()
+        self._ready = asyncio.Event()
+        # Set by EventHub.revoke: the stream must end
+        self.closed = False
+
+    def push(self, payload: str):
+        if len(self._queue) >= self.max_queue:
+            # Too far behind to catch up event by event
+            self._queue.clear()
+            payload = RESYNC
+        self._queue.append(payload)
+        self._ready.set()
+
+    def close(self):
+        self.closed = True
+        self._queue.clear()
+        self._ready.set()
+
+    async def next(self, timeout: float) -> Optional[str]:
+        """The next encoded event, or None if nothing arrived within ``timeout`` or the subscription was closed."""
+        if not self._queue and not self.closed:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if self.closed:
+            return None
+        return self._queue.popleft()
+
+
+class EventHub:
+    def __init__(self, db, describe: DescribeFn, collections: Iterable[str], max_queue: int = 1000, retry_interval: float = 30.0):
+        self.db = db
+        self.describe = describe
+        self.collections = list(collections)
+        self.max_queue = max_queue
+        self.retry_interval = retry_interval
+        self.available = False
+        self._subscribers: Set[Subscription] = set()
+        self._admins: Set[Subscription] = set()
+        self._by_user: Dict[str, Set[Subscription]] = {}
+        self._resume_token = None
+        self._pre_images = True
+        self._opened = False
+        self._reported = False
+
+    # --- subscribers ---
+
+    def subscribe(self, user_id: str, admin: bool = False) -> Subscription:
+        subscription = Subscription(user_id, admin, self.max_queue)
+        self._subscribers.add(subscription)
+        if admin:
+            self._admins.add(subscription)
+        self._by_user.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+        self._admins.discard(subscription)
+        subscriptions = self._by_user.get(subscription.user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._by_user[subscription.user_id]
+
+    def revoke(self, user_id: str, admin: Optional[bool] = None):
+        """Close the user's subscriptions: all of them, or only those whose admin scope isn't ``admin``."""
+        for subscription in list(self._by_user.get(user_id, ())):
+            if admin is None or subscription.admin != admin:
+                self.unsubscribe(subscription)
+                subscription.close()
+
+    def revoke_admins(self):
+        """Close every admin subscription, so each admin is authorized again on reconnect."""
+        for subscription in list(self._admins):
+            self.unsubscribe(subscription)
+            subscription.close()
+
+    def subscriptions_of(self, user_id: str) -> int:
+        return len(self._by_user.get(user_id, ()))
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def _audience(self, audience: str) -> Iterable[Subscription]:
+        if audience == EVERYONE:
+            return self._subscribers
+        if audience == ADMINS:
+            return self._admins
+        if audience == MEMBERS:
+            return self._subscribers - self._admins
+        return self._admins | self._by_user.get(audience, set())
+
+    def publish(self, event: Event):
+        targets = self._audience(event.audience)
+        if not targets:
+            return
+        payload = event.encode()
+        for subscription in targets:
+            subscription.push(payload)
+
+    def resync(self):
+        for subscription in self._subscribers:
+            subscription.push(RESYNC)
+
+    # --- change feed ---
+
+    async def _enable_pre_images(self):
+        for name in self.collections:
+            try:
+                await self.db.command("collMod", name, changeStreamPreAndPostImages={"enabled": True})
+            except PyMongoError as e:
+                # MongoDB < 6, standalone, missing collection or no collMod privilege
+                logger.debug(f"Change stream pre-images not enabled on {name}: {e}")
+
+    def _watch(self):
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": self.collections},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+        }}]
+        options = {"full_document": "updateLookup"}
+        if self._pre_images:
+            options["full_document_before_change"] = "whenAvailable"
+        if self._resume_token is not None:
+            options["resume_after"] = self._resume_token
+        return self.db.watch(pipeline, **options)
+
+    def _handle(self, stream, change: dict):
+        self._resume_token = stream.resume_token
+        try:
+            events: List[Event] = list(self.describe(change))
+        except Exception as e:
+            logger.error(f"Could not describe {change.get('operationType')} on {change.get('ns')}: {e}")
+            events = [Event("resync", {}, EVERYONE)]
+        for event in events:
+            self.publish(event)
+
+    async def _follow(self):
+        resumed = self._resume_token is not None
+        async with self._watch() as stream:
+            # Opens the cursor, so deployments without change streams fail here
+            first = await stream.try_next()
+            if self._opened and not resumed:
+                # Changes made while the feed was down are lost: have pages reload
+                self.resync()
+            self._opened = True
+            if not self.available:
+                logger.info("Event feed is following the change stream")
+                self.available = True
+                self._reported = False
+            if first is not None:
+                self._handle(stream, first)
+            async for change in stream:
+                self._handle(stream, change)
+
+    async def run(self):
+        """Follow the change stream until cancelled, reopening it after errors."""
+        await self._enable_pre_images()
+        while True:
+            try:
+                await self._follow()
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if self._resume_token is not None:
+                    # Resume point fell off the oplog: start fresh (subscribers get a resync)
+                    logger.warning(f"Event feed could not resume: {e}")
+                    self._resume_token = None
+                    continue
+                if self._pre_images and "fullDocumentBeforeChange" in str(e):
+                    # Server older than 6.0
+                    self._pre_images = False
+                    continue
+                self._unavailable(e)
+                await asyncio.sleep(self.retry_interval)
+            except Exception as e:
+                self._unavailable(e)
+                await asyncio.sleep(1.0 if self._resume_token is not None else self.retry_interval)
+
+    def _unavailable(self, error: Exception):
+        if not self._reported:
+            logger.info(f"Event feed unavailable: {error}")
+            self._reported = True
+        self.available = False
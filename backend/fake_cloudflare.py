@@ -0,0 +1,184 @@
+"""In-memory stand-in for the Cloudflare DNS records API.
+
+Plugs into ``CloudflareClient(transport=FakeCloudflare().transport())`` so the
+reconciler, the bulk endpoints and benchmarks can run offline. It implements
+the subset of the v4 API this app uses: paged listing with ``name``/``type``
+filters, create, get, PUT/PATCH, delete and the atomic ``/batch`` endpoint.
+Optional per-request latency and periodic 429s make it usable for load tests.
+"""
+import asyncio
+import json
+import re
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+_PATH_RE = re.compile(r"/zones/([^/]+)/dns_records(?:/([^/]+))?$")
+
+
+class FakeCloudflareError(Exception):
+    def __init__(self, status: int, code: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class FakeCloudflare:
+    def __init__(self, latency: float = 0.0, rate_limit_every: int = 0, retry_after: float = 0.0):
+        self.zones: Dict[str, Dict[str, dict]] = {}
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.calls: Counter = Counter()
+        self.rate_limited = 0
+        self._requests = 0
+
+    # --- direct manipulation (test setup / simulated dashboard edits) ---
+
+    def add_record(self, zone_id: str, record_type: str, name: str, content: str, ttl: int = 1, proxied: bool = False, **extra) -> dict:
+        record = {
+            "id": uuid.uuid4().hex,
+            "zone_id": zone_id,
+            "type": record_type,
+            "name": name.lower(),
+            "content": content,
+            "ttl": ttl,
+            "proxied": proxied,
+            "created_on": _now(),
+            "modified_on": _now(),
+            **extra,
+        }
+        self.zones.setdefault(zone_id, {})[record["id"]] = record
+        return record
+
+    def records(self, zone_id: str) -> List[dict]:
+        return list(self.zones.get(zone_id, {}).values())
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    # --- HTTP handling ---
+
+    @staticmethod
+    def _ok(result, **extra) -> httpx.Response:
+        return httpx.Response(200, json={"success": True, "errors": [], "messages": [], "result": result, **extra})
+
+    @staticmethod
+    def _error(status: int, code: int, message: str) -> httpx.Response:
+        return httpx.Response(status, json={"success": False, "errors": [{"code": code, "message": message}], "result": None})
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self._requests += 1
+        self.calls[request.method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.rate_limit_every and self._requests % self.rate_limit_every == 0:
+            self.rate_limited += 1
+            return httpx.Response(429, headers={"Retry-After": str(self.retry_after)}, json={"success": False, "errors": [{"code": 10000, "message": "Rate limited"}]})
+
+        match = _PATH_RE.search(request.url.path)
+        if not match:
+            return self._error(404, 7000, "No route for that URI")
+        zone_id, record_id = match.groups()
+        records = self.zones.setdefault(zone_id, {})
+        body = json.loads(request.content) if request.content else {}
+        try:
+            if record_id == "batch" and request.method == "POST":
+                return self._ok(self._batch(zone_id, records, body))
+            if record_id is None:
+                if request.method == "GET":
+                    return self._list(records, request.url.params)
+                if request.method == "POST":
+                    return self._ok(self._create(zone_id, records, body))
+            elif request.method == "GET":
+                return self._ok(self._get(records, record_id))
+            elif request.method in ("PUT", "PATCH"):
+                return self._ok(self._update(records, record_id, body, replace=request.method == "PUT"))
+            elif request.method == "DELETE":
+                self._get(records, record_id)
+                del records[record_id]
+                return self._ok({"id": record_id})
+        except FakeCloudflareError as e:
+            return self._error(e.status, e.code, str(e))
+        return self._error(405, 10405, "Method not allowed")
+
+    def _list(self, records: Dict[str, dict], params) -> httpx.Response:
+        items = list(records.values())
+        name = params.get("name")
+        if name:
+            items = [r for r in items if r["name"] == name.lower()]
+        record_type = params.get("type")
+        if record_type:
+            items = [r for r in items if r["type"] == record_type]
+        page = max(1, int(params.get("page", 1)))
+        per_page = max(1, min(int(params.get("per_page", 100)), 5000))
+        total_pages = max(1, -(-len(items) // per_page))
+        chunk = items[(page - 1) * per_page:page * per_page]
+        info = {"page": page, "per_page": per_page, "count": len(chunk), "total_count": len(items), "total_pages": total_pages}
+        return self._ok(chunk, result_info=info)
+
+    @staticmethod
+    def _get(records: Dict[str, dict], record_id: str) -> dict:
+        if record_id not in records:
+            raise FakeCloudflareError(404, 81044, "Record does not exist.")
+        return records[record_id]
+
+    @staticmethod
+    def _validate(records: Dict[str, dict], body: dict, exclude: Optional[str] = None):
+        for field in ("type", "name", "content"):
+            if not body.get(field):
+                raise FakeCloudflareError(400, 9000, f"DNS record {field} is required")
+        name = body["name"].lower()
+        for record in records.values():
+            if record["id"] == exclude or record["name"] != name:
+                continue
+            if record["type"] == "CNAME" or body["type"] == "CNAME":
+                raise FakeCloudflareError(400, 81053, "An A, AAAA, or CNAME record with that host already exists.")
+            if record["type"] == body["type"] and record["content"] == body["content"]:
+                raise FakeCloudflareError(400, 81058, "An identical record already exists.")
+
+    def _create(self, zone_id: str, records: Dict[str, dict], body: dict) -> dict:
+        self._validate(records, body)
+        return self.add_record(
+            zone_id, body["type"], body["name"], body["content"],
+            ttl=body.get("ttl", 1), proxied=body.get("proxied", False), comment=body.get("comment"),
+        )
+
+    def _update(self, records: Dict[str, dict], record_id: str, body: dict, replace: bool) -> dict:
+        current = self._get(records, record_id)
+        merged = {**current, **body} if not replace else {**current, "ttl": 1, "proxied": False, "comment": None, **body}
+        self._validate(records, merged, exclude=record_id)
+        merged["name"] = merged["name"].lower()
+        merged["modified_on"] = _now()
+        records[record_id] = merged
+        return merged
+
+    def _batch(self, zone_id: str, records: Dict[str, dict], body: dict) -> dict:
+        """Apply deletes, patches, puts, posts atomically: any failure leaves the zone untouched."""
+        staged = dict(records)
+        result = {"deletes": [], "patches": [], "puts": [], "posts": []}
+        for item in body.get("deletes") or []:
+            result["deletes"].append(self._get(staged, item["id"]))
+            del staged[item["id"]]
+        for kind in ("patches", "puts"):
+            for item in body.get(kind) or []:
+                result[kind].append(self._update(staged, item["id"], item, replace=kind == "puts"))
+        for item in body.get("posts") or []:
+            self._validate(staged, item)
+            record = {
+                "id": uuid.uuid4().hex, "zone_id": zone_id, "type": item["type"], "name": item["name"].lower(),
+                "content": item["content"], "ttl": item.get("ttl", 1), "proxied": item.get("proxied", False),
+                "comment": item.get("comment"), "created_on": _now(), "modified_on": _now(),
+            }
+            staged[record["id"]] = record
+            result["posts"].append(record)
+        records.clear()
+        records.update(staged)
+        return result
@@ -0,0 +1,272 @@
+"""Email delivery through a Mongo-backed outbox and one reusable SMTP session.
+
+Request handlers only enqueue mail. A background worker claims due items in
+batches and sends them over a single authenticated SMTP connection that is
+kept open between batches (and reopened if the server drops it), instead of
+paying TLS + login for every message. Failed sends are retried with backoff.
+
+Mail to the same address is coalesced: a pending message is replaced by the
+newer one, and an address gets at most one message per ``resend_interval``,
+so repeated "resend code" clicks inside the code validity window turn into a
+single mail carrying the latest code.
+"""
+import asyncio
+import logging
+import smtplib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPSession:
+    """A lazily opened, reused SMTP connection. Not thread-safe: use from one thread."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        security: str = "ssl",
+        username: str = "",
+        password: str = "",
+        timeout: float = 30.0,
+        observer: Optional[Callable[[str, float], None]] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.security = security
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        # Called as observer("ok" | "error", seconds) after every send
+        self.observer = observer
+        self._conn: Optional[smtplib.SMTP] = None
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.security == "ssl":
+            conn = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.security == "starttls":
+                conn.starttls()
+        if self.password:
+            conn.login(self.username, self.password)
+        return conn
+
+    def send(self, from_addr: str, to_addr: str, message: str):
+        started = time.perf_counter()
+        result = "error"
+        try:
+            self._send(from_addr, to_addr, message)
+            result = "ok"
+        finally:
+            if self.observer:
+                self.observer(result, time.perf_counter() - started)
+
+    def _send(self, from_addr: str, to_addr: str, message: str):
+        if self._conn is None:
+            self._conn = self._connect()
+        try:
+            self._conn.sendmail(from_addr, to_addr, message)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # The server dropped the idle connection: reconnect once
+            self.close()
+            self._conn = self._connect()
+            self._conn.sendmail(from_addr, to_addr, message)
+
+    def close(self):
+        if self._conn is not None:
+            try:
+                self._conn.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._conn = None
+
+
+def build_message(from_addr: str, to_addr: str, subject: str, text: str, html: str) -> str:
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+    msg["From"] = from_addr
+    msg["To"] = to_addr
+    msg.attach(MIMEText(text, "plain"))
+    msg.attach(MIMEText(html, "html"))
+    return msg.as_string()
+
+
+def normalize_address(address: str) -> str:
+    """An address SMTP can carry without SMTPUTF8: IDNA-encoded domain, ASCII local part.
+
+    Raises ValueError for anything else (including CR/LF), so a bad address is
+    rejected when it is queued instead of failing every batch it lands in.
+    """
+    address = address.strip()
+    local, at, domain = address.rpartition("@")
+    if not at or not local or not domain or any(c in address for c in "\r\n<> "):
+        raise ValueError(f"Invalid email address: {address!r}")
+    if not local.isascii():
+        raise ValueError(f"Non-ASCII local part in email address: {address!r}")
+    try:
+        domain = domain.encode("idna").decode("ascii")
+    except UnicodeError as e:
+        raise ValueError(f"Invalid email domain: {address!r}") from e
+    return f"{local}@{domain}"
+
+
+class EmailOutbox:
+    def __init__(
+        self,
+        collection,
+        session: SMTPSession,
+        sender: str,
+        sender_name: str = "",
+        batch_size: int = 20,
+        resend_interval: float = 60.0,
+        keep_sent_for: float = 600.0,
+        max_attempts: int = 5,
+        idle_timeout: float = 60.0,
+        lease: float = 60.0,
+    ):
+        self.collection = collection
+        self.session = session
+        self.sender = sender
+        self.from_header = f"{sender_name} <{sender}>" if sender_name else sender
+        self.batch_size = batch_size
+        self.resend_interval = resend_interval
+        self.keep_sent_for = keep_sent_for
+        self.max_attempts = max_attempts
+        self.idle_timeout = idle_timeout
+        self.lease = lease
+        # One thread owns the SMTP connection
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smtp")
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def _notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def enqueue(self, to_addr: str, kind: str, subject: str, text: str, html: str):
+        """Queue a mail; replaces any pending mail of the same kind to the same address.
+
+        Raises ValueError if ``to_addr`` can't be sent to (see ``normalize_address``).
+        """
+        to_addr = normalize_address(to_addr)
+        key = f"{kind}:{to_addr.lower()}"
+        now = time.time()
+        due_at = now
+        previous = await self.collection.find_one({"_id": key}, {"last_sent_at": 1})
+        if previous and previous.get("last_sent_at"):
+            due_at = max(now, previous["last_sent_at"] + self.resend_interval)
+        await self.collection.update_one(
+            {"_id": key},
+            {
+                "$set": {
+                    "to": to_addr, "kind": kind, "subject": subject, "text": text, "html": html,
+                    "status": "pending", "due_at": due_at, "attempts": 0, "queued_at": now,
+                },
+                "$unset": {"expire_at": ""},
+                "$inc": {"seq": 1},
+            },
+            upsert=True,
+        )
+        self._notify()
+
+    async def stats(self) -> dict:
+        pending = await self.collection.count_documents({"status": "pending"})
+        oldest = await self.collection.find_one({"status": "pending"}, {"queued_at": 1}, sort=[("queued_at", 1)])
+        return {
+            "depth": pending,
+            "oldest_age_seconds": round(time.time() - oldest["queued_at"], 3) if oldest else 0.0,
+        }
+
+    async def _claim_batch(self) -> List[dict]:
+        items = []
+        while len(items) < self.batch_size:
+            now = time.time()
+            item = await self.collection.find_one_and_update(
+                {"status": "pending", "due_at": {"$lte": now}},
+                {"$set": {"due_at": now + self.lease}},
+                sort=[("due_at", 1)],
+            )
+            if item is None:
+                break
+            items.append(item)
+        return items
+
+    def _send_batch(self, items: List[dict]) -> List[Optional[str]]:
+        """Runs on the SMTP thread; returns an error message (or None) per item."""
+        errors = []
+        for item in items:
+            try:
+                message = build_message(self.from_header, item["to"], item["subject"], item["text"], item["html"])
+                self.session.send(self.sender, item["to"], message)
+                errors.append(None)
+            except Exception as e:
+                # Any failure belongs to this item alone; the rest of the batch must still be recorded
+                self.session.close()
+                errors.append(str(e) or type(e).__name__)
+        return errors
+
+    async def flush_due(self) -> int:
+        items = await self._claim_batch()
+        if not items:
+            return 0
+        loop = asyncio.get_running_loop()
+        errors = await loop.run_in_executor(self._executor, self._send_batch, items)
+        for item, error in zip(items, errors):
+            now = time.time()
+            if error is None:
+                logger.info(f"Email ({item['kind']}) sent to {item['to']}")
+                await self.collection.update_one(
+                    {"_id": item["_id"], "seq": item["seq"]},
+                    {"$set": {
+                        "status": "sent", "last_sent_at": now,
+                        "expire_at": datetime.now(timezone.utc) + timedelta(seconds=self.keep_sent_for),
+                    }},
+                )
+                # A newer mail was queued while sending: keep it pending but respect the resend interval
+                await self.collection.update_one(
+                    {"_id": item["_id"], "seq": {"$ne": item["seq"]}},
+                    {"$set": {"last_sent_at": now, "due_at": now + self.resend_interval}},
+                )
+                continue
+            attempts = item.get("attempts", 0) + 1
+            if attempts >= self.max_attempts:
+                logger.error(f"Giving up on email to {item['to']} after {attempts} attempts: {error}")
+                update = {"status": "failed", "last_error": error, "expire_at": datetime.now(timezone.utc) + timedelta(seconds=self.keep_sent_for)}
+            else:
+                delay = min(300, 5 * (2 ** attempts))
+                logger.warning(f"Email to {item['to']} failed (attempt {attempts}), retrying in {delay}s: {error}")
+                update = {"due_at": now + delay, "attempts": attempts, "last_error": error}
+            await self.collection.update_one({"_id": item["_id"], "seq": item["seq"]}, {"$set": update})
+        return len(items)
+
+    async def run(self, poll_interval: float = 5.0):
+        """Deliver queued mail until cancelled; closes the SMTP session when idle."""
+        self._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        idle_since = time.time()
+        try:
+            while True:
+                try:
+                    sent = await self.flush_due()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Email outbox error: {e}")
+                    sent = 0
+                if sent:
+                    idle_since = time.time()
+                    continue
+                if time.time() - idle_since > self.idle_timeout:
+                    await loop.run_in_executor(self._executor, self.session.close)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await loop.run_in_executor(self._executor, self.session.close)
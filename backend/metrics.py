@@ -0,0 +1,259 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+A deliberately small implementation (counters, gauges, histograms with fixed
+buckets) so recording stays a dict lookup plus a bisect: cheap enough to run
+on every request, Cloudflare call and Mongo command. Values are updated under
+a lock because pymongo command events arrive from Motor's worker threads.
+Gauges that are expensive to read (queue depths) are filled by async
+collectors at scrape time instead of being kept up to date.
+
+Collected here:
+
+- HTTP latency per method, route template and status (``MetricsMiddleware``)
+- Cloudflare call latency and errors per zone and operation (``cf_observer``)
+- Mongo command latency and failures per command (``MongoCommandMetrics``)
+- event-loop lag (``monitor_loop_lag``), bcrypt and SMTP timings
+"""
+import abc
+import asyncio
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_CF_PATH_RE = re.compile(r"^/zones/([^/]+)/dns_records(?:/([^/]+))?")
+_CF_OPERATIONS = {
+    ("GET", False): "list",
+    ("POST", False): "create",
+    ("GET", True): "get",
+    ("PUT", True): "update",
+    ("PATCH", True): "patch",
+    ("DELETE", True): "delete",
+}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _label_str(self, values: Tuple, extra: str = "") -> str:
+        pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    @abc.abstractmethod
+    def samples(self) -> List[str]:
+        """Sample lines of this metric, without the HELP/TYPE header."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._label_str(k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *label_values, value: float):
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(label_values)
+            if state is None:
+                state = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def count(self, *label_values) -> int:
+        state = self._values.get(label_values)
+        return sum(state[0]) if state else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(counts), total) for k, (counts, total) in self._values.items()]
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="{}"'.format(_format_value(bound))
+                lines.append(f"{self.name}_bucket{self._label_str(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_str(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._label_str(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._collectors: List[Callable[[], Awaitable[None]]] = []
+
+    def _register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def collector(self, fn: Callable[[], Awaitable[None]]):
+        """Register an async callback that refreshes gauges right before each scrape."""
+        self._collectors.append(fn)
+        return fn
+
+    async def render(self) -> str:
+        results = await asyncio.gather(*(fn() for fn in self._collectors), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"Metrics collector failed: {result}")
+        return "".join(metric.render() for metric in self._metrics)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by its route template (``/api/dns/records/{record_id}``)."""
+
+    def __init__(self, app, histogram: Histogram, in_flight: Optional[Gauge] = None):
+        self.app = app
+        self.histogram = histogram
+        self.in_flight = in_flight
+        self._active = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self._track(1)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self._track(-1)
+            route = scope.get("route")
+            # Unmatched paths share one label so scanners can't blow up the series count
+            template = getattr(route, "path", None) or "unmatched"
+            self.histogram.observe(time.perf_counter() - start, scope["method"], template, str(status))
+
+    def _track(self, delta: int):
+        self._active += delta
+        if self.in_flight is not None:
+            self.in_flight.set(value=self._active)
+
+
+def cf_operation(method: str, path: str) -> Tuple[str, str]:
+    """``(zone_id, operation)`` labels for a Cloudflare API path."""
+    match = _CF_PATH_RE.match(path)
+    if not match:
+        return "", method.lower()
+    zone_id, record_id = match.groups()
+    if record_id == "batch":
+        return zone_id, "batch"
+    return zone_id, _CF_OPERATIONS.get((method.upper(), record_id is not None), method.lower())
+
+
+def cf_observer(latency: Histogram, errors: Counter) -> Callable[[str, str, str, float], None]:
+    """Callback for ``CloudflareClient(observer=...)``; ``status`` is the HTTP status or an error name."""
+    def observe(method: str, path: str, status: str, seconds: float):
+        zone_id, operation = cf_operation(method, path)
+        latency.observe(seconds, zone_id, operation)
+        if not status.startswith("2"):
+            errors.inc(zone_id, operation, status)
+    return observe
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command listener; pass it to the client with ``event_listeners=[...]``."""
+
+    def __init__(self, latency: Histogram, failures: Counter):
+        self.latency = latency
+        self.failures = failures
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.latency.observe(event.duration_micros / 1e6, event.command_name)
+
+    def failed(self, event):
+        self.latency.observe(event.duration_micros / 1e6, event.command_name)
+        self.failures.inc(event.command_name)
+
+
+async def monitor_loop_lag(histogram: Histogram, gauge: Gauge, interval: float = 0.5):
+    """Measure how late the event loop wakes a sleeping task; a busy loop delays every request."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        histogram.observe(lag)
+        gauge.set(value=lag)
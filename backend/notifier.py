@@ -0,0 +1,203 @@
+"""Non-blocking Telegram notifications with digest batching.
+
+Handlers call ``notify`` which only appends to an in-memory queue. A
+background task drains it: events arriving within ``window`` seconds of the
+first one are merged into a single digest message, messages to the chat are
+spaced at least ``min_interval`` apart, and a 429 from Telegram is honoured via
+its ``retry_after``. When the queue is full new events are dropped (and
+counted) rather than slowing down the request path.
+"""
+import asyncio
+import html
+import logging
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API = "https://api.telegram.org"
+MAX_MESSAGE_LENGTH = 4096
+
+EVENT_TITLES = {
+    "registration": "New user registration",
+    "record_created": "DNS record created",
+    "quota_hit": "Free plan limit reached",
+    "cloudflare_error": "Cloudflare error",
+}
+
+
+# A whole tag, a whole entity, or one character
+_HTML_TOKEN_RE = re.compile(r"<(/?)([A-Za-z]+)[^>]*>|&#?\w+;|.", re.DOTALL)
+
+
+def truncate_html(text: str, limit: int) -> str:
+    """Cut ``text`` to at most ``limit`` characters, never inside a tag or entity, closing any tag left open."""
+    if len(text) <= limit:
+        return text
+    kept, open_tags, size = [], [], 0
+    for match in _HTML_TOKEN_RE.finditer(text):
+        token, closing, tag = match.group(0), match.group(1), match.group(2)
+        tags = open_tags
+        if tag and closing:
+            tags = open_tags[:-1] if open_tags and open_tags[-1] == tag.lower() else open_tags
+        elif tag:
+            tags = open_tags + [tag.lower()]
+        # Room for the token, the ellipsis and the closing tags it would need
+        if size + len(token) + 1 + sum(len(t) + 3 for t in tags) > limit:
+            break
+        kept.append(token)
+        size += len(token)
+        open_tags = tags
+    return "".join(kept) + "…" + "".join(f"</{t}>" for t in reversed(open_tags))
+
+
+@dataclass
+class Event:
+    kind: str
+    text: str
+    at: float = field(default_factory=time.time)
+
+
+def format_digest(events: List[Event], limit: int = MAX_MESSAGE_LENGTH) -> str:
+    """A single event is sent as-is; several become a summary followed by the individual lines."""
+    if len(events) == 1:
+        event = events[0]
+        title = f"<b>{EVENT_TITLES.get(event.kind, event.kind)}</b>\n\n"
+        # Telegram rejects HTML cut inside a tag or entity
+        return title + truncate_html(event.text, limit - len(title))
+
+    counts = Counter(event.kind for event in events)
+    header = [f"<b>Digest: {len(events)} events</b>"]
+    header += [f"{EVENT_TITLES.get(kind, kind)}: {count}" for kind, count in counts.most_common()]
+    message = "\n".join(header) + "\n"
+    for shown, event in enumerate(events):
+        line = f"\n• <b>{EVENT_TITLES.get(event.kind, event.kind)}</b> {event.text}"
+        if len(message) + len(line) > limit - 40:
+            message += f"\n… and {len(events) - shown} more"
+            break
+        message += line
+    return message
+
+
+class TelegramNotifier:
+    def __init__(
+        self,
+        token: str,
+        chat_id: str,
+        window: float = 10.0,
+        min_interval: float = 3.0,
+        max_queue: int = 1000,
+        events: Optional[Iterable[str]] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.token = token
+        self.chat_id = chat_id
+        self.window = window
+        self.min_interval = min_interval
+        self.events = set(events) if events else None
+        self.dropped = 0
+        self.sent = 0
+        self.max_queue = max_queue
+        self._queue: "Optional[asyncio.Queue[Event]]" = None
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._last_sent = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token and self.chat_id)
+
+    def notify(self, kind: str, text: str):
+        """Queue an event without waiting; ``text`` is Telegram HTML."""
+        if self._queue is None or (self.events is not None and kind not in self.events):
+            return
+        try:
+            self._queue.put_nowait(Event(kind, text))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def stats(self) -> dict:
+        depth = self._queue.qsize() if self._queue is not None else 0
+        return {"enabled": self.enabled, "depth": depth, "sent": self.sent, "dropped": self.dropped}
+
+    async def start(self):
+        """Create the queue and HTTP client; ``notify`` is a no-op until then."""
+        if self._queue is None and self.enabled:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=10.0, transport=self._transport)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _collect(self) -> List[Event]:
+        events = [await self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                events.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        while not self._queue.empty():
+            events.append(self._queue.get_nowait())
+        return events
+
+    async def send(self, text: str, max_attempts: int = 3) -> bool:
+        await self.start()
+        url = f"{TELEGRAM_API}/bot{self.token}/sendMessage"
+        payload = {"chat_id": self.chat_id, "text": text, "parse_mode": "HTML", "disable_web_page_preview": True}
+        for _ in range(max_attempts):
+            wait = self._last_sent + self.min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                resp = await self._client.post(url, json=payload)
+            except httpx.HTTPError as e:
+                logger.error(f"Failed to send Telegram notification: {e}")
+                return False
+            finally:
+                self._last_sent = time.monotonic()
+            if resp.status_code == 429:
+                try:
+                    retry_after = float(resp.json().get("parameters", {}).get("retry_after", 1))
+                except ValueError:
+                    retry_after = 1.0
+                logger.warning(f"Telegram rate limited, retrying in {retry_after:.0f}s")
+                await asyncio.sleep(retry_after)
+                continue
+            if resp.status_code != 200:
+                logger.warning(f"Telegram notification failed: {resp.status_code} {resp.text[:200]}")
+                return False
+            self.sent += 1
+            return True
+        return False
+
+    async def run(self):
+        """Deliver queued events as digests until cancelled."""
+        if not self.enabled:
+            logger.warning("Telegram not configured, notifications disabled")
+            return
+        await self.start()
+        while True:
+            events = await self._collect()
+            try:
+                await self.send(format_digest(events))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Telegram notifier error: {e}")
+
+
+def escape(value) -> str:
+    """Escape user-supplied values for Telegram's HTML parse mode."""
+    return html.escape(str(value), quote=False)
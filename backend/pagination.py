@@ -0,0 +1,114 @@
+"""Keyset (cursor) pagination and NDJSON streaming for list endpoints.
+
+A page is ordered by ``(sort field, id)``; the opaque cursor carries the last
+document's values for both, and the next page starts strictly after them.
+Unlike skip/limit this stays cheap on deep pages and doesn't skip or repeat
+documents when rows are inserted between requests.
+
+Clients sending ``Accept: application/x-ndjson`` get every matching document
+streamed from the Motor cursor, one JSON object per line, so exports don't
+have to fit in memory on either side.
+"""
+import base64
+import json
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+NDJSON = "application/x-ndjson"
+
+
+def encode_cursor(doc: dict, field: str) -> str:
+    raw = json.dumps([doc.get(field), doc["id"]], separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, last_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(last_id, str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value, last_id
+
+
+def sort_spec(field: str, direction: int) -> dict:
+    """``$sort`` document; ``id`` breaks ties in the same direction so the order is total."""
+    return {field: direction, "id": direction} if field != "id" else {"id": direction}
+
+
+def after_cursor(field: str, direction: int, cursor: Optional[str]) -> dict:
+    """Filter selecting documents strictly after ``cursor`` in ``sort_spec`` order."""
+    if not cursor:
+        return {}
+    value, last_id = decode_cursor(cursor)
+    op = "$gt" if direction > 0 else "$lt"
+    if field == "id":
+        return {"id": {op: last_id}}
+    return {"$or": [{field: {op: value}}, {field: value, "id": {op: last_id}}]}
+
+
+def items_after(docs: List[dict], field: str, cursor: Optional[str]) -> List[dict]:
+    """``after_cursor`` for an in-memory list already in ascending ``(field, id)`` order."""
+    if not cursor:
+        return docs
+    value, last_id = decode_cursor(cursor)
+    key = (value or "", last_id)
+    return [doc for doc in docs if (doc.get(field) or "", doc["id"]) > key]
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON in request.headers.get("accept", "")
+
+
+def page_limit(limit: Optional[int], default: int, maximum: int) -> int:
+    return default if limit is None else max(1, min(limit, maximum))
+
+
+def stream_limit(limit: Optional[int]) -> Optional[int]:
+    """``page_limit`` for NDJSON exports: no default or maximum, but still at least 1."""
+    return None if limit is None else max(1, limit)
+
+
+async def fetch_page(collection, query: dict, projection: dict, field: str, direction: int, cursor: Optional[str], limit: int):
+    """One page of a find() plus the cursor for the next page (None on the last page)."""
+    query = {**query, **after_cursor(field, direction, cursor)} if cursor else query
+    docs = await collection.find(query, projection).sort(list(sort_spec(field, direction).items())).limit(limit + 1).to_list(limit + 1)
+    return page_result(docs, field, limit)
+
+
+def page_result(docs: List[dict], field: str, limit: int):
+    """Trim a ``limit + 1`` fetch to the page and derive the next cursor from its last item."""
+    if len(docs) > limit:
+        docs = docs[:limit]
+        return docs, encode_cursor(docs[-1], field)
+    return docs, None
+
+
+def stream_find(collection, query: dict, projection: dict, field: str, direction: int, cursor: Optional[str], limit: Optional[int]) -> StreamingResponse:
+    """NDJSON response over a find(); without ``limit`` everything after ``cursor`` is streamed."""
+    query = {**query, **after_cursor(field, direction, cursor)} if cursor else query
+    docs = collection.find(query, projection).sort(list(sort_spec(field, direction).items())).batch_size(500)
+    limit = stream_limit(limit)
+    if limit:
+        docs = docs.limit(limit)
+    return ndjson_response(docs)
+
+
+def ndjson_response(docs: AsyncIterator[dict]) -> StreamingResponse:
+    async def lines():
+        async for doc in docs:
+            doc.pop("_id", None)
+            yield json.dumps(doc, default=str) + "\n"
+    return StreamingResponse(lines(), media_type=NDJSON)
+
+
+def ndjson_items(docs: List[dict]) -> StreamingResponse:
+    """NDJSON response over documents already in memory."""
+    async def items():
+        for doc in docs:
+            yield doc
+    return ndjson_response(items())
@@ -0,0 +1,63 @@
+"""bcrypt hashing on a bounded worker pool instead of the event loop.
+
+``bcrypt.hashpw``/``checkpw`` take tens to hundreds of milliseconds; called
+inline from an async handler they stall every other request on the worker.
+Here they run on a small thread pool (bcrypt releases the GIL while hashing).
+When more calls are waiting than the queue allows, ``HasherOverloaded`` is
+raised so the API can shed load with a 503 instead of piling up latency.
+"""
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import bcrypt
+
+_COST_RE = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+
+class HasherOverloaded(Exception):
+    """Too many hashing calls are already queued."""
+
+
+class PasswordHasher:
+    def __init__(self, rounds: int = 12, workers: int = 2, max_queue: int = 32):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        """Calls running or waiting for a worker."""
+        return self._pending
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.workers + self.max_queue:
+            raise HasherOverloaded()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        hashed = await self._run(bcrypt.hashpw, password.encode('utf-8'), salt)
+        return hashed.decode('utf-8')
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True when the hash was made with a different work factor than the configured one."""
+        match = _COST_RE.match(hashed)
+        return not match or int(match.group(1)) != self.rounds
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
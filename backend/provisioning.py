@@ -0,0 +1,203 @@
+"""Durable job queue for asynchronous record provisioning.
+
+In async mode ``create_record`` stores the record with ``status: "pending"``,
+parks a job here (keyed by the record id) and answers 202 straight away. A
+pool of workers claims jobs with a lease, calls ``provision(record)`` (the
+Cloudflare side; it also moves the record to ``active``) and retries with
+backoff. ``ProvisioningFailed``, or running out of attempts, moves the record
+to ``failed`` with the error.
+
+Jobs live in Mongo, so a restart picks up where it left off; ``recover``
+re-creates the job of any pending record whose job was never written (the
+process died between the two inserts). ``provision`` must be idempotent: a
+worker can die after Cloudflare accepted the record but before the record was
+marked active.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+ProvisionFn = Callable[[dict], Awaitable[None]]
+
+
+class ProvisioningFailed(Exception):
+    """Permanent failure (e.g. Cloudflare rejected the record); not retried."""
+
+
+class ProvisioningQueue:
+    def __init__(
+        self,
+        jobs,
+        records,
+        provision: ProvisionFn,
+        workers: int = 4,
+        poll_interval: float = 2.0,
+        lease: float = 60.0,
+        max_attempts: int = 6,
+        retry_backoff: float = 2.0,
+        retry_backoff_max: float = 300.0,
+    ):
+        self.jobs = jobs
+        self.records = records
+        self.provision = provision
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self._wakeup = asyncio.Event()
+        # record id -> futures of status requests long-polling in this process
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+
+    async def enqueue(self, record_id: str):
+        now = time.time()
+        await self.jobs.update_one(
+            {"_id": record_id},
+            {"$setOnInsert": {"enqueued_at": now, "due_at": now, "attempts": 0}},
+            upsert=True,
+        )
+        self._wakeup.set()
+
+    async def discard(self, record_id: str):
+        """Drop the job, e.g. because the pending record is being deleted."""
+        await self.jobs.delete_one({"_id": record_id})
+
+    async def recover(self) -> int:
+        """Queue a job for every pending record that has none; returns how many were added."""
+        added = 0
+        async for record in self.records.find({"status": "pending"}, {"_id": 0, "id": 1}):
+            result = await self.jobs.update_one(
+                {"_id": record["id"]},
+                {"$setOnInsert": {"enqueued_at": time.time(), "due_at": time.time(), "attempts": 0}},
+                upsert=True,
+            )
+            if result.upserted_id is not None:
+                added += 1
+        if added:
+            logger.warning(f"Recovered {added} pending record(s) without a provisioning job")
+            self._wakeup.set()
+        return added
+
+    async def stats(self) -> dict:
+        depth = await self.jobs.count_documents({})
+        oldest = await self.jobs.find_one({}, {"enqueued_at": 1}, sort=[("enqueued_at", 1)])
+        return {
+            "depth": depth,
+            "oldest_age_seconds": round(time.time() - oldest["enqueued_at"], 3) if oldest else 0.0,
+        }
+
+    # --- waiting for a result ---
+
+    async def wait(self, record_id: str, timeout: float) -> bool:
+        """Wait until a worker in this process finishes ``record_id``; False on timeout.
+
+        Jobs finished by another process don't wake this up, so callers re-read
+        the record after every (bounded) wait.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(record_id, []).append(future)
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            waiters = self._waiters.get(record_id, [])
+            if future in waiters:
+                waiters.remove(future)
+            if not waiters:
+                self._waiters.pop(record_id, None)
+
+    def _notify(self, record_id: str):
+        for future in self._waiters.pop(record_id, []):
+            if not future.done():
+                future.set_result(None)
+
+    # --- workers ---
+
+    async def _claim(self) -> Optional[dict]:
+        now = time.time()
+        return await self.jobs.find_one_and_update(
+            {"due_at": {"$lte": now}},
+            {"$set": {"due_at": now + self.lease}, "$inc": {"attempts": 1}},
+            sort=[("due_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _fail(self, record_id: str, error: str):
+        await self.records.update_one(
+            {"id": record_id, "status": "pending"},
+            {"$set": {"status": "failed", "error": error}},
+        )
+        await self.jobs.delete_one({"_id": record_id})
+
+    async def process(self, job: dict):
+        record_id = job["_id"]
+        record = await self.records.find_one({"id": record_id}, {"_id": 0})
+        if record is None or record.get("status") != "pending":
+            # Deleted (or already settled) in the meantime
+            await self.jobs.delete_one({"_id": record_id})
+            return
+        try:
+            await self.provision(record)
+        except asyncio.CancelledError:
+            raise
+        except ProvisioningFailed as e:
+            logger.warning(f"Provisioning {record['full_name']} failed: {e}")
+            await self._fail(record_id, str(e))
+        except Exception as e:
+            error = getattr(e, "detail", None) or str(e)
+            attempts = job.get("attempts", 1)
+            if attempts >= self.max_attempts:
+                logger.error(f"Giving up on provisioning {record['full_name']} after {attempts} attempts: {error}")
+                await self._fail(record_id, error)
+            else:
+                delay = min(self.retry_backoff_max, self.retry_backoff * (2 ** attempts))
+                logger.warning(f"Provisioning {record['full_name']} failed (attempt {attempts}), retrying in {delay:.0f}s: {error}")
+                await self.jobs.update_one({"_id": record_id}, {"$set": {"due_at": time.time() + delay, "last_error": error}})
+                return
+        else:
+            await self.jobs.delete_one({"_id": record_id})
+        self._notify(record_id)
+
+    async def drain(self) -> int:
+        """Process due jobs until none is left; returns how many were handled."""
+        handled = 0
+        while True:
+            job = await self._claim()
+            if job is None:
+                return handled
+            await self.process(job)
+            handled += 1
+
+    async def _worker(self):
+        while True:
+            # Cleared before draining, so an enqueue that lands mid-drain isn't missed
+            self._wakeup.clear()
+            try:
+                handled = await self.drain()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Provisioning worker error: {e}")
+                handled = 0
+            if not handled:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run(self):
+        """Run the worker pool until cancelled."""
+        workers = [asyncio.create_task(self._worker()) for _ in range(max(1, self.workers))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
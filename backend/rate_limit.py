@@ -0,0 +1,159 @@
+"""Sliding-window rate limits for the auth and record routes.
+
+Limits are declared per route as ``(key, count, seconds)``: at most ``count``
+requests per ``seconds`` for each distinct value of ``key`` (``ip``, ``email``
+or ``user``). The window is a sliding-window counter: the current fixed window
+plus the previous one weighted by how much of it still overlaps, so every key
+costs two integers and one lookup per request.
+
+``MemoryStore`` keeps the counters in this process. ``MongoStore`` shares them
+between workers through the ``rate_limits`` collection (TTL-expired).
+
+Handlers call ``RateLimiter.check`` first thing, before any bcrypt, SMTP or
+Cloudflare work, so a rejected request costs a dict lookup (or one Mongo
+round trip).
+"""
+import asyncio
+import math
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+# (key, count, seconds)
+Limit = Tuple[str, int, float]
+
+
+class RateLimited(Exception):
+    def __init__(self, route: str, key: str, retry_after: float):
+        super().__init__(f"{route} rate limit exceeded for {key}")
+        self.route = route
+        self.key = key
+        self.retry_after = retry_after
+
+
+def parse_limits(spec: str) -> Dict[str, List[Limit]]:
+    """Parse ``route:key=count/seconds`` items, comma separated.
+
+    ``login:ip=20/60,login:email=5/300`` -> {"login": [("ip", 20, 60.0), ("email", 5, 300.0)]}
+    """
+    limits: Dict[str, List[Limit]] = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            target, rate = item.split("=", 1)
+            route, key = target.split(":", 1)
+            count, seconds = rate.split("/", 1)
+            limit = (key.strip(), int(count), float(seconds))
+        except ValueError:
+            raise ValueError(f"Invalid rate limit {item!r} (expected route:key=count/seconds)")
+        if limit[1] < 0 or limit[2] <= 0:
+            raise ValueError(f"Invalid rate limit {item!r}")
+        limits.setdefault(route.strip(), []).append(limit)
+    return limits
+
+
+def window_weight(now: float, seconds: float) -> Tuple[int, float]:
+    """Current window number and how much of the previous window still counts."""
+    window = int(now // seconds)
+    return window, 1.0 - (now - window * seconds) / seconds
+
+
+class MemoryStore:
+    """Per-process counters: {bucket: [window, current, previous, seconds]}."""
+
+    def __init__(self, max_keys: int = 100000, clock: Callable[[], float] = time.time):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._counters: Dict[str, list] = {}
+
+    async def hit(self, bucket: str, seconds: float) -> Tuple[int, int, float]:
+        now = self.clock()
+        window, _ = window_weight(now, seconds)
+        counter = self._counters.get(bucket)
+        if counter is None:
+            if len(self._counters) >= self.max_keys:
+                self._sweep(now)
+            counter = self._counters[bucket] = [window, 0, 0, seconds]
+        elif counter[0] != window:
+            counter[2] = counter[1] if counter[0] == window - 1 else 0
+            counter[0], counter[1] = window, 0
+        counter[1] += 1
+        return counter[1], counter[2], now
+
+    def _sweep(self, now: float):
+        # Buckets last hit two or more windows ago no longer count towards anything
+        for bucket, (window, _, _, seconds) in list(self._counters.items()):
+            if window < now // seconds - 1:
+                del self._counters[bucket]
+        if len(self._counters) >= self.max_keys:
+            # Everything is live (e.g. a spread-out flood): forget the oldest half
+            for bucket in list(self._counters)[: self.max_keys // 2]:
+                del self._counters[bucket]
+
+    def clear(self):
+        self._counters.clear()
+
+    def __len__(self):
+        return len(self._counters)
+
+
+class MongoStore:
+    """Counters shared by all workers: one document per bucket and window."""
+
+    def __init__(self, collection, clock: Callable[[], float] = time.time):
+        self.collection = collection
+        self.clock = clock
+
+    async def hit(self, bucket: str, seconds: float) -> Tuple[int, int, float]:
+        now = self.clock()
+        window, _ = window_weight(now, seconds)
+        expire_at = datetime.fromtimestamp((window + 2) * seconds, timezone.utc)
+        current, previous = await asyncio.gather(
+            self.collection.find_one_and_update(
+                {"_id": f"{bucket}:{window}"},
+                {"$inc": {"count": 1}, "$setOnInsert": {"expire_at": expire_at}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            ),
+            self.collection.find_one({"_id": f"{bucket}:{window - 1}"}),
+        )
+        return current["count"], previous["count"] if previous else 0, now
+
+
+class RateLimiter:
+    def __init__(self, store, limits: Dict[str, List[Limit]], enabled: bool = True, on_reject=None):
+        self.store = store
+        self.limits = limits
+        self.enabled = enabled
+        self.on_reject = on_reject
+
+    async def check(self, route: str, **keys: Optional[str]):
+        """Count one request against every limit of ``route``; raise RateLimited if one is exceeded.
+
+        Keys without a value (e.g. no client address) are skipped.
+        """
+        if not self.enabled:
+            return
+        for key, count, seconds in self.limits.get(route, ()):
+            value = keys.get(key)
+            if not value:
+                continue
+            current, previous, now = await self.store.hit(f"{route}:{key}:{seconds:g}:{value}", seconds)
+            _, weight = window_weight(now, seconds)
+            if current + previous * weight > count:
+                if self.on_reject:
+                    self.on_reject(route, key)
+                raise RateLimited(route, key, retry_after(current, previous, count, now, seconds))
+
+
+def retry_after(current: int, previous: int, count: int, now: float, seconds: float) -> int:
+    """Seconds until the weighted count drops back under the limit."""
+    window_end = (int(now // seconds) + 1) * seconds
+    if previous and current <= count:
+        # The previous window's share decays linearly; wait until enough of it is gone
+        weight_needed = (count - current) / previous
+        wait = (1.0 - weight_needed) * seconds - (now - (window_end - seconds))
+        if wait <= window_end - now:
+            return max(1, math.ceil(wait))
+    return max(1, math.ceil(window_end - now))
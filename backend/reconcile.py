@@ -0,0 +1,357 @@
+"""Mongo ↔ Cloudflare reconciliation with a drift report and optional repair.
+
+The two sides drift apart when a Cloudflare write succeeds but the Mongo write
+doesn't (or the other way round), when a cascade delete fails half-way, or
+when someone edits a zone in the Cloudflare dashboard. Each served zone is
+paged from Cloudflare into a compact map keyed by record id, then the zone's
+``dns_records`` are streamed from Mongo and matched against it, so a zone is
+diffed in one pass and only one page of Mongo documents is held at a time.
+A few zones are processed concurrently.
+
+Drift is reported in four categories:
+
+- ghosts: records in Mongo whose ``cf_id`` no longer exists in Cloudflare
+- orphans: Cloudflare records of a type and name this app manages
+  (``<label>.<domain>``) that no Mongo record points at. Only those carrying
+  the app's ``MANAGED_COMMENT`` are marked ``managed``; the rest may have
+  been added in the dashboard on purpose (``www``, ``mail``, ...)
+- mismatches: both sides exist but type, content, proxy or TTL differ
+- relinked: the ``cf_id`` is stale but a record of the same name and type
+  exists in Cloudflare, e.g. after it was re-created in the dashboard
+
+Records touched within ``grace`` seconds of the scan are skipped so in-flight
+creates and updates aren't reported. In repair mode Mongo is treated as the
+source of truth: ghosts are re-created, mismatches overwritten and managed
+orphans deleted through Cloudflare's batch endpoint, and relinked ids are
+saved. Unmanaged orphans are only ever reported.
+"""
+import asyncio
+import ipaddress
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from cascade import run_cascade
+from cf_client import error_message
+
+logger = logging.getLogger(__name__)
+
+MANAGED_TYPES = {"A", "AAAA", "CNAME", "NS"}
+DRIFT_KINDS = ("ghosts", "orphans", "mismatches", "relinked")
+# Set as the Cloudflare record comment on everything the app creates, so repair
+# can tell its own leftovers from records made in the dashboard
+MANAGED_COMMENT = "managed by dnslab.biz"
+RECORD_FIELDS = {"_id": 0, "id": 1, "cf_id": 1, "status": 1, "full_name": 1, "record_type": 1, "content": 1, "ttl": 1, "proxied": 1, "created_at": 1, "updated_at": 1}
+
+# Compact view of a Cloudflare record: (name, type, content, ttl, proxied, modified_on, comment)
+CFRecord = Tuple[str, str, str, int, bool, str, str]
+
+
+def normalize_content(record_type: str, content: str) -> str:
+    content = (content or "").strip()
+    if record_type in ("A", "AAAA"):
+        try:
+            return str(ipaddress.ip_address(content))
+        except ValueError:
+            return content
+    if record_type in ("CNAME", "NS"):
+        return content.lower().rstrip(".")
+    return content
+
+
+def record_diff(record: dict, cf_record: CFRecord) -> List[str]:
+    """Names of the fields where a Mongo record and its Cloudflare record disagree."""
+    cf_type, cf_content, cf_ttl, cf_proxied = cf_record[1:5]
+    record_type = record["record_type"]
+    fields = []
+    if record_type != cf_type:
+        fields.append("type")
+    if normalize_content(record_type, record["content"]) != normalize_content(cf_type, cf_content):
+        fields.append("content")
+    # NS records are never proxied on Cloudflare, whatever was stored
+    proxied = bool(record.get("proxied")) and record_type != "NS"
+    if proxied != cf_proxied:
+        fields.append("proxied")
+    # Proxied records always report the automatic TTL
+    elif not proxied and (record.get("ttl") or 1) != cf_ttl:
+        fields.append("ttl")
+    return fields
+
+
+def managed_name(name: str, domains: Iterable[str]) -> bool:
+    """Whether ``name`` is a single label under one of the zone's domains, i.e. a name users can own."""
+    for domain in domains:
+        suffix = "." + domain
+        if name.endswith(suffix) and "." not in name[:-len(suffix)]:
+            return True
+    return False
+
+
+def _payload(record: dict) -> dict:
+    return {
+        "type": record["record_type"],
+        "name": record["full_name"],
+        "content": record["content"],
+        "ttl": record.get("ttl") or 1,
+        "proxied": bool(record.get("proxied")) and record["record_type"] != "NS",
+        "comment": MANAGED_COMMENT,
+    }
+
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Reconciler:
+    def __init__(
+        self,
+        cf,
+        records,
+        reports,
+        index=None,
+        default_zone_id: str = "",
+        concurrency: int = 4,
+        per_page: int = 5000,
+        batch_size: int = 200,
+        grace: float = 120,
+        max_items: int = 200,
+        lease=None,
+    ):
+        self.cf = cf
+        self.records = records
+        self.reports = reports
+        self.index = index
+        self.default_zone_id = default_zone_id
+        self.concurrency = concurrency
+        self.per_page = per_page
+        self.batch_size = batch_size
+        self.grace = grace
+        self.max_items = max_items
+        # scheduler.Lease shared by every process, so runs never overlap across workers
+        self.lease = lease
+        self.running = False
+        self._task: Optional[asyncio.Task] = None
+
+    # --- Cloudflare side ---
+
+    async def _cf(self, method: str, path: str, **kwargs) -> dict:
+        data = await self.cf.request(method, path, **kwargs)
+        if not data.get("success"):
+            raise RuntimeError(f"Cloudflare: {error_message(data)}")
+        return data
+
+    async def fetch_zone(self, zone_id: str) -> Dict[str, CFRecord]:
+        records: Dict[str, CFRecord] = {}
+        page = 1
+        while True:
+            data = await self._cf("GET", f"/zones/{zone_id}/dns_records", params={"page": page, "per_page": self.per_page})
+            for rec in data.get("result") or []:
+                records[rec["id"]] = (
+                    rec["name"].lower(), rec["type"], rec.get("content", ""),
+                    rec.get("ttl", 1), bool(rec.get("proxied")), rec.get("modified_on") or rec.get("created_on") or "",
+                    rec.get("comment") or "",
+                )
+            if page >= (data.get("result_info") or {}).get("total_pages", 1):
+                return records
+            page += 1
+
+    # --- diff ---
+
+    def _mongo_query(self, zone_id: str) -> dict:
+        # Records created before zone_id was stored belong to the default zone
+        if zone_id == self.default_zone_id:
+            return {"$or": [{"zone_id": zone_id}, {"zone_id": {"$exists": False}}]}
+        return {"zone_id": zone_id}
+
+    async def diff_zone(self, zone_id: str, domains: Iterable[str], cutoff: str) -> dict:
+        """Drift of one zone: ``{"ghosts", "orphans", "mismatches", "relinked", "skipped", "scanned"}``."""
+        cf_records = await self.fetch_zone(zone_id)
+        scanned_cf = len(cf_records)
+        by_name: Dict[Tuple[str, str], str] = {(rec[0], rec[1]): cf_id for cf_id, rec in cf_records.items()}
+        drift = {kind: [] for kind in DRIFT_KINDS}
+        skipped = 0
+        scanned = 0
+
+        async for record in self.records.find(self._mongo_query(zone_id), RECORD_FIELDS).batch_size(1000):
+            scanned += 1
+            name = record["full_name"].lower()
+            if record.get("status") in ("pending", "failed"):
+                # Not (yet) in Cloudflare by design; a pending record's half-done
+                # create is adopted by its provisioning worker, not an orphan
+                if record["status"] == "pending":
+                    cf_records.pop(by_name.pop((name, record["record_type"]), None), None)
+                skipped += 1
+                continue
+            cf_record = cf_records.pop(record["cf_id"], None)
+            if cf_record is not None:
+                by_name.pop((cf_record[0], cf_record[1]), None)
+            if max(record.get("created_at") or "", record.get("updated_at") or "") > cutoff:
+                skipped += 1
+                continue
+            item = {"id": record["id"], "cf_id": record["cf_id"], "full_name": record["full_name"]}
+            if cf_record is None:
+                relink_id = by_name.pop((name, record["record_type"]), None)
+                if relink_id is None:
+                    drift["ghosts"].append({**item, "payload": _payload(record)})
+                    continue
+                cf_record = cf_records.pop(relink_id)
+                drift["relinked"].append({**item, "new_cf_id": relink_id})
+                item["cf_id"] = relink_id
+            fields = record_diff(record, cf_record)
+            if fields:
+                drift["mismatches"].append({**item, "fields": fields, "payload": {"id": item["cf_id"], **_payload(record)}})
+
+        domains = [d.lower() for d in domains]
+        for cf_id, (name, record_type, content, _, _, modified_on, comment) in cf_records.items():
+            if record_type not in MANAGED_TYPES or not managed_name(name, domains):
+                continue
+            if modified_on > cutoff:
+                skipped += 1
+                continue
+            drift["orphans"].append({
+                "cf_id": cf_id, "full_name": name, "type": record_type, "content": content,
+                "managed": comment == MANAGED_COMMENT,
+            })
+
+        drift["skipped"] = skipped
+        drift["scanned"] = {"mongo": scanned, "cloudflare": scanned_cf}
+        return drift
+
+    # --- repair ---
+
+    async def repair_zone(self, zone_id: str, drift: dict) -> dict:
+        """Push Mongo's view to Cloudflare; returns how many items of each kind were fixed."""
+        repaired = {kind: 0 for kind in DRIFT_KINDS}
+        path = f"/zones/{zone_id}/dns_records/batch"
+
+        # Records the app didn't create are left for an operator to judge
+        managed_orphans = [o for o in drift["orphans"] if o["managed"]]
+        for chunk in _chunks(managed_orphans, self.batch_size):
+            await self._cf("POST", path, json={"deletes": [{"id": o["cf_id"]} for o in chunk]})
+            for orphan in chunk:
+                if self.index:
+                    self.index.discard(zone_id, orphan["full_name"])
+            repaired["orphans"] += len(chunk)
+
+        for relink in drift["relinked"]:
+            result = await self.records.update_one(
+                {"id": relink["id"], "cf_id": relink["cf_id"]}, {"$set": {"cf_id": relink["new_cf_id"]}}
+            )
+            repaired["relinked"] += result.modified_count
+
+        for chunk in _chunks(drift["mismatches"], self.batch_size):
+            await self._cf("POST", path, json={"patches": [m["payload"] for m in chunk]})
+            repaired["mismatches"] += len(chunk)
+
+        for chunk in _chunks(drift["ghosts"], self.batch_size):
+            data = await self._cf("POST", path, json={"posts": [g["payload"] for g in chunk]})
+            stale = []
+            for ghost, created in zip(chunk, data["result"].get("posts") or []):
+                result = await self.records.update_one(
+                    {"id": ghost["id"], "cf_id": ghost["cf_id"]}, {"$set": {"cf_id": created["id"]}}
+                )
+                if result.modified_count:
+                    repaired["ghosts"] += 1
+                    if self.index:
+                        self.index.add(zone_id, ghost["full_name"])
+                else:
+                    # Deleted or changed while we were re-creating it: don't leave a new orphan behind
+                    stale.append({"id": created["id"]})
+            if stale:
+                await self._cf("POST", path, json={"deletes": stale})
+        return repaired
+
+    # --- full runs ---
+
+    async def reconcile(self, zones: Dict[str, Iterable[str]], repair: bool = False) -> Optional[dict]:
+        """Diff (and optionally repair) every zone in ``{zone_id: [domain names]}``.
+
+        The report is saved after every zone, so a long run can be followed
+        from ``latest()`` while it's still going. Returns None without running
+        when another process holds the lease.
+        """
+        self.running = True
+        if self.lease is None:
+            return await self._reconcile(zones, repair)
+        if not await self.lease.acquire():
+            self.running = False
+            logger.info("Reconciliation skipped: another process is running one")
+            return None
+        async with self.lease.keep():
+            return await self._reconcile(zones, repair)
+
+    async def _reconcile(self, zones: Dict[str, Iterable[str]], repair: bool) -> dict:
+        started = datetime.now(timezone.utc)
+        cutoff = (started - timedelta(seconds=self.grace)).isoformat()
+        report = {
+            "status": "running",
+            "repair": repair,
+            "started_at": started.isoformat(),
+            "finished_at": None,
+            "zones": len(zones),
+            "zones_done": 0,
+            "scanned": {"mongo": 0, "cloudflare": 0},
+            "counts": {kind: 0 for kind in DRIFT_KINDS},
+            "skipped": 0,
+            "repaired": {kind: 0 for kind in DRIFT_KINDS},
+            "errors": [],
+            **{kind: [] for kind in DRIFT_KINDS},
+        }
+
+        async def process(zone_id: str):
+            try:
+                drift = await self.diff_zone(zone_id, zones[zone_id], cutoff)
+                if repair:
+                    for kind, count in (await self.repair_zone(zone_id, drift)).items():
+                        report["repaired"][kind] += count
+            except Exception as e:
+                logger.warning(f"Reconcile failed for zone {zone_id}: {e}")
+                report["errors"].append({"zone_id": zone_id, "error": getattr(e, "detail", None) or str(e)})
+            else:
+                for side in ("mongo", "cloudflare"):
+                    report["scanned"][side] += drift["scanned"][side]
+                report["skipped"] += drift["skipped"]
+                for kind in DRIFT_KINDS:
+                    report["counts"][kind] += len(drift[kind])
+                    room = self.max_items - len(report[kind])
+                    for item in drift[kind][:max(0, room)]:
+                        item.pop("payload", None)
+                        report[kind].append({"zone_id": zone_id, **item})
+            report["zones_done"] += 1
+            await self._save(report)
+
+        try:
+            await run_cascade([z for z in zones if z], process, concurrency=self.concurrency)
+            report["status"] = "finished"
+        finally:
+            self.running = False
+            report["finished_at"] = datetime.now(timezone.utc).isoformat()
+            if report["status"] == "running":
+                report["status"] = "aborted"
+            await self._save(report)
+        counts = ", ".join(f"{report['counts'][kind]} {kind}" for kind in DRIFT_KINDS)
+        logger.info(f"Reconciled {report['zones_done']} zones: {counts}" + (" (repaired)" if repair else ""))
+        return report
+
+    async def _save(self, report: dict):
+        await self.reports.replace_one({"_id": "latest"}, {"_id": "latest", **report}, upsert=True)
+
+    async def latest(self) -> Optional[dict]:
+        return await self.reports.find_one({"_id": "latest"}, {"_id": 0})
+
+    async def start(self, zones: Dict[str, Iterable[str]], repair: bool = False) -> bool:
+        """Run ``reconcile`` in the background; False if a run is already in progress in any process."""
+        if self.running:
+            return False
+        self.running = True
+        if self.lease is not None and not await self.lease.acquire():
+            self.running = False
+            return False
+        self._task = asyncio.create_task(self.reconcile(zones, repair))
+        return True
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
@@ -0,0 +1,106 @@
+"""In-memory index of the record names present in each Cloudflare zone.
+
+``create_record`` used to ask Cloudflare whether a name was taken before every
+create. The index answers that locally: each zone is paged in once at startup,
+kept current by our own create/delete paths and re-synced in the background
+so edits made in the Cloudflare dashboard are picked up too.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from cf_client import error_message
+
+logger = logging.getLogger(__name__)
+
+
+class ZoneNameIndex:
+    def __init__(self, cf, per_page: int = 5000):
+        self.cf = cf
+        self.per_page = per_page
+        self._zones: Dict[str, Set[str]] = {}
+        # Local writes that happen while a zone is being re-paged: (added, removed)
+        self._in_flight: Dict[str, Tuple[Set[str], Set[str]]] = {}
+
+    def is_loaded(self, zone_id: str) -> bool:
+        return zone_id in self._zones
+
+    def contains(self, zone_id: str, name: str) -> Optional[bool]:
+        """Return whether ``name`` exists in the zone, or None if the zone isn't loaded yet."""
+        names = self._zones.get(zone_id)
+        if names is None:
+            return None
+        return name.lower() in names
+
+    def add(self, zone_id: str, name: str):
+        name = name.lower()
+        if zone_id in self._zones:
+            self._zones[zone_id].add(name)
+        if zone_id in self._in_flight:
+            added, removed = self._in_flight[zone_id]
+            added.add(name)
+            removed.discard(name)
+
+    def discard(self, zone_id: str, name: str):
+        name = name.lower()
+        if zone_id in self._zones:
+            self._zones[zone_id].discard(name)
+        if zone_id in self._in_flight:
+            added, removed = self._in_flight[zone_id]
+            removed.add(name)
+            added.discard(name)
+
+    def size(self) -> int:
+        return sum(len(names) for names in self._zones.values())
+
+    async def fetch_zone_names(self, zone_id: str) -> Set[str]:
+        names: Set[str] = set()
+        page = 1
+        while True:
+            data = await self.cf.request(
+                "GET", f"/zones/{zone_id}/dns_records",
+                params={"page": page, "per_page": self.per_page},
+            )
+            if not data.get("success"):
+                raise RuntimeError(f"Cloudflare: {error_message(data)}")
+            for rec in data.get("result") or []:
+                names.add(rec["name"].lower())
+            total_pages = (data.get("result_info") or {}).get("total_pages", 1)
+            if page >= total_pages:
+                return names
+            page += 1
+
+    async def load_zone(self, zone_id: str):
+        if zone_id in self._in_flight:
+            return
+        added: Set[str] = set()
+        removed: Set[str] = set()
+        self._in_flight[zone_id] = (added, removed)
+        try:
+            names = await self.fetch_zone_names(zone_id)
+            self._zones[zone_id] = (names | added) - removed
+        finally:
+            del self._in_flight[zone_id]
+
+    async def refresh(self, zone_ids: Iterable[str]):
+        zone_ids = [z for z in set(zone_ids) if z]
+        results = await asyncio.gather(*(self.load_zone(z) for z in zone_ids), return_exceptions=True)
+        for zone_id, result in zip(zone_ids, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Record index refresh failed for zone {zone_id}: {result}")
+        # Forget zones that are no longer served
+        for zone_id in list(self._zones):
+            if zone_id not in zone_ids:
+                del self._zones[zone_id]
+        logger.info(f"Record index refreshed: {len(self._zones)} zones, {self.size()} names")
+
+    async def run(self, get_zone_ids: Callable[[], Awaitable[Iterable[str]]], interval: float):
+        """Fill the index now, then re-sync every ``interval`` seconds until cancelled."""
+        while True:
+            try:
+                await self.refresh(await get_zone_ids())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Record index refresh error: {e}")
+            await asyncio.sleep(interval)
@@ -0,0 +1,211 @@
+"""Mongo leases and a leader-run scheduler for periodic jobs.
+
+Several uvicorn workers (and hosts) share one database, so anything that must
+happen once per cluster goes through a lease document in the ``leases``
+collection: ``{_id: name, owner, expires_at}``. Taking a lease is a single
+conditional upsert that only matches when the lease is free, expired or
+already ours; a concurrent taker loses on the duplicate ``_id``.
+
+``Lease.hold`` serializes a critical section (startup migrations and seeding)
+and keeps the lease renewed while it runs. ``Scheduler`` elects one leader per
+cluster and runs the registered periodic jobs only there; each job's last and
+next run are stored in ``scheduled_jobs``, so a new leader keeps the cadence
+instead of running everything again at once.
+
+Expiry uses each process's wall clock, like the other outbox leases; hosts
+are expected to run NTP, and ``ttl`` should be well above their skew.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+JobFn = Callable[[], Awaitable[object]]
+
+
+def process_id(node: str = "") -> str:
+    """Owner id of this process: node (hostname by default) plus pid, unique per worker."""
+    return f"{node or socket.gethostname()}:{os.getpid()}"
+
+
+class Lease:
+    def __init__(self, collection, name: str, owner: str, ttl: float = 30.0, clock: Callable[[], float] = time.time):
+        self.collection = collection
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+        self.clock = clock
+        self.expires_at = 0.0
+
+    @property
+    def held(self) -> bool:
+        return self.expires_at > self.clock()
+
+    async def acquire(self) -> bool:
+        """Take or renew the lease; False while another owner holds it."""
+        now = self.clock()
+        try:
+            doc = await self.collection.find_one_and_update(
+                {"_id": self.name, "$or": [{"owner": self.owner}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + self.ttl, "renewed_at": now}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            doc = None
+        if doc is None or doc.get("owner") != self.owner:
+            self.expires_at = 0.0
+            return False
+        self.expires_at = doc["expires_at"]
+        return True
+
+    async def release(self):
+        self.expires_at = 0.0
+        await self.collection.update_one({"_id": self.name, "owner": self.owner}, {"$set": {"expires_at": 0}})
+
+    async def _keep_alive(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            if not await self.acquire():
+                logger.error(f"Lost lease {self.name!r} while holding it")
+                return
+
+    @asynccontextmanager
+    async def keep(self):
+        """Keep an acquired lease renewed inside the block, release it afterwards."""
+        keep_alive = asyncio.create_task(self._keep_alive())
+        try:
+            yield self
+        finally:
+            keep_alive.cancel()
+            await asyncio.gather(keep_alive, return_exceptions=True)
+            await self.release()
+
+    @asynccontextmanager
+    async def hold(self, poll_interval: float = 1.0):
+        """Wait for the lease, keep it renewed inside the block, release it afterwards."""
+        while not await self.acquire():
+            await asyncio.sleep(poll_interval)
+        async with self.keep():
+            yield self
+
+
+class Job:
+    def __init__(self, name: str, interval: float, fn: JobFn, initial_delay: float):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.initial_delay = initial_delay
+        self.task: Optional[asyncio.Task] = None
+
+
+class Scheduler:
+    """Runs periodic jobs on whichever process currently holds the scheduler lease."""
+
+    def __init__(self, leases, jobs, owner: str, ttl: float = 30.0, tick: float = 5.0, clock: Callable[[], float] = time.time):
+        self.lease = Lease(leases, "scheduler", owner, ttl=ttl, clock=clock)
+        self.jobs_collection = jobs
+        self.owner = owner
+        self.tick = tick
+        self.clock = clock
+        self.jobs: Dict[str, Job] = {}
+
+    def every(self, name: str, interval: float, fn: JobFn, initial_delay: Optional[float] = None):
+        """Register ``fn`` to run every ``interval`` seconds (first run after ``initial_delay``, default ``interval``)."""
+        self.jobs[name] = Job(name, interval, fn, interval if initial_delay is None else initial_delay)
+
+    @property
+    def is_leader(self) -> bool:
+        return self.lease.held
+
+    async def _due(self, job: Job) -> bool:
+        now = self.clock()
+        state = await self.jobs_collection.find_one_and_update(
+            {"_id": job.name},
+            {"$setOnInsert": {"next_run_at": now + job.initial_delay, "interval": job.interval}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return state["next_run_at"] <= now
+
+    async def _run_job(self, job: Job):
+        started = self.clock()
+        # Claimed before running, so a leader change mid-run doesn't start it again right away
+        await self.jobs_collection.update_one(
+            {"_id": job.name},
+            {"$set": {"next_run_at": started + job.interval, "running_on": self.owner, "started_at": started}},
+        )
+        error = None
+        try:
+            await job.fn()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = str(e)
+            logger.error(f"Scheduled job {job.name} failed: {e}")
+        finished = self.clock()
+        await self.jobs_collection.update_one(
+            {"_id": job.name},
+            {"$set": {
+                "last_run_at": started,
+                "last_duration": round(finished - started, 3),
+                "last_error": error,
+                "next_run_at": finished + job.interval,
+                "running_on": None,
+            }},
+        )
+
+    def _stop_jobs(self):
+        for job in self.jobs.values():
+            if job.task and not job.task.done():
+                job.task.cancel()
+
+    async def step(self):
+        """One scheduling round: keep (or try to take) the leadership, start due jobs."""
+        was_leader = self.is_leader
+        leader = await self.lease.acquire()
+        if leader != was_leader:
+            logger.info(f"{self.owner} {'is now' if leader else 'is no longer'} the scheduler leader")
+        if not leader:
+            self._stop_jobs()
+            return
+        for job in self.jobs.values():
+            if job.task and not job.task.done():
+                continue
+            if await self._due(job):
+                job.task = asyncio.create_task(self._run_job(job))
+
+    async def run(self):
+        """Schedule until cancelled; leadership is renewed every tick."""
+        try:
+            while True:
+                try:
+                    await self.step()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Scheduler error: {e}")
+                await asyncio.sleep(self.tick)
+        finally:
+            self._stop_jobs()
+            tasks = [job.task for job in self.jobs.values() if job.task]
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self.lease.held:
+                await self.lease.release()
+
+    async def status(self) -> dict:
+        lease = await self.lease.collection.find_one({"_id": self.lease.name}) or {}
+        jobs: List[dict] = []
+        async for state in self.jobs_collection.find({"_id": {"$in": list(self.jobs)}}):
+            state["name"] = state.pop("_id")
+            jobs.append(state)
+        leader = lease.get("owner") if lease.get("expires_at", 0) > self.clock() else None
+        return {"leader": leader, "this_process": self.owner, "jobs": sorted(jobs, key=lambda j: j["name"])}
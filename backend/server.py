@@ -1,39 +1,108 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, BackgroundTasks
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DeleteOne, InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
 from typing import List, Optional
+from collections import defaultdict
 import uuid
+import base64
+import hashlib
+import ipaddress
+import secrets
 from datetime import datetime, timezone, timedelta
 import jwt
-import bcrypt
-import httpx
 import re
-import random
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import urllib.parse
+import time
+from cf_client import CF_BASE, CloudflareClient, CloudflareError, error_message
+from record_index import ZoneNameIndex
+from update_queue import WriteBehindQueue
+from provisioning import ProvisioningFailed, ProvisioningQueue
+from cascade import log_progress, run_cascade
+from user_cache import TTLCache
+from domain_registry import DomainRegistry
+from events import ADMINS, EVERYONE, MEMBERS, Event, EventHub
+from password_hasher import HasherOverloaded, PasswordHasher
+from rate_limit import MemoryStore, MongoStore, RateLimited, RateLimiter, parse_limits
+from mailer import EmailOutbox, SMTPSession
+from notifier import TelegramNotifier, escape
+from stats import StatsCounters
+from reconcile import MANAGED_COMMENT, Reconciler
+from scheduler import Lease, Scheduler, process_id
+from validation import record_content_error, record_name_error, record_type_error, validate_records
+from zonefile import ZoneError, cloudflare_ttl, format_record, parse_zonefile, zone_header
+from pagination import after_cursor, fetch_page, items_after, ndjson_items, ndjson_response, page_limit, page_result, sort_spec, stream_find, stream_limit, wants_ndjson
+from broadcast import Broadcast
+from dns_server import DNSAuthority, DNSServer, refresh_records, refresh_zones, sync_authority
+from metrics import CONTENT_TYPE, MetricsMiddleware, MongoCommandMetrics, Registry, cf_observer, monitor_loop_lag
+import db_schema
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Prometheus metrics, served at /api/metrics (set METRICS_TOKEN to require "Authorization: Bearer <token>")
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+metrics = Registry()
+http_latency = metrics.histogram("ddns_http_request_duration_seconds", "HTTP request latency by route template", ["method", "route", "status"])
+http_in_flight = metrics.gauge("ddns_http_requests_in_flight", "HTTP requests being served")
+cf_latency = metrics.histogram("ddns_cloudflare_request_duration_seconds", "Cloudflare API call latency per attempt", ["zone", "operation"])
+cf_errors = metrics.counter("ddns_cloudflare_errors_total", "Cloudflare API attempts without a 2xx answer", ["zone", "operation", "status"])
+mongo_latency = metrics.histogram("ddns_mongo_command_duration_seconds", "MongoDB command latency", ["command"])
+mongo_failures = metrics.counter("ddns_mongo_command_failures_total", "Failed MongoDB commands", ["command"])
+loop_lag = metrics.histogram("ddns_event_loop_lag_seconds", "Event loop scheduling delay", buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+loop_lag_last = metrics.gauge("ddns_event_loop_lag_last_seconds", "Most recent event loop lag sample")
+bcrypt_latency = metrics.histogram("ddns_bcrypt_duration_seconds", "Password hashing time including pool queueing", ["operation"])
+smtp_latency = metrics.histogram("ddns_smtp_send_duration_seconds", "SMTP send time per message", ["result"])
+queue_depth = metrics.gauge("ddns_queue_depth", "Items waiting in background queues", ["queue"])
+queue_age = metrics.gauge("ddns_queue_oldest_age_seconds", "Age of the oldest pending item per queue", ["queue"])
+rate_limited = metrics.counter("ddns_rate_limited_total", "Requests rejected by a rate limit", ["route", "key"])
+event_subscribers = metrics.gauge("ddns_event_subscribers", "Open /api/events streams on this worker")
+
 # MongoDB
 mongo_url = os.environ['MONGO_URL']
-mongo_client = AsyncIOMotorClient(mongo_url)
+mongo_client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics(mongo_latency, mongo_failures)])
 db = mongo_client[os.environ['DB_NAME']]
 
 # Cloudflare config (shared token for all domains)
 CF_API_TOKEN = os.environ.get('CLOUDFLARE_API_TOKEN', '')
-CF_BASE = "https://api.cloudflare.com/client/v4"
-CF_HEADERS = {
-    "Authorization": f"Bearer {CF_API_TOKEN}",
-    "Content-Type": "application/json"
-}
+CF_MAX_CONNECTIONS = int(os.environ.get('CF_MAX_CONNECTIONS', '20'))
+CF_MAX_IN_FLIGHT = int(os.environ.get('CF_MAX_IN_FLIGHT', '10'))
+CF_MAX_RETRIES = int(os.environ.get('CF_MAX_RETRIES', '4'))
+CF_HTTP2 = os.environ.get('CF_HTTP2', 'false').lower() == 'true'
+
+# Shared, app-lifetime Cloudflare client (opened on startup, closed on shutdown)
+cf = CloudflareClient(
+    CF_API_TOKEN,
+    base_url=CF_BASE,
+    max_connections=CF_MAX_CONNECTIONS,
+    max_in_flight=CF_MAX_IN_FLIGHT,
+    http2=CF_HTTP2,
+    max_retries=CF_MAX_RETRIES,
+    observer=cf_observer(cf_latency, cf_errors),
+)
+
+# Local record-name index (replaces the per-create Cloudflare existence lookup)
+RECORD_INDEX_REFRESH_INTERVAL = int(os.environ.get('RECORD_INDEX_REFRESH_INTERVAL', '300'))
+record_index = ZoneNameIndex(cf)
+
+# Write-behind mode: acknowledge record updates after the Mongo write and push
+# them to Cloudflare from an outbox, coalesced per record within the window
+CF_WRITE_BEHIND = os.environ.get('CF_WRITE_BEHIND', 'false').lower() == 'true'
+CF_WRITE_BEHIND_WINDOW = float(os.environ.get('CF_WRITE_BEHIND_WINDOW', '5'))
+
+# Async provisioning: create_record stores a pending record, answers 202 and
+# leaves the Cloudflare create to a worker pool draining the record_jobs outbox
+CF_ASYNC_PROVISIONING = os.environ.get('CF_ASYNC_PROVISIONING', 'false').lower() == 'true'
+PROVISION_WORKERS = int(os.environ.get('PROVISION_WORKERS', '4'))
+# Longest a status request may long-poll (?wait=seconds)
+PROVISION_MAX_WAIT = 30
 
 # Default domain (seeded on startup)
 DEFAULT_ZONE_ID = os.environ.get('CLOUDFLARE_ZONE_ID', '')
@@ -43,23 +112,171 @@ DEFAULT_DOMAIN = "dnslab.biz"
 JWT_SECRET = os.environ.get('JWT_SECRET', 'ddns-land-fallback-secret')
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRY_DAYS = 7
+# Carry role/plan as signed claims so read-only routes can skip the user lookup
+# (a plan change then shows up on those routes at the next login)
+JWT_EMBED_CLAIMS = os.environ.get('JWT_EMBED_CLAIMS', 'false').lower() == 'true'
+
+# Authenticated-user cache (per worker; routes that change a user invalidate it here and, through the broadcast, on every other worker)
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', '30'))
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '10000'))
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# In-memory domains; other workers' admin changes arrive by change stream, or by polling on standalone mongod
+DOMAIN_POLL_INTERVAL = float(os.environ.get('DOMAIN_POLL_INTERVAL', '1'))
+domain_registry = DomainRegistry(db.domains, poll_interval=DOMAIN_POLL_INTERVAL)
+
+# Password hashing (bcrypt on a bounded thread pool; hashes with another cost are upgraded on login)
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', '2'))
+BCRYPT_MAX_QUEUE = int(os.environ.get('BCRYPT_MAX_QUEUE', '32'))
+password_hasher = PasswordHasher(rounds=BCRYPT_ROUNDS, workers=BCRYPT_WORKERS, max_queue=BCRYPT_MAX_QUEUE)
+
+# Sliding-window rate limits per route, keyed on client ip, email or user id.
+# RATE_LIMITS overrides/extends the defaults: "route:key=count/seconds,..."
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+# memory (per worker) or mongo (shared by all workers)
+RATE_LIMIT_STORE = os.environ.get('RATE_LIMIT_STORE', 'memory').lower()
+RATE_LIMITS = {
+    "login": [("ip", 30, 60), ("email", 10, 300)],
+    "register": [("ip", 10, 3600), ("email", 5, 3600)],
+    "resend_code": [("ip", 10, 3600), ("email", 5, 3600)],
+    "verify": [("ip", 30, 600), ("email", 10, 600)],
+    "records": [("user", 60, 60)],
+    "dyndns": [("ip", 60, 60)],
+    **parse_limits(os.environ.get('RATE_LIMITS', '')),
+}
+rate_limiter = RateLimiter(
+    MongoStore(db.rate_limits) if RATE_LIMIT_STORE == 'mongo' else MemoryStore(),
+    RATE_LIMITS,
+    enabled=RATE_LIMIT_ENABLED,
+    on_reject=rate_limited.inc,
+)
 
 # App config
 FREE_RECORD_LIMIT = 2
+# Concurrent Cloudflare calls used by cascading deletes (user/domain teardown)
+CASCADE_CONCURRENCY = int(os.environ.get('CASCADE_CONCURRENCY', '8'))
+BULK_MAX_OPERATIONS = 1000
+# Operations per Cloudflare batch call
+CF_BATCH_SIZE = int(os.environ.get('CF_BATCH_SIZE', '200'))
 
 # SMTP config
 SMTP_EMAIL = os.environ.get('SMTP_EMAIL', '')
 SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', '')
+SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', '465'))
+# ssl (implicit TLS), starttls, or none (e.g. a local debugging server)
+SMTP_SECURITY = os.environ.get('SMTP_SECURITY', 'ssl').lower()
+# Minimum seconds between two verification mails to the same address
+EMAIL_RESEND_INTERVAL = float(os.environ.get('EMAIL_RESEND_INTERVAL', '60'))
 
 # Verification code expiry (minutes)
 VERIFY_CODE_EXPIRY = 10
+# Wrong guesses after which a code is discarded and a new one has to be requested
+VERIFY_MAX_ATTEMPTS = int(os.environ.get('VERIFY_MAX_ATTEMPTS', '5'))
+
+# Several workers/hosts can serve the API: periodic jobs run only on the process
+# holding the scheduler lease, and startup migrations/seeding are serialized by a
+# lease (scheduler.py). NODE_NAME defaults to the hostname; the pid is appended.
+PROCESS_ID = process_id(os.environ.get('NODE_NAME', ''))
+LEASE_TTL = float(os.environ.get('LEASE_TTL', '30'))
+scheduler = Scheduler(db.leases, db.scheduled_jobs, PROCESS_ID, ttl=LEASE_TTL, tick=LEASE_TTL / 6)
+# Changed user ids, record ids and zone names are announced to the other workers
+# through db.changes (works without change streams), polled every BROADCAST_POLL_INTERVAL
+BROADCAST_POLL_INTERVAL = float(os.environ.get('BROADCAST_POLL_INTERVAL', '1'))
+broadcast = Broadcast(db.changes, PROCESS_ID, poll_interval=BROADCAST_POLL_INTERVAL)
+
+# Seconds between exact recounts of the admin stats counters
+STATS_RECOUNT_INTERVAL = float(os.environ.get('STATS_RECOUNT_INTERVAL', '900'))
+stats = StatsCounters(db.stats, db)
+
+# Mongo <-> Cloudflare drift check every RECONCILE_INTERVAL seconds (0 disables the
+# periodic run; admins can still start one). With RECONCILE_REPAIR, Mongo wins.
+RECONCILE_INTERVAL = float(os.environ.get('RECONCILE_INTERVAL', '3600'))
+RECONCILE_REPAIR = os.environ.get('RECONCILE_REPAIR', 'false').lower() == 'true'
+RECONCILE_CONCURRENCY = int(os.environ.get('RECONCILE_CONCURRENCY', '4'))
+reconciler = Reconciler(
+    cf,
+    db.dns_records,
+    db.reconcile_reports,
+    index=record_index,
+    default_zone_id=DEFAULT_ZONE_ID,
+    concurrency=RECONCILE_CONCURRENCY,
+    batch_size=CF_BATCH_SIZE,
+    lease=Lease(db.leases, "reconcile", PROCESS_ID, ttl=LEASE_TTL),
+)
+
+email_outbox = EmailOutbox(
+    db.email_outbox,
+    SMTPSession(
+        SMTP_HOST, SMTP_PORT, security=SMTP_SECURITY, username=SMTP_EMAIL, password=SMTP_PASSWORD,
+        observer=lambda result, seconds: smtp_latency.observe(seconds, result),
+    ),
+    sender=SMTP_EMAIL,
+    sender_name="DNSLAB.BIZ",
+    resend_interval=EMAIL_RESEND_INTERVAL,
+    keep_sent_for=VERIFY_CODE_EXPIRY * 60,
+)
 
 # Telegram notification config
 TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN', '')
 TELEGRAM_CHAT_ID = os.environ.get('TELEGRAM_CHAT_ID', '')
+# Events arriving within this many seconds are merged into one digest message
+TELEGRAM_DIGEST_WINDOW = float(os.environ.get('TELEGRAM_DIGEST_WINDOW', '10'))
+# Minimum spacing between messages to the chat (Telegram allows ~20/min in groups)
+TELEGRAM_MIN_INTERVAL = float(os.environ.get('TELEGRAM_MIN_INTERVAL', '3'))
+# Comma-separated event types to forward; empty forwards all of them
+TELEGRAM_EVENTS = [e.strip() for e in os.environ.get('TELEGRAM_EVENTS', '').split(',') if e.strip()]
+
+notifier = TelegramNotifier(
+    TELEGRAM_BOT_TOKEN,
+    TELEGRAM_CHAT_ID,
+    window=TELEGRAM_DIGEST_WINDOW,
+    min_interval=TELEGRAM_MIN_INTERVAL,
+    events=TELEGRAM_EVENTS,
+)
+
+# Embedded authoritative DNS server for zones delegated to this host (answers
+# from memory, updated by the record write paths; no Cloudflare round trip)
+DNS_SERVER_ENABLED = os.environ.get('DNS_SERVER_ENABLED', 'false').lower() == 'true'
+DNS_SERVER_HOST = os.environ.get('DNS_SERVER_HOST', '0.0.0.0')
+DNS_SERVER_PORT = int(os.environ.get('DNS_SERVER_PORT', '53'))
+# Hostnames of the nameservers the zones are delegated to (apex NS and SOA)
+DNS_NAMESERVERS = [ns.strip() for ns in os.environ.get('DNS_NAMESERVERS', '').split(',') if ns.strip()]
+# Full reload interval; picks up writes made by other processes when change streams aren't available
+DNS_RELOAD_INTERVAL = float(os.environ.get('DNS_RELOAD_INTERVAL', '60'))
+dns_authority = DNSAuthority(DNS_NAMESERVERS, hostmaster=os.environ.get('ADMIN_EMAIL', ''))
+dns_server = DNSServer(dns_authority, DNS_SERVER_HOST, DNS_SERVER_PORT)
+
+
+async def serve_records(upserts=(), removals=()):
+    """Apply record writes to this worker's DNS trie and announce them to the other workers."""
+    for record in upserts:
+        dns_authority.upsert(record)
+    for record in removals:
+        dns_authority.remove(record)
+    if DNS_SERVER_ENABLED:
+        await broadcast.publish("dns_records", [r["id"] for r in (*upserts, *removals)])
+
+
+async def serve_zones(added=(), removed=()):
+    """Apply domain changes to this worker's DNS zones and announce them to the other workers."""
+    for name in removed:
+        dns_authority.remove_zone(name)
+    for name in added:
+        dns_authority.add_zone(name)
+    if DNS_SERVER_ENABLED:
+        await broadcast.publish("domains", [*removed, *added])
+
+
+async def invalidate_user(user_id: str):
+    user_cache.invalidate(user_id)
+    await broadcast.publish("users", [user_id])
 
 app = FastAPI(title="DNSLAB.BIZ API")
 api_router = APIRouter(prefix="/api")
+# dyndns2 clients expect /nic/update at the site root
+nic_router = APIRouter()
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -67,78 +284,187 @@ logger = logging.getLogger(__name__)
 
 # --- Cloudflare API Helpers (zone_id as parameter) ---
 async def cf_create_record(zone_id: str, record_type: str, name: str, content: str, ttl: int = 1, proxied: bool = False):
-    url = f"{CF_BASE}/zones/{zone_id}/dns_records"
-    payload = {"type": record_type, "name": name, "content": content, "ttl": ttl, "proxied": proxied}
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.post(url, headers=CF_HEADERS, json=payload)
-        data = resp.json()
-        if not data.get("success"):
-            errors = data.get("errors", [])
-            msg = errors[0].get("message", "Unknown error") if errors else "Unknown error"
-            logger.error(f"CF create error: {msg}")
-            raise HTTPException(status_code=400, detail=f"Cloudflare: {msg}")
-        return data["result"]
+    payload = {"type": record_type, "name": name, "content": content, "ttl": ttl, "proxied": proxied, "comment": MANAGED_COMMENT}
+    data = await cf.request("POST", f"/zones/{zone_id}/dns_records", json=payload)
+    if not data.get("success"):
+        msg = error_message(data)
+        logger.error(f"CF create error: {msg}")
+        raise HTTPException(status_code=400, detail=f"Cloudflare: {msg}")
+    return data["result"]
 
 
 async def cf_update_record(zone_id: str, record_id: str, record_type: str, name: str, content: str, ttl: int = 1, proxied: bool = False):
-    url = f"{CF_BASE}/zones/{zone_id}/dns_records/{record_id}"
-    payload = {"type": record_type, "name": name, "content": content, "ttl": ttl, "proxied": proxied}
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.put(url, headers=CF_HEADERS, json=payload)
-        data = resp.json()
-        if not data.get("success"):
-            errors = data.get("errors", [])
-            msg = errors[0].get("message", "Unknown error") if errors else "Unknown error"
-            raise HTTPException(status_code=400, detail=f"Cloudflare: {msg}")
-        return data["result"]
+    payload = {"type": record_type, "name": name, "content": content, "ttl": ttl, "proxied": proxied, "comment": MANAGED_COMMENT}
+    data = await cf.request("PUT", f"/zones/{zone_id}/dns_records/{record_id}", json=payload)
+    if not data.get("success"):
+        raise HTTPException(status_code=400, detail=f"Cloudflare: {error_message(data)}")
+    return data["result"]
 
 
 async def cf_check_record_exists(zone_id: str, name: str):
-    url = f"{CF_BASE}/zones/{zone_id}/dns_records?name={name}"
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.get(url, headers=CF_HEADERS)
-        data = resp.json()
-        if data.get("success") and data.get("result"):
-            return True
-        return False
+    data = await cf.request("GET", f"/zones/{zone_id}/dns_records", params={"name": name})
+    if data.get("success") and data.get("result"):
+        return True
+    return False
 
 
 async def cf_delete_record(zone_id: str, record_id: str):
-    url = f"{CF_BASE}/zones/{zone_id}/dns_records/{record_id}"
-    async with httpx.AsyncClient(timeout=30) as client:
-        resp = await client.delete(url, headers=CF_HEADERS)
-        data = resp.json()
-        if not data.get("success"):
-            errors = data.get("errors", [])
-            msg = errors[0].get("message", "Unknown error") if errors else "Unknown error"
-            raise HTTPException(status_code=400, detail=f"Cloudflare: {msg}")
-        return data.get("result", {})
+    data = await cf.request("DELETE", f"/zones/{zone_id}/dns_records/{record_id}")
+    if not data.get("success"):
+        raise HTTPException(status_code=400, detail=f"Cloudflare: {error_message(data)}")
+    return data.get("result", {})
+
+
+async def cf_batch_records(zone_id: str, deletes: list = (), patches: list = (), posts: list = ()):
+    """One atomic Cloudflare batch call; executed as deletes, then patches, then posts."""
+    payload = {"deletes": list(deletes), "patches": list(patches), "posts": list(posts)}
+    data = await cf.request("POST", f"/zones/{zone_id}/dns_records/batch", json=payload)
+    if not data.get("success"):
+        raise HTTPException(status_code=400, detail=f"Cloudflare: {error_message(data)}")
+    return data["result"]
+
+
+async def send_queued_update(zone_id: str, cf_id: str, payload: dict):
+    await cf_update_record(
+        zone_id=zone_id,
+        record_id=cf_id,
+        record_type=payload["type"],
+        name=payload["name"],
+        content=payload["content"],
+        ttl=payload["ttl"],
+        proxied=payload["proxied"]
+    )
+
+
+def queued_update_failed(item: dict, error: str):
+    notifier.notify("cloudflare_error", f"Gave up updating <code>{escape(item['payload']['name'])}</code>: {escape(error)}")
+
+
+update_queue = WriteBehindQueue(db.cf_outbox, send_queued_update, window=CF_WRITE_BEHIND_WINDOW, on_failed=queued_update_failed)
+
+
+async def push_record_update(record: dict, content: str, ttl: int, proxied: bool):
+    """Send a record change to Cloudflare, or park it in the write-behind outbox when enabled."""
+    zone_id = record.get("zone_id", DEFAULT_ZONE_ID)
+    if CF_WRITE_BEHIND:
+        await update_queue.enqueue(zone_id, record["cf_id"], {
+            "type": record["record_type"],
+            "name": record["full_name"],
+            "content": content,
+            "ttl": ttl,
+            "proxied": proxied,
+        })
+        return
+    await cf_update_record(
+        zone_id=zone_id,
+        record_id=record["cf_id"],
+        record_type=record["record_type"],
+        name=record["full_name"],
+        content=content,
+        ttl=ttl,
+        proxied=proxied
+    )
+
+
+async def cf_remove_record(record: dict):
+    """Take a record out of Cloudflare, or out of the provisioning queue if it never got there."""
+    zone_id = record.get("zone_id", DEFAULT_ZONE_ID)
+    if record.get("cf_id"):
+        await update_queue.discard(record["cf_id"])
+        await cf_delete_record(zone_id, record["cf_id"])
+    else:
+        await provisioner.discard(record["id"])
+    record_index.discard(zone_id, record["full_name"])
+
+
+async def provision_record(record: dict):
+    """Create a pending record in Cloudflare and mark it active (run by the provisioning workers)."""
+    zone_id = record["zone_id"]
+    full_name = record["full_name"]
+    # A previous attempt may have created it before its worker died: adopt that one.
+    # Names already in Cloudflare were refused at request time, so a match is ours.
+    data = await cf.request("GET", f"/zones/{zone_id}/dns_records", params={"name": full_name, "type": record["record_type"]})
+    existing = data.get("result") or []
+    if existing:
+        cf_result = existing[0]
+    else:
+        try:
+            cf_result = await cf_create_record(
+                zone_id=zone_id,
+                record_type=record["record_type"],
+                name=full_name,
+                content=record["content"],
+                ttl=record["ttl"],
+                proxied=False if record["record_type"] == "NS" else record["proxied"]
+            )
+        except HTTPException as e:
+            raise ProvisioningFailed(e.detail)
+    record_index.add(zone_id, full_name)
+
+    result = await db.dns_records.update_one(
+        {"id": record["id"], "status": "pending"},
+        {"$set": {"cf_id": cf_result["id"], "status": "active"}, "$unset": {"error": ""}}
+    )
+    if not result.matched_count:
+        # Deleted while we were creating it
+        try:
+            await cf_delete_record(zone_id, cf_result["id"])
+        except Exception:
+            logger.warning(f"Failed to roll back CF record {cf_result['id']} for {full_name}")
+        record_index.discard(zone_id, full_name)
+        return
+    await serve_records([{**record, "cf_id": cf_result["id"], "status": "active"}])
+    owner = await db.users.find_one({"id": record["user_id"]}, {"_id": 0, "email": 1}) or {}
+    notifier.notify("record_created", f"{record['record_type']} <code>{escape(full_name)}</code> → <code>{escape(record['content'])}</code> by {escape(owner.get('email', record['user_id']))}")
+
+
+provisioner = ProvisioningQueue(db.record_jobs, db.dns_records, provision_record, workers=PROVISION_WORKERS)
 
 
 # --- Auth Helpers ---
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def hash_password(password: str) -> str:
+    started = time.perf_counter()
+    try:
+        return await password_hasher.hash(password)
+    finally:
+        bcrypt_latency.observe(time.perf_counter() - started, "hash")
 
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+async def verify_password(password: str, hashed: str) -> bool:
+    started = time.perf_counter()
+    try:
+        return await password_hasher.verify(password, hashed)
+    finally:
+        bcrypt_latency.observe(time.perf_counter() - started, "verify")
 
 
-def create_token(user_id: str, email: str) -> str:
+def create_token(user_id: str, email: str, role: str = "user", plan: str = "free") -> str:
     payload = {
         "user_id": user_id,
         "email": email,
         "exp": datetime.now(timezone.utc) + timedelta(days=JWT_EXPIRY_DAYS)
     }
+    if JWT_EMBED_CLAIMS:
+        payload["role"] = role
+        payload["plan"] = plan
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 
 def generate_verification_code():
-    return str(random.randint(100000, 999999))
+    return str(100000 + secrets.randbelow(900000))
 
 
-def send_verification_email(to_email: str, code: str):
-    if not SMTP_EMAIL or not SMTP_PASSWORD:
+def new_code_fields(code: str) -> dict:
+    return {
+        "verification_code": code,
+        "code_expires_at": (datetime.now(timezone.utc) + timedelta(minutes=VERIFY_CODE_EXPIRY)).isoformat(),
+        "verify_attempts": 0,
+    }
+
+
+async def send_verification_email(to_email: str, code: str):
+    """Queue a verification code mail; delivered by the email outbox worker."""
+    if not SMTP_EMAIL or (not SMTP_PASSWORD and SMTP_SECURITY != "none"):
         logger.error("SMTP not configured")
         return False
 
@@ -161,58 +487,52 @@ def send_verification_email(to_email: str, code: str):
     </div>
     """
 
-    msg = MIMEMultipart("alternative")
-    msg["Subject"] = f"DNSLAB.BIZ - Verification Code: {code}"
-    msg["From"] = f"DNSLAB.BIZ <{SMTP_EMAIL}>"
-    msg["To"] = to_email
-    msg.attach(MIMEText(f"Your verification code is: {code}\nExpires in {VERIFY_CODE_EXPIRY} minutes.", "plain"))
-    msg.attach(MIMEText(html_body, "html"))
-
     try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(SMTP_EMAIL, SMTP_PASSWORD)
-            server.sendmail(SMTP_EMAIL, to_email, msg.as_string())
-        logger.info(f"Verification email sent to {to_email}")
-        return True
-    except Exception as e:
-        logger.error(f"Failed to send email to {to_email}: {e}")
+        await email_outbox.enqueue(
+            to_email,
+            "verification",
+            subject=f"DNSLAB.BIZ - Verification Code: {code}",
+            text=f"Your verification code is: {code}\nExpires in {VERIFY_CODE_EXPIRY} minutes.",
+            html=html_body,
+        )
+    except ValueError as e:
+        logger.error(f"Verification email not queued: {e}")
         return False
+    return True
 
 
-def send_telegram_notification(message: str):
-    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
-        logger.warning("Telegram not configured, skipping notification")
-        return
-    try:
-        import urllib.request as urlreq
-        encoded = urllib.parse.quote(message)
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage?chat_id={TELEGRAM_CHAT_ID}&text={encoded}&parse_mode=HTML"
-        req = urlreq.Request(url)
-        with urlreq.urlopen(req, timeout=10) as resp:
-            if resp.status == 200:
-                logger.info("Telegram notification sent")
-            else:
-                logger.warning(f"Telegram notification failed: {resp.status}")
-    except Exception as e:
-        logger.error(f"Failed to send Telegram notification: {e}")
-
-
-async def get_current_user(authorization: Optional[str] = Header(None)):
+def decode_token(authorization: Optional[str]) -> dict:
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Not authenticated")
     token = authorization.split(" ")[1]
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0})
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        return user
+        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
+async def get_current_user(authorization: Optional[str] = Header(None)):
+    payload = decode_token(authorization)
+    user = user_cache.get(payload["user_id"])
+    if user is None:
+        user = await db.users.find_one({"id": payload["user_id"]}, {"_id": 0})
+        if not user:
+            raise HTTPException(status_code=401, detail="User not found")
+        user_cache.set(payload["user_id"], user)
+    return dict(user)
+
+
+async def get_token_user(authorization: Optional[str] = Header(None)):
+    """For read-only routes: trust role/plan claims in the token when present, else load the user."""
+    if JWT_EMBED_CLAIMS:
+        payload = decode_token(authorization)
+        if "role" in payload and "plan" in payload:
+            return {"id": payload["user_id"], "email": payload["email"], "role": payload["role"], "plan": payload["plan"]}
+    return await get_current_user(authorization)
+
+
 # --- Pydantic Models ---
 class UserRegister(BaseModel):
     email: str
@@ -239,6 +559,21 @@ class DNSRecordUpdate(BaseModel):
     proxied: bool = False
 
 
+class BulkRecordOperation(BaseModel):
+    action: str
+    id: str = ""
+    record_type: str = ""
+    name: str = ""
+    content: str = ""
+    domain_id: str = ""
+    ttl: int = 1
+    proxied: bool = False
+
+
+class BulkRecordRequest(BaseModel):
+    operations: List[BulkRecordOperation] = Field(min_length=1, max_length=BULK_MAX_OPERATIONS)
+
+
 class DomainCreate(BaseModel):
     name: str
     zone_id: str
@@ -259,17 +594,74 @@ class ResendCode(BaseModel):
     email: str
 
 
+# Fields never returned by record endpoints
+RECORD_PROJECTION = {"_id": 0, "update_token_hash": 0}
+
+
 # --- Helper: get domain by id ---
 async def get_domain(domain_id: str):
-    domain = await db.domains.find_one({"id": domain_id}, {"_id": 0})
+    await domain_registry.ensure_loaded()
+    domain = domain_registry.get(domain_id)
     if not domain:
-        raise HTTPException(status_code=404, detail="Domain not found")
+        # Possibly added on another worker a moment ago
+        domain = await db.domains.find_one({"id": domain_id}, {"_id": 0})
+        if not domain:
+            raise HTTPException(status_code=404, detail="Domain not found")
+        domain_registry.put(domain)
     return domain
 
 
+# --- Record Helpers ---
+def is_record_limited(user: dict) -> bool:
+    return user.get("role") != "admin" and user.get("plan", "free") == "free"
+
+
+async def resolve_record_domain(domain_id: str) -> dict:
+    """Domain a new record goes into: the requested active domain, else the default one."""
+    if domain_id:
+        domain = await get_domain(domain_id)
+        if not domain.get("active"):
+            raise HTTPException(status_code=400, detail="This domain is not active")
+        return domain
+    # Fallback: use default domain
+    await domain_registry.ensure_loaded()
+    default_domain = domain_registry.by_name(DEFAULT_DOMAIN)
+    if default_domain:
+        return default_domain
+    return {"id": "", "name": DEFAULT_DOMAIN, "zone_id": DEFAULT_ZONE_ID}
+
+
+def record_response(record: dict) -> dict:
+    response = {
+        "id": record["id"],
+        "cf_id": record["cf_id"],
+        "domain_id": record["domain_id"],
+        "domain_name": record["domain_name"],
+        "record_type": record["record_type"],
+        "name": record["name"],
+        "full_name": record["full_name"],
+        "content": record["content"],
+        "ttl": record["ttl"],
+        "proxied": record["proxied"],
+        "status": record.get("status", "active"),
+        "created_at": record["created_at"]
+    }
+    if record.get("error"):
+        response["error"] = record["error"]
+    return response
+
+
+async def cf_name_exists(zone_id: str, full_name: str) -> bool:
+    exists = record_index.contains(zone_id, full_name)
+    if exists is None:
+        exists = await cf_check_record_exists(zone_id, full_name)
+    return exists
+
+
 # --- Auth Routes ---
 @api_router.post("/auth/register")
-async def register(data: UserRegister, background_tasks: BackgroundTasks):
+async def register(data: UserRegister, request: Request):
+    await rate_limiter.check("register", ip=client_key(request), email=data.email.lower())
     if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', data.email):
         raise HTTPException(status_code=400, detail="Invalid email format")
 
@@ -284,13 +676,9 @@ async def register(data: UserRegister, background_tasks: BackgroundTasks):
             code = generate_verification_code()
             await db.users.update_one(
                 {"email": data.email},
-                {"$set": {
-                    "password_hash": hash_password(data.password),
-                    "verification_code": code,
-                    "code_expires_at": (datetime.now(timezone.utc) + timedelta(minutes=VERIFY_CODE_EXPIRY)).isoformat()
-                }}
+                {"$set": {"password_hash": await hash_password(data.password), **new_code_fields(code)}}
             )
-            background_tasks.add_task(send_verification_email, data.email, code)
+            await send_verification_email(data.email, code)
             return {"message": "Verification code sent", "email": data.email, "verified": False}
 
     user_id = str(uuid.uuid4())
@@ -298,25 +686,29 @@ async def register(data: UserRegister, background_tasks: BackgroundTasks):
     user_doc = {
         "id": user_id,
         "email": data.email,
-        "password_hash": hash_password(data.password),
+        "password_hash": await hash_password(data.password),
         "plan": "free",
         "verified": False,
-        "verification_code": code,
-        "code_expires_at": (datetime.now(timezone.utc) + timedelta(minutes=VERIFY_CODE_EXPIRY)).isoformat(),
+        **new_code_fields(code),
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.users.insert_one(user_doc)
-
-    background_tasks.add_task(send_verification_email, data.email, code)
-    background_tasks.add_task(
-        send_telegram_notification,
-        f"<b>New User Registration</b>\n\nEmail: <code>{data.email}</code>\nTime: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M UTC')}"
+    try:
+        await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+
+    await stats.incr({"total_users": 1, "free_users": 1}, {"registrations": 1})
+    await send_verification_email(data.email, code)
+    notifier.notify(
+        "registration",
+        f"Email: <code>{escape(data.email)}</code>\nTime: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M UTC')}"
     )
     return {"message": "Verification code sent", "email": data.email, "verified": False}
 
 
 @api_router.post("/auth/verify")
-async def verify_email(data: VerifyCode):
+async def verify_email(data: VerifyCode, request: Request):
+    await rate_limiter.check("verify", ip=client_key(request), email=data.email.lower())
     user = await db.users.find_one({"email": data.email}, {"_id": 0})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -324,7 +716,24 @@ async def verify_email(data: VerifyCode):
     if user.get("verified", False):
         raise HTTPException(status_code=400, detail="Email already verified")
 
-    if user.get("verification_code") != data.code:
+    stored_code = user.get("verification_code")
+    if not stored_code:
+        raise HTTPException(status_code=400, detail="No active verification code. Request a new one.")
+    # Compared as bytes: compare_digest rejects non-ASCII str
+    if not secrets.compare_digest(stored_code.encode(), data.code.encode()):
+        # Each code allows VERIFY_MAX_ATTEMPTS guesses; then it is thrown away
+        result = await db.users.find_one_and_update(
+            {"email": data.email, "verification_code": stored_code},
+            {"$inc": {"verify_attempts": 1}},
+            projection={"verify_attempts": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if result and result.get("verify_attempts", 0) >= VERIFY_MAX_ATTEMPTS:
+            await db.users.update_one(
+                {"email": data.email, "verification_code": stored_code},
+                {"$unset": {"verification_code": "", "code_expires_at": "", "verify_attempts": ""}}
+            )
+            raise HTTPException(status_code=400, detail="Too many wrong codes. Request a new one.")
         raise HTTPException(status_code=400, detail="Invalid verification code")
 
     expires = user.get("code_expires_at", "")
@@ -333,12 +742,15 @@ async def verify_email(data: VerifyCode):
         if datetime.now(timezone.utc) > exp_dt:
             raise HTTPException(status_code=400, detail="Verification code expired. Request a new one.")
 
-    await db.users.update_one(
-        {"email": data.email},
-        {"$set": {"verified": True}, "$unset": {"verification_code": "", "code_expires_at": ""}}
+    result = await db.users.update_one(
+        {"email": data.email, "verified": {"$ne": True}},
+        {"$set": {"verified": True}, "$unset": {"verification_code": "", "code_expires_at": "", "verify_attempts": ""}}
     )
+    if result.modified_count:
+        await stats.incr({"verified_users": 1}, {"verifications": 1})
+    await invalidate_user(user["id"])
 
-    token = create_token(user["id"], user["email"])
+    token = create_token(user["id"], user["email"], user.get("role", "user"), user.get("plan", "free"))
     return {
         "token": token,
         "user": {"id": user["id"], "email": user["email"], "plan": user.get("plan", "free"), "role": user.get("role", "user")}
@@ -346,7 +758,8 @@ async def verify_email(data: VerifyCode):
 
 
 @api_router.post("/auth/resend-code")
-async def resend_code(data: ResendCode, background_tasks: BackgroundTasks):
+async def resend_code(data: ResendCode, request: Request):
+    await rate_limiter.check("resend_code", ip=client_key(request), email=data.email.lower())
     user = await db.users.find_one({"email": data.email}, {"_id": 0})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -357,35 +770,35 @@ async def resend_code(data: ResendCode, background_tasks: BackgroundTasks):
     code = generate_verification_code()
     await db.users.update_one(
         {"email": data.email},
-        {"$set": {
-            "verification_code": code,
-            "code_expires_at": (datetime.now(timezone.utc) + timedelta(minutes=VERIFY_CODE_EXPIRY)).isoformat()
-        }}
+        {"$set": new_code_fields(code)}
     )
 
-    background_tasks.add_task(send_verification_email, data.email, code)
+    await send_verification_email(data.email, code)
     return {"message": "Verification code sent"}
 
 
 @api_router.post("/auth/login")
-async def login(data: UserLogin, background_tasks: BackgroundTasks):
+async def login(data: UserLogin, request: Request):
+    await rate_limiter.check("login", ip=client_key(request), email=data.email.lower())
     user = await db.users.find_one({"email": data.email}, {"_id": 0})
-    if not user or not verify_password(data.password, user["password_hash"]):
+    if not user or not await verify_password(data.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
+    if password_hasher.needs_rehash(user["password_hash"]):
+        # Work factor changed since this hash was made: upgrade it transparently
+        await db.users.update_one({"id": user["id"]}, {"$set": {"password_hash": await hash_password(data.password)}})
+        await invalidate_user(user["id"])
+
     if not user.get("verified", False):
         code = generate_verification_code()
         await db.users.update_one(
             {"email": data.email},
-            {"$set": {
-                "verification_code": code,
-                "code_expires_at": (datetime.now(timezone.utc) + timedelta(minutes=VERIFY_CODE_EXPIRY)).isoformat()
-            }}
+            {"$set": new_code_fields(code)}
         )
-        background_tasks.add_task(send_verification_email, data.email, code)
+        await send_verification_email(data.email, code)
         raise HTTPException(status_code=403, detail="Email not verified. A new verification code has been sent.")
 
-    token = create_token(user["id"], user["email"])
+    token = create_token(user["id"], user["email"], user.get("role", "user"), user.get("plan", "free"))
     return {
         "token": token,
         "user": {"id": user["id"], "email": user["email"], "plan": user.get("plan", "free"), "role": user.get("role", "user")}
@@ -393,7 +806,7 @@ async def login(data: UserLogin, background_tasks: BackgroundTasks):
 
 
 @api_router.get("/auth/me")
-async def get_me(user=Depends(get_current_user)):
+async def get_me(user=Depends(get_token_user)):
     record_count = await db.dns_records.count_documents({"user_id": user["id"]})
     return {
         "id": user["id"],
@@ -407,51 +820,50 @@ async def get_me(user=Depends(get_current_user)):
 
 # --- Domain Routes (public) ---
 @api_router.get("/domains")
-async def list_active_domains(user=Depends(get_current_user)):
-    domains = await db.domains.find({"active": True}, {"_id": 0}).to_list(100)
-    return {"domains": domains}
+async def list_active_domains(request: Request, cursor: Optional[str] = None, limit: Optional[int] = None, user=Depends(get_token_user)):
+    await domain_registry.ensure_loaded()
+    domains = items_after(domain_registry.active(), "created_at", cursor)
+    if wants_ndjson(request):
+        limit = stream_limit(limit)
+        return ndjson_items(domains[:limit] if limit else domains)
+    limit = page_limit(limit, 100, 500)
+    domains, next_cursor = page_result(domains[:limit + 1], "created_at", limit)
+    return {"domains": domains, "next_cursor": next_cursor}
 
 
 # --- DNS Routes ---
+RECORD_PAGE_SIZE = 100
+RECORD_PAGE_MAX = 1000
+
+
 @api_router.get("/dns/records")
-async def list_records(user=Depends(get_current_user)):
-    records = await db.dns_records.find({"user_id": user["id"]}, {"_id": 0}).to_list(100)
-    return {"records": records}
+async def list_records(request: Request, cursor: Optional[str] = None, limit: Optional[int] = None, user=Depends(get_token_user)):
+    """The user's records oldest first; follow ``next_cursor`` for more, or ask for NDJSON to stream them all."""
+    query = {"user_id": user["id"]}
+    if wants_ndjson(request):
+        return stream_find(db.dns_records, query, RECORD_PROJECTION, "created_at", 1, cursor, limit)
+    records, next_cursor = await fetch_page(
+        db.dns_records, query, RECORD_PROJECTION, "created_at", 1, cursor, page_limit(limit, RECORD_PAGE_SIZE, RECORD_PAGE_MAX)
+    )
+    return {"records": records, "next_cursor": next_cursor}
 
 
 @api_router.post("/dns/records")
 async def create_record(data: DNSRecordCreate, user=Depends(get_current_user)):
-    if data.record_type not in ["A", "AAAA", "CNAME", "NS"]:
-        raise HTTPException(status_code=400, detail="Record type must be A, AAAA, CNAME, or NS")
-
-    if not re.match(r'^[a-zA-Z0-9]([a-zA-Z0-9-]*[a-zA-Z0-9])?$', data.name):
-        raise HTTPException(status_code=400, detail="Invalid subdomain name. Use only letters, numbers, and hyphens.")
-
-    if len(data.name) > 63:
-        raise HTTPException(status_code=400, detail="Subdomain name too long (max 63 characters)")
+    await rate_limiter.check("records", user=user["id"])
+    error = record_type_error(data.record_type) or record_name_error(data.name)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
 
     record_count = await db.dns_records.count_documents({"user_id": user["id"]})
-    is_admin = user.get("role") == "admin"
-    if not is_admin and user.get("plan", "free") == "free" and record_count >= FREE_RECORD_LIMIT:
+    if is_record_limited(user) and record_count >= FREE_RECORD_LIMIT:
+        notifier.notify("quota_hit", f"<code>{escape(user['email'])}</code> tried to create <code>{escape(data.name)}</code>")
         raise HTTPException(status_code=403, detail="Free plan limit reached. Upgrade to create more records.")
 
-    # Resolve domain
-    if data.domain_id:
-        domain = await get_domain(data.domain_id)
-        if not domain.get("active"):
-            raise HTTPException(status_code=400, detail="This domain is not active")
-        domain_name = domain["name"]
-        zone_id = domain["zone_id"]
-    else:
-        # Fallback: use default domain
-        default_domain = await db.domains.find_one({"name": DEFAULT_DOMAIN}, {"_id": 0})
-        if default_domain:
-            domain_name = default_domain["name"]
-            zone_id = default_domain["zone_id"]
-            data.domain_id = default_domain["id"]
-        else:
-            domain_name = DEFAULT_DOMAIN
-            zone_id = DEFAULT_ZONE_ID
+    domain = await resolve_record_domain(data.domain_id)
+    data.domain_id = domain["id"]
+    domain_name = domain["name"]
+    zone_id = domain["zone_id"]
 
     full_name = f"{data.name}.{domain_name}"
 
@@ -460,41 +872,18 @@ async def create_record(data: DNSRecordCreate, user=Depends(get_current_user)):
     if existing:
         raise HTTPException(status_code=400, detail="This subdomain is already taken")
 
-    # Check Cloudflare
-    cf_exists = await cf_check_record_exists(zone_id, full_name)
-    if cf_exists:
+    # Check Cloudflare (answered locally once the zone is indexed)
+    if await cf_name_exists(zone_id, full_name):
         raise HTTPException(status_code=400, detail="This subdomain already exists in DNS records")
 
     # Validate content
-    if data.record_type == "A":
-        if not re.match(r'^(\d{1,3}\.){3}\d{1,3}$', data.content):
-            raise HTTPException(status_code=400, detail="Invalid IPv4 address")
-        parts = data.content.split('.')
-        for p in parts:
-            if int(p) > 255:
-                raise HTTPException(status_code=400, detail="Invalid IPv4 address")
-    elif data.record_type == "AAAA":
-        if not re.match(r'^[0-9a-fA-F:]+$', data.content):
-            raise HTTPException(status_code=400, detail="Invalid IPv6 address")
-    elif data.record_type == "CNAME":
-        if not re.match(r'^[a-zA-Z0-9][a-zA-Z0-9.\-]+[a-zA-Z0-9]$', data.content):
-            raise HTTPException(status_code=400, detail="Invalid CNAME target")
-    elif data.record_type == "NS":
-        if not re.match(r'^[a-zA-Z0-9][a-zA-Z0-9.\-]+[a-zA-Z0-9]$', data.content):
-            raise HTTPException(status_code=400, detail="Invalid nameserver (e.g. ns1.example.com)")
-
-    cf_result = await cf_create_record(
-        zone_id=zone_id,
-        record_type=data.record_type,
-        name=full_name,
-        content=data.content,
-        ttl=data.ttl,
-        proxied=False if data.record_type == "NS" else data.proxied
-    )
+    error = record_content_error(data.record_type, data.content)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
 
     record = {
         "id": str(uuid.uuid4()),
-        "cf_id": cf_result["id"],
+        "cf_id": None,
         "user_id": user["id"],
         "domain_id": data.domain_id,
         "domain_name": domain_name,
@@ -507,53 +896,60 @@ async def create_record(data: DNSRecordCreate, user=Depends(get_current_user)):
         "proxied": data.proxied,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.dns_records.insert_one(record)
+    if CF_ASYNC_PROVISIONING:
+        record["status"] = "pending"
+        try:
+            await db.dns_records.insert_one(record)
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="This subdomain is already taken")
+        await provisioner.enqueue(record["id"])
+        await stats.incr({"total_records": 1}, {"records_created": 1})
+        return JSONResponse(
+            status_code=202,
+            content={**record_response(record), "status_url": f"/api/dns/records/{record['id']}/status"},
+        )
 
-    return {
-        "id": record["id"],
-        "cf_id": record["cf_id"],
-        "domain_id": record["domain_id"],
-        "domain_name": record["domain_name"],
-        "record_type": record["record_type"],
-        "name": record["name"],
-        "full_name": record["full_name"],
-        "content": record["content"],
-        "ttl": record["ttl"],
-        "proxied": record["proxied"],
-        "created_at": record["created_at"]
-    }
+    cf_result = await cf_create_record(
+        zone_id=zone_id,
+        record_type=data.record_type,
+        name=full_name,
+        content=data.content,
+        ttl=data.ttl,
+        proxied=False if data.record_type == "NS" else data.proxied
+    )
+    record_index.add(zone_id, full_name)
+    record["cf_id"] = cf_result["id"]
+    try:
+        await db.dns_records.insert_one(record)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent create of the same name: undo our Cloudflare record
+        try:
+            await cf_delete_record(zone_id, record["cf_id"])
+        except Exception:
+            logger.warning(f"Failed to roll back CF record {record['cf_id']} for {full_name}")
+        raise HTTPException(status_code=400, detail="This subdomain is already taken")
+    await serve_records([record])
+
+    await stats.incr({"total_records": 1}, {"records_created": 1})
+    notifier.notify("record_created", f"{data.record_type} <code>{escape(full_name)}</code> → <code>{escape(data.content)}</code> by {escape(user['email'])}")
+    return record_response(record)
 
 
 @api_router.put("/dns/records/{record_id}")
 async def update_record(record_id: str, data: DNSRecordUpdate, user=Depends(get_current_user)):
+    await rate_limiter.check("records", user=user["id"])
     record = await db.dns_records.find_one({"id": record_id, "user_id": user["id"]}, {"_id": 0})
     if not record:
         raise HTTPException(status_code=404, detail="Record not found")
 
-    if record["record_type"] == "A":
-        if not re.match(r'^(\d{1,3}\.){3}\d{1,3}$', data.content):
-            raise HTTPException(status_code=400, detail="Invalid IPv4 address")
-    elif record["record_type"] == "AAAA":
-        if not re.match(r'^[0-9a-fA-F:]+$', data.content):
-            raise HTTPException(status_code=400, detail="Invalid IPv6 address")
-    elif record["record_type"] == "CNAME":
-        if not re.match(r'^[a-zA-Z0-9][a-zA-Z0-9.\-]+[a-zA-Z0-9]$', data.content):
-            raise HTTPException(status_code=400, detail="Invalid CNAME target")
-    elif record["record_type"] == "NS":
-        if not re.match(r'^[a-zA-Z0-9][a-zA-Z0-9.\-]+[a-zA-Z0-9]$', data.content):
-            raise HTTPException(status_code=400, detail="Invalid nameserver (e.g. ns1.example.com)")
+    if record.get("status", "active") != "active":
+        raise HTTPException(status_code=409, detail=f"Record is {record['status']}; it can't be updated yet")
 
-    zone_id = record.get("zone_id", DEFAULT_ZONE_ID)
+    error = record_content_error(record["record_type"], data.content)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
 
-    await cf_update_record(
-        zone_id=zone_id,
-        record_id=record["cf_id"],
-        record_type=record["record_type"],
-        name=record["full_name"],
-        content=data.content,
-        ttl=data.ttl,
-        proxied=data.proxied
-    )
+    await push_record_update(record, data.content, data.ttl, data.proxied)
 
     await db.dns_records.update_one(
         {"id": record_id},
@@ -565,23 +961,450 @@ async def update_record(record_id: str, data: DNSRecordUpdate, user=Depends(get_
         }}
     )
 
-    updated = await db.dns_records.find_one({"id": record_id}, {"_id": 0})
+    updated = await db.dns_records.find_one({"id": record_id}, RECORD_PROJECTION)
+    if updated:
+        await serve_records([updated])
     return updated
 
 
 @api_router.delete("/dns/records/{record_id}")
 async def delete_record(record_id: str, user=Depends(get_current_user)):
+    await rate_limiter.check("records", user=user["id"])
     record = await db.dns_records.find_one({"id": record_id, "user_id": user["id"]}, {"_id": 0})
     if not record:
         raise HTTPException(status_code=404, detail="Record not found")
 
-    zone_id = record.get("zone_id", DEFAULT_ZONE_ID)
-    await cf_delete_record(zone_id, record["cf_id"])
-    await db.dns_records.delete_one({"id": record_id})
+    await cf_remove_record(record)
+    result = await db.dns_records.delete_one({"id": record_id})
+    await serve_records(removals=[record])
+    await count_deleted_records(result.deleted_count)
 
     return {"message": "Record deleted successfully"}
 
 
+@api_router.get("/dns/records/{record_id}/status")
+async def record_status(record_id: str, wait: float = Query(0, ge=0, allow_inf_nan=False), user=Depends(get_token_user)):
+    """Provisioning status of a record; with ?wait=seconds, long-poll while it is pending."""
+    deadline = time.monotonic() + min(wait, PROVISION_MAX_WAIT)
+    projection = {"_id": 0, "id": 1, "cf_id": 1, "status": 1, "error": 1}
+    while True:
+        record = await db.dns_records.find_one({"id": record_id, "user_id": user["id"]}, projection)
+        if not record:
+            raise HTTPException(status_code=404, detail="Record not found")
+        record.setdefault("status", "active")
+        remaining = deadline - time.monotonic()
+        if record["status"] != "pending" or remaining <= 0:
+            return record
+        # Woken by a worker of this process; re-checked every second for the others
+        await provisioner.wait(record_id, min(remaining, 1.0))
+
+
+async def count_deleted_records(deleted: int):
+    if deleted:
+        await stats.incr({"total_records": -deleted}, {"records_deleted": deleted})
+
+
+# --- Bulk Record Operations ---
+async def apply_zone_batches(zone_id: str, ops: list) -> dict:
+    """Send (index, kind, body) operations for one zone in chunked batch calls.
+
+    Returns {index: cf_result} for applied items and {index: Exception} for
+    items whose chunk Cloudflare rejected.
+    """
+    outcomes = {}
+    for start in range(0, len(ops), CF_BATCH_SIZE):
+        chunk = ops[start:start + CF_BATCH_SIZE]
+        grouped = {"deletes": [], "patches": [], "posts": []}
+        for index, kind, body in chunk:
+            grouped[kind].append((index, body))
+        try:
+            result = await cf_batch_records(
+                zone_id,
+                deletes=[body for _, body in grouped["deletes"]],
+                patches=[body for _, body in grouped["patches"]],
+                posts=[body for _, body in grouped["posts"]],
+            )
+        except (HTTPException, CloudflareError) as e:
+            for index, _, _ in chunk:
+                outcomes[index] = e
+            continue
+        for kind, items in grouped.items():
+            applied = result.get(kind) or []
+            for pos, (index, body) in enumerate(items):
+                outcomes[index] = applied[pos] if pos < len(applied) else body
+    return outcomes
+
+
+async def apply_record_operations(planned: list) -> dict:
+    """Apply planned operations to Cloudflare (batched per zone) and mirror them into Mongo.
+
+    ``planned`` holds dicts with index, action, zone_id, a Cloudflare ``body``
+    and the Mongo ``record`` (create) or ``record``/``changes`` (update/delete).
+    Returns {index: error message} for every item that failed.
+    """
+    errors = {}
+    by_zone = defaultdict(list)
+    kinds = {"create": "posts", "update": "patches", "delete": "deletes"}
+    outcomes = {}
+    for item in planned:
+        if item["action"] == "delete" and not item["record"].get("cf_id"):
+            # Pending/failed record that never reached Cloudflare
+            await provisioner.discard(item["record"]["id"])
+            outcomes[item["index"]] = {}
+            continue
+        by_zone[item["zone_id"]].append((item["index"], kinds[item["action"]], item["body"]))
+
+    zone_ids = list(by_zone)
+    zone_outcomes = await asyncio.gather(*(apply_zone_batches(z, by_zone[z]) for z in zone_ids))
+    for result in zone_outcomes:
+        outcomes.update(result)
+
+    requests = []
+    request_items = []
+    now = datetime.now(timezone.utc).isoformat()
+    for item in planned:
+        outcome = outcomes.get(item["index"])
+        if isinstance(outcome, Exception):
+            errors[item["index"]] = getattr(outcome, "detail", None) or str(outcome)
+            continue
+        record = item["record"]
+        if item["action"] == "create":
+            if not (outcome or {}).get("id"):
+                errors[item["index"]] = "Cloudflare did not return the created record"
+                continue
+            record["cf_id"] = outcome["id"]
+            record_index.add(item["zone_id"], record["full_name"])
+            requests.append(InsertOne(dict(record)))
+        elif item["action"] == "update":
+            await update_queue.discard(record["cf_id"])
+            requests.append(UpdateOne({"id": record["id"]}, {"$set": {**item["changes"], "updated_at": now}}))
+        else:
+            await update_queue.discard(record["cf_id"])
+            record_index.discard(item["zone_id"], record["full_name"])
+            requests.append(DeleteOne({"id": record["id"]}))
+        request_items.append(item)
+
+    if requests:
+        try:
+            await db.dns_records.bulk_write(requests, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get("writeErrors", []):
+                item = request_items[write_error["index"]]
+                errors[item["index"]] = write_error.get("errmsg", "Database error")
+                if item["action"] == "create":
+                    # Lost the name to a concurrent create: undo our Cloudflare record
+                    try:
+                        await cf_delete_record(item["zone_id"], item["record"]["cf_id"])
+                    except Exception:
+                        logger.warning(f"Failed to roll back CF record {item['record']['cf_id']}")
+                    errors[item["index"]] = "This subdomain is already taken"
+
+    applied = [item for item in request_items if item["index"] not in errors]
+    await serve_records(
+        upserts=[{**item["record"], **item.get("changes", {})} for item in applied if item["action"] != "delete"],
+        removals=[item["record"] for item in applied if item["action"] == "delete"],
+    )
+
+    created = sum(1 for item in request_items if item["action"] == "create" and item["index"] not in errors)
+    deleted = sum(1 for item in request_items if item["action"] == "delete" and item["index"] not in errors)
+    activity = {k: v for k, v in (("records_created", created), ("records_deleted", deleted)) if v}
+    await stats.incr({"total_records": created - deleted} if created != deleted else {}, activity)
+    return errors
+
+
+def planned_create(index: int, user_id: str, domain: dict, record_type: str, name: str, content: str, ttl: int, proxied: bool) -> dict:
+    """A create operation for ``apply_record_operations``; inputs must already be validated."""
+    full_name = f"{name}.{domain['name']}"
+    return {
+        "index": index,
+        "action": "create",
+        "zone_id": domain["zone_id"],
+        "body": {
+            "type": record_type,
+            "name": full_name,
+            "content": content,
+            "ttl": ttl,
+            "proxied": False if record_type == "NS" else proxied,
+            "comment": MANAGED_COMMENT,
+        },
+        "record": {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "domain_id": domain["id"],
+            "domain_name": domain["name"],
+            "zone_id": domain["zone_id"],
+            "record_type": record_type,
+            "name": name,
+            "full_name": full_name,
+            "content": content,
+            "ttl": ttl,
+            "proxied": proxied,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        },
+    }
+
+
+async def screen_creates(user: dict, planned: list, errors: dict, freed: int = 0):
+    """Apply the plan limit and name-availability checks to the planned creates, recording failures in ``errors``.
+
+    ``freed`` counts records the same request deletes, which free up plan slots.
+    """
+    creates = [item for item in planned if item["action"] == "create" and item["index"] not in errors]
+    if creates and is_record_limited(user):
+        allowance = FREE_RECORD_LIMIT - await db.dns_records.count_documents({"user_id": user["id"]}) + freed
+        for item in creates[max(0, allowance):]:
+            errors[item["index"]] = "Free plan limit reached. Upgrade to create more records."
+        if allowance < len(creates):
+            notifier.notify("quota_hit", f"<code>{escape(user['email'])}</code> bulk request over the limit by {len(creates) - max(0, allowance)}")
+
+    # Existence checks: one Mongo query for all names, Cloudflare via the local index
+    creates = [item for item in creates if item["index"] not in errors]
+    if creates:
+        names = [item["record"]["full_name"] for item in creates]
+        taken = {rec["full_name"] async for rec in db.dns_records.find({"full_name": {"$in": names}}, {"full_name": 1})}
+        for item in creates:
+            full_name = item["record"]["full_name"]
+            if full_name in taken:
+                errors[item["index"]] = "This subdomain is already taken"
+            elif await cf_name_exists(item["zone_id"], full_name):
+                errors[item["index"]] = "This subdomain already exists in DNS records"
+
+
+@api_router.post("/dns/records/bulk")
+async def bulk_records(data: BulkRecordRequest, user=Depends(get_current_user)):
+    """Create, update and delete many records in one request, one Cloudflare batch per zone."""
+    await rate_limiter.check("records", user=user["id"])
+    ops = data.operations
+    errors = {}
+
+    # Records referenced by update/delete, fetched in one query
+    ref_ids = [op.id for op in ops if op.action in ["update", "delete"]]
+    owned = {}
+    if ref_ids:
+        async for rec in db.dns_records.find({"id": {"$in": ref_ids}, "user_id": user["id"]}, {"_id": 0}):
+            owned[rec["id"]] = rec
+
+    # Record contents checked in one batch; updates keep their type and name
+    checked = [i for i, op in enumerate(ops) if op.action == "create" or (op.action == "update" and op.id in owned)]
+    verdicts = dict(zip(checked, validate_records(
+        (op.record_type, op.name, op.content) if op.action == "create" else (owned[op.id]["record_type"], None, op.content)
+        for op in (ops[i] for i in checked)
+    )))
+
+    # Validate the whole payload before touching Cloudflare
+    domains = {}
+    planned = []
+    new_names = set()
+    touched_ids = set()
+    for i, op in enumerate(ops):
+        if op.action not in ["create", "update", "delete"]:
+            errors[i] = "Action must be create, update or delete"
+            continue
+
+        if op.action == "create":
+            error = verdicts[i]
+            if error:
+                errors[i] = error
+                continue
+            if op.domain_id not in domains:
+                try:
+                    domains[op.domain_id] = await resolve_record_domain(op.domain_id)
+                except HTTPException as e:
+                    domains[op.domain_id] = e
+            domain = domains[op.domain_id]
+            if isinstance(domain, HTTPException):
+                errors[i] = domain.detail
+                continue
+            full_name = f"{op.name}.{domain['name']}"
+            if full_name in new_names:
+                errors[i] = "Duplicate subdomain in request"
+                continue
+            new_names.add(full_name)
+            planned.append(planned_create(i, user["id"], domain, op.record_type, op.name, op.content, op.ttl, op.proxied))
+            continue
+
+        record = owned.get(op.id)
+        if not record:
+            errors[i] = "Record not found"
+            continue
+        if record["id"] in touched_ids:
+            errors[i] = "Record appears more than once in request"
+            continue
+        touched_ids.add(record["id"])
+        zone_id = record.get("zone_id", DEFAULT_ZONE_ID)
+        if op.action == "update":
+            if record.get("status", "active") != "active":
+                errors[i] = f"Record is {record['status']}; it can't be updated yet"
+                continue
+            error = verdicts[i]
+            if error:
+                errors[i] = error
+                continue
+            changes = {"content": op.content, "ttl": op.ttl, "proxied": op.proxied}
+            planned.append({
+                "index": i,
+                "action": "update",
+                "zone_id": zone_id,
+                "body": {"id": record["cf_id"], **changes, "comment": MANAGED_COMMENT},
+                "record": record,
+                "changes": changes,
+            })
+        else:
+            planned.append({"index": i, "action": "delete", "zone_id": zone_id, "body": {"id": record["cf_id"]}, "record": record})
+
+    deletes = sum(1 for item in planned if item["action"] == "delete")
+    await screen_creates(user, planned, errors, freed=deletes)
+
+    planned = [item for item in planned if item["index"] not in errors]
+    errors.update(await apply_record_operations(planned))
+
+    created = [item["record"]["full_name"] for item in planned if item["action"] == "create" and item["index"] not in errors]
+    if created:
+        names = ", ".join(f"<code>{escape(name)}</code>" for name in created[:10])
+        more = f" and {len(created) - 10} more" if len(created) > 10 else ""
+        notifier.notify("record_created", f"{len(created)} records via bulk by {escape(user['email'])}: {names}{more}")
+
+    applied = {item["index"]: item for item in planned}
+    results = []
+    for i, op in enumerate(ops):
+        if i in errors:
+            results.append({"index": i, "action": op.action, "status": "error", "error": errors[i]})
+            continue
+        item = applied[i]
+        result = {"index": i, "action": op.action, "status": "ok", "id": item["record"]["id"]}
+        if op.action == "create":
+            result["record"] = record_response(item["record"])
+        results.append(result)
+
+    return {
+        "results": results,
+        "succeeded": sum(1 for r in results if r["status"] == "ok"),
+        "failed": sum(1 for r in results if r["status"] == "error"),
+    }
+
+
+# --- Dynamic DNS (dyndns2 protocol) ---
+DYNDNS_MAX_HOSTS = 20
+
+
+def hash_update_token(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def parse_basic_auth(authorization: Optional[str]):
+    if not authorization or not authorization.startswith("Basic "):
+        return None, None
+    try:
+        decoded = base64.b64decode(authorization[6:]).decode('utf-8')
+    except (ValueError, UnicodeDecodeError):
+        return None, None
+    username, _, password = decoded.partition(":")
+    return username, password
+
+
+def client_key(request: Request) -> str:
+    """Client address for rate limiting and for dyndns updates without ``myip``.
+
+    Forwarded headers are only trusted from a proxy on this host (nginx sets
+    X-Real-IP); anyone else could put an arbitrary address there. X-Forwarded-For
+    is never used: nginx appends to whatever the client sent.
+    """
+    peer = request.client.host if request.client else ""
+    if peer in ("127.0.0.1", "::1"):
+        return request.headers.get("x-real-ip", "").strip() or peer
+    return peer
+
+
+def pick_update_ip(record_type: str, candidates: List[str]):
+    """Return the first candidate matching the record's address family, normalized."""
+    version = 4 if record_type == "A" else 6
+    for candidate in candidates:
+        try:
+            ip = ipaddress.ip_address(candidate.strip())
+        except ValueError:
+            continue
+        if ip.version == version:
+            return ip.compressed
+    return None
+
+
+@api_router.post("/dns/records/{record_id}/update-token")
+async def create_update_token(record_id: str, user=Depends(get_current_user)):
+    """Issue (or rotate) the per-record token used by /nic/update. Returned only once."""
+    await rate_limiter.check("records", user=user["id"])
+    record = await db.dns_records.find_one({"id": record_id, "user_id": user["id"]}, {"_id": 0})
+    if not record:
+        raise HTTPException(status_code=404, detail="Record not found")
+    if record["record_type"] not in ["A", "AAAA"]:
+        raise HTTPException(status_code=400, detail="Dynamic updates are only supported for A and AAAA records")
+
+    token = secrets.token_urlsafe(24)
+    await db.dns_records.update_one({"id": record_id}, {"$set": {"update_token_hash": hash_update_token(token)}})
+    return {
+        "token": token,
+        "hostname": record["full_name"],
+        "update_url": f"/nic/update?hostname={record['full_name']}",
+    }
+
+
+async def dyndns_update_host(hostname: str, token_hash: str, candidates: List[str]) -> str:
+    record = await db.dns_records.find_one({"full_name": hostname, "update_token_hash": token_hash}, {"_id": 0})
+    if not record:
+        return "nohost"
+    if record.get("status", "active") != "active":
+        # Not in Cloudflare (yet): ask the client to retry later
+        return "911" if record["status"] == "pending" else "dnserr"
+    ip = pick_update_ip(record["record_type"], candidates)
+    if not ip:
+        return "dnserr"
+    if record["content"] == ip:
+        return f"nochg {ip}"
+
+    try:
+        await push_record_update(record, ip, record.get("ttl", 1), record.get("proxied", False))
+    except (HTTPException, CloudflareError) as e:
+        logger.error(f"dyndns update of {hostname} failed: {getattr(e, 'detail', e)}")
+        if isinstance(e, CloudflareError):
+            notifier.notify("cloudflare_error", f"dyndns update of <code>{escape(hostname)}</code>: {escape(e)}")
+        return "911"
+
+    await db.dns_records.update_one(
+        {"id": record["id"]},
+        {"$set": {"content": ip, "updated_at": datetime.now(timezone.utc).isoformat()}}
+    )
+    await serve_records([{**record, "content": ip}])
+    return f"good {ip}"
+
+
+@nic_router.get("/nic/update", response_class=PlainTextResponse)
+@api_router.get("/nic/update", response_class=PlainTextResponse)
+async def dyndns_update(request: Request, hostname: str = "", myip: str = "", token: str = ""):
+    """dyndns2-compatible update: HTTP Basic auth (password = record update token) or ?token=.
+
+    Tokens are per record (unique index, migration 2): of several comma-separated
+    hostnames only the token's own record is updated, the others get ``nohost``.
+    """
+    try:
+        await rate_limiter.check("dyndns", ip=client_key(request))
+    except RateLimited as e:
+        return PlainTextResponse("abuse", status_code=429, headers={"Retry-After": str(e.retry_after)})
+    if not token:
+        _, token = parse_basic_auth(request.headers.get("authorization"))
+    if not token:
+        return PlainTextResponse("badauth", status_code=401, headers={"WWW-Authenticate": 'Basic realm="DNSLAB.BIZ"'})
+
+    hostnames = [h.strip().lower().rstrip(".") for h in hostname.split(",") if h.strip()]
+    if not hostnames:
+        return PlainTextResponse("notfqdn")
+    if len(hostnames) > DYNDNS_MAX_HOSTS:
+        return PlainTextResponse("numhost")
+
+    candidates = [ip for ip in myip.split(",") if ip.strip()] or [client_key(request)]
+    token_hash = hash_update_token(token)
+    results = [await dyndns_update_host(h, token_hash, candidates) for h in hostnames]
+    return PlainTextResponse("\n".join(results))
+
+
 # --- Admin Helpers ---
 ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL', 'admin@gmail.com')
 
@@ -593,13 +1416,137 @@ async def get_admin_user(authorization: Optional[str] = Header(None)):
     return user
 
 
+async def delete_records_cascade(query: dict, label: str) -> dict:
+    """Delete every matching record from Cloudflare with bounded concurrency, then from Mongo.
+
+    Cloudflare failures don't stop the cascade; they are logged and reported
+    so the orphaned records can be cleaned up.
+    """
+    removed = []
+
+    async def remove(rec):
+        # Gone from Mongo below whether or not the Cloudflare delete succeeds
+        removed.append(rec)
+        await cf_remove_record(rec)
+
+    cursor = db.dns_records.find(query, {"_id": 0, "id": 1, "cf_id": 1, "zone_id": 1, "full_name": 1})
+    report = await run_cascade(
+        cursor,
+        remove,
+        concurrency=CASCADE_CONCURRENCY,
+        describe=lambda rec: {"cf_id": rec["cf_id"], "full_name": rec["full_name"]},
+        on_progress=log_progress(label),
+    )
+    for failure in report["failed"]:
+        logger.warning(f"{label}: failed to delete CF record {failure['item']['cf_id']}: {failure['error']}")
+    if report["failed"]:
+        notifier.notify("cloudflare_error", f"{escape(label)}: {len(report['failed'])} of {report['total']} Cloudflare deletes failed")
+
+    result = await db.dns_records.delete_many(query)
+    await serve_records(removals=removed)
+    await count_deleted_records(result.deleted_count)
+    return {"total": report["total"], "deleted": len(report["succeeded"]), "failed": report["failed"]}
+
+
+ADMIN_LIST_MAX = 500
+
+# $lookup with both localField and pipeline needs MongoDB 5.0+; checked at startup
+lookup_local_field = True
+
+
+async def detect_lookup_support():
+    global lookup_local_field
+    try:
+        info = await db.command("buildInfo")
+    except Exception as e:
+        logger.warning(f"Could not read the MongoDB version: {e}")
+        return
+    lookup_local_field = tuple(info.get("versionArray", [])[:2]) >= (5, 0)
+    if not lookup_local_field:
+        logger.warning(f"MongoDB {info.get('version')} is older than 5.0; admin listings count records with a correlated $lookup, which is slower")
+
+
+def record_count_stages(foreign_field: str) -> list:
+    """Stages adding ``record_count`` (dns_records whose ``foreign_field`` equals ``id``) without loading the records."""
+    if lookup_local_field:
+        # localField + pipeline counts through the foreign_field index
+        lookup = {"localField": "id", "foreignField": foreign_field, "pipeline": [{"$count": "n"}]}
+    else:
+        lookup = {
+            "let": {"owner": "$id"},
+            "pipeline": [{"$match": {"$expr": {"$eq": [f"${foreign_field}", "$$owner"]}}}, {"$count": "n"}],
+        }
+    return [
+        {"$lookup": {"from": "dns_records", **lookup, "as": "record_stats"}},
+        {"$addFields": {"record_count": {"$ifNull": [{"$arrayElemAt": ["$record_stats.n", 0]}, 0]}}},
+        {"$project": {"record_stats": 0}},
+    ]
+
+
+def listing_direction(sort: str, order: str, allowed: List[str]) -> int:
+    if sort not in allowed:
+        raise HTTPException(status_code=400, detail=f"Sort must be one of: {', '.join(allowed)}")
+    if order not in ["asc", "desc"]:
+        raise HTTPException(status_code=400, detail="Order must be 'asc' or 'desc'")
+    return 1 if order == "asc" else -1
+
+
+async def admin_listing(request: Request, collection, match: dict, projection: dict, foreign_field: str, sort: str, direction: int, cursor: Optional[str], limit: Optional[int]):
+    """A keyset page of documents with their record counts, or all of them as NDJSON.
+
+    Counts are joined after paging unless the listing is ordered by them, so
+    only the returned documents pay for the lookup and the sort can use an index.
+    """
+    after = after_cursor(sort, direction, cursor)
+    counts = record_count_stages(foreign_field)
+    if sort == "record_count":
+        ordered = [{"$match": match}, {"$project": projection}] + counts
+        ordered += ([{"$match": after}] if after else []) + [{"$sort": sort_spec(sort, direction)}]
+        tail = []
+    else:
+        ordered = [{"$match": {**match, **after}}, {"$sort": sort_spec(sort, direction)}]
+        tail = [{"$project": projection}] + counts
+
+    if wants_ndjson(request):
+        limit = stream_limit(limit)
+        pipeline = ordered + ([{"$limit": limit}] if limit else []) + tail
+        return ndjson_response(collection.aggregate(pipeline, batchSize=500))
+
+    limit = page_limit(limit, ADMIN_LIST_MAX, ADMIN_LIST_MAX)
+    pipeline = ordered + [{"$limit": limit + 1}] + tail
+    docs, total = await asyncio.gather(
+        collection.aggregate(pipeline).to_list(limit + 1),
+        collection.count_documents(match),
+    )
+    items, next_cursor = page_result(docs, sort, limit)
+    return {"items": items, "total": total, "next_cursor": next_cursor}
+
+
+def search_filter(field: str, search: str) -> dict:
+    search = search.strip()
+    return {field: {"$regex": re.escape(search), "$options": "i"}} if search else {}
+
+
 # --- Admin Domain Routes ---
 @api_router.get("/admin/domains")
-async def admin_list_domains(admin=Depends(get_admin_user)):
-    domains = await db.domains.find({}, {"_id": 0}).to_list(100)
-    for d in domains:
-        d["record_count"] = await db.dns_records.count_documents({"domain_id": d["id"]})
-    return {"domains": domains}
+async def admin_list_domains(
+    request: Request,
+    search: str = "",
+    active: Optional[bool] = None,
+    sort: str = "created_at",
+    order: str = "asc",
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    admin=Depends(get_admin_user),
+):
+    direction = listing_direction(sort, order, ["created_at", "name", "record_count"])
+    match = search_filter("name", search)
+    if active is not None:
+        match["active"] = active
+    page = await admin_listing(request, db.domains, match, {"_id": 0}, "domain_id", sort, direction, cursor, limit)
+    if not isinstance(page, dict):
+        return page
+    return {"domains": page["items"], "total": page["total"], "next_cursor": page["next_cursor"]}
 
 
 @api_router.post("/admin/domains")
@@ -619,7 +1566,13 @@ async def admin_add_domain(data: DomainCreate, admin=Depends(get_admin_user)):
         "active": True,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.domains.insert_one(domain)
+    try:
+        await db.domains.insert_one(domain)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Domain already exists")
+    domain_registry.put(domain)
+    await stats.incr({"total_domains": 1, "active_domains": 1})
+    await serve_zones(added=[name])
 
     return {
         "id": domain["id"],
@@ -648,25 +1601,140 @@ async def admin_update_domain(domain_id: str, data: DomainUpdate, admin=Depends(
         raise HTTPException(status_code=400, detail="No fields to update")
 
     update_fields["updated_at"] = datetime.now(timezone.utc).isoformat()
-    await db.domains.update_one({"id": domain_id}, {"$set": update_fields})
+    try:
+        await db.domains.update_one({"id": domain_id}, {"$set": update_fields})
+    except DuplicateKeyError:
+        # Renamed to the name of another domain
+        raise HTTPException(status_code=400, detail="Domain already exists")
+    if data.active is not None and data.active != domain.get("active", False):
+        await stats.incr({"active_domains": 1 if data.active else -1})
 
     updated = await db.domains.find_one({"id": domain_id}, {"_id": 0})
+    if updated:
+        domain_registry.put(updated)
+    await serve_zones(added=[updated["name"]] if updated and updated.get("active") else [], removed=[domain["name"]])
     return updated
 
 
 @api_router.delete("/admin/domains/{domain_id}")
-async def admin_delete_domain(domain_id: str, admin=Depends(get_admin_user)):
+async def admin_delete_domain(domain_id: str, force: bool = False, admin=Depends(get_admin_user)):
+    """Delete a domain. With ?force=true its records are torn down first instead of blocking the delete."""
     domain = await db.domains.find_one({"id": domain_id}, {"_id": 0})
     if not domain:
         raise HTTPException(status_code=404, detail="Domain not found")
 
     # Check if domain has records
     record_count = await db.dns_records.count_documents({"domain_id": domain_id})
-    if record_count > 0:
+    if record_count > 0 and not force:
         raise HTTPException(status_code=400, detail=f"Cannot delete domain with {record_count} active records. Delete records first.")
 
-    await db.domains.delete_one({"id": domain_id})
-    return {"message": f"Domain {domain['name']} deleted"}
+    report = None
+    if record_count > 0:
+        report = await delete_records_cascade({"domain_id": domain_id}, f"Deleting records of domain {domain['name']}")
+
+    result = await db.domains.delete_one({"id": domain_id})
+    domain_registry.discard(domain_id)
+    await serve_zones(removed=[domain["name"]])
+    if result.deleted_count:
+        await stats.incr({"total_domains": -1, "active_domains": -1 if domain.get("active") else 0})
+    return {"message": f"Domain {domain['name']} deleted", "records": report}
+
+
+# Zone file lines screened and applied per round of Cloudflare batches + bulk_write
+ZONEFILE_IMPORT_CHUNK = 1000
+ZONEFILE_MAX_ERRORS = 1000
+
+
+@api_router.get("/admin/domains/{domain_id}/zonefile")
+async def admin_export_zonefile(domain_id: str, admin=Depends(get_admin_user)):
+    """Stream the domain's records as an RFC 1035 zone file."""
+    domain = await get_domain(domain_id)
+
+    async def lines():
+        yield zone_header(domain["name"])
+        cursor = db.dns_records.find({"domain_id": domain_id}, RECORD_PROJECTION)
+        async for record in cursor.sort([("created_at", 1), ("id", 1)]).batch_size(500):
+            yield format_record(record)
+
+    return StreamingResponse(
+        lines(),
+        media_type="text/dns",
+        headers={"Content-Disposition": f'attachment; filename="{domain["name"]}.zone"'},
+    )
+
+
+@api_router.post("/admin/domains/{domain_id}/zonefile")
+async def admin_import_zonefile(request: Request, domain_id: str, user_id: Optional[str] = None, admin=Depends(get_admin_user)):
+    """Import a zone file (raw request body) into the domain, owned by ``user_id`` or the calling admin.
+
+    The body is parsed as it arrives; every record goes through the same checks
+    as ``create_record`` and valid ones are applied ZONEFILE_IMPORT_CHUNK at a
+    time through Cloudflare batch calls and one bulk_write per chunk. SOA and
+    apex NS records are skipped. Errors are reported per line.
+    """
+    domain = await get_domain(domain_id)
+    owner = admin
+    if user_id:
+        owner = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
+        if not owner:
+            raise HTTPException(status_code=404, detail="User not found")
+
+    report = {"created": 0, "skipped": 0, "failed": 0, "errors": []}
+
+    def fail(line: int, name: str, error: str):
+        report["failed"] += 1
+        if len(report["errors"]) < ZONEFILE_MAX_ERRORS:
+            report["errors"].append({"line": line, "name": name, "error": error})
+
+    entries, chunk, chunk_names = [], [], set()
+
+    async def flush():
+        errors = {}
+        await screen_creates(owner, chunk, errors)
+        errors.update(await apply_record_operations([item for item in chunk if item["index"] not in errors]))
+        for item in chunk:
+            if item["index"] in errors:
+                fail(item["index"], item["record"]["name"], errors[item["index"]])
+            else:
+                report["created"] += 1
+        chunk.clear()
+        chunk_names.clear()
+
+    async def plan():
+        verdicts = validate_records((entry.record_type, entry.name, entry.content) for entry in entries)
+        for entry, error in zip(entries, verdicts):
+            if error:
+                fail(entry.line, entry.name, error)
+                continue
+            if entry.name.lower() in chunk_names:
+                fail(entry.line, entry.name, "Duplicate subdomain in zone file")
+                continue
+            chunk_names.add(entry.name.lower())
+            ttl = cloudflare_ttl(entry.ttl)
+            chunk.append(planned_create(entry.line, owner["id"], domain, entry.record_type, entry.name, entry.content, ttl, entry.proxied))
+        entries.clear()
+        if chunk:
+            await flush()
+
+    async for entry in parse_zonefile(request.stream(), domain["name"]):
+        if isinstance(entry, ZoneError):
+            fail(entry.line, entry.name, entry.error)
+            continue
+        if entry.record_type == "SOA" or (entry.record_type == "NS" and entry.name == "@"):
+            report["skipped"] += 1
+            continue
+        if entry.name == "@":
+            fail(entry.line, entry.name, "Records at the zone apex are not supported")
+            continue
+        entries.append(entry)
+        if len(entries) >= ZONEFILE_IMPORT_CHUNK:
+            await plan()
+    if entries:
+        await plan()
+
+    if report["created"]:
+        notifier.notify("record_created", f"{report['created']} records imported into <code>{escape(domain['name'])}</code> by {escape(admin['email'])}")
+    return report
 
 
 # --- Admin User Routes ---
@@ -675,11 +1743,31 @@ class UpdateUserPlan(BaseModel):
 
 
 @api_router.get("/admin/users")
-async def admin_list_users(admin=Depends(get_admin_user)):
-    users = await db.users.find({}, {"_id": 0, "password_hash": 0}).to_list(500)
-    for u in users:
-        u["record_count"] = await db.dns_records.count_documents({"user_id": u["id"]})
-    return {"users": users}
+async def admin_list_users(
+    request: Request,
+    search: str = "",
+    plan: Optional[str] = None,
+    role: Optional[str] = None,
+    verified: Optional[bool] = None,
+    sort: str = "created_at",
+    order: str = "asc",
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    admin=Depends(get_admin_user),
+):
+    direction = listing_direction(sort, order, ["created_at", "email", "plan", "record_count"])
+    match = search_filter("email", search)
+    if plan:
+        match["plan"] = plan
+    if role:
+        match["role"] = "admin" if role == "admin" else {"$ne": "admin"}
+    if verified is not None:
+        match["verified"] = verified
+    projection = {"_id": 0, "password_hash": 0, "verification_code": 0}
+    page = await admin_listing(request, db.users, match, projection, "user_id", sort, direction, cursor, limit)
+    if not isinstance(page, dict):
+        return page
+    return {"users": page["items"], "total": page["total"], "next_cursor": page["next_cursor"]}
 
 
 @api_router.put("/admin/users/{user_id}/plan")
@@ -687,12 +1775,17 @@ async def admin_update_plan(user_id: str, data: UpdateUserPlan, admin=Depends(ge
     if data.plan not in ["free", "premium"]:
         raise HTTPException(status_code=400, detail="Plan must be 'free' or 'premium'")
 
-    result = await db.users.update_one(
+    before = await db.users.find_one_and_update(
         {"id": user_id},
-        {"$set": {"plan": data.plan, "updated_at": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"plan": data.plan, "updated_at": datetime.now(timezone.utc).isoformat()}},
+        projection={"plan": 1},
     )
-    if result.matched_count == 0:
+    if before is None:
         raise HTTPException(status_code=404, detail="User not found")
+    await invalidate_user(user_id)
+    previous = before.get("plan", "free")
+    if previous != data.plan:
+        await stats.incr({f"{previous}_users": -1, f"{data.plan}_users": 1})
 
     return {"message": f"User plan updated to {data.plan}"}
 
@@ -706,45 +1799,111 @@ async def admin_delete_user(user_id: str, admin=Depends(get_admin_user)):
     if user.get("role") == "admin":
         raise HTTPException(status_code=400, detail="Cannot delete admin user")
 
-    user_records = await db.dns_records.find({"user_id": user_id}, {"_id": 0}).to_list(100)
-    for rec in user_records:
-        try:
-            zone_id = rec.get("zone_id", DEFAULT_ZONE_ID)
-            await cf_delete_record(zone_id, rec["cf_id"])
-        except Exception:
-            logger.warning(f"Failed to delete CF record {rec['cf_id']} for user {user_id}")
-
-    await db.dns_records.delete_many({"user_id": user_id})
-    await db.users.delete_one({"id": user_id})
+    report = await delete_records_cascade({"user_id": user_id}, f"Deleting records of user {user_id}")
+    result = await db.users.delete_one({"id": user_id})
+    await invalidate_user(user_id)
+    if result.deleted_count:
+        counters = {"total_users": -1, f"{user.get('plan', 'free')}_users": -1}
+        if user.get("verified"):
+            counters["verified_users"] = -1
+        await stats.incr(counters)
 
-    return {"message": "User and all their records deleted"}
+    return {"message": "User and all their records deleted", "records": report}
 
 
 @api_router.get("/admin/stats")
 async def admin_stats(admin=Depends(get_admin_user)):
-    total_users = await db.users.count_documents({})
-    total_records = await db.dns_records.count_documents({})
-    free_users = await db.users.count_documents({"plan": "free"})
-    premium_users = await db.users.count_documents({"plan": "premium"})
-    total_domains = await db.domains.count_documents({})
-    active_domains = await db.domains.count_documents({"active": True})
+    """Materialized counters: one document read, kept exact by the periodic recount."""
+    return await stats.get()
+
+
+@api_router.get("/admin/stats/history")
+async def admin_stats_history(days: int = 30, admin=Depends(get_admin_user)):
+    """Daily buckets (activity totals plus the last recount of that day) for growth charts."""
+    return {"days": await stats.history(max(1, min(days, 366)))}
+
+
+@api_router.get("/admin/queues")
+async def admin_queue_stats(admin=Depends(get_admin_user)):
     return {
-        "total_users": total_users,
-        "total_records": total_records,
-        "free_users": free_users,
-        "premium_users": premium_users,
-        "total_domains": total_domains,
-        "active_domains": active_domains,
+        "cf_write_behind": {"enabled": CF_WRITE_BEHIND, **await update_queue.stats()},
+        "provisioning": {"enabled": CF_ASYNC_PROVISIONING, **await provisioner.stats()},
+        "email_outbox": await email_outbox.stats(),
+        "telegram": notifier.stats(),
+    }
+
+
+@api_router.get("/admin/jobs")
+async def admin_scheduled_jobs(admin=Depends(get_admin_user)):
+    """Scheduler leader and the last/next run of every periodic job."""
+    return await scheduler.status()
+
+
+@api_router.get("/admin/reconcile")
+async def admin_reconcile_report(admin=Depends(get_admin_user)):
+    """Latest Mongo/Cloudflare drift report (updated after every zone while a run is in progress)."""
+    return {"running": reconciler.running, "report": await reconciler.latest()}
+
+
+@api_router.post("/admin/reconcile", status_code=202)
+async def admin_start_reconcile(repair: bool = False, zone_id: Optional[str] = None, admin=Depends(get_admin_user)):
+    zones = await served_zones()
+    if zone_id:
+        if zone_id not in zones:
+            raise HTTPException(status_code=404, detail="Zone not found")
+        zones = {zone_id: zones[zone_id]}
+    if not await reconciler.start(zones, repair):
+        raise HTTPException(status_code=409, detail="A reconciliation is already running")
+    return {"message": "Reconciliation started", "zones": len(zones), "repair": repair}
+
+
+@api_router.get("/admin/schema")
+async def admin_schema_report(admin=Depends(get_admin_user)):
+    """Schema version, any migrations still pending (and why) plus an explain() report showing which index serves each hot query."""
+    version = await db_schema.current_version(db)
+    return {
+        "version": version,
+        "pending": db_schema.pending_migrations(version),
+        "failure": db_schema.last_failure,
+        "queries": await db_schema.explain_hot_queries(db),
     }
 
 
 @api_router.get("/admin/users/{user_id}/records")
-async def admin_get_user_records(user_id: str, admin=Depends(get_admin_user)):
+async def admin_get_user_records(request: Request, user_id: str, cursor: Optional[str] = None, limit: Optional[int] = None, admin=Depends(get_admin_user)):
     user = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    records = await db.dns_records.find({"user_id": user_id}, {"_id": 0}).to_list(100)
-    return {"user": user, "records": records}
+    query = {"user_id": user_id}
+    if wants_ndjson(request):
+        return stream_find(db.dns_records, query, RECORD_PROJECTION, "created_at", 1, cursor, limit)
+    records, next_cursor = await fetch_page(
+        db.dns_records, query, RECORD_PROJECTION, "created_at", 1, cursor, page_limit(limit, RECORD_PAGE_SIZE, RECORD_PAGE_MAX)
+    )
+    return {"user": user, "records": records, "next_cursor": next_cursor}
+
+
+@api_router.get("/admin/records")
+async def admin_list_records(
+    request: Request,
+    domain_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    admin=Depends(get_admin_user),
+):
+    """Every record (optionally per domain or user); use NDJSON to export them all in one streamed response."""
+    query = {}
+    if domain_id:
+        query["domain_id"] = domain_id
+    if user_id:
+        query["user_id"] = user_id
+    if wants_ndjson(request):
+        return stream_find(db.dns_records, query, RECORD_PROJECTION, "created_at", 1, cursor, limit)
+    records, next_cursor = await fetch_page(
+        db.dns_records, query, RECORD_PROJECTION, "created_at", 1, cursor, page_limit(limit, RECORD_PAGE_SIZE, RECORD_PAGE_MAX)
+    )
+    return {"records": records, "next_cursor": next_cursor}
 
 
 @api_router.delete("/admin/records/{record_id}")
@@ -752,9 +1911,10 @@ async def admin_delete_record(record_id: str, admin=Depends(get_admin_user)):
     record = await db.dns_records.find_one({"id": record_id}, {"_id": 0})
     if not record:
         raise HTTPException(status_code=404, detail="Record not found")
-    zone_id = record.get("zone_id", DEFAULT_ZONE_ID)
-    await cf_delete_record(zone_id, record["cf_id"])
-    await db.dns_records.delete_one({"id": record_id})
+    await cf_remove_record(record)
+    result = await db.dns_records.delete_one({"id": record_id})
+    await serve_records(removals=[record])
+    await count_deleted_records(result.deleted_count)
     return {"message": "Record deleted successfully"}
 
 
@@ -769,15 +1929,156 @@ async def admin_setup():
         {"email": ADMIN_EMAIL},
         {"$set": {"role": "admin", "verified": True}, "$unset": {"verification_code": "", "code_expires_at": ""}}
     )
+    await invalidate_user(admin_user["id"])
+    if not admin_user.get("verified"):
+        await stats.incr({"verified_users": 1})
     return {"message": f"User {ADMIN_EMAIL} is now admin"}
 
 
+# --- Live Events ---
+# Per-subscriber backlog before it is replaced by a resync, and open streams allowed per user and worker
+EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', '1000'))
+EVENTS_MAX_PER_USER = int(os.environ.get('EVENTS_MAX_PER_USER', '5'))
+EVENTS_KEEPALIVE = 15
+
+# Never sent to browsers; changes touching only these don't produce an event
+USER_PRIVATE_FIELDS = {"password_hash", "verification_code", "code_expires_at", "verify_attempts"}
+RECORD_PRIVATE_FIELDS = {"update_token_hash"}
+
+
+def quiet_update(change: dict, private: set) -> bool:
+    description = change.get("updateDescription")
+    if not description:
+        return False
+    touched = set(description.get("updatedFields", {})) | set(description.get("removedFields", []))
+    return bool(touched) and touched <= private
+
+
+def change_events(change: dict) -> List[Event]:
+    """Events for one change on dns_records, users or domains."""
+    collection = change["ns"]["coll"]
+    op = "update" if change["operationType"] == "replace" else change["operationType"]
+    doc = change.get("fullDocument")
+    before = change.get("fullDocumentBeforeChange")
+    if op == "delete" and before is None:
+        if collection == "users":
+            # The deleted user may be an admin: make every admin stream re-authorize
+            event_hub.revoke_admins()
+        # No pre-image: the owner is unknown
+        return [Event("resync", {}, EVERYONE)]
+    if op != "delete" and doc is None:
+        # Deleted before the lookup; its delete event follows
+        return []
+
+    if collection == "dns_records":
+        if op == "delete":
+            return [Event("record", {"op": op, "id": before["id"], "user_id": before["user_id"]}, before["user_id"])]
+        if quiet_update(change, RECORD_PRIVATE_FIELDS):
+            return []
+        return [Event("record", {"op": op, "user_id": doc["user_id"], "record": record_response(doc)}, doc["user_id"])]
+
+    if collection == "users":
+        # Streams are scoped when they open: end them when the account goes away or its role changes
+        if op == "delete":
+            event_hub.revoke(before["id"])
+            return [Event("user", {"op": op, "id": before["id"]}, before["id"])]
+        event_hub.revoke(doc["id"], admin=doc.get("role") == "admin")
+        if quiet_update(change, USER_PRIVATE_FIELDS):
+            return []
+        user = {k: v for k, v in doc.items() if k != "_id" and k not in USER_PRIVATE_FIELDS}
+        return [Event("user", {"op": op, "user": user}, doc["id"])]
+
+    if collection == "domains":
+        if op == "delete":
+            return [Event("domain", {"op": op, "id": before["id"]}, EVERYONE)]
+        domain = {k: v for k, v in doc.items() if k != "_id"}
+        if domain.get("active"):
+            return [Event("domain", {"op": op, "domain": domain}, EVERYONE)]
+        # Users only see active domains: an inactive one leaves their list
+        return [
+            Event("domain", {"op": op, "domain": domain}, ADMINS),
+            Event("domain", {"op": "delete", "id": domain["id"]}, MEMBERS),
+        ]
+    return []
+
+
+event_hub = EventHub(db, change_events, ["dns_records", "users", "domains"], max_queue=EVENTS_QUEUE_SIZE)
+
+
+@api_router.get("/events")
+async def event_stream(user=Depends(get_current_user)):
+    """Server-Sent Events with changes to the caller's records, account and the domain list (admins: everything)."""
+    if not event_hub.available:
+        raise HTTPException(status_code=503, detail="Live updates need MongoDB change streams (a replica set)")
+    if event_hub.subscriptions_of(user["id"]) >= EVENTS_MAX_PER_USER:
+        raise HTTPException(status_code=429, detail="Too many open event streams")
+
+    async def stream():
+        subscription = event_hub.subscribe(user["id"], admin=user.get("role") == "admin")
+        try:
+            yield "retry: 5000\nevent: ready\ndata: {}\n\n"
+            while True:
+                payload = await subscription.next(EVENTS_KEEPALIVE)
+                if subscription.closed:
+                    # Revoked: the client reconnects and is authorized again
+                    return
+                yield payload if payload is not None else ": keepalive\n\n"
+        finally:
+            event_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: nginx would otherwise hold events back
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @api_router.get("/health")
 async def health():
     return {"status": "healthy", "service": "DNSLAB.BIZ API"}
 
 
+@metrics.collector
+async def collect_queue_metrics():
+    cf_queue, mail_queue, jobs = await asyncio.gather(update_queue.stats(), email_outbox.stats(), provisioner.stats())
+    for name, queue in (("cf_write_behind", cf_queue), ("email_outbox", mail_queue), ("provisioning", jobs)):
+        queue_depth.set(name, value=queue["depth"])
+        queue_age.set(name, value=queue["oldest_age_seconds"])
+    queue_depth.set("telegram", value=notifier.stats()["depth"])
+    queue_depth.set("bcrypt", value=password_hasher.pending)
+    event_subscribers.set(value=len(event_hub))
+
+
+@api_router.get("/metrics")
+async def prometheus_metrics(authorization: Optional[str] = Header(None)):
+    # Compared as bytes: a latin-1 header would make compare_digest raise on str
+    if METRICS_TOKEN and not secrets.compare_digest((authorization or "").encode(), f"Bearer {METRICS_TOKEN}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(await metrics.render(), media_type=CONTENT_TYPE)
+
+
 app.include_router(api_router)
+app.include_router(nic_router)
+
+
+@app.exception_handler(HasherOverloaded)
+async def hasher_overloaded_handler(request: Request, exc: HasherOverloaded):
+    return JSONResponse(status_code=503, content={"detail": "Server busy, please try again"}, headers={"Retry-After": "1"})
+
+
+@app.exception_handler(RateLimited)
+async def rate_limited_handler(request: Request, exc: RateLimited):
+    return JSONResponse(status_code=429, content={"detail": "Too many requests, please try again later"}, headers={"Retry-After": str(exc.retry_after)})
+
+
+@app.exception_handler(CloudflareError)
+async def cloudflare_error_handler(request: Request, exc: CloudflareError):
+    headers = {}
+    if exc.retry_after is not None:
+        headers["Retry-After"] = str(max(1, int(exc.retry_after)))
+    notifier.notify("cloudflare_error", f"{request.method} <code>{escape(request.url.path)}</code>: {escape(exc)}")
+    return JSONResponse(status_code=exc.status_code, content={"detail": f"Cloudflare: {exc}"}, headers=headers)
 
 app.add_middleware(
     CORSMiddleware,
@@ -786,9 +2087,79 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware, histogram=http_latency, in_flight=http_in_flight)
+
+
+# Long-running background jobs, cancelled on shutdown
+background_jobs: List[asyncio.Task] = []
+
+
+async def served_zones():
+    """``{zone_id: [domain names]}`` for every zone records can live in."""
+    zones = defaultdict(list)
+    await domain_registry.ensure_loaded()
+    for domain in domain_registry.all():
+        if domain.get("zone_id"):
+            zones[domain["zone_id"]].append(domain["name"])
+    if DEFAULT_ZONE_ID and DEFAULT_DOMAIN not in zones[DEFAULT_ZONE_ID]:
+        zones[DEFAULT_ZONE_ID].append(DEFAULT_DOMAIN)
+    return dict(zones)
+
+
+async def served_zone_ids():
+    return set(await served_zones())
+
+
+@app.on_event("startup")
+async def initialize_database():
+    """Migrations and seeding, one worker at a time; the others wait, then find nothing left to do."""
+    async with Lease(db.leases, "startup", PROCESS_ID, ttl=LEASE_TTL).hold():
+        version = await db_schema.migrate(db)
+        logger.info(f"Database schema at version {version}")
+        await seed_default_domain()
+    await detect_lookup_support()
+
+
+async def periodic_reconcile():
+    # The lease keeps other workers out; a manual run started on this one is checked here
+    if not reconciler.running:
+        await reconciler.reconcile(await served_zones(), RECONCILE_REPAIR)
 
 
 @app.on_event("startup")
+async def start_background_services():
+    await cf.start()
+    await domain_registry.load()
+    background_jobs.append(asyncio.create_task(domain_registry.run()))
+    if RECORD_INDEX_REFRESH_INTERVAL > 0:
+        background_jobs.append(asyncio.create_task(record_index.run(served_zone_ids, RECORD_INDEX_REFRESH_INTERVAL)))
+    # Drained even when write-behind is off, so updates parked before a config change still go out
+    background_jobs.append(asyncio.create_task(update_queue.run()))
+    # Likewise pending records left over from async mode still get provisioned
+    await provisioner.recover()
+    background_jobs.append(asyncio.create_task(provisioner.run()))
+    background_jobs.append(asyncio.create_task(email_outbox.run()))
+    background_jobs.append(asyncio.create_task(notifier.run()))
+    background_jobs.append(asyncio.create_task(monitor_loop_lag(loop_lag, loop_lag_last)))
+    background_jobs.append(asyncio.create_task(event_hub.run()))
+    broadcast.subscribe("users", lambda user_ids: [user_cache.invalidate(user_id) for user_id in user_ids])
+    if DNS_SERVER_ENABLED:
+        broadcast.subscribe("dns_records", lambda ids: refresh_records(dns_authority, db.dns_records, ids))
+        broadcast.subscribe("domains", lambda names: refresh_zones(dns_authority, db.domains, names))
+        background_jobs.append(asyncio.create_task(sync_authority(dns_authority, db, DNS_RELOAD_INTERVAL)))
+        try:
+            await dns_server.start()
+        except OSError as e:
+            logger.error(f"DNS server could not bind {DNS_SERVER_HOST}:{DNS_SERVER_PORT}: {e}")
+    # Cluster-wide jobs: run on the scheduler leader only
+    if STATS_RECOUNT_INTERVAL > 0:
+        scheduler.every("stats_recount", STATS_RECOUNT_INTERVAL, stats.recount, initial_delay=0)
+    if RECONCILE_INTERVAL > 0:
+        scheduler.every("reconcile", RECONCILE_INTERVAL, periodic_reconcile)
+    background_jobs.append(asyncio.create_task(scheduler.run()))
+    background_jobs.append(asyncio.create_task(broadcast.run()))
+
+
 async def seed_default_domain():
     """Seed the default domain if it doesn't exist yet."""
     if DEFAULT_ZONE_ID:
@@ -801,10 +2172,24 @@ async def seed_default_domain():
                 "active": True,
                 "created_at": datetime.now(timezone.utc).isoformat()
             }
-            await db.domains.insert_one(domain)
-            logger.info(f"Seeded default domain: {DEFAULT_DOMAIN}")
+            try:
+                await db.domains.insert_one(domain)
+                domain_registry.put(domain)
+                await stats.incr({"total_domains": 1, "active_domains": 1})
+                await serve_zones(added=[DEFAULT_DOMAIN])
+                logger.info(f"Seeded default domain: {DEFAULT_DOMAIN}")
+            except DuplicateKeyError:
+                pass
 
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in background_jobs:
+        task.cancel()
+    await asyncio.gather(*background_jobs, return_exceptions=True)
+    await reconciler.stop()
+    await dns_server.close()
+    await cf.close()
+    await notifier.close()
+    password_hasher.shutdown()
     mongo_client.close()
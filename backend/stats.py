@@ -0,0 +1,106 @@
+"""Materialized counters behind ``/api/admin/stats``.
+
+Routes that add or remove users, records or domains adjust a single
+``stats`` document with ``$inc`` instead of the admin page counting whole
+collections on every load. The same write bumps today's bucket
+(``daily:YYYY-MM-DD``) with activity totals (registrations, records
+created/deleted, ...). A periodic ``recount`` resets the counters to exact
+values, correcting any drift from crashes between the data write and the
+counter write, and stores the totals in today's bucket so growth can be
+charted from one small range query.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_ID = "global"
+
+# counter -> (collection, filter) used by the exact recount
+COUNTERS = {
+    "total_users": ("users", {}),
+    "verified_users": ("users", {"verified": True}),
+    "free_users": ("users", {"plan": "free"}),
+    "premium_users": ("users", {"plan": "premium"}),
+    "total_records": ("dns_records", {}),
+    "total_domains": ("domains", {}),
+    "active_domains": ("domains", {"active": True}),
+}
+
+
+def _day(when: datetime) -> str:
+    return when.strftime("%Y-%m-%d")
+
+
+class StatsCounters:
+    def __init__(self, collection, db):
+        self.collection = collection
+        self.db = db
+
+    async def incr(self, counters: Dict[str, int], activity: Dict[str, int] = None):
+        """Adjust counters and today's activity totals in one round trip."""
+        now = datetime.now(timezone.utc)
+        requests = []
+        if counters:
+            requests.append(UpdateOne(
+                {"_id": GLOBAL_ID},
+                {"$inc": counters, "$set": {"updated_at": now.isoformat()}},
+                upsert=True,
+            ))
+        if activity:
+            requests.append(UpdateOne(
+                {"_id": f"daily:{_day(now)}"},
+                {"$inc": activity, "$setOnInsert": {"date": _day(now)}},
+                upsert=True,
+            ))
+        if not requests:
+            return
+        try:
+            await self.collection.bulk_write(requests, ordered=False)
+        except Exception as e:
+            # The data write already happened; the next recount fixes the counters
+            logger.warning(f"Failed to update stats counters: {e}")
+
+    async def recount(self) -> dict:
+        """Count every collection exactly and overwrite the counters."""
+        values = await asyncio.gather(*(
+            self.db[collection].count_documents(query) for collection, query in COUNTERS.values()
+        ))
+        counts = dict(zip(COUNTERS, values))
+        now = datetime.now(timezone.utc)
+        await self.collection.bulk_write([
+            UpdateOne(
+                {"_id": GLOBAL_ID},
+                {"$set": {**counts, "updated_at": now.isoformat(), "recounted_at": now.isoformat()}},
+                upsert=True,
+            ),
+            UpdateOne(
+                {"_id": f"daily:{_day(now)}"},
+                {"$set": {"totals": counts}, "$setOnInsert": {"date": _day(now)}},
+                upsert=True,
+            ),
+        ], ordered=False)
+        return counts
+
+    async def get(self) -> dict:
+        doc = await self.collection.find_one({"_id": GLOBAL_ID})
+        if doc is None or any(name not in doc for name in COUNTERS):
+            await self.recount()
+            doc = await self.collection.find_one({"_id": GLOBAL_ID})
+        doc.pop("_id", None)
+        return doc
+
+    async def history(self, days: int = 30) -> List[dict]:
+        """Daily buckets for the last ``days`` days, oldest first."""
+        start = _day(datetime.now(timezone.utc) - timedelta(days=days - 1))
+        # ";" sorts right after ":", bounding the range to daily buckets
+        cursor = self.collection.find(
+            {"_id": {"$gte": f"daily:{start}", "$lt": "daily;"}},
+            {"_id": 0},
+        ).sort("_id", 1)
+        return await cursor.to_list(days)
+
@@ -0,0 +1,287 @@
+import asyncio
+import copy
+import operator
+import os
+import re
+import sys
+import uuid
+
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+# Make backend modules (server.py, cf_client.py, ...) importable from tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# --- in-memory Motor stand-in shared by the tests: the query and update operators the app uses ---
+
+COMPARISONS = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+
+
+def _get(doc, path):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return None, False
+        doc = doc[part]
+    return doc, True
+
+
+def _matches_value(value, present, condition):
+    if not isinstance(condition, dict) or not any(k.startswith("$") for k in condition):
+        return present and value == condition
+    for op, arg in condition.items():
+        if op == "$exists":
+            ok = present == bool(arg)
+        elif op == "$ne":
+            ok = not present or value != arg
+        elif op == "$in":
+            ok = present and value in arg
+        elif op == "$nin":
+            ok = not present or value not in arg
+        elif op in COMPARISONS:
+            ok = present and value is not None and COMPARISONS[op](value, arg)
+        elif op == "$regex":
+            ok = present and isinstance(value, str) and re.search(arg, value, re.I if "i" in condition.get("$options", "") else 0)
+        elif op == "$options":
+            ok = True
+        else:
+            raise NotImplementedError(op)
+        if not ok:
+            return False
+    return True
+
+
+def matches(doc, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, q) for q in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, q) for q in condition):
+                return False
+        else:
+            value, present = _get(doc, key)
+            if not _matches_value(value, present, condition):
+                return False
+    return True
+
+
+def project(doc, projection):
+    doc = copy.deepcopy(doc)
+    if not projection:
+        return doc
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    if include:
+        doc = {k: v for k, v in doc.items() if k in include or k == "_id"}
+    else:
+        doc = {k: v for k, v in doc.items() if projection.get(k, 1)}
+    if projection.get("_id", 1) == 0:
+        doc.pop("_id", None)
+    return doc
+
+
+def apply_update(doc, update, inserting=False):
+    for field, value in update.get("$set", {}).items():
+        doc[field] = copy.deepcopy(value)
+    if inserting:
+        for field, value in update.get("$setOnInsert", {}).items():
+            doc[field] = copy.deepcopy(value)
+    for field in update.get("$unset", {}):
+        doc.pop(field, None)
+    for field, amount in update.get("$inc", {}).items():
+        doc[field] = doc.get(field, 0) + amount
+
+
+def _sort_key(doc, field):
+    # Missing and null values sort first, like in Mongo
+    value = _get(doc, field)[0]
+    return (False, 0) if value is None else (True, value)
+
+
+class Result:
+    def __init__(self, matched=0, modified=0, deleted=0, upserted_id=None, inserted_id=None):
+        self.matched_count = matched
+        self.modified_count = modified
+        self.deleted_count = deleted
+        self.upserted_id = upserted_id
+        self.inserted_id = inserted_id
+        self.acknowledged = True
+
+
+class Cursor:
+    def __init__(self, docs, projection=None):
+        self.docs = docs
+        self.projection = projection
+
+    def sort(self, key, direction=1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, order in reversed(keys):
+            self.docs.sort(key=lambda d: _sort_key(d, field), reverse=order < 0)
+        return self
+
+    def skip(self, n):
+        self.docs = self.docs[n:]
+        return self
+
+    def limit(self, n):
+        if n:
+            self.docs = self.docs[:abs(n)]
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    async def to_list(self, length=None):
+        return [project(d, self.projection) for d in self.docs[:length]]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            # Other tasks run between documents, as they do while Motor fetches a batch
+            await asyncio.sleep(0)
+            yield project(doc, self.projection)
+
+
+class Collection:
+    def __init__(self, docs=(), unique=()):
+        self.docs = [copy.deepcopy(d) for d in docs]
+        # Fields with a unique index; _id always has one
+        self.unique = {"_id", *unique}
+        self.indexes = {}
+
+    def get(self, value, field="_id"):
+        """The stored document (not a copy) whose ``field`` equals ``value``"""
+        return next((d for d in self.docs if d.get(field) == value), None)
+
+    def _find(self, query):
+        return [d for d in self.docs if matches(d, query or {})]
+
+    def _check_unique(self, doc, ignore=None):
+        for field in self.unique:
+            if field in doc and any(d is not ignore and d.get(field) == doc[field] for d in self.docs):
+                raise DuplicateKeyError(f"E11000 duplicate key error: {field}")
+
+    def find(self, query=None, projection=None, sort=None, limit=0):
+        cursor = Cursor(self._find(query), projection)
+        if sort:
+            cursor.sort(sort)
+        return cursor.limit(limit)
+
+    async def find_one(self, query=None, projection=None, sort=None):
+        docs = self.find(query, projection, sort).docs
+        return project(docs[0], projection) if docs else None
+
+    async def count_documents(self, query, limit=0):
+        count = len(self._find(query))
+        return min(count, limit) if limit else count
+
+    async def insert_one(self, doc):
+        doc.setdefault("_id", uuid.uuid4().hex)
+        self._check_unique(doc)
+        self.docs.append(copy.deepcopy(doc))
+        return Result(inserted_id=doc["_id"])
+
+    async def insert_many(self, docs, ordered=True):
+        for doc in docs:
+            await self.insert_one(doc)
+        return Result()
+
+    async def update_one(self, query, update, upsert=False):
+        found = self._find(query)
+        if found:
+            changed = copy.deepcopy(found[0])
+            apply_update(changed, update)
+            self._check_unique(changed, ignore=found[0])
+            modified = changed != found[0]
+            found[0].clear()
+            found[0].update(changed)
+            return Result(matched=1, modified=int(modified))
+        if upsert:
+            doc = {k: v for k, v in query.items() if not k.startswith("$") and not isinstance(v, dict)}
+            apply_update(doc, update, inserting=True)
+            await self.insert_one(doc)
+            return Result(upserted_id=doc["_id"])
+        return Result()
+
+    async def bulk_write(self, requests, ordered=True):
+        errors = []
+        for index, request in enumerate(requests):
+            try:
+                if isinstance(request, InsertOne):
+                    await self.insert_one(request._doc)
+                elif isinstance(request, UpdateOne):
+                    await self.update_one(request._filter, request._doc, upsert=bool(request._upsert))
+                elif isinstance(request, DeleteOne):
+                    await self.delete_one(request._filter)
+            except DuplicateKeyError as e:
+                errors.append({"index": index, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+        return Result()
+
+    async def update_many(self, query, update):
+        found = self._find(query)
+        for doc in found:
+            apply_update(doc, update)
+        return Result(matched=len(found), modified=len(found))
+
+    async def replace_one(self, query, replacement, upsert=False):
+        found = self._find(query)
+        if found:
+            found[0].clear()
+            found[0].update(copy.deepcopy(replacement))
+            return Result(matched=1, modified=1)
+        if upsert:
+            await self.insert_one(dict(replacement))
+        return Result()
+
+    async def find_one_and_update(self, query, update, projection=None, sort=None, upsert=False, return_document=False):
+        docs = self.find(query, None, sort).docs
+        if not docs:
+            if not upsert:
+                return None
+            await self.update_one(query, update, upsert=True)
+            return project(self.docs[-1], projection) if return_document else None
+        before = copy.deepcopy(docs[0])
+        apply_update(docs[0], update)
+        return project(docs[0] if return_document else before, projection)
+
+    async def find_one_and_delete(self, query, projection=None, sort=None):
+        docs = self.find(query, None, sort).docs
+        if not docs:
+            return None
+        self.docs.remove(docs[0])
+        return project(docs[0], projection)
+
+    async def delete_one(self, query):
+        found = self._find(query)
+        if found:
+            self.docs.remove(found[0])
+        return Result(deleted=len(found[:1]))
+
+    async def create_indexes(self, models):
+        for model in models:
+            self.indexes[model.document["name"]] = model.document
+
+    async def delete_many(self, query):
+        found = self._find(query)
+        self.docs = [d for d in self.docs if d not in found]
+        return Result(deleted=len(found))
+
+
+class Database:
+    """Collections are created on first use; pass the ones that need unique indexes"""
+
+    def __init__(self, **collections):
+        self.collections = dict(collections)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.collections.setdefault(name, Collection())
+
+    __getitem__ = __getattr__
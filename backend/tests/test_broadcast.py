@@ -0,0 +1,38 @@
+"""
+Unit tests for cross-worker change notifications (broadcast.py)
+- Keys published by one worker reach the handlers of the others, batched per topic
+- A worker ignores its own entries, and overlapping polls don't repeat entries
+"""
+import asyncio
+
+from broadcast import Broadcast
+from conftest import Collection
+
+
+class TestBroadcast:
+    """Publish and poll"""
+
+    def test_other_workers_receive_keys(self):
+        changes = Collection()
+        one, two = Broadcast(changes, "host:1"), Broadcast(changes, "host:2")
+        received = {"one": [], "two": []}
+        one.subscribe("users", lambda keys: received["one"].append(keys))
+
+        async def invalidate(keys):
+            received["two"].append(keys)
+
+        two.subscribe("users", invalidate)
+
+        async def run():
+            await one.publish("users", ["u1"])
+            await one.publish("users", ["u2", "u1"])
+            await one.publish("dns_records", ["r1"])
+            await one.publish("users", [])
+            counts = [await two.poll(), await one.poll()]
+            # The next poll overlaps the previous one but finds nothing new
+            counts.append(await two.poll())
+            return counts
+
+        assert asyncio.run(run()) == [3, 0, 0]
+        assert received == {"one": [], "two": [{"u1", "u2"}]}
+        assert len(changes.docs) == 3 and "expire_at" in changes.docs[0]
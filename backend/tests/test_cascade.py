@@ -0,0 +1,51 @@
+"""
+Unit tests for the bounded-concurrency cascade executor (cascade.py)
+- Concurrency cap is respected
+- Failures are collected per item without stopping the cascade
+- Async iterables (e.g. Motor cursors) are streamed
+"""
+import asyncio
+
+from cascade import run_cascade
+
+
+class TestRunCascade:
+    """Cascade execution and reporting"""
+
+    def test_respects_concurrency_cap(self):
+        in_flight = 0
+        peak = 0
+
+        async def action(item):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.001)
+            in_flight -= 1
+
+        report = asyncio.run(run_cascade(range(50), action, concurrency=4))
+        assert report["total"] == 50
+        assert len(report["succeeded"]) == 50
+        assert peak <= 4
+
+    def test_collects_failures(self):
+        async def action(item):
+            if item % 3 == 0:
+                raise RuntimeError(f"boom {item}")
+
+        progress = []
+        report = asyncio.run(run_cascade(range(9), action, concurrency=2, on_progress=lambda d, f: progress.append((d, f))))
+        assert sorted(f["item"] for f in report["failed"]) == [0, 3, 6]
+        assert report["failed"][0]["error"].startswith("boom")
+        assert progress[-1] == (9, 3)
+
+    def test_streams_async_iterable(self):
+        async def source():
+            for i in range(5):
+                yield {"id": i}
+
+        async def action(item):
+            await asyncio.sleep(0)
+
+        report = asyncio.run(run_cascade(source(), action, concurrency=3, describe=lambda item: item["id"]))
+        assert sorted(report["succeeded"]) == [0, 1, 2, 3, 4]
@@ -0,0 +1,86 @@
+"""
+Unit tests for the pooled Cloudflare client (cf_client.py)
+- Retry on 429/5xx honouring Retry-After
+- No duplicate POSTs on server errors
+- Rate-limit exhaustion surfaces as CloudflareRateLimited
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from cf_client import CloudflareClient, CloudflareRateLimited, parse_retry_after
+
+
+def make_client(handler, **kwargs):
+    kwargs.setdefault("backoff_base", 0.001)
+    return CloudflareClient("test-token", transport=httpx.MockTransport(handler), **kwargs)
+
+
+class TestRetryAfter:
+    """Retry-After header parsing"""
+
+    def test_seconds(self):
+        assert parse_retry_after("3") == 3.0
+
+    def test_missing_or_garbage(self):
+        assert parse_retry_after(None) is None
+        assert parse_retry_after("soon") is None
+
+
+class TestCloudflareClient:
+    """Retry and pooling behaviour against a mock transport"""
+
+    def test_retries_429_then_succeeds(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if len(calls) < 3:
+                return httpx.Response(429, headers={"Retry-After": "0"})
+            return httpx.Response(200, json={"success": True, "result": {"id": "abc"}})
+
+        async def run():
+            client = make_client(handler)
+            try:
+                return await client.request("GET", "/zones/z/dns_records")
+            finally:
+                await client.close()
+
+        data = asyncio.run(run())
+        assert data["result"]["id"] == "abc"
+        assert len(calls) == 3
+        assert calls[0].headers["Authorization"] == "Bearer test-token"
+
+    def test_rate_limit_exhausted_raises(self):
+        def handler(request):
+            return httpx.Response(429, headers={"Retry-After": "0"})
+
+        async def run():
+            client = make_client(handler, max_retries=2)
+            try:
+                await client.request("GET", "/zones/z/dns_records")
+            finally:
+                await client.close()
+
+        with pytest.raises(CloudflareRateLimited) as exc:
+            asyncio.run(run())
+        assert exc.value.status_code == 503
+
+    def test_post_not_retried_on_5xx(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(500, json={"success": False, "errors": [{"message": "boom"}]})
+
+        async def run():
+            client = make_client(handler)
+            try:
+                return await client.request("POST", "/zones/z/dns_records", json={"type": "A"})
+            finally:
+                await client.close()
+
+        data = asyncio.run(run())
+        assert data["success"] is False
+        assert len(calls) == 1
@@ -0,0 +1,76 @@
+"""
+Unit tests for the index migrations (db_schema.py)
+- A fresh database gets every migration, recorded in schema_migrations
+- A failing migration stops the run, is reported, and is retried on the next run
+- explain() plan trees are walked through nested and OR stages
+"""
+import asyncio
+
+import pytest
+from pymongo.errors import OperationFailure
+
+import db_schema
+from conftest import Database
+from db_schema import MIGRATIONS, _plan_stages, current_version, migrate, pending_migrations
+
+LATEST = MIGRATIONS[-1][0]
+
+
+@pytest.fixture(autouse=True)
+def no_failure(monkeypatch):
+    monkeypatch.setattr(db_schema, "last_failure", None)
+
+
+class TestMigrate:
+    """Applying, recording and reporting migrations"""
+
+    def test_fresh_database(self):
+        db = Database()
+        assert asyncio.run(migrate(db)) == LATEST
+        assert [d["_id"] for d in db.schema_migrations.docs] == list(range(1, LATEST + 1))
+        assert asyncio.run(current_version(db)) == LATEST
+        assert pending_migrations(LATEST) == [] and db_schema.last_failure is None
+        records = db.dns_records.indexes
+        assert "full_name_1" in records and "user_id_1_created_at_1_id_1" in records
+        # A prefix of the keyset index, so not created separately
+        assert "user_id_1_created_at_1" not in records
+        # A second run (another worker) finds nothing to do
+        assert asyncio.run(migrate(db)) == LATEST
+        assert len(db.schema_migrations.docs) == LATEST
+
+    def test_failure_stops_and_is_reported(self):
+        db = Database()
+
+        async def duplicate_emails(models):
+            raise OperationFailure("E11000 duplicate key error", code=11000)
+
+        # Duplicate emails block the unique index of migration 1
+        db.users.create_indexes = duplicate_emails
+        assert asyncio.run(migrate(db)) == 0
+        assert db.schema_migrations.docs == []
+        assert "cf_outbox" not in db.collections
+        failure = db_schema.last_failure
+        assert failure["version"] == 1 and "E11000" in failure["error"]
+        assert [p["version"] for p in pending_migrations(0)] == list(range(1, LATEST + 1))
+
+        del db.users.create_indexes
+        assert asyncio.run(migrate(db)) == LATEST
+        assert db_schema.last_failure is None
+
+
+class TestPlanStages:
+    """Walking explain() output"""
+
+    def test_nested_and_or_stages(self):
+        plan = {
+            "stage": "FETCH",
+            "inputStage": {
+                "stage": "OR",
+                "inputStages": [
+                    {"stage": "IXSCAN", "indexName": "email_1"},
+                    {"stage": "COLLSCAN", "direction": "forward"},
+                ],
+            },
+        }
+        assert list(_plan_stages(plan)) == [("FETCH", None), ("OR", None), ("IXSCAN", "email_1"), ("COLLSCAN", None)]
+        assert list(_plan_stages({})) == []
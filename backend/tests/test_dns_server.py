@@ -0,0 +1,130 @@
+"""
+Unit tests for the embedded authoritative DNS server (dns_server.py)
+- Trie updates: upsert replaces, remove prunes back to NXDOMAIN, zones refuse outside names
+- Resolution: CNAME chasing, delegation referrals, NODATA/NXDOMAIN with SOA, proxied records
+- Wire format: parsing, name compression, EDNS and truncation
+- Reload keeps updates that arrive while the new trie is being built
+- Records and zones changed by another worker are re-read by id / name
+"""
+import asyncio
+import struct
+
+from conftest import Collection
+from dns_server import (
+    RCODE_NXDOMAIN, RCODE_REFUSED, TYPE_A, TYPE_AAAA, TYPE_CNAME, TYPE_NS, TYPE_SOA,
+    DNSAuthority, DNSServer, parse_query, refresh_records, refresh_zones,
+)
+
+
+def record(record_id, name, record_type="A", content="192.0.2.1", **extra):
+    return {"id": record_id, "full_name": f"{name}.example.com", "record_type": record_type, "content": content, "ttl": 1, **extra}
+
+
+def authority():
+    auth = DNSAuthority(["ns1.example.net", "ns2.example.net"])
+    auth.loaded = True
+    auth.add_zone("example.com")
+    auth.upsert(record("1", "www"))
+    auth.upsert(record("2", "alias", "CNAME", "www.example.com."))
+    auth.upsert(record("3", "sub", "NS", "ns1.elsewhere.org"))
+    auth.upsert(record("4", "cdn", proxied=True))
+    return auth
+
+
+def query(name, qtype, msg_id=7, edns=None):
+    qname = b"".join(bytes([len(label)]) + label.encode() for label in name.split(".")) + b"\0"
+    message = struct.pack("!HHHHHH", msg_id, 0x0100, 1, 0, 0, 1 if edns else 0) + qname + struct.pack("!HH", qtype, 1)
+    if edns:
+        message += struct.pack("!BHHIH", 0, 41, edns, 0, 0)
+    return message
+
+
+class TestResolve:
+    """Answers from the trie"""
+
+    def test_answers_and_updates(self):
+        auth = authority()
+        assert auth.resolve("WWW.example.com.", TYPE_A).answers == [("www.example.com", TYPE_A, 300, bytes([192, 0, 2, 1]))]
+        auth.upsert(record("1", "www", content="192.0.2.9"))
+        assert auth.resolve("www.example.com", TYPE_A).answers[0][3] == bytes([192, 0, 2, 9])
+        auth.remove({"id": "1"})
+        assert auth.resolve("www.example.com", TYPE_A).rcode == RCODE_NXDOMAIN
+        assert auth.trie.node("www.example.com") is None
+
+    def test_cname_is_chased(self):
+        answers = authority().resolve("alias.example.com", TYPE_A).answers
+        assert [(name, type_code) for name, type_code, _, _ in answers] == [("alias.example.com", TYPE_CNAME), ("www.example.com", TYPE_A)]
+
+    def test_delegation_referral(self):
+        result = authority().resolve("host.sub.example.com", TYPE_A)
+        assert not result.authoritative and result.answers == []
+        assert result.authority == [("sub.example.com", TYPE_NS, 300, "ns1.elsewhere.org")]
+
+    def test_nodata_nxdomain_refused(self):
+        auth = authority()
+        nodata = auth.resolve("www.example.com", TYPE_AAAA)
+        assert nodata.rcode == 0 and nodata.answers == [] and nodata.authority[0][1] == TYPE_SOA
+        assert auth.resolve("cdn.example.com", TYPE_A).rcode == RCODE_NXDOMAIN
+        assert auth.resolve("example.org", TYPE_A).rcode == RCODE_REFUSED
+
+    def test_apex_ns(self):
+        answers = authority().resolve("example.com", TYPE_NS).answers
+        assert [value for _, _, _, value in answers] == ["ns1.example.net", "ns2.example.net"]
+
+    def test_reload_keeps_concurrent_updates(self):
+        auth = DNSAuthority()
+
+        async def run():
+            load = asyncio.create_task(auth.load(Collection([{"name": "example.com", "active": True}]), Collection([record("1", "www")])))
+            await asyncio.sleep(0)
+            auth.upsert(record("2", "api"))
+            await load
+
+        asyncio.run(run())
+        assert auth.size() == 2
+        assert auth.resolve("api.example.com", TYPE_A).answers
+
+    def test_refresh_from_other_workers(self):
+        auth = authority()
+        # Another worker changed www, deleted alias and added a zone while disabling another
+        records = Collection([record("1", "www", content="192.0.2.9"), record("5", "new")])
+        domains = Collection([{"name": "example.org", "active": True}, {"name": "example.com", "active": False}])
+        asyncio.run(refresh_records(auth, records, ["1", "2", "5"]))
+        assert auth.resolve("www.example.com", TYPE_A).answers[0][3] == bytes([192, 0, 2, 9])
+        assert auth.resolve("new.example.com", TYPE_A).answers
+        assert auth.resolve("alias.example.com", TYPE_A).rcode == RCODE_NXDOMAIN
+        asyncio.run(refresh_zones(auth, domains, ["example.org", "example.com"]))
+        assert auth.resolve("www.example.com", TYPE_A).rcode == RCODE_REFUSED
+        assert auth.resolve("example.org", TYPE_NS).answers
+
+
+class TestWire:
+    """Message encoding"""
+
+    def test_parse_query(self):
+        parsed = parse_query(query("www.example.com", TYPE_A, edns=4096))
+        assert (parsed.id, parsed.qname, parsed.qtype, parsed.edns, parsed.udp_payload) == (7, "www.example.com", TYPE_A, True, 1232)
+
+    def test_response_with_compression(self):
+        server = DNSServer(authority())
+        request = query("alias.example.com", TYPE_A)
+        response = server.handle(request)
+        msg_id, flags, qd, an, ns, ar = struct.unpack("!HHHHHH", response[:12])
+        assert (msg_id, flags & 0x8000, flags & 0x0400, flags & 0x000F, qd, an) == (7, 0x8000, 0x0400, 0, 1, 2)
+        # Answer owner name is a pointer back to the question
+        assert response[len(request):len(request) + 2] == b"\xc0\x0c"
+        assert response.endswith(bytes([192, 0, 2, 1]))
+
+    def test_udp_truncation(self):
+        auth = authority()
+        for i in range(60):
+            auth.upsert(record(f"m{i}", "many", content=f"198.51.100.{i}"))
+        server = DNSServer(auth)
+        small = server.handle(query("many.example.com", TYPE_A), udp=True)
+        assert struct.unpack("!H", small[2:4])[0] & 0x0200 and len(small) <= 512
+        full = server.handle(query("many.example.com", TYPE_A))
+        assert struct.unpack("!H", full[6:8])[0] == 60
+
+    def test_garbage_is_formerr(self):
+        response = DNSServer(authority()).handle(b"\x00\x07\x01\x00\x00\x02" + b"\x00" * 6)
+        assert struct.unpack("!H", response[2:4])[0] & 0x000F == 1
@@ -0,0 +1,114 @@
+"""
+Unit tests for the in-memory domain registry (domain_registry.py)
+- Lookups by id and name, active list in (created_at, id) order, copies returned
+- Local writes (put/discard), including renames
+- Change-stream events, deletes resolved through the Mongo _id
+- Falls back to polling when change streams are unavailable
+"""
+import asyncio
+
+from conftest import Collection
+from domain_registry import DomainRegistry
+
+
+def domain(n, active=True, **fields):
+    return {"_id": f"oid{n}", "id": f"d{n}", "name": f"ex{n}.com", "zone_id": f"z{n}", "active": active,
+            "created_at": f"2026-01-0{n}T00:00:00+00:00", **fields}
+
+
+class Stream:
+    def __init__(self, changes):
+        self.changes = changes
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        while True:
+            yield await self.changes.get()
+
+
+class Domains(Collection):
+    """Counts finds and serves change streams from a queue"""
+
+    def __init__(self, docs=(), streams=True):
+        super().__init__(docs)
+        self.streams = streams
+        self.changes = asyncio.Queue() if streams else None
+        self.finds = 0
+
+    def find(self, query=None, projection=None, sort=None, limit=0):
+        self.finds += 1
+        return super().find(query, projection, sort, limit)
+
+    def watch(self, full_document=None):
+        if not self.streams:
+            raise RuntimeError("The $changeStream stage is only supported on replica sets")
+        return Stream(self.changes)
+
+
+class TestLookups:
+    """Indexes and local writes"""
+
+    def test_lookups(self):
+        registry = DomainRegistry(Domains([domain(2), domain(1), domain(3, active=False)]))
+        asyncio.run(registry.load())
+        assert registry.get("d1")["name"] == "ex1.com"
+        assert "_id" not in registry.get("d1")
+        assert registry.by_name("ex3.com")["id"] == "d3"
+        assert registry.get("nope") is None
+        assert [d["id"] for d in registry.active()] == ["d1", "d2"]
+        registry.get("d1")["name"] = "changed"
+        assert registry.get("d1")["name"] == "ex1.com"
+
+    def test_put_and_discard(self):
+        registry = DomainRegistry(Domains([domain(1)]))
+        asyncio.run(registry.load())
+        registry.put({**domain(1), "name": "renamed.com"})
+        assert registry.by_name("ex1.com") is None and registry.by_name("renamed.com")["id"] == "d1"
+        registry.discard("d1")
+        assert registry.get("d1") is None and registry.by_name("renamed.com") is None and len(registry) == 0
+
+
+class TestRefresh:
+    """Change streams and polling"""
+
+    def test_change_stream(self):
+        collection = Domains([domain(1)])
+        registry = DomainRegistry(collection)
+
+        async def run():
+            task = asyncio.create_task(registry.run())
+            await asyncio.sleep(0.01)
+            assert registry.loaded and not registry.polling
+            await collection.changes.put({"operationType": "insert", "fullDocument": domain(2)})
+            await collection.changes.put({"operationType": "update", "fullDocument": domain(1, active=False)})
+            await asyncio.sleep(0.01)
+            assert registry.get("d2") and not registry.get("d1")["active"]
+            await collection.changes.put({"operationType": "delete", "documentKey": {"_id": "oid2"}})
+            await asyncio.sleep(0.01)
+            task.cancel()
+
+        asyncio.run(run())
+        assert registry.get("d2") is None and registry.get("d1") is not None
+
+    def test_polling_fallback(self):
+        collection = Domains([domain(1)], streams=False)
+        registry = DomainRegistry(collection, poll_interval=0.01)
+
+        async def run():
+            task = asyncio.create_task(registry.run())
+            await asyncio.sleep(0.02)
+            assert registry.polling
+            collection.docs.append(domain(2))
+            await asyncio.sleep(0.03)
+            task.cancel()
+
+        asyncio.run(run())
+        assert registry.get("d2")["name"] == "ex2.com"
@@ -0,0 +1,179 @@
+"""
+Unit tests for the live event hub (events.py)
+- Audiences: everyone, admins, non-admins, one user (plus admins)
+- A subscriber that falls behind gets a single resync instead of its backlog
+- Revoked subscriptions (deleted user, changed role) are closed
+- One change stream feeds every subscriber and is reopened from its resume token after errors
+- Without change streams the hub reports itself unavailable
+"""
+import asyncio
+
+from pymongo.errors import OperationFailure
+
+from events import ADMINS, EVERYONE, MEMBERS, RESYNC, Event, EventHub
+
+
+async def pending(subscription):
+    items = []
+    while True:
+        payload = await subscription.next(0)
+        if payload is None:
+            return items
+        items.append(payload)
+
+
+def drain(subscription):
+    return asyncio.run(pending(subscription))
+
+
+class Stream:
+    """Motor change stream over a queue; None in the queue ends the stream with an error"""
+
+    def __init__(self, changes):
+        self.changes = changes
+        self.resume_token = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def try_next(self):
+        return await self._next() if not self.changes.empty() else None
+
+    async def _next(self):
+        change = await self.changes.get()
+        if change is None:
+            raise ConnectionError("connection reset")
+        self.resume_token = {"_data": change["n"]}
+        return change
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._next()
+
+
+class Database:
+    def __init__(self, streams=True):
+        self.streams = streams
+        self.changes = asyncio.Queue()
+        self.watches = []
+
+    async def command(self, *args, **kwargs):
+        raise OperationFailure("no such command: collMod")
+
+    def watch(self, pipeline, **options):
+        self.watches.append(options)
+        if not self.streams:
+            return FailingStream()
+        return Stream(self.changes)
+
+
+class FailingStream(Stream):
+    def __init__(self):
+        super().__init__(None)
+
+    async def try_next(self):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets")
+
+
+def describe(change):
+    return [Event("record", {"n": change["n"]}, change["owner"])]
+
+
+class TestFanOut:
+    """Audiences and slow subscribers"""
+
+    def test_audiences(self):
+        hub = EventHub(Database(), describe, ["dns_records"])
+
+        async def run():
+            alice, bob, admin = hub.subscribe("alice"), hub.subscribe("bob"), hub.subscribe("root", admin=True)
+            hub.publish(Event("record", {"n": 1}, "alice"))
+            hub.publish(Event("domain", {"n": 2}, EVERYONE))
+            hub.publish(Event("domain", {"n": 3}, MEMBERS))
+            hub.publish(Event("domain", {"n": 4}, ADMINS))
+            return alice, bob, admin
+
+        alice, bob, admin = asyncio.run(run())
+        assert drain(alice) == [
+            'event: record\ndata: {"n":1}\n\n', 'event: domain\ndata: {"n":2}\n\n', 'event: domain\ndata: {"n":3}\n\n'
+        ]
+        assert len(drain(bob)) == 2
+        assert [p.split("\n")[1] for p in drain(admin)] == ['data: {"n":1}', 'data: {"n":2}', 'data: {"n":4}']
+        hub.unsubscribe(alice)
+        assert hub.subscriptions_of("alice") == 0 and len(hub) == 2
+
+    def test_overflow_becomes_resync(self):
+        hub = EventHub(Database(), describe, ["dns_records"], max_queue=3)
+
+        async def run():
+            subscription = hub.subscribe("alice")
+            for n in range(5):
+                hub.publish(Event("record", {"n": n}, "alice"))
+            return subscription
+
+        subscription = asyncio.run(run())
+        assert drain(subscription) == [RESYNC, 'event: record\ndata: {"n":4}\n\n']
+
+    def test_revoke(self):
+        hub = EventHub(Database(), describe, ["dns_records"])
+
+        async def run():
+            admin, member = hub.subscribe("root", admin=True), hub.subscribe("root")
+            other = hub.subscribe("other", admin=True)
+            hub.publish(Event("record", {"n": 1}, "alice"))
+            # root was demoted: only the admin-scoped stream ends
+            hub.revoke("root", admin=False)
+            hub.publish(Event("record", {"n": 2}, "alice"))
+            assert await admin.next(0) is None and admin.closed
+            assert not member.closed and hub.subscriptions_of("root") == 1
+            hub.revoke("root")
+            hub.revoke_admins()
+            return member, other
+
+        member, other = asyncio.run(run())
+        assert member.closed and other.closed and len(hub) == 0
+
+
+class TestFeed:
+    """Change stream handling"""
+
+    def test_one_stream_feeds_subscribers(self):
+        db = Database()
+        hub = EventHub(db, describe, ["dns_records"], retry_interval=0)
+
+        async def run():
+            alice = hub.subscribe("alice")
+            task = asyncio.create_task(hub.run())
+            await db.changes.put({"n": 1, "owner": "alice"})
+            await db.changes.put({"n": 2, "owner": "bob"})
+            await asyncio.sleep(0.01)
+            assert hub.available
+            first = [await alice.next(0)]
+            # Connection drops: reopened with the resume token, so no resync
+            await db.changes.put(None)
+            await db.changes.put({"n": 3, "owner": "alice"})
+            await asyncio.sleep(1.1)
+            task.cancel()
+            return first + await pending(alice)
+
+        assert asyncio.run(run()) == ['event: record\ndata: {"n":1}\n\n', 'event: record\ndata: {"n":3}\n\n']
+        assert len(db.watches) == 2
+        assert db.watches[1]["resume_after"] == {"_data": 2}
+        assert db.watches[0]["full_document_before_change"] == "whenAvailable"
+
+    def test_without_change_streams(self):
+        db = Database(streams=False)
+        hub = EventHub(db, describe, ["dns_records"], retry_interval=60)
+
+        async def run():
+            task = asyncio.create_task(hub.run())
+            await asyncio.sleep(0.01)
+            task.cancel()
+
+        asyncio.run(run())
+        assert not hub.available and len(db.watches) == 1
@@ -0,0 +1,202 @@
+"""
+Unit tests for the email outbox (mailer.py), delivering to a local SMTP sink
+- Pending mail of the same kind to the same address is coalesced into the latest one
+- An address gets at most one mail per resend_interval
+- Rejected mail is retried, then marked failed after max_attempts
+- A mail queued while the previous one was being sent stays pending (seq guard)
+- One undeliverable item doesn't stop the rest of its batch from being recorded
+"""
+import asyncio
+import socketserver
+import threading
+
+import pytest
+
+from conftest import Collection
+from mailer import EmailOutbox, SMTPSession, normalize_address
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Minimal SMTP server that keeps every accepted message and refuses recipients in ``reject``"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, reject=()):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.reject = set(reject)
+        self.messages = []
+        self.connections = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 sink ready")
+        sender, recipients = None, []
+        for raw in self.rfile:
+            command = raw.decode().rstrip("\r\n")
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 sink")
+            elif verb == "MAIL":
+                sender, recipients = command[10:].strip("<>"), []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipient = command[8:].strip("<>")
+                if recipient in self.server.reject:
+                    self.reply("550 No such user")
+                else:
+                    recipients.append(recipient)
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                for data in self.rfile:
+                    if data == b".\r\n":
+                        break
+                    lines.append(data.decode())
+                self.server.messages.append((sender, recipients, "".join(lines)))
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                # RSET, NOOP
+                self.reply("250 OK")
+
+
+@pytest.fixture
+def sink():
+    server = SMTPSink(reject={"gone@example.com"})
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_outbox(sink, **options):
+    session = SMTPSession("127.0.0.1", sink.port, security="none", timeout=5)
+    return EmailOutbox(Collection(), session, sender="noreply@example.com", **options)
+
+
+async def queue(outbox, to_addr, code, kind="verification"):
+    await outbox.enqueue(to_addr, kind, subject=f"Code {code}", text=f"Your code is {code}", html=f"<b>{code}</b>")
+
+
+class TestDelivery:
+    """Coalescing and the resend interval"""
+
+    def test_coalesces_per_kind_and_address(self, sink):
+        outbox = make_outbox(sink)
+
+        async def run():
+            await queue(outbox, "a@example.com", "111")
+            await queue(outbox, "A@example.com", "222")
+            await queue(outbox, "a@example.com", "333", kind="reset")
+            return await outbox.flush_due()
+
+        assert asyncio.run(run()) == 2
+        assert sorted(d["_id"] for d in outbox.collection.docs) == ["reset:a@example.com", "verification:a@example.com"]
+        bodies = [body for _, _, body in sink.messages]
+        assert len(bodies) == 2
+        # Matched on the subject: a bare "111" can turn up in a Message-ID
+        assert any("Subject: Code 222" in body for body in bodies)
+        assert not any("Subject: Code 111" in body for body in bodies)
+        # Both mails went over one SMTP connection
+        assert sink.connections == 1
+
+    def test_resend_interval(self, sink):
+        outbox = make_outbox(sink, resend_interval=60)
+
+        async def run():
+            await queue(outbox, "a@example.com", "111")
+            await outbox.flush_due()
+            await queue(outbox, "a@example.com", "222")
+            return await outbox.flush_due()
+
+        assert asyncio.run(run()) == 0
+        doc = outbox.collection.get("verification:a@example.com")
+        assert doc["status"] == "pending" and doc["text"] == "Your code is 222"
+        assert doc["due_at"] == pytest.approx(doc["last_sent_at"] + 60)
+        assert len(sink.messages) == 1
+
+
+class TestFailures:
+    """Retries, the seq guard and poisoned batches"""
+
+    def test_retry_then_failed(self, sink):
+        outbox = make_outbox(sink, max_attempts=2)
+        doc_id = "verification:gone@example.com"
+
+        async def run():
+            await queue(outbox, "gone@example.com", "111")
+            await outbox.flush_due()
+            first = dict(outbox.collection.get(doc_id))
+            outbox.collection.get(doc_id)["due_at"] = 0
+            await outbox.flush_due()
+            return first
+
+        first = asyncio.run(run())
+        assert first["status"] == "pending" and first["attempts"] == 1 and "No such user" in first["last_error"]
+        doc = outbox.collection.get(doc_id)
+        assert doc["status"] == "failed" and "expire_at" in doc
+        assert sink.messages == []
+
+    def test_mail_queued_during_send_stays_pending(self, sink):
+        outbox = make_outbox(sink, resend_interval=60)
+        doc_id = "verification:a@example.com"
+
+        async def run():
+            await queue(outbox, "a@example.com", "111")
+            claimed = await outbox._claim_batch()
+            # A resend click lands between the claim and the status update
+            await queue(outbox, "a@example.com", "222")
+
+            async def claim():
+                return claimed
+
+            outbox._claim_batch = claim
+            await outbox.flush_due()
+
+        asyncio.run(run())
+        doc = outbox.collection.get(doc_id)
+        assert doc["status"] == "pending" and doc["text"] == "Your code is 222"
+        assert doc["due_at"] == pytest.approx(doc["last_sent_at"] + 60)
+        assert len(sink.messages) == 1 and "Subject: Code 111" in sink.messages[0][2]
+
+    def test_poisoned_batch(self, sink):
+        outbox = make_outbox(sink)
+
+        async def run():
+            with pytest.raises(ValueError):
+                await queue(outbox, "ü@example.com", "000")
+            # Queued before addresses were checked
+            outbox.collection.docs.append({
+                "_id": "verification:ü@example.com", "to": "ü@example.com", "kind": "verification",
+                "subject": "Code 000", "text": "000", "html": "000", "status": "pending", "due_at": 0,
+                "attempts": 0, "queued_at": 0, "seq": 1,
+            })
+            await queue(outbox, "b@example.com", "222")
+            return await outbox.flush_due()
+
+        assert asyncio.run(run()) == 2
+        good = outbox.collection.get("verification:b@example.com")
+        bad = outbox.collection.get("verification:ü@example.com")
+        assert good["status"] == "sent"
+        assert bad["status"] == "pending" and bad["attempts"] == 1 and bad["last_error"]
+        assert [recipients for _, recipients, _ in sink.messages] == [["b@example.com"]]
+
+    def test_normalize_address(self):
+        assert normalize_address(" user@bücher.example ") == "user@xn--bcher-kva.example"
+        for address in ("ü@example.com", "a@example.com\r\nRCPT TO:<x@y>", "nobody", "@example.com"):
+            with pytest.raises(ValueError):
+                normalize_address(address)
@@ -0,0 +1,89 @@
+"""
+Unit tests for the Prometheus metrics subsystem (metrics.py)
+- Counter/histogram exposition format and bucket placement
+- Route-template labels from the ASGI middleware
+- Cloudflare path -> (zone, operation) labels through the client observer
+"""
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from cf_client import CloudflareClient
+from fake_cloudflare import FakeCloudflare
+from metrics import MetricsMiddleware, Registry, cf_observer, cf_operation
+
+
+class TestExposition:
+    """Text format"""
+
+    def test_counter_and_histogram(self):
+        registry = Registry()
+        errors = registry.counter("errors_total", "Errors", ["kind"])
+        latency = registry.histogram("latency_seconds", "Latency", ["op"], buckets=(0.1, 1.0))
+        errors.inc('a"b')
+        for value in (0.05, 0.1, 0.5, 3.0):
+            latency.observe(value, "get")
+
+        text = asyncio.run(registry.render())
+        assert '# TYPE errors_total counter\nerrors_total{kind="a\\"b"} 1\n' in text
+        assert 'latency_seconds_bucket{op="get",le="0.1"} 2\n' in text
+        assert 'latency_seconds_bucket{op="get",le="1"} 3\n' in text
+        assert 'latency_seconds_bucket{op="get",le="+Inf"} 4\n' in text
+        assert 'latency_seconds_sum{op="get"} 3.65\n' in text
+        assert 'latency_seconds_count{op="get"} 4\n' in text
+
+    def test_collectors_run_before_render(self):
+        registry = Registry()
+        depth = registry.gauge("depth", "Depth", ["queue"])
+
+        @registry.collector
+        async def collect():
+            depth.set("mail", value=7)
+
+        assert 'depth{queue="mail"} 7' in asyncio.run(registry.render())
+
+
+class TestInstrumentation:
+    """Middleware and Cloudflare labels"""
+
+    def test_route_template_labels(self):
+        registry = Registry()
+        latency = registry.histogram("http_seconds", "HTTP", ["method", "route", "status"])
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware, histogram=latency)
+
+        @app.get("/items/{item_id}")
+        async def item(item_id: str):
+            return {"id": item_id}
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+                await client.get("/items/1")
+                await client.get("/items/2")
+                await client.get("/nope")
+
+        asyncio.run(run())
+        assert latency.count("GET", "/items/{item_id}", "200") == 2
+        assert latency.count("GET", "unmatched", "404") == 1
+
+    def test_cf_operation(self):
+        assert cf_operation("GET", "/zones/z1/dns_records") == ("z1", "list")
+        assert cf_operation("PUT", "/zones/z1/dns_records/r1") == ("z1", "update")
+        assert cf_operation("POST", "/zones/z1/dns_records/batch") == ("z1", "batch")
+
+    def test_cf_observer(self):
+        registry = Registry()
+        latency = registry.histogram("cf_seconds", "CF", ["zone", "operation"])
+        errors = registry.counter("cf_errors_total", "CF errors", ["zone", "operation", "status"])
+        fake = FakeCloudflare()
+        cf = CloudflareClient("token", transport=fake.transport(), observer=cf_observer(latency, errors))
+
+        async def run():
+            await cf.request("POST", "/zones/z1/dns_records", json={"type": "A", "name": "a.example.com", "content": "192.0.2.1"})
+            await cf.request("DELETE", "/zones/z1/dns_records/missing")
+            await cf.close()
+
+        asyncio.run(run())
+        assert latency.count("z1", "create") == 1
+        assert errors.value("z1", "delete", "404") == 1
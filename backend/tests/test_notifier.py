@@ -0,0 +1,105 @@
+"""
+Unit tests for the Telegram notifier (notifier.py)
+- Events inside the window are merged into one digest message
+- Long messages are cut without breaking their HTML
+- A 429 is retried after Telegram's retry_after
+- Filtered event types and a full queue don't block the caller
+"""
+import asyncio
+import json
+
+import httpx
+
+from notifier import Event, TelegramNotifier, format_digest, truncate_html
+
+
+def make_notifier(handler, **kwargs):
+    kwargs.setdefault("window", 0.05)
+    kwargs.setdefault("min_interval", 0)
+    return TelegramNotifier("token", "chat", transport=httpx.MockTransport(handler), **kwargs)
+
+
+class TestDigest:
+    """Batching and message formatting"""
+
+    def test_events_in_window_become_one_message(self):
+        sent = []
+
+        def handler(request):
+            sent.append(json.loads(request.content)["text"])
+            return httpx.Response(200, json={"ok": True})
+
+        async def scenario():
+            notifier = make_notifier(handler)
+            await notifier.start()
+            task = asyncio.create_task(notifier.run())
+            notifier.notify("registration", "a@example.com")
+            notifier.notify("registration", "b@example.com")
+            notifier.notify("quota_hit", "c@example.com")
+            await asyncio.sleep(0.2)
+            task.cancel()
+            await notifier.close()
+            return notifier
+
+        notifier = asyncio.run(scenario())
+        assert len(sent) == 1 and notifier.sent == 1
+        assert "Digest: 3 events" in sent[0]
+        assert "New user registration: 2" in sent[0]
+
+    def test_long_digest_is_truncated(self):
+        events = [Event("record_created", "x" * 100) for _ in range(100)]
+        message = format_digest(events)
+        assert len(message) <= 4096
+        assert "more" in message.splitlines()[-1]
+
+
+    def test_long_event_keeps_valid_html(self):
+        text = "import by <code>" + "a&amp;b " * 1000 + "</code> done"
+        message = format_digest([Event("record_created", text)])
+        assert len(message) <= 4096
+        assert message.startswith("<b>DNS record created</b>\n\n") and message.endswith("…</code>")
+        body = message.rsplit("…", 1)[0]
+        assert body.endswith(("a", "&amp;", "b", " "))
+
+    def test_truncate_html(self):
+        text = "abc <code>a&amp;b</code> tail"
+        assert truncate_html(text, 100) == text
+        assert truncate_html(text, 10) == "abc …"
+        assert truncate_html(text, 21) == "abc <code>a…</code>"
+        assert truncate_html(text, 25) == "abc <code>a&amp;b</code>…"
+        assert all(len(truncate_html(text, n)) <= n for n in range(1, len(text)))
+
+
+class TestDelivery:
+    """Rate limits and back-pressure"""
+
+    def test_retries_after_429(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if len(calls) == 1:
+                return httpx.Response(429, json={"ok": False, "parameters": {"retry_after": 0}})
+            return httpx.Response(200, json={"ok": True})
+
+        async def scenario():
+            notifier = make_notifier(handler)
+            ok = await notifier.send("hello")
+            await notifier.close()
+            return ok
+
+        assert asyncio.run(scenario()) is True
+        assert len(calls) == 2
+
+    def test_filtered_and_overflowing_events_are_dropped(self):
+        async def scenario():
+            notifier = make_notifier(lambda r: httpx.Response(200), events=["registration"], max_queue=1)
+            await notifier.start()
+            notifier.notify("record_created", "ignored")
+            notifier.notify("registration", "kept")
+            notifier.notify("registration", "dropped")
+            await notifier.close()
+            return notifier.stats()
+
+        stats = asyncio.run(scenario())
+        assert stats["depth"] == 1 and stats["dropped"] == 1
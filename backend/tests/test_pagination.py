@@ -0,0 +1,58 @@
+"""
+Unit tests for keyset pagination helpers (pagination.py)
+- Cursors round-trip and reject garbage
+- The "after cursor" filter respects sort direction and the id tie-breaker
+- Pages are trimmed with a cursor only when more documents exist
+- In-memory lists are resumed after a cursor the same way
+- Limits are clamped to at least 1, with a default and maximum only for pages
+"""
+import pytest
+from fastapi import HTTPException
+
+from pagination import after_cursor, decode_cursor, encode_cursor, items_after, page_limit, page_result, stream_limit
+
+
+class TestCursor:
+    """Opaque cursor encoding"""
+
+    def test_round_trip(self):
+        cursor = encode_cursor({"id": "r1", "created_at": "2026-01-01T00:00:00+00:00"}, "created_at")
+        assert decode_cursor(cursor) == ("2026-01-01T00:00:00+00:00", "r1")
+
+    def test_invalid_cursor_is_400(self):
+        with pytest.raises(HTTPException) as exc:
+            decode_cursor("not-a-cursor!")
+        assert exc.value.status_code == 400
+
+
+class TestKeyset:
+    """Filters and page trimming"""
+
+    def test_after_cursor_ascending(self):
+        cursor = encode_cursor({"id": "b", "email": "x@gmail.com"}, "email")
+        assert after_cursor("email", 1, cursor) == {
+            "$or": [{"email": {"$gt": "x@gmail.com"}}, {"email": "x@gmail.com", "id": {"$gt": "b"}}]
+        }
+
+    def test_after_cursor_descending_on_id(self):
+        cursor = encode_cursor({"id": "b"}, "id")
+        assert after_cursor("id", -1, cursor) == {"id": {"$lt": "b"}}
+        assert after_cursor("id", -1, None) == {}
+
+    def test_page_result(self):
+        docs = [{"id": str(i), "n": i} for i in range(4)]
+        page, cursor = page_result(docs, "n", 3)
+        assert [d["id"] for d in page] == ["0", "1", "2"]
+        assert decode_cursor(cursor) == (2, "2")
+        assert page_result(docs[:3], "n", 3) == (docs[:3], None)
+
+    def test_items_after(self):
+        docs = [{"id": "a", "at": "1"}, {"id": "b", "at": "2"}, {"id": "c", "at": "2"}, {"id": "d", "at": "3"}]
+        assert items_after(docs, "at", None) is docs
+        assert [d["id"] for d in items_after(docs, "at", encode_cursor(docs[1], "at"))] == ["c", "d"]
+
+    def test_limits(self):
+        assert page_limit(None, 100, 500) == 100
+        assert [page_limit(n, 100, 500) for n in (-1, 0, 7, 9999)] == [1, 1, 7, 500]
+        assert stream_limit(None) is None
+        assert [stream_limit(n) for n in (-1, 0, 7, 9999)] == [1, 1, 7, 9999]
@@ -0,0 +1,45 @@
+"""
+Unit tests for the pooled bcrypt hasher (password_hasher.py)
+- Hash/verify round trip off the event loop
+- Work-factor change detection for rehash-on-login
+- Load shedding once the queue is full
+"""
+import asyncio
+
+import bcrypt
+
+from password_hasher import HasherOverloaded, PasswordHasher
+
+
+class TestPasswordHasher:
+    """Hashing, rehash detection and overload"""
+
+    def test_hash_and_verify(self):
+        hasher = PasswordHasher(rounds=4)
+
+        async def run():
+            hashed = await hasher.hash("secret123")
+            return hashed, await hasher.verify("secret123", hashed), await hasher.verify("wrong", hashed)
+
+        hashed, ok, bad = asyncio.run(run())
+        hasher.shutdown()
+        assert ok is True and bad is False
+        assert not hasher.needs_rehash(hashed)
+
+    def test_needs_rehash_on_cost_change(self):
+        hasher = PasswordHasher(rounds=5)
+        old = bcrypt.hashpw(b"pw", bcrypt.gensalt(rounds=4)).decode()
+        assert hasher.needs_rehash(old)
+        assert hasher.needs_rehash("not-a-bcrypt-hash")
+
+    def test_sheds_load_when_queue_full(self):
+        hasher = PasswordHasher(rounds=4, workers=1, max_queue=1)
+        hashed = bcrypt.hashpw(b"pw", bcrypt.gensalt(rounds=4)).decode()
+
+        async def run():
+            return await asyncio.gather(*(hasher.verify("pw", hashed) for _ in range(5)), return_exceptions=True)
+
+        results = asyncio.run(run())
+        hasher.shutdown()
+        assert sum(1 for r in results if r is True) == 2
+        assert sum(1 for r in results if isinstance(r, HasherOverloaded)) == 3
@@ -0,0 +1,102 @@
+"""
+Unit tests for the async record provisioning queue (provisioning.py)
+- Pending records become active; permanent failures mark them failed
+- Transient errors are retried with backoff until the attempt budget runs out
+- Jobs of deleted records are dropped, and recover() re-queues orphaned pending records
+- Long-polling waiters are woken when their record is done
+"""
+import asyncio
+
+from conftest import Collection
+from provisioning import ProvisioningFailed, ProvisioningQueue
+
+
+def pending(record_id):
+    return {"id": record_id, "full_name": f"{record_id}.example.com", "status": "pending", "cf_id": None}
+
+
+def make(provision, records, **options):
+    records = Collection(records, unique=("id",))
+    return ProvisioningQueue(Collection(), records, provision, retry_backoff=0, **options), records
+
+
+class TestProvisioning:
+    """Job lifecycle"""
+
+    def test_success_and_permanent_failure(self):
+        async def provision(record):
+            if record["id"] == "bad":
+                raise ProvisioningFailed("Cloudflare: invalid content")
+            await records.update_one({"id": record["id"], "status": "pending"}, {"$set": {"status": "active", "cf_id": "cf-1"}})
+
+        queue, records = make(provision, [pending("good"), pending("bad")])
+
+        async def run():
+            await queue.enqueue("good")
+            await queue.enqueue("bad")
+            return await queue.drain()
+
+        assert asyncio.run(run()) == 2
+        assert records.get("good", "id")["status"] == "active"
+        assert records.get("bad", "id")["status"] == "failed"
+        assert records.get("bad", "id")["error"] == "Cloudflare: invalid content"
+        assert queue.jobs.docs == []
+
+    def test_transient_errors_are_retried(self):
+        calls = []
+
+        async def provision(record):
+            calls.append(record["id"])
+            raise RuntimeError("Cloudflare unavailable")
+
+        queue, records = make(provision, [pending("r1")], max_attempts=3)
+
+        async def run():
+            await queue.enqueue("r1")
+            for _ in range(5):
+                await queue.drain()
+
+        asyncio.run(run())
+        assert calls == ["r1", "r1", "r1"]
+        assert records.get("r1", "id")["status"] == "failed"
+        assert records.get("r1", "id")["error"] == "Cloudflare unavailable"
+
+    def test_deleted_record_drops_job(self):
+        calls = []
+
+        async def provision(record):
+            calls.append(record)
+
+        queue, records = make(provision, [])
+        asyncio.run(queue.enqueue("gone"))
+        assert asyncio.run(queue.drain()) == 1
+        assert calls == [] and queue.jobs.docs == []
+
+    def test_recover_requeues_pending_records(self):
+        async def provision(record):
+            pass
+
+        queue, _ = make(provision, [pending("r1"), pending("r2"), {**pending("r3"), "status": "active"}])
+
+        async def run():
+            await queue.enqueue("r1")
+            return await queue.recover()
+
+        assert asyncio.run(run()) == 1
+        assert sorted(d["_id"] for d in queue.jobs.docs) == ["r1", "r2"]
+
+    def test_waiters_are_woken(self):
+        async def provision(record):
+            await asyncio.sleep(0.01)
+
+        queue, _ = make(provision, [pending("r1")], poll_interval=5)
+
+        async def run():
+            worker = asyncio.create_task(queue.run())
+            await queue.enqueue("r1")
+            done = await queue.wait("r1", timeout=1)
+            worker.cancel()
+            return done
+
+        assert asyncio.run(run()) is True
+        assert asyncio.run(queue.wait("r2", timeout=0.01)) is False
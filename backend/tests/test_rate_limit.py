@@ -0,0 +1,116 @@
+"""
+Unit tests for the sliding-window rate limiter (rate_limit.py)
+- Limit spec parsing
+- Sliding window: the previous window's share decays, keys are independent
+- Retry-After and the reject callback
+- Shared Mongo store counting across limiter instances
+"""
+import asyncio
+
+import pytest
+
+from conftest import Collection
+from rate_limit import MemoryStore, MongoStore, RateLimited, RateLimiter, parse_limits
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def hits(limiter, n, route="login", **keys):
+    """Run n checks, return how many were allowed."""
+    async def run():
+        allowed = 0
+        for _ in range(n):
+            try:
+                await limiter.check(route, **keys)
+                allowed += 1
+            except RateLimited:
+                pass
+        return allowed
+    return asyncio.run(run())
+
+
+class TestParse:
+    """RATE_LIMITS syntax"""
+
+    def test_parse_limits(self):
+        assert parse_limits("login:ip=20/60, login:email=5/300,records:user=1/1") == {
+            "login": [("ip", 20, 60.0), ("email", 5, 300.0)],
+            "records": [("user", 1, 1.0)],
+        }
+        assert parse_limits("") == {}
+        with pytest.raises(ValueError):
+            parse_limits("login=20/60")
+
+
+class TestSlidingWindow:
+    """MemoryStore behaviour"""
+
+    def test_limit_per_key(self):
+        limiter = RateLimiter(MemoryStore(clock=Clock()), {"login": [("ip", 3, 60)]})
+        assert hits(limiter, 5, ip="192.0.2.1") == 3
+        assert hits(limiter, 1, ip="192.0.2.2") == 1
+        # Missing key values are not limited
+        assert hits(limiter, 5, ip="") == 5
+
+    def test_previous_window_decays(self):
+        clock = Clock(600.0)
+        limiter = RateLimiter(MemoryStore(clock=clock), {"login": [("ip", 10, 60)]})
+        assert hits(limiter, 10, ip="a") == 10
+        # 15s into the next window, 75% of the previous 10 still count
+        clock.now = 675.0
+        assert hits(limiter, 5, ip="a") == 2
+        # Two windows later nothing is left
+        clock.now = 780.0
+        assert hits(limiter, 10, ip="a") == 10
+
+    def test_retry_after_and_reject_callback(self):
+        rejected = []
+        clock = Clock(540.0)
+        limiter = RateLimiter(MemoryStore(clock=clock), {"login": [("email", 4, 60)]}, on_reject=lambda *labels: rejected.append(labels))
+        hits(limiter, 4, email="x@gmail.com")
+        clock.now = 630.0
+        assert hits(limiter, 2, email="x@gmail.com") == 2
+
+        async def run():
+            with pytest.raises(RateLimited) as info:
+                await limiter.check("login", email="x@gmail.com")
+            return info.value
+
+        # 3 + 4 * 0.5 > 4: the old share has to fall to 1 / 4 -> at 645s
+        error = asyncio.run(run())
+        assert (error.route, error.key, error.retry_after) == ("login", "email", 15)
+        assert rejected == [("login", "email")]
+
+    def test_disabled(self):
+        limiter = RateLimiter(MemoryStore(), {"login": [("ip", 1, 60)]}, enabled=False)
+        assert hits(limiter, 5, ip="a") == 5
+
+    def test_sweep_drops_idle_buckets(self):
+        clock = Clock(0.0)
+        store = MemoryStore(max_keys=2, clock=clock)
+        limiter = RateLimiter(store, {"login": [("ip", 5, 10)]})
+        hits(limiter, 1, ip="a")
+        hits(limiter, 1, ip="b")
+        clock.now = 100.0
+        hits(limiter, 1, ip="c")
+        assert len(store) == 1
+
+
+class TestMongoStore:
+    """Counters shared through a collection"""
+
+    def test_shared_between_limiters(self):
+        collection = Collection()
+        clock = Clock(600.0)
+        limits = {"verify": [("email", 4, 60)]}
+        first = RateLimiter(MongoStore(collection, clock=clock), limits)
+        second = RateLimiter(MongoStore(collection, clock=clock), limits)
+        assert hits(first, 3, "verify", email="x") == 3
+        assert hits(second, 3, "verify", email="x") == 1
+        assert all("expire_at" in doc for doc in collection.docs)
@@ -0,0 +1,151 @@
+"""
+Unit tests for Mongo/Cloudflare reconciliation (reconcile.py) against fake_cloudflare.py
+- Ghosts, orphans, mismatches and relinks are detected in one pass
+- Unmanaged names/types and records inside the grace period are left alone
+- Repair mode converges both sides, and a second run finds no drift
+- Orphans the app didn't create (no managed comment) are reported but survive repair
+- Pending/failed (async-provisioned) records are neither ghosts nor leave orphans
+- Under a shared lease only one process reconciles at a time
+"""
+import asyncio
+
+from cf_client import CloudflareClient
+from conftest import Collection
+from fake_cloudflare import FakeCloudflare
+from reconcile import MANAGED_COMMENT, Reconciler, normalize_content, record_diff
+from scheduler import Lease
+
+ZONE = "zone1"
+OLD = "2020-01-01T00:00:00+00:00"
+
+
+def mongo_record(name, cf_id, record_type="A", content="192.0.2.1", **extra):
+    return {
+        "id": f"id-{name}", "cf_id": cf_id, "zone_id": ZONE, "full_name": f"{name}.example.com",
+        "record_type": record_type, "content": content, "ttl": 1, "proxied": False, "created_at": OLD, **extra,
+    }
+
+
+def make(fake, docs, lease=None):
+    fake.zones.setdefault(ZONE, {})
+    # Seeded records predate the scan's grace period
+    for record in fake.records(ZONE):
+        record["modified_on"] = OLD
+    cf = CloudflareClient("token", transport=fake.transport(), max_retries=0)
+    records = Collection(docs)
+    return Reconciler(cf, records, Collection(), default_zone_id=ZONE, lease=lease), records
+
+
+def drifted_zone():
+    fake = FakeCloudflare()
+    ok = fake.add_record(ZONE, "A", "ok.example.com", "192.0.2.1")
+    changed = fake.add_record(ZONE, "AAAA", "changed.example.com", "2001:db8::2")
+    moved = fake.add_record(ZONE, "CNAME", "moved.example.com", "target.example.net")
+    fake.add_record(ZONE, "A", "orphan.example.com", "192.0.2.9", comment=MANAGED_COMMENT)
+    fake.add_record(ZONE, "CNAME", "www.example.com", "example.com")   # added in the dashboard
+    fake.add_record(ZONE, "A", "example.com", "192.0.2.10")            # apex: not ours
+    fake.add_record(ZONE, "MX", "mail.example.com", "mx.example.net")  # unmanaged type
+    fake.add_record(ZONE, "A", "a.b.example.com", "192.0.2.11")        # nested: not ours
+    docs = [
+        mongo_record("ok", ok["id"]),
+        mongo_record("changed", changed["id"], "AAAA", "2001:db8::1"),
+        mongo_record("moved", "stale-id", "CNAME", "Target.example.net."),
+        mongo_record("ghost", "gone-id"),
+        mongo_record("fresh", "not-yet", created_at="2999-01-01T00:00:00+00:00"),
+    ]
+    return fake, docs, moved
+
+
+class TestDiff:
+    """Field comparison"""
+
+    def test_normalization(self):
+        assert normalize_content("AAAA", "2001:DB8:0::1") == "2001:db8::1"
+        assert normalize_content("CNAME", "Host.Example.com.") == "host.example.com"
+
+    def test_record_diff(self):
+        record = {"record_type": "NS", "content": "ns1.example.net", "ttl": 1, "proxied": True}
+        assert record_diff(record, ("x", "NS", "ns1.example.net.", 1, False, "")) == []
+        record = {"record_type": "A", "content": "192.0.2.1", "ttl": 300, "proxied": False}
+        assert record_diff(record, ("x", "A", "192.0.2.2", 1, False, "")) == ["content", "ttl"]
+
+
+class TestReconciler:
+    """Drift report and repair"""
+
+    def test_report(self):
+        fake, docs, moved = drifted_zone()
+        reconciler, _ = make(fake, docs)
+        report = asyncio.run(reconciler.reconcile({ZONE: ["example.com"]}))
+        assert report["status"] == "finished"
+        assert report["counts"] == {"ghosts": 1, "orphans": 2, "mismatches": 1, "relinked": 1}
+        assert report["skipped"] == 1
+        assert report["ghosts"][0]["full_name"] == "ghost.example.com"
+        orphans = {o["full_name"]: o["managed"] for o in report["orphans"]}
+        assert orphans == {"orphan.example.com": True, "www.example.com": False}
+        assert report["mismatches"][0]["fields"] == ["content"]
+        assert report["relinked"][0]["new_cf_id"] == moved["id"]
+        assert fake.calls["POST"] == 0
+
+    def test_repair_converges(self):
+        fake, docs, moved = drifted_zone()
+        reconciler, records = make(fake, docs)
+        report = asyncio.run(reconciler.reconcile({ZONE: ["example.com"]}, repair=True))
+        assert report["repaired"] == {"ghosts": 1, "orphans": 1, "mismatches": 1, "relinked": 1}
+
+        names = {r["name"]: r for r in fake.records(ZONE)}
+        assert "orphan.example.com" not in names
+        # The operator's dashboard record is left alone
+        assert names["www.example.com"]["content"] == "example.com"
+        assert names["ghost.example.com"]["comment"] == MANAGED_COMMENT
+        assert names["changed.example.com"]["content"] == "2001:db8::1"
+        by_id = {d["id"]: d for d in records.docs}
+        assert by_id["id-ghost"]["cf_id"] == names["ghost.example.com"]["id"]
+        assert by_id["id-moved"]["cf_id"] == moved["id"]
+
+        for record in fake.records(ZONE):
+            record["modified_on"] = OLD
+        again = asyncio.run(reconciler.reconcile({ZONE: ["example.com"]}, repair=True))
+        assert again["counts"] == {"ghosts": 0, "orphans": 1, "mismatches": 0, "relinked": 0}
+        assert again["repaired"]["orphans"] == 0 and "www.example.com" in {r["name"] for r in fake.records(ZONE)}
+
+    def test_unprovisioned_records_are_skipped(self):
+        fake = FakeCloudflare()
+        fake.add_record(ZONE, "A", "halfway.example.com", "192.0.2.1")
+        docs = [
+            mongo_record("halfway", None, status="pending"),
+            mongo_record("rejected", None, status="failed"),
+        ]
+        reconciler, _ = make(fake, docs)
+        report = asyncio.run(reconciler.reconcile({ZONE: ["example.com"]}))
+        assert report["counts"] == {"ghosts": 0, "orphans": 0, "mismatches": 0, "relinked": 0}
+        assert report["skipped"] == 2
+
+    def test_zone_errors_are_reported(self):
+        fake = FakeCloudflare(rate_limit_every=1)
+        reconciler, _ = make(fake, [])
+        report = asyncio.run(reconciler.reconcile({ZONE: ["example.com"]}))
+        assert report["status"] == "finished"
+        assert report["errors"][0]["zone_id"] == ZONE
+
+    def test_one_run_across_processes(self):
+        fake, docs, _ = drifted_zone()
+        leases = Collection()
+        first, _ = make(fake, docs, Lease(leases, "reconcile", "a"))
+        second, _ = make(fake, docs, Lease(leases, "reconcile", "b"))
+        zones = {ZONE: ["example.com"]}
+
+        async def run():
+            assert await first.start(zones)
+            assert not await first.start(zones)
+            # Another worker (manual or periodic) is kept out until the first run ends
+            assert not await second.start(zones) and not second.running
+            assert await second.reconcile(zones) is None
+            await first._task
+            return await second.reconcile(zones)
+
+        report = asyncio.run(run())
+        assert report["status"] == "finished" and not first.running
+        # Released once done
+        lease = asyncio.run(leases.find_one({"_id": "reconcile"}))
+        assert lease["owner"] == "b" and lease["expires_at"] == 0
@@ -0,0 +1,59 @@
+"""
+Unit tests for the per-zone record-name index (record_index.py)
+- Paging a zone in from Cloudflare
+- Local create/delete bookkeeping, including writes during a refresh
+"""
+import asyncio
+
+from record_index import ZoneNameIndex
+
+
+class FakeCF:
+    """Serves a fixed zone two names per page"""
+
+    def __init__(self, names):
+        self.names = names
+        self.requests = 0
+
+    async def request(self, method, path, params=None, json=None):
+        self.requests += 1
+        page, per_page = params["page"], 2
+        chunk = self.names[(page - 1) * per_page:page * per_page]
+        total_pages = max(1, -(-len(self.names) // per_page))
+        await asyncio.sleep(0)
+        return {
+            "success": True,
+            "result": [{"name": n} for n in chunk],
+            "result_info": {"page": page, "total_pages": total_pages},
+        }
+
+
+class TestZoneNameIndex:
+    """Index lookups and maintenance"""
+
+    def test_unloaded_zone_returns_none(self):
+        index = ZoneNameIndex(FakeCF([]))
+        assert index.contains("zone1", "a.example.com") is None
+
+    def test_load_pages_through_zone(self):
+        cf = FakeCF(["a.example.com", "B.example.com", "c.example.com"])
+        index = ZoneNameIndex(cf)
+        asyncio.run(index.refresh(["zone1"]))
+        assert cf.requests == 2
+        assert index.contains("zone1", "b.example.com") is True
+        assert index.contains("zone1", "d.example.com") is False
+
+    def test_local_writes_during_refresh_are_kept(self):
+        cf = FakeCF(["a.example.com", "b.example.com", "c.example.com"])
+        index = ZoneNameIndex(cf)
+
+        async def run():
+            load = asyncio.create_task(index.load_zone("zone1"))
+            await asyncio.sleep(0)
+            index.add("zone1", "new.example.com")
+            index.discard("zone1", "a.example.com")
+            await load
+
+        asyncio.run(run())
+        assert index.contains("zone1", "new.example.com") is True
+        assert index.contains("zone1", "a.example.com") is False
@@ -0,0 +1,123 @@
+"""
+Unit tests for Mongo leases and the leader-run scheduler (scheduler.py)
+- One owner at a time; expired leases can be taken over, released ones immediately
+- Lease.hold serializes critical sections across processes
+- Only the leader runs jobs, each once per interval, and a new leader keeps the cadence
+"""
+import asyncio
+
+from conftest import Collection
+from scheduler import Lease, Scheduler
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestLease:
+    """Acquire, renew, expire, release"""
+
+    def test_single_owner(self):
+        clock = Clock()
+        leases = Collection()
+        a = Lease(leases, "job", "a", ttl=30, clock=clock)
+        b = Lease(leases, "job", "b", ttl=30, clock=clock)
+
+        async def run():
+            assert await a.acquire() and a.held
+            assert not await b.acquire()
+            clock.now += 20
+            assert await a.acquire()          # renewal pushes the expiry
+            clock.now += 20
+            assert not await b.acquire()
+            clock.now += 31
+            assert await b.acquire()          # a stopped renewing
+            assert not await a.acquire() and not a.held
+            await b.release()
+            assert await a.acquire()
+
+        asyncio.run(run())
+
+    def test_hold_serializes(self):
+        leases = Collection()
+        inside = []
+
+        async def worker(name):
+            async with Lease(leases, "startup", name, ttl=30).hold(poll_interval=0.001):
+                inside.append(name)
+                assert len(inside) == 1
+                await asyncio.sleep(0.01)
+                inside.remove(name)
+            return name
+
+        async def run():
+            return await asyncio.gather(*(worker(f"w{i}") for i in range(3)))
+
+        assert asyncio.run(run()) == ["w0", "w1", "w2"]
+
+
+class TestScheduler:
+    """Leader-only periodic jobs"""
+
+    def test_only_leader_runs_jobs(self):
+        clock = Clock()
+        leases, jobs = Collection(), Collection()
+        runs = []
+
+        def scheduler(owner):
+            s = Scheduler(leases, jobs, owner, ttl=30, clock=clock)
+
+            async def job():
+                runs.append(owner)
+
+            s.every("recount", 60, job, initial_delay=0)
+            return s
+
+        a, b = scheduler("a"), scheduler("b")
+
+        async def step(*schedulers):
+            for s in schedulers:
+                await s.step()
+                await asyncio.gather(*(j.task for j in s.jobs.values() if j.task))
+
+        async def run():
+            await step(a, b)
+            assert runs == ["a"] and a.is_leader and not b.is_leader
+            clock.now += 30
+            await step(a, b)
+            assert runs == ["a"]             # not due yet
+            clock.now += 31
+            await step(a, b)
+            assert runs == ["a", "a"]
+            # a dies; b takes over once the lease expires and keeps the 60s cadence
+            clock.now += 31
+            await step(b)
+            assert b.is_leader and runs == ["a", "a"]
+            clock.now += 30
+            await step(b)
+            assert runs == ["a", "a", "b"]
+            status = await b.status()
+            assert status["leader"] == "b" and status["jobs"][0]["name"] == "recount"
+
+        asyncio.run(run())
+
+    def test_failed_job_is_recorded(self):
+        leases, jobs = Collection(), Collection()
+        s = Scheduler(leases, jobs, "a", ttl=30)
+
+        async def broken():
+            raise RuntimeError("boom")
+
+        s.every("broken", 60, broken, initial_delay=0)
+
+        async def run():
+            await s.step()
+            await s.jobs["broken"].task
+
+        asyncio.run(run())
+        assert jobs.get("broken")["last_error"] == "boom"
+        assert jobs.get("broken")["running_on"] is None
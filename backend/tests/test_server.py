@@ -0,0 +1,377 @@
+"""
+Route tests for server.py over an in-memory database and fake_cloudflare.py
+- Record provisioning status: ?wait is bounded and must be a finite number
+- Email verification: wrong (including non-ASCII) codes count as attempts instead of failing
+- Metrics token: a non-ASCII Authorization header is a 401
+- NDJSON exports clamp ?limit to at least 1, like the paginated responses
+- Admin domains: renaming onto an existing name is a 400, not a 500
+- Bulk records: a rejected Cloudflare chunk fails only its items, the plan limit counts the
+  whole batch (deletes included), and a create that loses its name in Mongo is rolled back
+- dyndns (/nic/update): badauth, notfqdn, numhost, nohost, nochg, good, address family
+  selection, client address fallback (forwarded headers only from the local proxy) and
+  911 for records still being provisioned
+- Admin listings: the record count $lookup falls back to let/$expr before MongoDB 5.0
+"""
+import asyncio
+import base64
+import json
+import os
+import uuid
+
+import httpx
+import pytest
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:1")
+os.environ.setdefault("DB_NAME", "test")
+os.environ.setdefault("JWT_SECRET", "route-tests-secret-0123456789abcdef")
+
+import server  # noqa: E402
+from cf_client import CloudflareClient  # noqa: E402
+from conftest import Collection, Database  # noqa: E402
+from domain_registry import DomainRegistry  # noqa: E402
+from fake_cloudflare import FakeCloudflare, FakeCloudflareError  # noqa: E402
+from user_cache import TTLCache  # noqa: E402
+
+ZONE = "zone1"
+
+
+# --- app wiring ---
+
+class API:
+    """Server state for one test: fake database, fake Cloudflare and an HTTP client"""
+
+    def __init__(self, monkeypatch):
+        self.db = Database(
+            users=Collection(unique=("id", "email")),
+            # update_token_hash is unique and sparse, like migration 2
+            dns_records=Collection(unique=("id", "full_name", "update_token_hash")),
+            domains=Collection(unique=("id", "name")),
+        )
+        self.cloudflare = FakeCloudflare()
+        self.cloudflare.zones[ZONE] = {}
+        cf = CloudflareClient("token", transport=self.cloudflare.transport(), max_retries=0)
+        monkeypatch.setattr(server, "db", self.db)
+        monkeypatch.setattr(server, "cf", cf)
+        monkeypatch.setattr(server.record_index, "cf", cf)
+        monkeypatch.setattr(server, "user_cache", TTLCache(ttl=0))
+        monkeypatch.setattr(server, "domain_registry", DomainRegistry(self.db.domains))
+        monkeypatch.setattr(server.stats, "collection", self.db.stats)
+        monkeypatch.setattr(server.stats, "db", self.db)
+        monkeypatch.setattr(server.provisioner, "records", self.db.dns_records)
+        monkeypatch.setattr(server.provisioner, "jobs", self.db.record_jobs)
+        monkeypatch.setattr(server.rate_limiter, "enabled", False)
+        monkeypatch.setattr(server.broadcast, "collection", self.db.changes)
+        monkeypatch.setattr(server.update_queue, "collection", self.db.cf_outbox)
+        monkeypatch.setattr(server.email_outbox, "collection", self.db.email_outbox)
+        self.domain = {
+            "id": "dom1", "name": "example.com", "zone_id": ZONE, "active": True,
+            "created_at": "2026-01-01T00:00:00+00:00",
+        }
+        self.db.domains.docs.append(dict(self.domain))
+
+    def user(self, role="user", plan="free", **fields):
+        user_id = str(uuid.uuid4())
+        email = f"{user_id[:8]}@gmail.com"
+        self.db.users.docs.append({
+            "id": user_id, "email": email, "password_hash": "x", "plan": plan, "role": role, "verified": True,
+            "created_at": "2026-01-01T00:00:00+00:00", **fields,
+        })
+        return user_id, {"Authorization": f"Bearer {server.create_token(user_id, email, role, plan)}"}
+
+    def record(self, user_id, name, record_type="A", content="192.0.2.1", **fields):
+        full_name = f"{name}.example.com"
+        cf_record = self.cloudflare.add_record(ZONE, record_type, full_name, content)
+        doc = {
+            "id": str(uuid.uuid4()), "cf_id": cf_record["id"], "user_id": user_id, "domain_id": "dom1",
+            "domain_name": "example.com", "zone_id": ZONE, "record_type": record_type, "name": name,
+            "full_name": full_name, "content": content, "ttl": 1, "proxied": False,
+            "created_at": "2026-01-01T00:00:00+00:00", **fields,
+        }
+        self.db.dns_records._check_unique(doc)
+        self.db.dns_records.docs.append(doc)
+        return doc
+
+    def run(self, scenario, peer=("127.0.0.1", 123)):
+        async def main():
+            transport = httpx.ASGITransport(app=server.app, client=peer)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await scenario(client)
+
+        return asyncio.run(main())
+
+
+@pytest.fixture
+def api(monkeypatch):
+    return API(monkeypatch)
+
+
+class TestRecordStatus:
+    """GET /api/dns/records/{id}/status"""
+
+    def test_wait_must_be_finite(self, api):
+        user_id, headers = api.user()
+        record = api.record(user_id, "home", status="pending")
+
+        async def scenario(client):
+            path = f"/api/dns/records/{record['id']}/status"
+            bad = [(await client.get(path, params={"wait": w}, headers=headers)).status_code for w in ("nan", "-1")]
+            now = await client.get(path, params={"wait": 0}, headers=headers)
+            return bad, now.json()
+
+        bad, now = api.run(scenario)
+        assert bad == [422, 422]
+        assert now["status"] == "pending"
+
+
+class TestVerifyEmail:
+    """POST /api/auth/verify"""
+
+    def test_non_ascii_code_is_a_wrong_code(self, api):
+        user_id, _ = api.user(verified=False, verification_code="123456", code_expires_at="2999-01-01T00:00:00+00:00")
+        email = api.db.users.docs[0]["email"]
+
+        async def scenario(client):
+            wrong = await client.post("/api/auth/verify", json={"email": email, "code": "é"})
+            right = await client.post("/api/auth/verify", json={"email": email, "code": "123456"})
+            return wrong, right
+
+        wrong, right = api.run(scenario)
+        assert wrong.status_code == 400 and wrong.json()["detail"] == "Invalid verification code"
+        assert right.status_code == 200
+        assert api.db.users.docs[0]["verified"] is True
+
+
+class TestMetrics:
+    """GET /api/metrics"""
+
+    def test_token(self, api, monkeypatch):
+        monkeypatch.setattr(server, "METRICS_TOKEN", "s3cret")
+
+        async def scenario(client):
+            return [
+                (await client.get("/api/metrics", headers={"Authorization": value})).status_code
+                for value in (b"Bearer \xe9t\xe9", "Bearer wrong", "Bearer s3cret")
+            ]
+
+        assert api.run(scenario) == [401, 401, 200]
+
+
+class TestNDJSON:
+    """Accept: application/x-ndjson on the list endpoints"""
+
+    def test_limit_is_clamped(self, api):
+        api.db.domains.docs.append({**api.domain, "id": "dom2", "name": "example.net", "created_at": "2026-01-02T00:00:00+00:00"})
+        user_id, headers = api.user()
+        api.record(user_id, "one")
+        api.record(user_id, "two", created_at="2026-01-02T00:00:00+00:00")
+        headers = {**headers, "Accept": "application/x-ndjson"}
+
+        async def scenario(client):
+            names = {}
+            for path, field in (("/api/domains", "name"), ("/api/dns/records", "name")):
+                for limit in (None, -1, 0, 1):
+                    params = {} if limit is None else {"limit": limit}
+                    response = await client.get(path, params=params, headers=headers)
+                    names[path, limit] = [json.loads(line)[field] for line in response.text.splitlines()]
+            return names
+
+        names = api.run(scenario)
+        assert names["/api/domains", None] == ["example.com", "example.net"]
+        assert names["/api/dns/records", None] == ["one", "two"]
+        for limit in (-1, 0, 1):
+            assert names["/api/domains", limit] == ["example.com"]
+            assert names["/api/dns/records", limit] == ["one"]
+
+
+class TestAdminDomains:
+    """PUT /api/admin/domains/{id}"""
+
+    def test_rename_to_existing_name(self, api):
+        api.db.domains.docs.append({**api.domain, "id": "dom2", "name": "example.net"})
+        _, headers = api.user(role="admin")
+
+        async def scenario(client):
+            taken = await client.put("/api/admin/domains/dom2", json={"name": "Example.com"}, headers=headers)
+            free = await client.put("/api/admin/domains/dom2", json={"name": "example.org"}, headers=headers)
+            return taken, free
+
+        taken, free = api.run(scenario)
+        assert taken.status_code == 400 and taken.json()["detail"] == "Domain already exists"
+        assert free.status_code == 200 and free.json()["name"] == "example.org"
+
+
+class TestBulkRecords:
+    """POST /api/dns/records/bulk"""
+
+    @staticmethod
+    def create(name):
+        return {"action": "create", "record_type": "A", "name": name, "content": "192.0.2.10", "domain_id": "dom1"}
+
+    def post(self, api, headers, operations):
+        async def scenario(client):
+            return await client.post("/api/dns/records/bulk", json={"operations": operations}, headers=headers)
+
+        response = api.run(scenario)
+        assert response.status_code == 200
+        return response.json()
+
+    def names(self, api, user_id):
+        mongo = sorted(d["name"] for d in api.db.dns_records.docs if d["user_id"] == user_id)
+        cloudflare = sorted(r["name"] for r in api.cloudflare.records(ZONE))
+        return mongo, cloudflare
+
+    def test_rejected_chunk(self, api, monkeypatch):
+        user_id, headers = api.user(plan="premium")
+        monkeypatch.setattr(server, "CF_BATCH_SIZE", 2)
+        batch = api.cloudflare._batch
+
+        def reject_c(zone_id, records, body):
+            if any(post["name"] == "c.example.com" for post in body.get("posts") or []):
+                raise FakeCloudflareError(400, 81053, "An A, AAAA, or CNAME record with that host already exists.")
+            return batch(zone_id, records, body)
+
+        monkeypatch.setattr(api.cloudflare, "_batch", reject_c)
+        body = self.post(api, headers, [self.create(name) for name in "abcd"])
+        assert [r["status"] for r in body["results"]] == ["ok", "ok", "error", "error"]
+        assert "already exists" in body["results"][3]["error"]
+        assert (body["succeeded"], body["failed"]) == (2, 2)
+        assert self.names(api, user_id) == (["a", "b"], ["a.example.com", "b.example.com"])
+
+    def test_plan_limit_counts_the_batch(self, api):
+        user_id, headers = api.user()
+        old = api.record(user_id, "old")
+        limit = server.FREE_RECORD_LIMIT
+        names = [f"r{i}" for i in range(limit)]
+        # Deleting one record frees the slot it used
+        body = self.post(api, headers, [self.create(name) for name in names] + [{"action": "delete", "id": old["id"]}])
+        assert body["failed"] == 0
+        body = self.post(api, headers, [self.create("extra")])
+        assert body["results"][0]["error"] == "Free plan limit reached. Upgrade to create more records."
+        assert self.names(api, user_id)[0] == names
+
+    def test_lost_name_is_rolled_back(self, api, monkeypatch):
+        user_id, headers = api.user(plan="premium")
+        other_id, _ = api.user(plan="premium")
+        batch_records = server.cf_batch_records
+
+        async def concurrent_create(zone_id, **ops):
+            # Another request claims "b" between our screening and our Mongo write
+            api.db.dns_records.docs.append({"id": "theirs", "user_id": other_id, "name": "b", "full_name": "b.example.com"})
+            return await batch_records(zone_id, **ops)
+
+        monkeypatch.setattr(server, "cf_batch_records", concurrent_create)
+        body = self.post(api, headers, [self.create("a"), self.create("b")])
+        assert [r["status"] for r in body["results"]] == ["ok", "error"]
+        assert body["results"][1]["error"] == "This subdomain is already taken"
+        assert self.names(api, user_id) == (["a"], ["a.example.com"])
+
+
+class TestDyndns:
+    """GET /nic/update and its helpers"""
+
+    def test_pick_update_ip(self):
+        assert server.pick_update_ip("A", ["bad", "2001:db8::1", " 192.0.2.5 "]) == "192.0.2.5"
+        assert server.pick_update_ip("AAAA", ["192.0.2.5", "2001:DB8:0::1"]) == "2001:db8::1"
+        assert server.pick_update_ip("A", ["2001:db8::1"]) is None
+
+    def update(self, api, *requests, peer="127.0.0.1"):
+        async def scenario(client):
+            responses = []
+            for params, headers in requests:
+                response = await client.get("/nic/update", params=params, headers=headers or {})
+                responses.append((response.status_code, response.text))
+            return responses
+
+        return api.run(scenario, peer=(peer, 40000))
+
+    def test_responses(self, api):
+        user_id, _ = api.user()
+        token_hash = server.hash_update_token("tok")
+        home = api.record(user_id, "home", content="192.0.2.1", update_token_hash=token_hash)
+        api.record(user_id, "home6", "AAAA", "2001:db8::1", update_token_hash=server.hash_update_token("tok6"))
+        api.record(user_id, "new", status="pending", update_token_hash=server.hash_update_token("tok-new"))
+        basic = {"Authorization": "Basic " + base64.b64encode(b"me:tok").decode()}
+        too_many = ",".join(f"h{i}.example.com" for i in range(server.DYNDNS_MAX_HOSTS + 1))
+
+        responses = self.update(
+            api,
+            ({"hostname": "home.example.com"}, None),
+            ({"hostname": ""}, basic),
+            ({"hostname": too_many}, basic),
+            ({"hostname": "home.example.com", "token": "wrong"}, None),
+            ({"hostname": "home6.example.com"}, basic),
+            ({"hostname": "home.example.com", "myip": "192.0.2.1"}, basic),
+            ({"hostname": "HOME.example.com.", "myip": "2001:db8::7,192.0.2.7"}, basic),
+            ({"hostname": "new.example.com", "token": "tok-new", "myip": "192.0.2.8"}, None),
+        )
+        assert responses == [
+            (401, "badauth"),
+            (200, "notfqdn"),
+            (200, "numhost"),
+            (200, "nohost"),
+            # The token belongs to another record
+            (200, "nohost"),
+            (200, "nochg 192.0.2.1"),
+            (200, "good 192.0.2.7"),
+            (200, "911"),
+        ]
+        assert api.db.dns_records.docs[0]["content"] == "192.0.2.7"
+        assert api.cloudflare.zones[ZONE][home["cf_id"]]["content"] == "192.0.2.7"
+
+    def test_address_family_and_client_address(self, api):
+        user_id, _ = api.user()
+        api.record(user_id, "home", content="192.0.2.1", update_token_hash=server.hash_update_token("tok"))
+        api.record(user_id, "home6", "AAAA", "2001:db8::1", update_token_hash=server.hash_update_token("tok6"))
+        both = "home.example.com,home6.example.com"
+        # Set by nginx on this host
+        forwarded = {"X-Real-IP": "192.0.2.9"}
+
+        responses = self.update(
+            api,
+            # A token updates only its own record
+            ({"hostname": both, "token": "tok", "myip": "2001:db8::7,192.0.2.7"}, None),
+            ({"hostname": "home6.example.com", "token": "tok6", "myip": "2001:db8::7,192.0.2.7"}, None),
+            # No myip: the client address, which only fits the A record
+            ({"hostname": "home.example.com", "token": "tok"}, forwarded),
+            ({"hostname": "home6.example.com", "token": "tok6"}, forwarded),
+        )
+        assert responses == [
+            (200, "good 192.0.2.7\nnohost"),
+            (200, "good 2001:db8::7"),
+            (200, "good 192.0.2.9"),
+            (200, "dnserr"),
+        ]
+
+    def test_forwarded_headers_only_from_local_proxy(self, api):
+        user_id, _ = api.user()
+        api.record(user_id, "home", content="192.0.2.1", update_token_hash=server.hash_update_token("tok"))
+        forged = {"X-Real-IP": "192.0.2.66", "X-Forwarded-For": "192.0.2.66"}
+        params = {"hostname": "home.example.com", "token": "tok"}
+
+        assert self.update(api, (params, forged), peer="198.51.100.7") == [(200, "good 198.51.100.7")]
+        # Through nginx, X-Forwarded-For holds whatever the client sent first
+        assert self.update(api, (params, {"X-Forwarded-For": "192.0.2.66, 198.51.100.8"})) == [(200, "good 127.0.0.1")]
+
+
+class TestAdminListing:
+    """Record counts joined into the admin user and domain listings"""
+
+    def test_lookup_follows_server_version(self, api, monkeypatch):
+        monkeypatch.setattr(server, "lookup_local_field", True)
+        versions = iter([[7, 0, 2, 0], [4, 4, 29, 0]])
+
+        async def command(name):
+            assert name == "buildInfo"
+            return {"versionArray": next(versions)}
+
+        api.db.command = command
+        lookups = []
+        for _ in range(2):
+            asyncio.run(server.detect_lookup_support())
+            lookups.append(server.record_count_stages("user_id")[0]["$lookup"])
+
+        modern, legacy = lookups
+        assert (modern["localField"], modern["foreignField"]) == ("id", "user_id")
+        assert "let" not in modern and "localField" not in legacy
+        assert legacy["pipeline"][0] == {"$match": {"$expr": {"$eq": ["$user_id", "$$owner"]}}}
+        assert legacy["let"] == {"owner": "$id"}
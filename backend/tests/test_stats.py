@@ -0,0 +1,97 @@
+"""
+Unit tests for the materialized admin counters (stats.py)
+- incr adjusts the global counters and today's activity bucket, and never raises
+- recount overwrites drifted counters with exact values and snapshots them for today
+- get recounts when counters are missing
+- history returns only daily buckets within the range, oldest first
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from conftest import Collection, Database
+from stats import COUNTERS, GLOBAL_ID, StatsCounters
+
+
+def today(days_ago=0):
+    return (datetime.now(timezone.utc) - timedelta(days=days_ago)).strftime("%Y-%m-%d")
+
+
+def make_stats():
+    db = Database(
+        users=Collection([{"plan": "free", "verified": True}, {"plan": "premium", "verified": True}, {"plan": "free"}]),
+        dns_records=Collection([{}, {}]),
+        domains=Collection([{"active": True}, {"active": False}]),
+    )
+    return StatsCounters(Collection(), db)
+
+
+EXACT = {
+    "total_users": 3, "verified_users": 2, "free_users": 2, "premium_users": 1,
+    "total_records": 2, "total_domains": 2, "active_domains": 1,
+}
+
+
+class TestCounters:
+    """incr, recount and get"""
+
+    def test_incr(self):
+        stats = make_stats()
+
+        async def run():
+            await stats.incr({"total_records": 1}, {"records_created": 1})
+            await stats.incr({"total_records": 1}, {"records_created": 2})
+            await stats.incr({}, {"registrations": 1})
+            await stats.incr({}, {})
+
+        asyncio.run(run())
+        assert stats.collection.get(GLOBAL_ID)["total_records"] == 2
+        daily = stats.collection.get(f"daily:{today()}")
+        assert daily == {"_id": f"daily:{today()}", "date": today(), "records_created": 3, "registrations": 1}
+
+    def test_incr_swallows_errors(self):
+        stats = make_stats()
+
+        async def no_primary(requests, ordered=True):
+            raise ConnectionError("no primary")
+
+        stats.collection.bulk_write = no_primary
+        asyncio.run(stats.incr({"total_users": 1}, {"registrations": 1}))
+        assert stats.collection.docs == []
+
+    def test_recount_fixes_drift(self):
+        stats = make_stats()
+        stats.collection.docs.append({"_id": GLOBAL_ID, "total_records": 40, "total_users": -1})
+
+        async def run():
+            counts = await stats.recount()
+            await stats.incr({"total_records": 1}, {"records_created": 1})
+            return counts
+
+        assert asyncio.run(run()) == EXACT
+        doc = stats.collection.get(GLOBAL_ID)
+        assert {name: doc[name] for name in COUNTERS} == {**EXACT, "total_records": 3}
+        assert "recounted_at" in doc
+        # The snapshot keeps the recounted totals next to the day's activity
+        daily = stats.collection.get(f"daily:{today()}")
+        assert daily["totals"] == EXACT and daily["records_created"] == 1
+
+    def test_get_recounts_missing_counters(self):
+        stats = make_stats()
+        stats.collection.docs.append({"_id": GLOBAL_ID, "total_records": 5})
+        doc = asyncio.run(stats.get())
+        assert "_id" not in doc
+        assert {name: doc[name] for name in COUNTERS} == EXACT
+
+
+class TestHistory:
+    """Daily buckets"""
+
+    def test_range(self):
+        stats = make_stats()
+        for days_ago in (0, 1, 6, 7, 30):
+            stats.collection.docs.append({"_id": f"daily:{today(days_ago)}", "date": today(days_ago)})
+        stats.collection.docs.append({"_id": GLOBAL_ID, "total_records": 5})
+
+        history = asyncio.run(stats.history(days=7))
+        assert [bucket["date"] for bucket in history] == [today(6), today(1), today()]
+        assert all("_id" not in bucket for bucket in history)
@@ -0,0 +1,132 @@
+"""
+Unit tests for the Cloudflare write-behind queue (update_queue.py)
+- Updates to one record inside the window are coalesced into one send of the latest payload
+- An update enqueued while the previous one was being sent is not lost (seq guard)
+- Failed sends back off exponentially up to retry_backoff_max
+- After max_attempts the item is kept as failed and reported, and a new update revives it
+"""
+import asyncio
+import time
+
+import pytest
+
+from conftest import Collection
+from update_queue import WriteBehindQueue
+
+
+class Cloudflare:
+    """send() stand-in recording payloads; raises while ``failing``"""
+
+    def __init__(self):
+        self.sent = []
+        self.failing = False
+        self.during_send = None
+
+    async def send(self, zone_id, cf_id, payload):
+        if self.during_send:
+            hook, self.during_send = self.during_send, None
+            await hook()
+        if self.failing:
+            raise RuntimeError("502 Bad Gateway")
+        self.sent.append((zone_id, cf_id, payload["content"]))
+
+
+def make_queue(**options):
+    cloudflare = Cloudflare()
+    queue = WriteBehindQueue(Collection(), cloudflare.send, **options)
+    return queue, cloudflare
+
+
+def make_due(queue, cf_id="cf1"):
+    queue.collection.get(cf_id)["due_at"] = 0
+
+
+def update(content):
+    return {"type": "A", "name": "home.example.com", "content": content, "ttl": 1, "proxied": False}
+
+
+class TestCoalescing:
+    """Window and seq guard"""
+
+    def test_latest_payload_wins(self):
+        queue, cloudflare = make_queue(window=5)
+
+        async def run():
+            await queue.enqueue("zone1", "cf1", update("192.0.2.1"))
+            due_at = queue.collection.get("cf1")["due_at"]
+            await queue.enqueue("zone1", "cf1", update("192.0.2.2"))
+            # The window isn't restarted by later updates
+            assert queue.collection.get("cf1")["due_at"] == due_at
+            early = await queue.flush_due()
+            make_due(queue)
+            return early, await queue.flush_due()
+
+        assert asyncio.run(run()) == (0, 1)
+        assert cloudflare.sent == [("zone1", "cf1", "192.0.2.2")]
+        assert queue.collection.docs == []
+
+    def test_update_during_send_is_kept(self):
+        queue, cloudflare = make_queue()
+
+        async def run():
+            await queue.enqueue("zone1", "cf1", update("192.0.2.1"))
+            make_due(queue)
+            cloudflare.during_send = lambda: queue.enqueue("zone1", "cf1", update("192.0.2.2"))
+            await queue.flush_due()
+            assert queue.collection.get("cf1")["due_at"] <= time.time()
+            await queue.flush_due()
+
+        asyncio.run(run())
+        assert [content for _, _, content in cloudflare.sent] == ["192.0.2.1", "192.0.2.2"]
+        assert queue.collection.docs == []
+
+
+class TestFailures:
+    """Backoff, giving up and recovery"""
+
+    def test_backoff(self):
+        queue, cloudflare = make_queue(window=5, retry_backoff_max=30)
+        cloudflare.failing = True
+
+        async def run():
+            await queue.enqueue("zone1", "cf1", update("192.0.2.1"))
+            delays = []
+            for _ in range(3):
+                make_due(queue)
+                started = time.time()
+                await queue.flush_due()
+                delays.append(queue.collection.get("cf1")["due_at"] - started)
+            return delays
+
+        delays = asyncio.run(run())
+        assert delays == [pytest.approx(d, abs=1) for d in (10, 20, 30)]
+        doc = queue.collection.get("cf1")
+        assert doc["attempts"] == 3 and doc["last_error"] == "502 Bad Gateway"
+
+    def test_kept_as_failed_then_revived(self):
+        failures = []
+        queue, cloudflare = make_queue(max_attempts=2, on_failed=lambda item, error: failures.append((item["_id"], error)))
+        cloudflare.failing = True
+
+        async def run():
+            await queue.enqueue("zone1", "cf1", update("192.0.2.1"))
+            await queue.enqueue("zone1", "cf2", update("192.0.2.9"))
+            for _ in range(2):
+                make_due(queue)
+                await queue.flush_due()
+            failed = dict(queue.collection.get("cf1"))
+            stats = await queue.stats()
+            # Never claimed again
+            assert await queue.flush_due() == 0
+            cloudflare.failing = False
+            await queue.enqueue("zone1", "cf1", update("192.0.2.3"))
+            make_due(queue)
+            await queue.flush_due()
+            return failed, stats
+
+        failed, stats = asyncio.run(run())
+        assert failed["status"] == "failed" and failed["attempts"] == 2 and "due_at" not in failed
+        assert failures == [("cf1", "502 Bad Gateway")]
+        assert stats["depth"] == 1 and stats["failed"] == 1
+        assert cloudflare.sent == [("zone1", "cf1", "192.0.2.3")]
+        assert [d["_id"] for d in queue.collection.docs] == ["cf2"]
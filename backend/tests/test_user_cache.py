@@ -0,0 +1,43 @@
+"""
+Unit tests for the TTL + LRU user cache (user_cache.py)
+- Expiry after the TTL
+- Least recently used entries are evicted first
+- Explicit invalidation
+"""
+import time
+
+from user_cache import TTLCache
+
+
+class TestTTLCache:
+    """Cache hits, expiry and eviction"""
+
+    def test_hit_and_invalidate(self):
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("u1", {"id": "u1"})
+        assert cache.get("u1") == {"id": "u1"}
+        cache.invalidate("u1")
+        assert cache.get("u1") is None
+        assert cache.hits == 1 and cache.misses == 1
+
+    def test_expires_after_ttl(self):
+        cache = TTLCache(maxsize=10, ttl=0.01)
+        cache.set("u1", {"id": "u1"})
+        time.sleep(0.02)
+        assert cache.get("u1") is None
+        assert len(cache) == 0
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_disabled_when_ttl_zero(self):
+        cache = TTLCache(maxsize=10, ttl=0)
+        cache.set("a", 1)
+        assert cache.get("a") is None
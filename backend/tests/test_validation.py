@@ -0,0 +1,118 @@
+"""
+Unit tests for record validation (validation.py)
+- Addresses: IPv4 octets and leading zeros, IPv6 spellings and garbage like ":::::"
+- Non-ASCII digits and trailing newlines are rejected everywhere
+- Host-name targets (single-label CNAME targets allowed), subdomain labels and SRV/TXT underscore owners
+- TXT, MX, SRV and CAA presentation formats
+- Batch validation: per-item errors aligned with the input, allowed types, name skipping
+"""
+from validation import RECORD_TYPES, is_hostname, record_content_error, record_error, record_name_error, validate_records
+
+
+class TestAddresses:
+    """A and AAAA"""
+
+    def test_ipv4(self):
+        for content in ["192.0.2.1", "0.0.0.0", "255.255.255.255"]:
+            assert record_content_error("A", content) is None
+        for content in ["256.1.1.1", "1.2.3", "01.2.3.4", "1.2.3.4 ", "a.b.c.d", "", "1.2.3.\u0664", "1.2.3.4\n"]:
+            assert record_content_error("A", content) == "Invalid IPv4 address"
+
+    def test_ipv6(self):
+        for content in ["2001:db8::1", "::1", "::", "fe80::1:2:3:4", "::ffff:192.0.2.1", "2001:DB8:0:0:0:0:0:1"]:
+            assert record_content_error("AAAA", content) is None
+        for content in [":::::", "2001:db8:::1", "1:2:3:4:5:6:7:8:9", "2001:db8::g", "192.0.2.1", "fe80::1%eth0"]:
+            assert record_content_error("AAAA", content) == "Invalid IPv6 address"
+
+
+class TestNames:
+    """Host names and owners"""
+
+    def test_hostnames(self):
+        assert is_hostname("ns1.example.com")
+        assert is_hostname("a-b.c0.example")
+        assert not is_hostname("ns1.example.com\n")
+        for value in ["localhost", "-a.example.com", "a-.example.com", "a..example.com", "example.com.",
+                      "a_b.example.com", ("a" * 64) + ".com", ".".join(["a" * 60] * 5)]:
+            assert not is_hostname(value), value
+        assert record_content_error("CNAME", "target.example.net") is None
+        # Unlike nameservers, CNAME targets may be a single label
+        assert record_content_error("CNAME", "localhost") is None
+        for value in ["-a", "a..b", "target.example.net.", "target\n", ("a" * 64)]:
+            assert record_content_error("CNAME", value) == "Invalid CNAME target", value
+        assert record_content_error("NS", "ns1") == "Invalid nameserver (e.g. ns1.example.com)"
+
+    def test_subdomains(self):
+        assert record_name_error("home-1") is None
+        assert record_name_error("-home") is not None
+        assert record_name_error("home\n") is not None
+        assert record_name_error("_sip._tcp\n", "SRV") is not None
+        assert record_name_error("_dmarc\n", "TXT") is not None
+        assert record_name_error("a.b") is not None
+        assert record_name_error("a" * 64) == "Subdomain name too long (max 63 characters)"
+        assert record_name_error("_dmarc", "TXT") is None
+        assert record_name_error("_dmarc", "A") is not None
+        assert record_name_error("_sip._tcp", "SRV") is None
+        assert record_name_error("_sip._tcp.office", "SRV") is None
+        assert record_name_error("sip", "SRV") is not None
+
+
+class TestRichTypes:
+    """TXT, MX, SRV, CAA"""
+
+    def test_txt(self):
+        assert record_content_error("TXT", "v=spf1 -all") is None
+        assert record_content_error("TXT", '"part one" "part two"') is None
+        assert record_content_error("TXT", "") is not None
+        assert record_content_error("TXT", "x" * 2049) is not None
+        assert record_content_error("TXT", "bad\x00byte") is not None
+        assert record_content_error("TXT", '"unterminated') is not None
+        assert record_content_error("TXT", '"' + "x" * 256 + '"') is not None
+
+    def test_mx_and_srv(self):
+        assert record_content_error("MX", "10 mail.example.com") is None
+        assert record_content_error("MX", "0 .") is None
+        assert record_content_error("MX", "mail.example.com") is not None
+        assert record_content_error("MX", "70000 mail.example.com") is not None
+        assert record_content_error("SRV", "10 5 5060 sip.example.com") is None
+        assert record_content_error("SRV", "10 5 99999 sip.example.com") is not None
+        assert record_content_error("SRV", "10 5 5060 sip") is not None
+        assert record_content_error("MX", "\u0661\u0660 mail.example.com") is not None
+        assert record_content_error("MX", "10 mail.example.com\n") is not None
+        assert record_content_error("SRV", "10 5 5060\u00a0sip.example.com") is not None
+
+    def test_caa(self):
+        assert record_content_error("CAA", '0 issue "letsencrypt.org"') is None
+        assert record_content_error("CAA", '0 issuewild ";"') is None
+        assert record_content_error("CAA", '128 iodef "mailto:security@example.com"') is None
+        assert record_content_error("CAA", '0 iodef "security@example.com"') is not None
+        assert record_content_error("CAA", '0 issue letsencrypt.org') is not None
+        assert record_content_error("CAA", '0 policy "x"') is not None
+        assert record_content_error("CAA", '256 issue "letsencrypt.org"') is not None
+
+
+class TestBatch:
+    """validate_records"""
+
+    def test_matches_single_record_checks(self):
+        records = [
+            ("A", "www", "192.0.2.1"),
+            ("A", "www2", "192.0.2.1"),
+            ("A", "bad", "999.0.0.1"),
+            ("AAAA", "v6", ":::::"),
+            ("MX", "mail", "10 mail.example.com"),
+            ("CNAME", None, "target.example.com"),
+            ("CNAME", "-x", "target.example.com"),
+        ]
+        errors = validate_records(records)
+        assert errors == [record_error(t, n, c) for t, n, c in records]
+        assert errors[:2] == [None, None]
+        assert errors[2] == "Invalid IPv4 address"
+        assert errors[3] == "Invalid IPv6 address"
+        assert errors[4] == "Record type must be A, AAAA, CNAME, or NS"
+        assert errors[5] is None
+
+    def test_allowed_types(self):
+        records = [("MX", "mail", "10 mail.example.com"), ("TXT", "_dmarc", "v=DMARC1; p=none"), ("A", "x", "1.2.3.4")]
+        assert validate_records(records, allowed=RECORD_TYPES + ("TXT", "MX")) == [None, None, None]
+        assert validate_records(records, allowed=("A",)) == ["Record type must be A", "Record type must be A", None]
@@ -0,0 +1,111 @@
+"""
+Unit tests for zone-file parsing and formatting (zonefile.py)
+- Directives, relative/absolute/inherited owners and TTL/class ordering
+- $ORIGIN completes relative names but owners stay relative to the zone apex
+- Multi-line (parenthesised) records and quoted semicolons
+- Chunk boundaries in the middle of lines
+- Export lines re-import to the same record, automatic TTLs included
+"""
+import asyncio
+
+from zonefile import ZoneError, ZoneRecord, cloudflare_ttl, format_record, parse_ttl, parse_zonefile
+
+
+def parse(text, origin="example.com", chunk=None):
+    async def chunks():
+        size = chunk or len(text) or 1
+        for start in range(0, len(text), size):
+            yield text[start:start + size].encode("utf-8")
+
+    async def collect():
+        return [entry async for entry in parse_zonefile(chunks(), origin)]
+    return asyncio.run(collect())
+
+
+class TestParse:
+    """Master-file syntax"""
+
+    def test_owners_and_ttls(self):
+        entries = parse(
+            "$TTL 2h\n"
+            "www IN 600 A 192.0.2.1\n"
+            "    AAAA 2001:db8::1\n"
+            "api.example.com. A 192.0.2.2\n"
+            "alias CNAME www\n"
+        )
+        assert entries == [
+            ZoneRecord(2, "www", "A", "192.0.2.1", 600),
+            ZoneRecord(3, "www", "AAAA", "2001:db8::1", 7200),
+            ZoneRecord(4, "api", "A", "192.0.2.2", 7200),
+            ZoneRecord(5, "alias", "CNAME", "www.example.com", 7200),
+        ]
+
+    def test_multiline_soa_and_comments(self):
+        entries = parse(
+            "@ IN SOA ns1.example.com. hostmaster.example.com. (\n"
+            "   1 ; serial\n"
+            "   3600 )\n"
+            'txt IN TXT "a;b" ; trailing\n'
+        )
+        assert [(e.line, e.name, e.record_type) for e in entries] == [(1, "@", "SOA"), (4, "txt", "TXT")]
+        assert entries[1].content == '"a;b"'
+
+    def test_errors_are_reported_per_line(self):
+        entries = parse("$INCLUDE other.zone\nhost.other.org. A 192.0.2.1\nbroken A\n")
+        assert all(isinstance(e, ZoneError) for e in entries)
+        assert [e.line for e in entries] == [1, 2, 3]
+
+    def test_nested_origin(self):
+        entries = parse(
+            "$ORIGIN sub.example.com.\n"
+            "www A 192.0.2.1\n"
+            "@ A 192.0.2.2\n"
+            "alias CNAME www\n"
+            "$ORIGIN deeper\n"
+            "x A 192.0.2.3\n"
+            "top.example.com. A 192.0.2.4\n"
+        )
+        assert entries == [
+            ZoneRecord(2, "www.sub", "A", "192.0.2.1", None),
+            ZoneRecord(3, "sub", "A", "192.0.2.2", None),
+            ZoneRecord(4, "alias.sub", "CNAME", "www.sub.example.com", None),
+            ZoneRecord(6, "x.deeper.sub", "A", "192.0.2.3", None),
+            ZoneRecord(7, "top", "A", "192.0.2.4", None),
+        ]
+
+    def test_out_of_zone_origin(self):
+        entries = parse(
+            "$ORIGIN other.org.\n"
+            "mail A 192.0.2.1\n"
+            "    AAAA 2001:db8::1\n"
+            "x.other.org. A 192.0.2.2\n"
+            "www.example.com. CNAME target\n"
+        )
+        assert [(type(e), e.line) for e in entries] == [(ZoneError, 2), (ZoneError, 3), (ZoneError, 4), (ZoneRecord, 5)]
+        assert entries[0].error == "Name is outside the zone example.com" and entries[0].name == "mail.other.org"
+        # Targets may point anywhere, completed against the current $ORIGIN
+        assert entries[3] == ZoneRecord(5, "www", "CNAME", "target.other.org", None)
+
+    def test_chunk_boundaries(self):
+        text = "$ORIGIN example.com.\na A 192.0.2.1\r\nb A 192.0.2.2\n"
+        assert parse(text, chunk=3) == parse(text)
+
+    def test_parse_ttl_units(self):
+        assert parse_ttl("1h30m") == 5400
+        assert parse_ttl("IN") is None
+
+
+class TestFormat:
+    """Export lines"""
+
+    def test_round_trip(self):
+        record = {"name": "www", "record_type": "CNAME", "content": "target.example.net", "ttl": 1, "proxied": True}
+        line = format_record(record)
+        assert line == "www\t300\tIN\tCNAME\ttarget.example.net. ; cf_tags=cf-proxied:true\n"
+        assert parse(line) == [ZoneRecord(1, "www", "CNAME", "target.example.net", 300, proxied=True)]
+
+    def test_automatic_ttl_round_trip(self):
+        for ttl in (1, 120, 3600):
+            (entry,) = parse(format_record({"name": "www", "record_type": "A", "content": "192.0.2.1", "ttl": ttl}))
+            assert cloudflare_ttl(entry.ttl) == ttl
+        assert [cloudflare_ttl(t) for t in (None, 30, 300, 100000)] == [1, 1, 1, 86400]
@@ -0,0 +1,152 @@
+"""Write-behind queue that coalesces Cloudflare record updates.
+
+Updates are acknowledged as soon as Mongo is written; the Cloudflare PUT is
+parked in an outbox collection keyed by ``cf_id``. Further updates to the same
+record inside the coalescing window just overwrite the pending payload, so a
+flapping DDNS client costs one Cloudflare call per window instead of one per
+request. Because the outbox lives in Mongo, pending updates survive restarts,
+and items are claimed with a short lease so several workers can drain it.
+
+Failed sends are retried with exponential backoff. After ``max_attempts`` the
+item is kept with ``status: "failed"`` (and ``on_failed`` is called) instead
+of being dropped, so the lost update stays visible; the next ``enqueue`` for
+the record puts it back in the queue.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+SendFn = Callable[[str, str, dict], Awaitable[None]]
+FailedFn = Callable[[dict, str], None]
+
+
+class WriteBehindQueue:
+    def __init__(
+        self,
+        collection,
+        send: SendFn,
+        window: float = 5.0,
+        poll_interval: float = 1.0,
+        batch_size: int = 50,
+        lease: float = 30.0,
+        max_attempts: int = 8,
+        retry_backoff_max: float = 300.0,
+        on_failed: Optional[FailedFn] = None,
+    ):
+        self.collection = collection
+        self.send = send
+        self.window = window
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_backoff_max = retry_backoff_max
+        self.on_failed = on_failed
+
+    async def enqueue(self, zone_id: str, cf_id: str, payload: dict):
+        """Park an update; a pending update for the same record is replaced, keeping its due time."""
+        now = time.time()
+        await self.collection.update_one(
+            {"_id": cf_id},
+            {
+                "$set": {"zone_id": zone_id, "payload": payload, "updated_at": now},
+                "$setOnInsert": {"enqueued_at": now, "due_at": now + self.window, "attempts": 0},
+                "$inc": {"seq": 1},
+            },
+            upsert=True,
+        )
+        # A record that had given up is retried with the new payload
+        await self.collection.update_one(
+            {"_id": cf_id, "status": "failed"},
+            {"$set": {"due_at": now + self.window, "attempts": 0}, "$unset": {"status": "", "failed_at": ""}},
+        )
+
+    async def discard(self, cf_id: str):
+        """Drop any pending update, e.g. because the record is being deleted."""
+        await self.collection.delete_one({"_id": cf_id})
+
+    async def stats(self) -> dict:
+        pending = {"status": {"$ne": "failed"}}
+        depth = await self.collection.count_documents(pending)
+        failed = await self.collection.count_documents({"status": "failed"})
+        oldest = await self.collection.find_one(pending, {"enqueued_at": 1}, sort=[("enqueued_at", 1)])
+        return {
+            "depth": depth,
+            "failed": failed,
+            "oldest_age_seconds": round(time.time() - oldest["enqueued_at"], 3) if oldest else 0.0,
+        }
+
+    async def _claim(self) -> Optional[dict]:
+        now = time.time()
+        return await self.collection.find_one_and_update(
+            {"due_at": {"$lte": now}},
+            {"$set": {"due_at": now + self.lease}},
+            sort=[("due_at", 1)],
+        )
+
+    async def _flush_item(self, item: dict):
+        try:
+            await self.send(item["zone_id"], item["_id"], item["payload"])
+        except Exception as e:
+            attempts = item.get("attempts", 0) + 1
+            error = getattr(e, "detail", None) or str(e)
+            if attempts >= self.max_attempts:
+                # Without due_at the item is never claimed again
+                result = await self.collection.update_one(
+                    {"_id": item["_id"], "seq": item["seq"]},
+                    {
+                        "$set": {"status": "failed", "failed_at": time.time(), "attempts": attempts, "last_error": error},
+                        "$unset": {"due_at": ""},
+                    },
+                )
+                if result.matched_count:
+                    logger.error(f"Giving up on Cloudflare update for {item['_id']} after {attempts} attempts: {error}")
+                    if self.on_failed:
+                        self.on_failed(item, error)
+                    return
+                # A newer payload was enqueued while sending; it gets its own attempts
+                attempts = 0
+            delay = min(self.retry_backoff_max, self.window * (2 ** attempts))
+            logger.warning(f"Cloudflare update for {item['_id']} failed (attempt {attempts}), retrying in {delay:.0f}s: {error}")
+            await self.collection.update_one(
+                {"_id": item["_id"]},
+                {"$set": {"due_at": time.time() + delay, "attempts": attempts, "last_error": error}},
+            )
+            return
+
+        # Only remove the item if nothing newer was enqueued while we were sending;
+        # otherwise it stays with its (already past) due time and is sent next round.
+        result = await self.collection.delete_one({"_id": item["_id"], "seq": item["seq"]})
+        if result.deleted_count == 0:
+            await self.collection.update_one(
+                {"_id": item["_id"]},
+                {"$set": {"due_at": time.time(), "attempts": 0}},
+            )
+
+    async def flush_due(self) -> int:
+        """Send every item whose window has elapsed; returns how many were processed."""
+        items = []
+        while len(items) < self.batch_size:
+            item = await self._claim()
+            if item is None:
+                break
+            items.append(item)
+        if items:
+            await asyncio.gather(*(self._flush_item(item) for item in items))
+        return len(items)
+
+    async def run(self):
+        """Drain the outbox until cancelled."""
+        while True:
+            try:
+                processed = await self.flush_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Write-behind queue error: {e}")
+                processed = 0
+            if processed < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
@@ -0,0 +1,233 @@
+"""Record validation shared by the record routes, bulk operations and zone-file imports.
+
+Errors are returned as strings (``None`` when valid), never raised, so callers
+can collect them per item. Addresses go through precompiled patterns first and
+``ipaddress`` only for IPv6 (which has too many spellings for a regex); host
+names use precompiled label rules (letters, digits and inner hyphens, 1-63
+characters per label, 253 in total).
+
+Content checks exist for A, AAAA, CNAME, NS, TXT, MX, SRV and CAA, in the
+master-file presentation Cloudflare exports (``10 mail.example.com`` for MX,
+``priority weight port target`` for SRV, ``flags tag "value"`` for CAA).
+Which of them users may create is the caller's ``allowed`` set; by default
+that is ``RECORD_TYPES``.
+
+``validate_records`` checks a whole batch in one call and remembers the
+verdict for repeated contents, which imports are full of (one address behind
+hundreds of names).
+"""
+import ipaddress
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Types users can create; the others are validated but not provisioned
+RECORD_TYPES = ("A", "AAAA", "CNAME", "NS")
+
+TXT_MAX_LENGTH = 2048
+CAA_TAGS = ("issue", "issuewild", "iodef")
+
+# re.ASCII keeps \d and \s to ASCII digits and whitespace (no "٤"), and \Z
+# rejects the trailing newline that $ would let through
+_OCTET = r"(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)"
+_IPV4_RE = re.compile(rf"^{_OCTET}(?:\.{_OCTET}){{3}}\Z", re.ASCII)
+_IPV6_CHARS_RE = re.compile(r"^[0-9A-Fa-f:.]{2,45}\Z", re.ASCII)
+_LABEL = r"(?!-)[A-Za-z0-9-]{1,63}(?<!-)"
+_LABEL_RE = re.compile(rf"^{_LABEL}\Z", re.ASCII)
+# At least two labels: a bare label would be resolved relative to the zone
+_HOSTNAME_RE = re.compile(rf"^(?=.{{1,253}}\Z){_LABEL}(?:\.{_LABEL})+\Z", re.ASCII)
+# CNAME targets have always been allowed to be a single label (e.g. "localhost")
+_CNAME_TARGET_RE = re.compile(rf"^(?=.{{1,253}}\Z){_LABEL}(?:\.{_LABEL})*\Z", re.ASCII)
+# _service._proto, optionally followed by a subdomain label
+_SRV_NAME_RE = re.compile(rf"^_[A-Za-z0-9-]{{1,62}}\._(?:tcp|udp|tls|sctp)(?:\.{_LABEL})?\Z", re.IGNORECASE | re.ASCII)
+# TXT owners may be underscore labels such as _dmarc or _acme-challenge
+_TXT_NAME_RE = re.compile(rf"^_?{_LABEL}(?:\._?{_LABEL})*\Z", re.ASCII)
+_MX_RE = re.compile(r"^(\d{1,5})\s+(\S+)\Z", re.ASCII)
+_SRV_RE = re.compile(r"^(\d{1,5})\s+(\d{1,5})\s+(\d{1,5})\s+(\S+)\Z", re.ASCII)
+_CAA_RE = re.compile(r'^(\d{1,3})\s+([A-Za-z0-9]+)\s+"([^"]*)"\Z', re.ASCII)
+_CAA_ISSUER_RE = re.compile(rf"^(?:{_LABEL}(?:\.{_LABEL})+)?(?:\s*;.*)?\Z", re.ASCII)
+_CONTROL_RE = re.compile(r"[\x00-\x1f\x7f]")
+_TXT_STRING_RE = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+RecordTuple = Tuple[str, Optional[str], str]
+
+
+def _type_list(types: Sequence[str]) -> str:
+    return ", ".join(types[:-1]) + ", or " + types[-1] if len(types) > 1 else types[0]
+
+
+def record_type_error(record_type: str, allowed: Sequence[str] = RECORD_TYPES) -> Optional[str]:
+    if record_type not in allowed:
+        return f"Record type must be {_type_list(allowed)}"
+    return None
+
+
+def record_name_error(name: str, record_type: str = "") -> Optional[str]:
+    """Subdomain label of a new record; SRV and TXT owners may carry underscore labels."""
+    if record_type == "SRV":
+        if not _SRV_NAME_RE.match(name):
+            return "SRV name must look like _service._tcp or _service._udp"
+        return None
+    if record_type == "TXT" and name.startswith("_"):
+        if len(name) > 253 or not _TXT_NAME_RE.match(name):
+            return "Invalid TXT name"
+        return None
+    if len(name) > 63:
+        return "Subdomain name too long (max 63 characters)"
+    if not _LABEL_RE.match(name):
+        return "Invalid subdomain name. Use only letters, numbers, and hyphens."
+    return None
+
+
+def is_hostname(value: str) -> bool:
+    return _HOSTNAME_RE.match(value) is not None
+
+
+def _uint16(value: str) -> bool:
+    return int(value) <= 65535
+
+
+def _a_error(content: str) -> Optional[str]:
+    if not _IPV4_RE.match(content):
+        return "Invalid IPv4 address"
+    return None
+
+
+def _aaaa_error(content: str) -> Optional[str]:
+    if not _IPV6_CHARS_RE.match(content):
+        return "Invalid IPv6 address"
+    try:
+        ipaddress.IPv6Address(content)
+    except ValueError:
+        return "Invalid IPv6 address"
+    return None
+
+
+def _cname_error(content: str) -> Optional[str]:
+    if not _CNAME_TARGET_RE.match(content):
+        return "Invalid CNAME target"
+    return None
+
+
+def _ns_error(content: str) -> Optional[str]:
+    if not is_hostname(content):
+        return "Invalid nameserver (e.g. ns1.example.com)"
+    return None
+
+
+def _txt_error(content: str) -> Optional[str]:
+    if not content:
+        return "TXT content can't be empty"
+    if len(content) > TXT_MAX_LENGTH:
+        return f"TXT content too long (max {TXT_MAX_LENGTH} characters)"
+    if _CONTROL_RE.search(content):
+        return "TXT content can't contain control characters"
+    if content.startswith('"'):
+        strings = _TXT_STRING_RE.findall(content)
+        if not strings or _TXT_STRING_RE.sub("", content).strip():
+            return "Unbalanced quotes in TXT content"
+        if any(len(s) > 255 for s in strings):
+            return "Each quoted TXT string is limited to 255 characters"
+    return None
+
+
+def _mx_error(content: str) -> Optional[str]:
+    match = _MX_RE.match(content)
+    if not match:
+        return "MX content must be 'priority mail.example.com'"
+    priority, host = match.groups()
+    if not _uint16(priority):
+        return "MX priority must be between 0 and 65535"
+    # "." is the null MX of RFC 7505: the domain accepts no mail
+    if host != "." and not is_hostname(host):
+        return "Invalid MX mail server"
+    return None
+
+
+def _srv_error(content: str) -> Optional[str]:
+    match = _SRV_RE.match(content)
+    if not match:
+        return "SRV content must be 'priority weight port target'"
+    priority, weight, port, target = match.groups()
+    if not (_uint16(priority) and _uint16(weight) and _uint16(port)):
+        return "SRV priority, weight and port must be between 0 and 65535"
+    if target != "." and not is_hostname(target):
+        return "Invalid SRV target"
+    return None
+
+
+def _caa_error(content: str) -> Optional[str]:
+    match = _CAA_RE.match(content)
+    if not match:
+        return "CAA content must be 'flags tag \"value\"'"
+    flags, tag, value = match.groups()
+    if int(flags) > 255:
+        return "CAA flags must be between 0 and 255"
+    tag = tag.lower()
+    if tag not in CAA_TAGS:
+        return f"CAA tag must be {_type_list(CAA_TAGS)}"
+    if tag == "iodef":
+        if not value.startswith(("mailto:", "https://", "http://")):
+            return "CAA iodef value must be a mailto: or http(s) URL"
+    elif not _CAA_ISSUER_RE.match(value):
+        return "Invalid CAA issuer domain"
+    return None
+
+
+_CONTENT_CHECKS: Dict[str, Callable[[str], Optional[str]]] = {
+    "A": _a_error,
+    "AAAA": _aaaa_error,
+    "CNAME": _cname_error,
+    "NS": _ns_error,
+    "TXT": _txt_error,
+    "MX": _mx_error,
+    "SRV": _srv_error,
+    "CAA": _caa_error,
+}
+
+
+def record_content_error(record_type: str, content: str) -> Optional[str]:
+    check = _CONTENT_CHECKS.get(record_type)
+    return check(content) if check else None
+
+
+def record_error(record_type: str, name: Optional[str], content: str, allowed: Sequence[str] = RECORD_TYPES) -> Optional[str]:
+    """Type, name and content of one record; ``name=None`` skips the name (updates keep theirs)."""
+    return (
+        record_type_error(record_type, allowed)
+        or (None if name is None else record_name_error(name, record_type))
+        or record_content_error(record_type, content)
+    )
+
+
+def validate_records(records: Iterable[RecordTuple], allowed: Sequence[str] = RECORD_TYPES) -> List[Optional[str]]:
+    """Errors for a batch of ``(record_type, name, content)``, index-aligned with the input.
+
+    ``name`` may be ``None`` to skip the name check. Content verdicts are
+    memoized per call, so a batch with few distinct contents costs little
+    more than its distinct values.
+    """
+    allowed_set = frozenset(allowed)
+    type_message = None
+    checks = _CONTENT_CHECKS
+    seen: Dict[Tuple[str, str], Optional[str]] = {}
+    errors: List[Optional[str]] = []
+    append = errors.append
+    for record_type, name, content in records:
+        if record_type not in allowed_set:
+            if type_message is None:
+                type_message = record_type_error(record_type, allowed)
+            append(type_message)
+            continue
+        if name is not None:
+            error = record_name_error(name, record_type)
+            if error:
+                append(error)
+                continue
+        key = (record_type, content)
+        if key in seen:
+            append(seen[key])
+            continue
+        check = checks.get(record_type)
+        error = seen[key] = check(content) if check else None
+        append(error)
+    return errors
@@ -0,0 +1,208 @@
+"""RFC 1035 zone files: formatting records for export and incremental parsing for import.
+
+The parser works on an async stream of text chunks, so an uploaded zone file
+is never held in memory as a whole. It understands the common master-file
+syntax: ``$ORIGIN``/``$TTL`` directives, ``@``, relative and absolute owner
+names, inherited owners (lines starting with whitespace), optional TTL/class
+fields in either order, comments and parenthesised multi-line records.
+Cloudflare's ``cf_tags=cf-proxied:true`` comment is read and written so an
+export re-imports with the same proxy setting.
+"""
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterable, AsyncIterator, Optional, Union
+
+# Cloudflare's "automatic" TTL (1) is 300 seconds
+AUTO_TTL = 300
+PROXIED_TAG = "cf-proxied:true"
+
+_TTL_RE = re.compile(r"^(\d+[smhdwSMHDW]?)+$")
+_TTL_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+_CLASSES = {"IN", "CH", "HS", "CS"}
+# Record names carried by the rdata of these types
+_NAME_RDATA = {"CNAME", "NS"}
+
+
+@dataclass
+class ZoneRecord:
+    line: int
+    name: str          # relative to the origin; "@" for the apex
+    record_type: str
+    content: str
+    ttl: Optional[int]
+    proxied: bool = False
+
+
+@dataclass
+class ZoneError:
+    line: int
+    error: str
+    name: str = ""
+
+
+def _fqdn(name: str) -> str:
+    return name if name.endswith(".") else name + "."
+
+
+def format_record(record: dict) -> str:
+    """One master-file line for a stored record; owner names are relative to the domain."""
+    content = record["content"]
+    if record["record_type"] in _NAME_RDATA:
+        content = _fqdn(content)
+    ttl = record.get("ttl") or 1
+    line = f"{record['name']}\t{AUTO_TTL if ttl == 1 else ttl}\tIN\t{record['record_type']}\t{content}"
+    if record.get("proxied"):
+        line += f" ; cf_tags={PROXIED_TAG}"
+    return line + "\n"
+
+
+def cloudflare_ttl(ttl: Optional[int]) -> int:
+    """TTL to store for an imported record: Cloudflare takes 1 (automatic) or 60..86400 seconds.
+
+    ``AUTO_TTL`` maps back to 1, so exported automatic records re-import unchanged
+    (an explicit 300 becomes automatic too, which Cloudflare serves the same way).
+    """
+    if not ttl or ttl < 60 or ttl == AUTO_TTL:
+        return 1
+    return min(ttl, 86400)
+
+
+def zone_header(origin: str) -> str:
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+    return f";; Zone file for {origin}\n;; Exported by DNSLAB.BIZ at {now}\n$ORIGIN {_fqdn(origin)}\n$TTL {AUTO_TTL}\n"
+
+
+def parse_ttl(token: str) -> Optional[int]:
+    """``3600`` or BIND-style ``1h30m``; None when the token isn't a TTL."""
+    if not _TTL_RE.match(token):
+        return None
+    if token.isdigit():
+        return int(token)
+    total = 0
+    for amount, unit in re.findall(r"(\d+)([smhdwSMHDW])", token):
+        total += int(amount) * _TTL_UNITS[unit.lower()]
+    return total
+
+
+def _split_comment(line: str):
+    """Split off a ``;`` comment that is not inside a quoted string."""
+    quoted = False
+    for pos, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif char == ";" and not quoted:
+            return line[:pos], line[pos + 1:]
+    return line, ""
+
+
+async def iter_lines(chunks: AsyncIterable[Union[bytes, str]]) -> AsyncIterator[str]:
+    """Yield decoded lines from a stream of chunks without buffering the whole body."""
+    pending = ""
+    async for chunk in chunks:
+        pending += chunk.decode("utf-8", errors="replace") if isinstance(chunk, bytes) else chunk
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    if pending:
+        yield pending.rstrip("\r")
+
+
+def _absolute(name: str, origin: str) -> str:
+    """Fully qualified form (without the trailing dot) of ``name`` read under ``origin``."""
+    name = name.lower()
+    if name == "@":
+        return origin
+    if name.endswith("."):
+        return name.rstrip(".")
+    return f"{name}.{origin}"
+
+
+def _relative(name: str, apex: str) -> Optional[str]:
+    """Fully qualified ``name`` relative to the zone ``apex`` ("@" for the apex); None when outside the zone."""
+    if name == apex:
+        return "@"
+    if name.endswith("." + apex):
+        return name[:-len(apex) - 1]
+    return None
+
+
+async def parse_zonefile(chunks: AsyncIterable[Union[bytes, str]], origin: str) -> AsyncIterator[Union[ZoneRecord, ZoneError]]:
+    """Yield a ``ZoneRecord`` or ``ZoneError`` per record line of the zone file.
+
+    ``origin`` is the zone apex. ``$ORIGIN`` only changes how relative names
+    are completed; owners are always returned relative to the apex.
+    """
+    apex = origin = origin.lower().rstrip(".")
+    default_ttl: Optional[int] = None
+    owner: Optional[str] = None
+    buffered, buffered_comment, start_line = "", "", 0
+    line_no = 0
+
+    async for raw in iter_lines(chunks):
+        line_no += 1
+        text, comment = _split_comment(raw)
+        if buffered:
+            buffered += " " + text
+            buffered_comment += comment
+            if ")" not in text:
+                continue
+            text, comment, number = buffered, buffered_comment, start_line
+            buffered, buffered_comment = "", ""
+        elif "(" in text and ")" not in text:
+            buffered, buffered_comment, start_line = text, comment, line_no
+            continue
+        else:
+            number = line_no
+
+        if not text.strip():
+            continue
+        inherits_owner = text[0] in " \t"
+        tokens = text.replace("(", " ").replace(")", " ").split()
+
+        if tokens[0].startswith("$"):
+            directive = tokens[0].upper()
+            if directive == "$ORIGIN" and len(tokens) > 1:
+                # A relative $ORIGIN extends the current one (RFC 1035 5.1)
+                origin = _absolute(tokens[1], origin)
+            elif directive == "$TTL" and len(tokens) > 1 and parse_ttl(tokens[1]) is not None:
+                default_ttl = parse_ttl(tokens[1])
+            else:
+                yield ZoneError(number, f"Unsupported directive {tokens[0]}")
+            continue
+
+        if not inherits_owner:
+            name = _absolute(tokens[0], origin)
+            owner = _relative(name, apex)
+            if owner is None:
+                yield ZoneError(number, f"Name is outside the zone {apex}", name)
+                continue
+            tokens = tokens[1:]
+        elif owner is None:
+            yield ZoneError(number, "Record has no owner name")
+            continue
+
+        ttl = None
+        while tokens and (tokens[0].upper() in _CLASSES or parse_ttl(tokens[0]) is not None):
+            if tokens[0].upper() not in _CLASSES:
+                ttl = parse_ttl(tokens[0])
+            tokens = tokens[1:]
+        if len(tokens) < 2:
+            yield ZoneError(number, "Expected a record type and data", owner)
+            continue
+
+        record_type = tokens[0].upper()
+        content = " ".join(tokens[1:])
+        if record_type in _NAME_RDATA:
+            content = _absolute(tokens[1], origin)
+        yield ZoneRecord(
+            line=number,
+            name=owner,
+            record_type=record_type,
+            content=content,
+            ttl=ttl if ttl is not None else default_ttl,
+            proxied=PROXIED_TAG in comment,
+        )
+
+    if buffered:
+        yield ZoneError(start_line, "Unterminated parenthesis")
@@ -0,0 +1,72 @@
+// Live updates from GET /api/events (Server-Sent Events).
+// EventSource can't send the Authorization header, so the stream is read with fetch.
+// handlers: { ready, record, user, domain, resync } receive the parsed event data.
+// `ready` fires on every (re)connect with { reconnected } so pages can catch up.
+// Returns a function that closes the stream; on 503 (no change streams) it just stops.
+export function subscribeEvents(url, token, handlers) {
+  let controller = null;
+  let closed = false;
+  let retry = 5000;
+  let timer = null;
+
+  const dispatch = (block, reconnected) => {
+    let kind = 'message';
+    const data = [];
+    for (const line of block.split('\n')) {
+      if (line.startsWith('event:')) kind = line.slice(6).trim();
+      else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+      else if (line.startsWith('retry:')) retry = Number(line.slice(6)) || retry;
+    }
+    if (!data.length || !handlers[kind]) return;
+    if (kind === 'ready') handlers.ready({ reconnected });
+    else handlers[kind](JSON.parse(data.join('\n')));
+  };
+
+  const connect = async (reconnected) => {
+    controller = new AbortController();
+    try {
+      const res = await fetch(url, {
+        headers: { Authorization: `Bearer ${token}`, Accept: 'text/event-stream' },
+        signal: controller.signal,
+      });
+      if (res.status === 503 || res.status === 401 || res.status === 403) return;
+      if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+      const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+      let buffer = '';
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += value;
+        let end;
+        while ((end = buffer.indexOf('\n\n')) >= 0) {
+          const block = buffer.slice(0, end);
+          buffer = buffer.slice(end + 2);
+          dispatch(block, reconnected);
+        }
+      }
+    } catch {
+      if (closed) return;
+    }
+    if (!closed) timer = setTimeout(() => connect(true), retry);
+  };
+
+  connect(false);
+  return () => {
+    closed = true;
+    clearTimeout(timer);
+    controller?.abort();
+  };
+}
+
+// Replace or add `item` (matched by id) in a list, keeping fields the event doesn't carry
+export function upsertById(list, item) {
+  const index = list.findIndex((existing) => existing.id === item.id);
+  if (index < 0) return [...list, item];
+  const next = [...list];
+  next[index] = { ...list[index], ...item };
+  return next;
+}
+
+export function removeById(list, id) {
+  return list.filter((item) => item.id !== id);
+}
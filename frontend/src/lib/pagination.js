@@ -0,0 +1,14 @@
+import axios from 'axios';
+
+// Follows next_cursor until the last page and returns every item under `key`
+export async function fetchAllPages(url, key, config = {}) {
+  const items = [];
+  let cursor = null;
+  do {
+    const params = { ...(config.params || {}), ...(cursor ? { cursor } : {}) };
+    const res = await axios.get(url, { ...config, params });
+    items.push(...(res.data[key] || []));
+    cursor = res.data.next_cursor;
+  } while (cursor);
+  return items;
+}
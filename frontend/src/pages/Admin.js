@@ -1,4 +1,4 @@
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import { useLanguage } from '../contexts/LanguageContext';
 import { useAuth } from '../contexts/AuthContext';
 import Navbar from '../components/Navbar';
@@ -45,10 +45,20 @@ import {
   TabsList,
   TabsTrigger,
 } from '../components/ui/tabs';
+import {
+  Select,
+  SelectContent,
+  SelectItem,
+  SelectTrigger,
+  SelectValue,
+} from '../components/ui/select';
 import { toast } from 'sonner';
 import axios from 'axios';
+import { fetchAllPages } from '../lib/pagination';
+import { subscribeEvents, upsertById, removeById } from '../lib/events';
+import { ResponsiveContainer, LineChart, Line, XAxis, YAxis, Tooltip, CartesianGrid } from 'recharts';
 import {
-  Users, Database, Crown, Loader2, Trash2, MoreVertical, Shield, Star, UserX, Eye, Globe, X, Plus,
+  Users, Database, Crown, Loader2, Trash2, MoreVertical, Shield, Star, UserX, Eye, Globe, X, Plus, Download, Upload,
 } from 'lucide-react';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -76,7 +86,12 @@ export default function Admin() {
   const { t } = useLanguage();
   const { token } = useAuth();
   const [users, setUsers] = useState([]);
+  const [usersCursor, setUsersCursor] = useState(null);
+  const [userSearch, setUserSearch] = useState('');
+  const [appliedSearch, setAppliedSearch] = useState('');
+  const [userSort, setUserSort] = useState('created_at');
   const [stats, setStats] = useState(null);
+  const [history, setHistory] = useState([]);
   const [loading, setLoading] = useState(true);
   const [deleteOpen, setDeleteOpen] = useState(false);
   const [deleteUser, setDeleteUser] = useState(null);
@@ -100,17 +115,45 @@ export default function Admin() {
   const [deleteDomainOpen, setDeleteDomainOpen] = useState(false);
   const [deleteDomainItem, setDeleteDomainItem] = useState(null);
   const [deleteDomainLoading, setDeleteDomainLoading] = useState(false);
+  const [importDomain, setImportDomain] = useState(null);
+  const zoneFileInput = useRef(null);
 
   const getHeaders = useCallback(() => ({ Authorization: `Bearer ${token}` }), [token]);
 
+  const fetchUsers = useCallback(async () => {
+    const params = { search: appliedSearch, sort: userSort, order: userSort === 'email' ? 'asc' : 'desc' };
+    const res = await axios.get(`${API}/admin/users`, { headers: getHeaders(), params });
+    setUsers(res.data.users || []);
+    setUsersCursor(res.data.next_cursor || null);
+  }, [getHeaders, appliedSearch, userSort]);
+
+  const loadMoreUsers = async () => {
+    const params = { search: appliedSearch, sort: userSort, order: userSort === 'email' ? 'asc' : 'desc', cursor: usersCursor };
+    try {
+      const res = await axios.get(`${API}/admin/users`, { headers: getHeaders(), params });
+      setUsers(prev => [...prev, ...(res.data.users || [])]);
+      setUsersCursor(res.data.next_cursor || null);
+    } catch {
+      toast.error('Failed to load admin data');
+    }
+  };
+
+  const fetchStats = useCallback(async () => {
+    const [statsRes, historyRes] = await Promise.all([
+      axios.get(`${API}/admin/stats`, { headers: getHeaders() }),
+      axios.get(`${API}/admin/stats/history`, { headers: getHeaders(), params: { days: 30 } }),
+    ]);
+    setStats(statsRes.data);
+    setHistory((historyRes.data.days || []).filter((d) => d.totals).map((d) => ({
+      date: d.date.slice(5),
+      users: d.totals.total_users,
+      records: d.totals.total_records,
+    })));
+  }, [getHeaders]);
+
   const fetchData = useCallback(async () => {
     try {
-      const [usersRes, statsRes] = await Promise.all([
-        axios.get(`${API}/admin/users`, { headers: getHeaders() }),
-        axios.get(`${API}/admin/stats`, { headers: getHeaders() }),
-      ]);
-      setUsers(usersRes.data.users || []);
-      setStats(statsRes.data);
+      await Promise.all([fetchUsers(), fetchStats()]);
     } catch (err) {
       if (err.response?.status === 403) {
         toast.error('Admin access required');
@@ -120,7 +163,7 @@ export default function Admin() {
     } finally {
       setLoading(false);
     }
-  }, [getHeaders]);
+  }, [fetchUsers, fetchStats]);
 
   const fetchDomains = useCallback(async () => {
     setDomainsLoading(true);
@@ -139,12 +182,73 @@ export default function Admin() {
     fetchDomains();
   }, [fetchData, fetchDomains]);
 
+  // Live updates. While the stream is up, lists are patched from its events and
+  // the counters are reloaded once activity settles; without it (503), handlers reload as before.
+  const live = useRef(false);
+  const statsTimer = useRef(null);
+  const openRecordsUser = useRef(null);
+
+  useEffect(() => {
+    openRecordsUser.current = recordsOpen ? recordsUser?.id : null;
+  }, [recordsOpen, recordsUser]);
+
+  const scheduleStats = useCallback(() => {
+    clearTimeout(statsTimer.current);
+    statsTimer.current = setTimeout(() => fetchStats().catch(() => {}), 1000);
+  }, [fetchStats]);
+
+  useEffect(() => {
+    if (!token) return undefined;
+    const reload = () => {
+      fetchData();
+      fetchDomains();
+    };
+    const close = subscribeEvents(`${API}/events`, token, {
+      ready: ({ reconnected }) => {
+        live.current = true;
+        if (reconnected) reload();
+      },
+      resync: reload,
+      user: (event) => {
+        if (event.op === 'delete') setUsers((prev) => removeById(prev, event.id));
+        // New sign-ups only change the counters; they appear in the list on its next load
+        else setUsers((prev) => (prev.some((u) => u.id === event.user.id) ? upsertById(prev, event.user) : prev));
+        scheduleStats();
+      },
+      record: (event) => {
+        if (openRecordsUser.current === event.user_id) {
+          setUserRecords((prev) => (event.op === 'delete' ? removeById(prev, event.id) : upsertById(prev, event.record)));
+        }
+        if (event.op !== 'update') {
+          const delta = event.op === 'delete' ? -1 : 1;
+          setUsers((prev) => prev.map((u) => (u.id === event.user_id ? { ...u, record_count: Math.max((u.record_count || 0) + delta, 0) } : u)));
+          scheduleStats();
+        }
+      },
+      domain: (event) => {
+        setDomains((prev) => (event.op === 'delete' ? removeById(prev, event.id) : upsertById(prev, event.domain)));
+        scheduleStats();
+      },
+    });
+    return () => {
+      live.current = false;
+      clearTimeout(statsTimer.current);
+      close();
+    };
+  }, [token, fetchData, fetchDomains, scheduleStats]);
+
+  // Search on the server once typing pauses
+  useEffect(() => {
+    const timer = setTimeout(() => setAppliedSearch(userSearch.trim()), 300);
+    return () => clearTimeout(timer);
+  }, [userSearch]);
+
   const handleChangePlan = async (userId, plan) => {
     setActionLoading(true);
     try {
       await axios.put(`${API}/admin/users/${userId}/plan`, { plan }, { headers: getHeaders() });
       toast.success(`Plan updated to ${plan}`);
-      fetchData();
+      if (!live.current) fetchData();
     } catch (err) {
       toast.error(err.response?.data?.detail || 'Failed to update plan');
     } finally {
@@ -156,10 +260,15 @@ export default function Admin() {
     if (!deleteUser) return;
     setActionLoading(true);
     try {
-      await axios.delete(`${API}/admin/users/${deleteUser.id}`, { headers: getHeaders() });
-      toast.success('User deleted');
+      const res = await axios.delete(`${API}/admin/users/${deleteUser.id}`, { headers: getHeaders() });
+      const failed = res.data.records?.failed || [];
+      if (failed.length > 0) {
+        toast.warning(`User deleted, but ${failed.length} Cloudflare record(s) could not be removed`);
+      } else {
+        toast.success('User deleted');
+      }
       setDeleteOpen(false);
-      fetchData();
+      if (!live.current) fetchData();
     } catch (err) {
       toast.error(err.response?.data?.detail || 'Failed to delete user');
     } finally {
@@ -172,8 +281,7 @@ export default function Admin() {
     setRecordsOpen(true);
     setRecordsLoading(true);
     try {
-      const res = await axios.get(`${API}/admin/users/${user.id}/records`, { headers: getHeaders() });
-      setUserRecords(res.data.records || []);
+      setUserRecords(await fetchAllPages(`${API}/admin/users/${user.id}/records`, 'records', { headers: getHeaders() }));
     } catch {
       toast.error('Failed to load user records');
     } finally {
@@ -189,8 +297,8 @@ export default function Admin() {
       toast.success('Record deleted');
       setDeleteRecordOpen(false);
       setDeleteRecordItem(null);
-      setUserRecords(prev => prev.filter(r => r.id !== deleteRecordItem.id));
-      fetchData();
+      setUserRecords(prev => removeById(prev, deleteRecordItem.id));
+      if (!live.current) fetchData();
     } catch (err) {
       toast.error(err.response?.data?.detail || 'Failed to delete record');
     } finally {
@@ -207,8 +315,10 @@ export default function Admin() {
       toast.success('Domain added!');
       setAddDomainOpen(false);
       setDomainForm({ name: '', zone_id: '' });
-      fetchDomains();
-      fetchData();
+      if (!live.current) {
+        fetchDomains();
+        fetchData();
+      }
     } catch (err) {
       toast.error(err.response?.data?.detail || 'Failed to add domain');
     } finally {
@@ -220,7 +330,7 @@ export default function Admin() {
     try {
       await axios.put(`${API}/admin/domains/${domain.id}`, { active: !domain.active }, { headers: getHeaders() });
       toast.success(domain.active ? 'Domain deactivated' : 'Domain activated');
-      fetchDomains();
+      if (!live.current) fetchDomains();
     } catch (err) {
       toast.error(err.response?.data?.detail || 'Failed to update domain');
     }
@@ -234,8 +344,10 @@ export default function Admin() {
       toast.success('Domain deleted');
       setDeleteDomainOpen(false);
       setDeleteDomainItem(null);
-      fetchDomains();
-      fetchData();
+      if (!live.current) {
+        fetchDomains();
+        fetchData();
+      }
     } catch (err) {
       toast.error(err.response?.data?.detail || 'Failed to delete domain');
     } finally {
@@ -243,6 +355,50 @@ export default function Admin() {
     }
   };
 
+  const handleExportZone = async (domain) => {
+    try {
+      const res = await axios.get(`${API}/admin/domains/${domain.id}/zonefile`, { headers: getHeaders(), responseType: 'blob' });
+      const url = URL.createObjectURL(res.data);
+      const link = document.createElement('a');
+      link.href = url;
+      link.download = `${domain.name}.zone`;
+      link.click();
+      URL.revokeObjectURL(url);
+    } catch {
+      toast.error('Failed to export zone file');
+    }
+  };
+
+  const openZoneImport = (domain) => {
+    setImportDomain(domain);
+    zoneFileInput.current?.click();
+  };
+
+  const handleImportZone = async (e) => {
+    const file = e.target.files?.[0];
+    e.target.value = '';
+    if (!file || !importDomain) return;
+    const toastId = toast.loading(`Importing ${file.name}...`);
+    try {
+      const res = await axios.post(`${API}/admin/domains/${importDomain.id}/zonefile`, file, {
+        headers: { ...getHeaders(), 'Content-Type': 'text/plain' },
+      });
+      const { created, skipped, failed, errors } = res.data;
+      const summary = `${created} created, ${skipped} skipped, ${failed} failed`;
+      if (failed > 0) {
+        toast.warning(summary, { id: toastId, description: errors.slice(0, 3).map((err) => `Line ${err.line}: ${err.error}`).join('\n') });
+      } else {
+        toast.success(summary, { id: toastId });
+      }
+      fetchDomains();
+      fetchData();
+    } catch (err) {
+      toast.error(err.response?.data?.detail || 'Failed to import zone file', { id: toastId });
+    } finally {
+      setImportDomain(null);
+    }
+  };
+
   const formatDate = (dateStr) => {
     if (!dateStr) return '-';
     return new Date(dateStr).toLocaleDateString('en-US', { year: 'numeric', month: 'short', day: 'numeric' });
@@ -283,6 +439,27 @@ export default function Admin() {
           </div>
         )}
 
+        {/* Growth */}
+        {history.length > 1 && (
+          <Card className="border-border/60 bg-card/50 backdrop-blur-sm mb-8" data-testid="admin-growth-chart">
+            <CardHeader className="pb-3">
+              <CardTitle className="text-base">{t('admin.growth')}</CardTitle>
+            </CardHeader>
+            <CardContent className="h-56">
+              <ResponsiveContainer width="100%" height="100%">
+                <LineChart data={history} margin={{ top: 4, right: 8, left: -16, bottom: 0 }}>
+                  <CartesianGrid strokeDasharray="3 3" className="stroke-border" />
+                  <XAxis dataKey="date" tick={{ fontSize: 11 }} />
+                  <YAxis allowDecimals={false} tick={{ fontSize: 11 }} />
+                  <Tooltip />
+                  <Line type="monotone" dataKey="users" name={t('admin.total_users')} stroke="#2563eb" dot={false} />
+                  <Line type="monotone" dataKey="records" name={t('admin.total_records')} stroke="#16a34a" dot={false} />
+                </LineChart>
+              </ResponsiveContainer>
+            </CardContent>
+          </Card>
+        )}
+
         {/* Tabs */}
         <Tabs defaultValue="users" className="space-y-4">
           <TabsList data-testid="admin-tabs">
@@ -300,10 +477,31 @@ export default function Admin() {
           <TabsContent value="users">
             <Card className="border-border/60 bg-card/50 backdrop-blur-sm">
               <CardHeader className="pb-3">
-                <CardTitle className="text-base flex items-center gap-2">
-                  <Users className="h-4 w-4" />
-                  {t('admin.users')}
-                </CardTitle>
+                <div className="flex flex-col sm:flex-row sm:items-center justify-between gap-3">
+                  <CardTitle className="text-base flex items-center gap-2">
+                    <Users className="h-4 w-4" />
+                    {t('admin.users')}
+                  </CardTitle>
+                  <div className="flex items-center gap-2">
+                    <Input
+                      value={userSearch}
+                      onChange={(e) => setUserSearch(e.target.value)}
+                      placeholder={t('admin.search_users')}
+                      className="h-8 w-full sm:w-56"
+                      data-testid="admin-user-search"
+                    />
+                    <Select value={userSort} onValueChange={setUserSort}>
+                      <SelectTrigger className="h-8 w-36" data-testid="admin-user-sort">
+                        <SelectValue />
+                      </SelectTrigger>
+                      <SelectContent>
+                        <SelectItem value="created_at">{t('admin.sort_newest')}</SelectItem>
+                        <SelectItem value="record_count">{t('admin.sort_records')}</SelectItem>
+                        <SelectItem value="email">{t('admin.email')}</SelectItem>
+                      </SelectContent>
+                    </Select>
+                  </div>
+                </div>
               </CardHeader>
               <CardContent className="p-0">
                 {users.length === 0 ? (
@@ -431,6 +629,13 @@ export default function Admin() {
                       </TableBody>
                     </Table>
                     </div>
+                    {usersCursor && (
+                      <div className="p-4 text-center">
+                        <Button variant="outline" size="sm" onClick={loadMoreUsers} data-testid="admin-users-load-more">
+                          {t('admin.load_more')}
+                        </Button>
+                      </div>
+                    )}
                   </>
                 )}
               </CardContent>
@@ -439,6 +644,14 @@ export default function Admin() {
 
           {/* Domains Tab */}
           <TabsContent value="domains">
+            <input
+              ref={zoneFileInput}
+              type="file"
+              accept=".zone,.txt,.db,text/plain"
+              className="hidden"
+              onChange={handleImportZone}
+              data-testid="zone-file-input"
+            />
             <Card className="border-border/60 bg-card/50 backdrop-blur-sm">
               <CardHeader className="pb-3">
                 <div className="flex items-center justify-between">
@@ -476,6 +689,12 @@ export default function Admin() {
                                 onCheckedChange={() => handleToggleDomain(d)}
                                 data-testid={`toggle-domain-mobile-${d.id}`}
                               />
+                              <Button variant="ghost" size="icon" className="h-8 w-8" onClick={() => handleExportZone(d)} data-testid={`export-zone-mobile-${d.id}`}>
+                                <Download className="h-3.5 w-3.5" />
+                              </Button>
+                              <Button variant="ghost" size="icon" className="h-8 w-8" onClick={() => openZoneImport(d)} data-testid={`import-zone-mobile-${d.id}`}>
+                                <Upload className="h-3.5 w-3.5" />
+                              </Button>
                               <Button
                                 variant="ghost"
                                 size="icon"
@@ -532,6 +751,12 @@ export default function Admin() {
                             </TableCell>
                             <TableCell>
                               <div className="flex items-center justify-end">
+                                <Button variant="ghost" size="icon" className="h-8 w-8" onClick={() => handleExportZone(d)} title={t('admin.export_zone')} data-testid={`export-zone-${d.id}`}>
+                                  <Download className="h-3.5 w-3.5" />
+                                </Button>
+                                <Button variant="ghost" size="icon" className="h-8 w-8" onClick={() => openZoneImport(d)} title={t('admin.import_zone')} data-testid={`import-zone-${d.id}`}>
+                                  <Upload className="h-3.5 w-3.5" />
+                                </Button>
                                 <Button
                                   variant="ghost"
                                   size="icon"
@@ -42,9 +42,11 @@ import {
 } from '../components/ui/table';
 import { toast } from 'sonner';
 import axios from 'axios';
+import { fetchAllPages } from '../lib/pagination';
+import { subscribeEvents, upsertById, removeById } from '../lib/events';
 import {
   Plus, Pencil, Trash2, Loader2, Database, Crown, Server, Send, Globe,
-  Copy, Check, Link, Wifi,
+  Copy, Check, Link, Wifi, KeyRound,
 } from 'lucide-react';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -132,6 +134,8 @@ export default function Dashboard() {
   const [editRecord, setEditRecord] = useState(null);
   const [editForm, setEditForm] = useState({ content: '', ttl: 1, proxied: false });
   const [editLoading, setEditLoading] = useState(false);
+  const [ddnsToken, setDdnsToken] = useState(null);
+  const [ddnsLoading, setDdnsLoading] = useState(false);
 
   // Delete dialog
   const [deleteOpen, setDeleteOpen] = useState(false);
@@ -142,8 +146,7 @@ export default function Dashboard() {
 
   const fetchRecords = useCallback(async () => {
     try {
-      const res = await axios.get(`${API}/dns/records`, { headers: getHeaders() });
-      setRecords(res.data.records || []);
+      setRecords(await fetchAllPages(`${API}/dns/records`, 'records', { headers: getHeaders() }));
     } catch {
       toast.error('Failed to load records');
     } finally {
@@ -176,16 +179,50 @@ export default function Dashboard() {
     fetchDomains();
   }, [fetchRecords, fetchStats, fetchDomains]);
 
+  const userId = user?.id;
+
+  // Live updates: changes made elsewhere (dyndns, provisioning, admins) are patched in place
+  useEffect(() => {
+    if (!token || !userId) return undefined;
+    const reload = () => {
+      fetchRecords();
+      fetchStats();
+      fetchDomains();
+    };
+    return subscribeEvents(`${API}/events`, token, {
+      ready: ({ reconnected }) => reconnected && reload(),
+      resync: reload,
+      record: (event) => {
+        // Admins receive every user's records; the dashboard lists only their own
+        if (event.user_id !== userId) return;
+        setRecords((prev) => (event.op === 'delete' ? removeById(prev, event.id) : upsertById(prev, event.record)));
+      },
+      domain: (event) => {
+        setDomains((prev) => (event.op === 'delete' || !event.domain.active ? removeById(prev, event.domain?.id ?? event.id) : upsertById(prev, event.domain)));
+      },
+      user: (event) => (event.user?.id ?? event.id) === userId && fetchStats(),
+    });
+  }, [token, userId, fetchRecords, fetchStats, fetchDomains]);
+
   const handleCreate = async (e) => {
     e.preventDefault();
     setCreateLoading(true);
     try {
-      await axios.post(`${API}/dns/records`, createForm, { headers: getHeaders() });
-      toast.success('Record created successfully!');
+      const res = await axios.post(`${API}/dns/records`, createForm, { headers: getHeaders() });
       setCreateOpen(false);
       setCreateForm(prev => ({ record_type: 'A', name: '', content: '', domain_id: prev.domain_id, ttl: 1, proxied: false }));
-      fetchRecords();
-      fetchStats();
+      const { status_url: statusUrl, ...record } = res.data;
+      setRecords(prev => upsertById(prev, record));
+      if (res.status === 202) {
+        // Accepted as pending: wait for the provisioning worker, then show the outcome
+        toast.info('Record is being created...');
+        const { data } = await axios.get(`${BACKEND_URL}${statusUrl}?wait=30`, { headers: getHeaders() });
+        if (data.status === 'failed') toast.error(data.error || 'Failed to create record');
+        else if (data.status === 'active') toast.success('Record created successfully!');
+        setRecords(prev => upsertById(prev, data));
+      } else {
+        toast.success('Record created successfully!');
+      }
     } catch (err) {
       toast.error(err.response?.data?.detail || 'Failed to create record');
     } finally {
@@ -197,10 +234,10 @@ export default function Dashboard() {
     e.preventDefault();
     setEditLoading(true);
     try {
-      await axios.put(`${API}/dns/records/${editRecord.id}`, editForm, { headers: getHeaders() });
+      const res = await axios.put(`${API}/dns/records/${editRecord.id}`, editForm, { headers: getHeaders() });
       toast.success('Record updated successfully!');
       setEditOpen(false);
-      fetchRecords();
+      setRecords(prev => upsertById(prev, res.data));
     } catch (err) {
       toast.error(err.response?.data?.detail || 'Failed to update record');
     } finally {
@@ -214,8 +251,7 @@ export default function Dashboard() {
       await axios.delete(`${API}/dns/records/${deleteRecord.id}`, { headers: getHeaders() });
       toast.success('Record deleted successfully!');
       setDeleteOpen(false);
-      fetchRecords();
-      fetchStats();
+      setRecords(prev => removeById(prev, deleteRecord.id));
     } catch (err) {
       toast.error(err.response?.data?.detail || 'Failed to delete record');
     } finally {
@@ -223,7 +259,20 @@ export default function Dashboard() {
     }
   };
 
+  const handleGenerateToken = async () => {
+    setDdnsLoading(true);
+    try {
+      const res = await axios.post(`${API}/dns/records/${editRecord.id}/update-token`, {}, { headers: getHeaders() });
+      setDdnsToken(res.data);
+    } catch (err) {
+      toast.error(err.response?.data?.detail || 'Failed to generate token');
+    } finally {
+      setDdnsLoading(false);
+    }
+  };
+
   const openEdit = (record) => {
+    setDdnsToken(null);
     setEditRecord(record);
     setEditForm({ content: record.content, ttl: record.ttl || 1, proxied: record.proxied || false });
     setEditOpen(true);
@@ -241,11 +290,15 @@ export default function Dashboard() {
     return t('dashboard.content_placeholder_cname');
   };
 
+  const ddnsUrl = ddnsToken ? `${BACKEND_URL}/nic/update?hostname=${ddnsToken.hostname}&token=${ddnsToken.token}` : '';
+
   const selectedDomain = domains.find(d => d.id === createForm.domain_id);
   const selectedDomainName = selectedDomain?.name || 'dnslab.biz';
 
   const recordLimit = userStats?.record_limit === -1 ? t('dashboard.stats.unlimited') : userStats?.record_limit ?? 2;
-  const canCreate = userStats?.record_limit === -1 || (userStats?.record_count ?? 0) < (userStats?.record_limit ?? 2);
+  // Counted from the list once loaded, so in-place updates keep it current
+  const recordCount = loading ? (userStats?.record_count ?? 0) : records.length;
+  const canCreate = userStats?.record_limit === -1 || recordCount < (userStats?.record_limit ?? 2);
 
   return (
     <div className="min-h-screen bg-background" data-testid="dashboard-page">
@@ -286,7 +339,7 @@ export default function Dashboard() {
           <StatsCard
             icon={Database}
             title={t('dashboard.stats.total_records')}
-            value={userStats?.record_count ?? 0}
+            value={recordCount}
           />
           <StatsCard
             icon={Server}
@@ -356,6 +409,11 @@ export default function Dashboard() {
                         <Badge variant={record.proxied ? 'default' : 'outline'} className="text-[10px]">
                           {record.proxied ? 'Proxied' : 'DNS Only'}
                         </Badge>
+                        {record.status && record.status !== 'active' && (
+                          <Badge variant={record.status === 'failed' ? 'destructive' : 'secondary'} className="text-[10px]" title={record.error}>
+                            {record.status === 'failed' ? 'Failed' : 'Pending'}
+                          </Badge>
+                        )}
                       </div>
                     </div>
                   ))}
@@ -401,6 +459,11 @@ export default function Dashboard() {
                           <Badge variant={record.proxied ? 'default' : 'outline'} className="text-[10px]">
                             {record.proxied ? 'ON' : 'OFF'}
                           </Badge>
+                          {record.status && record.status !== 'active' && (
+                            <Badge variant={record.status === 'failed' ? 'destructive' : 'secondary'} className="ml-1 text-[10px]" title={record.error}>
+                              {record.status === 'failed' ? 'Failed' : 'Pending'}
+                            </Badge>
+                          )}
                         </TableCell>
                         <TableCell>
                           <div className="flex items-center justify-end gap-1">
@@ -565,6 +628,24 @@ export default function Dashboard() {
                 data-testid="edit-proxied-switch"
               />
             </div>
+            {editRecord && ['A', 'AAAA'].includes(editRecord.record_type) && (
+              <div className="rounded-md border border-border/60 p-3 space-y-2" data-testid="ddns-token-section">
+                <div className="flex items-center justify-between gap-2">
+                  <Label>{t('dashboard.ddns_title')}</Label>
+                  <Button type="button" variant="outline" size="sm" className="gap-2" onClick={handleGenerateToken} disabled={ddnsLoading} data-testid="ddns-token-btn">
+                    {ddnsLoading ? <Loader2 className="h-3.5 w-3.5 animate-spin" /> : <KeyRound className="h-3.5 w-3.5" />}
+                    {t('dashboard.ddns_generate')}
+                  </Button>
+                </div>
+                <p className="text-xs text-muted-foreground">{t('dashboard.ddns_hint')}</p>
+                {ddnsToken && (
+                  <div className="flex items-center gap-1 font-mono text-xs bg-muted/30 rounded px-3 py-2 break-all" dir="ltr">
+                    <span className="flex-1">{ddnsUrl}</span>
+                    <CopyButton text={ddnsUrl} />
+                  </div>
+                )}
+              </div>
+            )}
             <DialogFooter>
               <Button type="button" variant="outline" onClick={() => setEditOpen(false)}>
                 {t('dashboard.cancel')}
@@ -107,6 +107,9 @@ export const translations = {
       content_placeholder_aaaa: "e.g. 2001:db8::1",
       content_placeholder_cname: "e.g. example.com",
       content_placeholder_ns: "e.g. ns1.example.com",
+      ddns_title: "Dynamic DNS (router / script)",
+      ddns_generate: "Generate Token",
+      ddns_hint: "Use this URL in your router's dyndns2 settings. Generating a new token revokes the previous one.",
       stats: {
         total_records: "Total Records",
         record_limit: "Record Limit",
@@ -142,6 +145,12 @@ export const translations = {
       setup_admin: "Setup Admin",
       setup_desc: "Promote user to admin role",
       no_users: "No users found",
+      search_users: "Search by email",
+      sort_newest: "Newest",
+      sort_records: "Most records",
+      load_more: "Load more",
+      export_zone: "Export zone file",
+      import_zone: "Import zone file",
       gmail_only: "Only Gmail addresses (@gmail.com) are allowed",
       view_records: "User DNS Records",
       no_records: "This user has no DNS records",
@@ -160,6 +169,7 @@ export const translations = {
       no_domains: "No domains added yet",
       total_domains: "Total Domains",
       active_domains: "Active Domains",
+      growth: "Growth (last 30 days)",
     },
   },
   fa: {
@@ -270,6 +280,9 @@ export const translations = {
       content_placeholder_aaaa: "مثلا 2001:db8::1",
       content_placeholder_cname: "مثلا example.com",
       content_placeholder_ns: "مثلا ns1.example.com",
+      ddns_title: "DNS داینامیک (روتر / اسکریپت)",
+      ddns_generate: "ساخت توکن",
+      ddns_hint: "این آدرس را در تنظیمات dyndns2 روتر خود وارد کنید. ساخت توکن جدید، توکن قبلی را باطل می\u200Cکند.",
       stats: {
         total_records: "تعداد رکوردها",
         record_limit: "سقف رکورد",
@@ -305,6 +318,12 @@ export const translations = {
       setup_admin: "تنظیم ادمین",
       setup_desc: "ارتقای کاربر به نقش ادمین",
       no_users: "کاربری یافت نشد",
+      search_users: "جستجو بر اساس ایمیل",
+      sort_newest: "جدیدترین",
+      sort_records: "بیشترین رکورد",
+      load_more: "نمایش بیشتر",
+      export_zone: "خروجی فایل زون",
+      import_zone: "وارد کردن فایل زون",
       gmail_only: "فقط آدرس\u200Cهای جیمیل (@gmail.com) مجاز هستند",
       view_records: "رکوردهای DNS کاربر",
       no_records: "این کاربر هیچ رکورد DNS ندارد",
@@ -323,6 +342,7 @@ export const translations = {
       no_domains: "هنوز دامنه\u200Cای اضافه نشده",
       total_domains: "کل دامنه\u200Cها",
       active_domains: "دامنه\u200Cهای فعال",
+      growth: "رشد (۳۰ روز اخیر)",
     },
   },
 };
@@ -90,6 +90,8 @@ set_env_val() {
 BACKEND_ENV="$PROJECT_DIR/backend/.env"
 FRONTEND_ENV="$PROJECT_DIR/frontend/.env"
 BACKEND_PORT=8001
+# uvicorn worker processes (default: one per CPU core); override with BACKEND_WORKERS=N ./install.sh
+BACKEND_WORKERS="${BACKEND_WORKERS:-$(nproc 2>/dev/null || echo 1)}"
 
 # ============================================================
 #  MANAGEMENT MENU (called via: ddns or install.sh menu)
@@ -933,6 +935,10 @@ else
             # Fallback: try community package if mongodb-org fails
             if ! check_command mongod; then
                 $SUDO apt-get install -y -qq mongodb > /dev/null 2>&1
+                if check_command mongod; then
+                    print_warn "Installed the distribution's mongodb package: $(mongod --version 2>/dev/null | head -1)"
+                    print_info "MongoDB 4.4+ is required, 5.0+ recommended (faster admin listings)"
+                fi
             fi
             ;;
         centos|rhel|rocky|almalinux|fedora)
@@ -1281,6 +1287,7 @@ SMTP_EMAIL=${SMTP_EMAIL}
 SMTP_PASSWORD=${SMTP_PASSWORD}
 TELEGRAM_BOT_TOKEN=${TELEGRAM_BOT_TOKEN}
 TELEGRAM_CHAT_ID=${TELEGRAM_CHAT_ID}
+RATE_LIMIT_STORE=mongo
 ENVEOF
 print_ok "backend/.env configured"
 
@@ -1327,7 +1334,7 @@ Group=$(id -gn)
 WorkingDirectory=${PROJECT_DIR}/backend
 Environment="PATH=${PROJECT_DIR}/backend/venv/bin:/usr/local/bin:/usr/bin:/bin"
 EnvironmentFile=${PROJECT_DIR}/backend/.env
-ExecStart=${PYTHON_PATH} -m uvicorn server:app --host 127.0.0.1 --port ${BACKEND_PORT}
+ExecStart=${PYTHON_PATH} -m uvicorn server:app --host 127.0.0.1 --port ${BACKEND_PORT} --workers ${BACKEND_WORKERS}
 Restart=always
 RestartSec=3
 StandardOutput=journal
@@ -1400,6 +1407,15 @@ server {
         proxy_read_timeout 86400;
     }
 
+    # dyndns2-compatible update endpoint used by routers and scripts
+    location /nic/ {
+        proxy_pass http://127.0.0.1:${BACKEND_PORT};
+        proxy_set_header Host \$host;
+        proxy_set_header X-Real-IP \$remote_addr;
+        proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto \$scheme;
+    }
+
     location /static/ {
         root ${PROJECT_DIR}/frontend/build;
         expires 1y;